@@ -9,10 +9,18 @@ from .template_filler import (
     EXPECTED_SHEETS,
     list_available_templates,
 )
+from .template_cache import TemplateCache, get_template_cache
+from .template_layout import TemplateLayout
+from .incremental import ExportSnapshot, get_snapshot_store
 
 __all__ = [
     'TemplateFiller',
     'TEMPLATE_MAPPING',
     'EXPECTED_SHEETS',
     'list_available_templates',
+    'TemplateCache',
+    'get_template_cache',
+    'TemplateLayout',
+    'ExportSnapshot',
+    'get_snapshot_store',
 ]
@@ -3,25 +3,50 @@ Export API Endpoints
 Provides endpoints for generating and downloading AESIA Excel exports.
 """
 
-from fastapi import APIRouter, Response, HTTPException
+from fastapi import APIRouter, Header, Response, HTTPException
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-import zipfile
-from io import BytesIO
+from typing import List, Optional, Dict, Any, Literal
+from collections import deque
+from concurrent.futures import Future
+import asyncio
+import json
+import logging
 import os
 
-from .template_filler import TemplateFiller, TEMPLATE_MAPPING, list_available_templates
+from .template_filler import TemplateFiller, TEMPLATE_MAPPING
+from .export_pool import fill_requirement, refill_requirement
+from .incremental import get_snapshot_store
+from .zip_stream import ZipStream
+from services.audit import get_audit_log
+from services.catalog import get_catalog
+from services.executor import ExecutorSaturated, get_executor
+from services.export_jobs import ExportJob, get_job_queue
+from services.gatekeeper import check_exportable
+from services.http_cache import directory_version, get_static_responses
+from services.result_cache import canonical_digest, etag_matches, get_result_cache, make_etag
+from services.storage import LocalStorageBackend
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/export", tags=["export"])
 
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
 # Initialize template filler
 TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), '..', 'templates')
 filler = TemplateFiller(TEMPLATES_DIR)
 
 
+def preload_templates() -> Dict[str, str]:
+    """Parse available templates and their layouts into the cache (startup hook)."""
+    return filler.preload()
+
+
 class AssessmentMG(BaseModel):
     mg_id: str
-    subpart_id: str
+    # Omitted: the assessment applies to every subpart the MG covers in the catalog
+    subpart_id: Optional[str] = None
     difficulty: Optional[str] = None
     maturity: Optional[str] = None
 
@@ -59,105 +84,395 @@ class FullExportRequest(BaseModel):
     requirements: List[ExportRequest]
 
 
-@router.get("/templates")
-async def get_available_templates():
-    """List available templates and their status."""
+def _expand_assessments_mg(assessments: List[AssessmentMG]) -> List[Dict[str, Any]]:
+    """One row per (MG, subpart); MG-level assessments expand via the catalog."""
+    catalog = get_catalog()
+    rows = []
+    for a in assessments:
+        row = a.model_dump()
+        if row['subpart_id']:
+            rows.append(row)
+        else:
+            rows.extend({**row, 'subpart_id': subpart_id} for subpart_id in catalog.mg_subparts(a.mg_id))
+    return rows
+
+
+def _fill_kwargs(req: ExportRequest) -> Dict[str, Any]:
+    """Convert an ExportRequest into TemplateFiller.fill_template keyword arguments."""
     return {
-        "available": list_available_templates(TEMPLATES_DIR),
-        "total": len(TEMPLATE_MAPPING)
+        'requirement_code': req.requirement_code,
+        'assessments_mg': _expand_assessments_mg(req.assessments_mg),
+        'measures_additional': [m.model_dump() for m in req.measures_additional] if req.measures_additional else None,
+        'assessments_ma': [a.model_dump() for a in req.assessments_ma] if req.assessments_ma else None,
+        'ma_to_subpart': [r.model_dump() for r in req.ma_to_subpart] if req.ma_to_subpart else None,
+        'application_info': req.application_info,
     }
 
 
+@router.get("/templates")
+async def get_available_templates(if_none_match: Optional[str] = Header(None)):
+    """List available templates and their status (cached until the templates directory changes)."""
+    def build():
+        return {
+            "available": {code: filler.get_template_path(code) is not None for code in TEMPLATE_MAPPING},
+            "total": len(TEMPLATE_MAPPING)
+        }
+    return get_static_responses().respond("templates", directory_version(TEMPLATES_DIR), build, if_none_match)
+
+
+def export_cache_key(requirement_code: str, template_version: str, fill_kwargs: Dict[str, Any]) -> str:
+    """
+    Content hash of a template fill. Inputs are normalized the way the filler
+    reads them (last assessment per key wins, relation order is irrelevant).
+    """
+    def latest_by_key(rows, id_field):
+        latest = {(r.get(id_field) or '', r.get('subpart_id') or ''): r for r in rows or []}
+        return [latest[key] for key in sorted(latest)]
+    
+    return canonical_digest(
+        'template_fill',
+        requirement_code,
+        template_version,
+        latest_by_key(fill_kwargs['assessments_mg'], 'mg_id'),
+        latest_by_key(fill_kwargs['assessments_ma'], 'ma_id'),
+        fill_kwargs['measures_additional'] or [],
+        sorted({(r['ma_id'], r['subpart_id']) for r in fill_kwargs['ma_to_subpart'] or []}),
+        fill_kwargs['application_info'] or {},
+    )
+
+
+def _submit_fill(application_id: Optional[str], fill_kwargs: Dict[str, Any], admitted: bool = True) -> Future:
+    """
+    Submit a template fill to the CPU pool; returns a Future of the xlsx bytes.
+    
+    With an application id the fill patches the last export of the same
+    requirement (only rows whose inputs changed are rewritten) and the new
+    snapshot replaces it once the fill completes.
+    """
+    executor = get_executor()
+    if not application_id:
+        return executor.submit('cpu', fill_requirement, TEMPLATES_DIR, fill_kwargs, admitted=admitted)
+    
+    snapshots = get_snapshot_store()
+    requirement_code = fill_kwargs['requirement_code']
+    previous = snapshots.get(application_id, requirement_code)
+    inner = executor.submit('cpu', refill_requirement, TEMPLATES_DIR, fill_kwargs, previous, admitted=admitted)
+    outer: Future = Future()
+    
+    def done(future: Future):
+        try:
+            excel_bytes, snapshot = future.result()
+        except BaseException as e:
+            outer.set_exception(e)
+            return
+        snapshots.put(application_id, requirement_code, snapshot)
+        outer.set_result(excel_bytes)
+    
+    inner.add_done_callback(done)
+    return outer
+
+
 @router.post("/single/{requirement_code}")
-async def export_single_requirement(requirement_code: str, request: ExportRequest):
+async def export_single_requirement(
+    requirement_code: str,
+    request: ExportRequest,
+    application_id: str,
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Export a single requirement's checklist as filled Excel file.
     
+    Identical inputs are served from the result cache; the response carries a
+    strong ETag and If-None-Match is answered with 304. The application must
+    pass the Gatekeeper (409 otherwise) and a cache miss patches the
+    application's previous export of the requirement.
+    
     Returns the Excel file as downloadable attachment.
     """
     if requirement_code not in TEMPLATE_MAPPING:
         raise HTTPException(status_code=404, detail=f"Unknown requirement: {requirement_code}")
+    await check_exportable(application_id)
     
     template_path = filler.get_template_path(requirement_code)
     if not template_path:
         raise HTTPException(status_code=404, detail=f"Template not found for: {requirement_code}")
     
+    fill_kwargs = {**_fill_kwargs(request), 'requirement_code': requirement_code}
+    cache_key = export_cache_key(requirement_code, filler.get_template_version(requirement_code), fill_kwargs)
+    etag = make_etag(cache_key)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    executor = get_executor()
+    cache = get_result_cache()
     try:
-        excel_bytes = filler.fill_template(
-            requirement_code=requirement_code,
-            assessments_mg=[a.dict() for a in request.assessments_mg],
-            measures_additional=[m.dict() for m in request.measures_additional] if request.measures_additional else None,
-            assessments_ma=[a.dict() for a in request.assessments_ma] if request.assessments_ma else None,
-            ma_to_subpart=[r.dict() for r in request.ma_to_subpart] if request.ma_to_subpart else None,
-            application_info=request.application_info
-        )
+        excel_bytes = await executor.run_io(cache.get, cache_key, admitted=True)
+        headers["X-Cache"] = "HIT" if excel_bytes is not None else "MISS"
+        if excel_bytes is None:
+            excel_bytes = await asyncio.wrap_future(_submit_fill(application_id, fill_kwargs, admitted=False))
+            await executor.run_io(cache.put, cache_key, excel_bytes, admitted=True)
         
         filename = f"{requirement_code}_Checklist_Filled.xlsx"
+        get_audit_log().log('EXPORT_SINGLE', metadata={
+            'application_id': application_id, 'requirement_code': requirement_code, 'cache': headers["X-Cache"],
+        })
         
         return Response(
             content=excel_bytes,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+            media_type=XLSX_MEDIA_TYPE,
             headers={
+                **headers,
                 "Content-Disposition": f'attachment; filename="{filename}"'
             }
         )
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _default_zip_compression() -> str:
+    """ZIP mode from EXPORT_ZIP_COMPRESSION; xlsx is already deflated, so STORED by default."""
+    return os.environ.get('EXPORT_ZIP_COMPRESSION', 'stored')
+
+
+class _FullExportArchive:
+    """ZIP of filled checklists plus a manifest.json of per-requirement outcomes."""
+    
+    def __init__(self, application_id: str, compression: str):
+        self.stream = ZipStream(compression)
+        self.manifest = {"application_id": application_id, "files": []}
+    
+    def skipped(self, requirement_code: str):
+        self.manifest["files"].append(
+            {"requirement_code": requirement_code, "status": "skipped", "error": "Unknown requirement"}
+        )
+    
+    def failed(self, requirement_code: str, error: Exception):
+        logger.error("Error processing %s: %s", requirement_code, error)
+        self.manifest["files"].append(
+            {"requirement_code": requirement_code, "status": "failed", "error": str(error)}
+        )
+    
+    def add(self, requirement_code: str, excel_bytes: bytes) -> bytes:
+        filename = f"{requirement_code}_Checklist.xlsx"
+        chunk = self.stream.add(filename, excel_bytes)
+        self.manifest["files"].append({
+            "requirement_code": requirement_code,
+            "status": "ok",
+            "file_name": filename,
+            "size_bytes": len(excel_bytes),
+        })
+        return chunk
+    
+    def close(self) -> bytes:
+        manifest_bytes = json.dumps(self.manifest, indent=2, ensure_ascii=False).encode('utf-8')
+        return self.stream.add("manifest.json", manifest_bytes) + self.stream.close()
+
+
+def _ordered_submissions(application_id: str, requirements: List[ExportRequest]):
+    """
+    Yield (request, future) in request order, keeping at most pool-size fills
+    in flight. Unknown requirement codes yield a None future.
+    """
+    executor = get_executor()
+    window = executor.workers('cpu')
+    valid = iter([req for req in requirements if req.requirement_code in TEMPLATE_MAPPING])
+    pending = deque()
+    
+    for req in requirements:
+        if req.requirement_code not in TEMPLATE_MAPPING:
+            yield req, None
+            continue
+        while len(pending) < window:
+            nxt = next(valid, None)
+            if nxt is None:
+                break
+            pending.append(_submit_fill(application_id, _fill_kwargs(nxt)))
+        yield req, pending.popleft()
+
+
+async def _stream_full_export(request: FullExportRequest, compression: str):
+    """Yield the ZIP archive of a full export, flushing each checklist once filled."""
+    archive = _FullExportArchive(request.application_id, compression)
+    for req, future in _ordered_submissions(request.application_id, request.requirements):
+        if future is None:
+            archive.skipped(req.requirement_code)
+            continue
+        try:
+            excel_bytes = await asyncio.wrap_future(future)
+        except Exception as e:
+            archive.failed(req.requirement_code, e)
+            continue
+        yield await get_executor().run_io(archive.add, req.requirement_code, excel_bytes, admitted=True)
+    yield archive.close()
+
+
+def _build_full_export(request: FullExportRequest, compression: str):
+    """Blocking variant of _stream_full_export, used by background jobs."""
+    archive = _FullExportArchive(request.application_id, compression)
+    for req, future in _ordered_submissions(request.application_id, request.requirements):
+        if future is None:
+            archive.skipped(req.requirement_code)
+            continue
+        try:
+            excel_bytes = future.result()
+        except Exception as e:
+            archive.failed(req.requirement_code, e)
+            continue
+        yield archive.add(req.requirement_code, excel_bytes)
+    yield archive.close()
+
+
+def _full_export_filename(application_id: str) -> str:
+    return f"IA_Sandbox_Checklists_{application_id}.zip"
+
+
 @router.post("/full")
-async def export_all_requirements(request: FullExportRequest):
+async def export_all_requirements(
+    request: FullExportRequest,
+    compression: Optional[Literal['stored', 'deflated']] = None,
+):
     """
     Export all requirements as a ZIP file containing 12 Excel files.
     
+    The archive is streamed: each checklist is sent as soon as it is filled.
+    Per-requirement results are listed in manifest.json inside the ZIP.
+    The application must pass the Gatekeeper (409 otherwise).
+    
     Returns a ZIP file as downloadable attachment.
     """
-    zip_buffer = BytesIO()
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        for req in request.requirements:
-            if req.requirement_code not in TEMPLATE_MAPPING:
-                continue
-            
-            try:
-                excel_bytes = filler.fill_template(
-                    requirement_code=req.requirement_code,
-                    assessments_mg=[a.dict() for a in req.assessments_mg],
-                    measures_additional=[m.dict() for m in req.measures_additional] if req.measures_additional else None,
-                    assessments_ma=[a.dict() for a in req.assessments_ma] if req.assessments_ma else None,
-                    ma_to_subpart=[r.dict() for r in req.ma_to_subpart] if req.ma_to_subpart else None,
-                    application_info=req.application_info
-                )
-                
-                filename = f"{req.requirement_code}_Checklist.xlsx"
-                zip_file.writestr(filename, excel_bytes)
-            except Exception as e:
-                # Log error but continue with other files
-                print(f"Error processing {req.requirement_code}: {e}")
-    
-    zip_buffer.seek(0)
-    zip_content = zip_buffer.getvalue()
-    
-    return Response(
-        content=zip_content,
+    await check_exportable(request.application_id)
+    # Admission happens before streaming starts; a saturated pool yields 503
+    get_executor().ensure_capacity('cpu')
+    get_audit_log().log('EXPORT_FULL', metadata={
+        'application_id': request.application_id, 'requirements': len(request.requirements),
+    })
+    return StreamingResponse(
+        _stream_full_export(request, compression or _default_zip_compression()),
         media_type="application/zip",
         headers={
-            "Content-Disposition": f'attachment; filename="IA_Sandbox_Checklists_{request.application_id}.zip"'
+            "Content-Disposition": f'attachment; filename="{_full_export_filename(request.application_id)}"'
         }
     )
 
 
+# ============ Export Jobs ============
+
+def _job_response(job: ExportJob) -> Dict[str, Any]:
+    return {
+        **job.to_dict(),
+        "status_url": f"{router.prefix}/jobs/{job.id}",
+        "download_url": f"{router.prefix}/jobs/{job.id}/download",
+    }
+
+
+async def _artifact_response(job: ExportJob) -> Response:
+    media_type = "application/zip" if job.export_type == 'FULL_ZIP' else XLSX_MEDIA_TYPE
+    get_audit_log().log('FILE_DOWNLOAD', entity_type='export', entity_id=job.id, metadata={
+        'application_id': job.application_id, 'file_name': job.file_name,
+    })
+    storage = get_job_queue().storage
+    if isinstance(storage, LocalStorageBackend):
+        # Streamed from the file in chunks, read off the event loop
+        return FileResponse(storage.local_path(job.storage_path), media_type=media_type, filename=job.file_name)
+    return Response(
+        content=await get_executor().run_io(storage.get, job.storage_path),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{job.file_name}"'}
+    )
+
+
+@router.post("/jobs/single/{requirement_code}", status_code=202)
+async def enqueue_single_export(requirement_code: str, request: ExportRequest, application_id: str):
+    """
+    Queue a single requirement export. Poll GET /export/jobs/{job_id} and
+    download the artifact once its status is DONE.
+    """
+    if requirement_code not in TEMPLATE_MAPPING:
+        raise HTTPException(status_code=404, detail=f"Unknown requirement: {requirement_code}")
+    if not filler.get_template_path(requirement_code):
+        raise HTTPException(status_code=404, detail=f"Template not found for: {requirement_code}")
+    await check_exportable(application_id)
+    
+    fill_kwargs = {**_fill_kwargs(request), 'requirement_code': requirement_code}
+    job = ExportJob(
+        application_id=application_id,
+        export_type='SINGLE_REQUIREMENT',
+        requirement_code=requirement_code,
+        file_name=f"{requirement_code}_Checklist_Filled.xlsx",
+        template_version_map={requirement_code: filler.get_template_version(requirement_code)},
+    )
+    job = get_job_queue().enqueue(job, lambda: _submit_fill(application_id, fill_kwargs).result())
+    get_audit_log().log('EXPORT_SINGLE', entity_id=job.id, metadata={
+        'application_id': application_id, 'requirement_code': requirement_code, 'job': True,
+    })
+    return _job_response(job)
+
+
+@router.post("/jobs/full", status_code=202)
+async def enqueue_full_export(
+    request: FullExportRequest,
+    compression: Optional[Literal['stored', 'deflated']] = None,
+):
+    """Queue a full ZIP export of all requirements (the application must pass the Gatekeeper)."""
+    await check_exportable(request.application_id)
+    compression = compression or _default_zip_compression()
+    job = ExportJob(
+        application_id=request.application_id,
+        export_type='FULL_ZIP',
+        file_name=_full_export_filename(request.application_id),
+        template_version_map={
+            req.requirement_code: filler.get_template_version(req.requirement_code)
+            for req in request.requirements
+            if req.requirement_code in TEMPLATE_MAPPING and filler.get_template_path(req.requirement_code)
+        },
+    )
+    job = get_job_queue().enqueue(job, lambda: _build_full_export(request, compression))
+    get_audit_log().log('EXPORT_FULL', entity_id=job.id, metadata={
+        'application_id': request.application_id, 'requirements': len(job.template_version_map), 'job': True,
+    })
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}")
+async def get_export_job(job_id: str):
+    """Status of an export job (QUEUED, RUNNING, DONE or FAILED)."""
+    job = get_job_queue().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Export job not found: {job_id}")
+    return _job_response(job)
+
+
+@router.get("/jobs/{job_id}/download")
+async def download_export_job(job_id: str):
+    """Download the artifact of a finished export job."""
+    job = get_job_queue().get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Export job not found: {job_id}")
+    if job.status == 'FAILED':
+        raise HTTPException(status_code=500, detail=job.error_message)
+    if job.status != 'DONE':
+        raise HTTPException(status_code=409, detail=f"Export job is {job.status}")
+    if job.is_expired:
+        raise HTTPException(status_code=410, detail="Export expired")
+    return await _artifact_response(job)
+
+
 @router.get("/download/{application_id}/{requirement_code}")
 async def download_export(application_id: str, requirement_code: str):
     """
-    Download a previously generated export from storage.
+    Download the latest finished export of an application from storage.
     
-    This endpoint checks Supabase storage for existing exports.
-    Falls back to generating a new one if not found.
+    Use requirement_code=FULL for the full ZIP export.
     """
-    # TODO: Implement Supabase storage lookup
-    # For now, return 404
-    raise HTTPException(
-        status_code=404, 
-        detail="Export not found. Use POST /export/single/{requirement_code} to generate."
+    job = get_job_queue().latest_done(
+        application_id, None if requirement_code == 'FULL' else requirement_code
     )
+    if not job:
+        raise HTTPException(
+            status_code=404, 
+            detail="Export not found. Use POST /export/jobs/single/{requirement_code} to generate."
+        )
+    return await _artifact_response(job)
@@ -0,0 +1,52 @@
+"""
+Export Pool - Worker-side entry points
+Functions executed inside the shared CPU process pool (services.executor).
+Each worker process keeps its own TemplateFiller and template cache.
+"""
+
+from typing import Any, Dict, Optional, Tuple
+
+from .incremental import ExportSnapshot
+from .template_filler import TemplateFiller
+
+# One filler per worker process and templates dir (each with its own template cache)
+_worker_fillers: Dict[str, TemplateFiller] = {}
+
+
+def fill_requirement(templates_dir: str, fill_kwargs: Dict[str, Any]) -> bytes:
+    """
+    Fill one requirement template inside a worker process.
+
+    Args:
+        templates_dir: Directory holding the AESIA templates
+        fill_kwargs: Keyword arguments for TemplateFiller.fill_template
+
+    Returns:
+        Excel file as bytes
+    """
+    return _filler(templates_dir).fill_template(**fill_kwargs)
+
+
+def refill_requirement(
+    templates_dir: str, fill_kwargs: Dict[str, Any], previous: Optional[ExportSnapshot]
+) -> Tuple[bytes, ExportSnapshot]:
+    """
+    Fill one requirement template by patching its previous export.
+
+    Args:
+        templates_dir: Directory holding the AESIA templates
+        fill_kwargs: Keyword arguments for TemplateFiller.fill_template
+        previous: Snapshot returned by the last call for the same
+                  application and requirement (None for a full fill)
+
+    Returns:
+        Excel file as bytes and the snapshot for the next call
+    """
+    return _filler(templates_dir).fill_template_incremental(previous, **fill_kwargs)
+
+
+def _filler(templates_dir: str) -> TemplateFiller:
+    filler = _worker_fillers.get(templates_dir)
+    if filler is None:
+        filler = _worker_fillers[templates_dir] = TemplateFiller(templates_dir)
+    return filler
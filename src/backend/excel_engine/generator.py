@@ -2,14 +2,28 @@
 Generador de Excel - Motor de Exportación (9 pestañas)
 Sistema de Preevaluación Sandbox IA España
 """
+from dataclasses import dataclass, field
 from io import BytesIO
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 from datetime import datetime
+import os
 
 from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side, NamedStyle
+from openpyxl.styles.fonts import DEFAULT_FONT
 from openpyxl.utils import get_column_letter
 
+from services.catalog import get_catalog
+from services.relations import Relation
+
+# Versión del formato generado: incrementar cuando cambie el contenido renderizado
+# (invalida las exportaciones cacheadas)
+GENERATOR_VERSION = "3"
+
+# A partir de este número de filas de datos se usa el modo write-only (streaming)
+WRITE_ONLY_THRESHOLD = int(os.environ.get('EXCEL_WRITE_ONLY_THRESHOLD', 5000))
+
 # Colores corporativos Garrigues
 GARRIGUES_GREEN = "004438"  # PANTONE 3308 C
 BRIGHT_GREEN = "009A77"
@@ -19,54 +33,165 @@ LIGHT_GREEN = "D4EDDA"
 LIGHT_YELLOW = "FFF3CD"
 
 
-def create_header_style() -> Dict:
-    """Estilo para encabezados de tabla."""
-    return {
+# ============ Estilos ============
+# Los objetos de estilo se crean una sola vez. Las celdas de tabla usan estilos
+# con nombre (NamedStyle) que se registran en cada libro y se asignan por nombre,
+# de modo que no se reconstruyen Font/Fill/Border por celda.
+
+_THIN = Side(style='thin')
+_GRID = Border(left=_THIN, right=_THIN, top=_THIN, bottom=_THIN)
+_WRAP = Alignment(vertical='center', wrap_text=True)
+_CENTER = Alignment(horizontal='center', vertical='center')
+
+
+def _solid(color: str) -> PatternFill:
+    return PatternFill(start_color=color, end_color=color, fill_type='solid')
+
+
+# Estilos con nombre: nombre -> atributos del NamedStyle
+NAMED_STYLES: Dict[str, Dict] = {
+    'header': {
         'font': Font(bold=True, color=WHITE),
-        'fill': PatternFill(start_color=GARRIGUES_GREEN, end_color=GARRIGUES_GREEN, fill_type='solid'),
+        'fill': _solid(GARRIGUES_GREEN),
         'alignment': Alignment(horizontal='center', vertical='center', wrap_text=True),
-        'border': Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-    }
+        'border': _GRID,
+    },
+    'cell': {'font': DEFAULT_FONT, 'alignment': _WRAP, 'border': _GRID},
+    'status-ok': {'font': DEFAULT_FONT, 'alignment': _WRAP, 'border': _GRID, 'fill': _solid(LIGHT_GREEN)},
+    'status-pending': {'font': DEFAULT_FONT, 'alignment': _WRAP, 'border': _GRID, 'fill': _solid(LIGHT_YELLOW)},
+    'matrix-cell': {'font': DEFAULT_FONT, 'alignment': _CENTER, 'border': _GRID},
+    'matrix-hit': {'font': DEFAULT_FONT, 'alignment': _CENTER, 'border': _GRID, 'fill': _solid(LIGHT_GREEN)},
+}
+
+# Estilos puntuales (títulos, avisos) aplicados atributo a atributo
+TITLE_FONT = Font(size=16, bold=True, color=GARRIGUES_GREEN)
+PLACEHOLDER_FONT = Font(italic=True, color='666666')
+
+
+def register_named_styles(wb):
+    """
+    Registra los estilos con nombre en el libro (si no lo están ya).
+
+    Cada libro recibe sus propias instancias de NamedStyle, porque openpyxl
+    guarda en ellas los índices de la tabla de estilos del libro al que se
+    vinculan; los objetos Font/Fill/Border sí se comparten.
+    """
+    registered = set(wb.named_styles)
+    for name, attrs in NAMED_STYLES.items():
+        if name not in registered:
+            wb.add_named_style(NamedStyle(name=name, **attrs))
+
+
+def create_header_style() -> Dict:
+    """Estilo para encabezados de tabla."""
+    return dict(NAMED_STYLES['header'])
 
 
 def create_cell_style() -> Dict:
     """Estilo para celdas normales."""
-    return {
-        'alignment': Alignment(vertical='center', wrap_text=True),
-        'border': Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-    }
-
-
-def apply_style(cell, style_dict: Dict):
-    """Aplica un diccionario de estilos a una celda."""
-    for attr, value in style_dict.items():
+    return dict(NAMED_STYLES['cell'])
+
+
+def apply_style(cell, style):
+    """Aplica a una celda un estilo con nombre o un diccionario de estilos."""
+    if isinstance(style, str):
+        cell.style = style
+        return
+    for attr, value in style.items():
         setattr(cell, attr, value)
 
 
-def render_portada(ws, data: Dict):
+# ============ Modelo de pestañas ============
+# Cada pestaña se describe como un SheetSpec: filas (generadas perezosamente),
+# anchos de columna y rangos combinados. El mismo spec se vuelca en una hoja
+# estándar (write_sheet) o en una hoja write-only en streaming (stream_sheet),
+# por lo que ambos modos producen el mismo contenido y estilos.
+
+# Celda: (valor, estilo con nombre o diccionario de estilos) o None para dejarla vacía
+Cell = Optional[Tuple[Any, Optional[Union[str, Dict]]]]
+# Fila: (número de fila, celdas desde la columna A)
+Row = Tuple[int, List[Cell]]
+
+
+@dataclass
+class SheetSpec:
+    """Descripción de una pestaña lista para volcar en una hoja."""
+    title: str
+    rows: Iterable[Row]
+    widths: Dict[str, float] = field(default_factory=dict)
+    merges: List[str] = field(default_factory=list)
+
+
+def _title_rows(title: str, subtitle: Optional[str] = None) -> Iterator[Row]:
+    """Título en A1 y, opcionalmente, texto explicativo en A3."""
+    yield 1, [(title, {'font': TITLE_FONT})]
+    if subtitle:
+        yield 3, [(subtitle, None)]
+
+
+def _header_row(row: int, headers: List[str]) -> Row:
+    return row, [(header, 'header') for header in headers]
+
+
+def _placeholder_row(row: int, text: str) -> Row:
+    return row, [(text, {'font': PLACEHOLDER_FONT})]
+
+
+def _widths(widths: List[float]) -> Dict[str, float]:
+    return {get_column_letter(i): width for i, width in enumerate(widths, 1)}
+
+
+def write_sheet(ws, spec: SheetSpec):
+    """Vuelca un SheetSpec en una hoja estándar de openpyxl."""
+    register_named_styles(ws.parent)
+    for cell_range in spec.merges:
+        ws.merge_cells(cell_range)
+    for row_idx, cells in spec.rows:
+        for col, cell in enumerate(cells, 1):
+            if cell is None:
+                continue
+            value, style = cell
+            target = ws.cell(row=row_idx, column=col, value=value)
+            if style:
+                apply_style(target, style)
+    for letter, width in spec.widths.items():
+        ws.column_dimensions[letter].width = width
+
+
+def stream_sheet(ws, spec: SheetSpec):
+    """
+    Vuelca un SheetSpec en una hoja write-only: las filas se serializan a
+    medida que se generan. Anchos y rangos combinados deben fijarse antes.
+    """
+    register_named_styles(ws.parent)
+    for letter, width in spec.widths.items():
+        ws.column_dimensions[letter].width = width
+    for cell_range in spec.merges:
+        ws.merged_cells.add(cell_range)
+
+    next_row = 1
+    for row_idx, cells in spec.rows:
+        while next_row < row_idx:
+            ws.append([])
+            next_row += 1
+        row = []
+        for cell in cells:
+            if cell is None:
+                row.append(None)
+                continue
+            value, style = cell
+            target = WriteOnlyCell(ws, value=value)
+            if style:
+                apply_style(target, style)
+            row.append(target)
+        ws.append(row)
+        next_row += 1
+
+
+# ============ Pestañas ============
+
+def sheet_portada(data: Dict) -> SheetSpec:
     """Pestaña 1: Portada con datos del proyecto."""
-    ws.merge_cells('A1:D1')
-    ws['A1'] = 'INFORME DE PREEVALUACIÓN - SANDBOX IA ESPAÑA'
-    ws['A1'].font = Font(size=20, bold=True, color=GARRIGUES_GREEN)
-    ws['A1'].alignment = Alignment(horizontal='center')
-    
-    ws['A3'] = 'Fecha de generación:'
-    ws['B3'] = datetime.now().strftime('%d/%m/%Y %H:%M')
-    
-    ws['A5'] = 'DATOS DEL PROYECTO'
-    ws['A5'].font = Font(size=14, bold=True, color=GARRIGUES_GREEN)
-    
-    row = 7
     metadata = data.get('project_metadata', {})
     fields = [
         ('Nombre del Proyecto', metadata.get('nombre', '-')),
@@ -75,38 +200,39 @@ def render_portada(ws, data: Dict):
         ('Proveedor', metadata.get('proveedor', '-')),
         ('Descripción', metadata.get('descripcion', '-')),
     ]
-    
-    for label, value in fields:
-        ws[f'A{row}'] = label
-        ws[f'A{row}'].font = Font(bold=True)
-        ws[f'B{row}'] = str(value) if value else '-'
-        row += 1
-    
-    # Disclaimer
-    row += 2
-    ws[f'A{row}'] = 'AVISO LEGAL'
-    ws[f'A{row}'].font = Font(bold=True, color='C00000')
-    row += 1
-    ws.merge_cells(f'A{row}:D{row+2}')
-    ws[f'A{row}'] = (
-        'Este informe es una herramienta de autodiagnóstico y no constituye '
-        'una evaluación oficial del Sandbox de IA. Los resultados deben ser '
-        'validados por profesionales cualificados antes de su presentación.'
+    # Aviso legal tras los campos y dos filas en blanco
+    disclaimer_row = 7 + len(fields) + 2 + 1
+
+    def rows() -> Iterator[Row]:
+        yield 1, [('INFORME DE PREEVALUACIÓN - SANDBOX IA ESPAÑA', {
+            'font': Font(size=20, bold=True, color=GARRIGUES_GREEN),
+            'alignment': Alignment(horizontal='center'),
+        })]
+        yield 3, [('Fecha de generación:', None), (datetime.now().strftime('%d/%m/%Y %H:%M'), None)]
+        yield 5, [('DATOS DEL PROYECTO', {'font': Font(size=14, bold=True, color=GARRIGUES_GREEN)})]
+
+        for row, (label, value) in enumerate(fields, 7):
+            yield row, [(label, {'font': Font(bold=True)}), (str(value) if value else '-', None)]
+
+        # Disclaimer
+        yield disclaimer_row - 1, [('AVISO LEGAL', {'font': Font(bold=True, color='C00000')})]
+        yield disclaimer_row, [(
+            'Este informe es una herramienta de autodiagnóstico y no constituye '
+            'una evaluación oficial del Sandbox de IA. Los resultados deben ser '
+            'validados por profesionales cualificados antes de su presentación.',
+            {'alignment': Alignment(wrap_text=True)},
+        )]
+
+    return SheetSpec(
+        title="1. Portada",
+        rows=rows(),
+        widths={'A': 30, 'B': 50},
+        merges=['A1:D1', f'A{disclaimer_row}:D{disclaimer_row + 2}'],
     )
-    ws[f'A{row}'].alignment = Alignment(wrap_text=True)
-    
-    # Ajustar anchos
-    ws.column_dimensions['A'].width = 30
-    ws.column_dimensions['B'].width = 50
 
 
-def render_intro(ws):
+def sheet_intro() -> SheetSpec:
     """Pestaña 2: Introducción y escala L1-L8."""
-    ws['A1'] = 'ESCALA DE MADUREZ (L1-L8)'
-    ws['A1'].font = Font(size=16, bold=True, color=GARRIGUES_GREEN)
-    
-    ws['A3'] = 'Según la Guía 16 de AESIA, el nivel de madurez se evalúa en 8 niveles:'
-    
     levels = [
         ('L1', 'No identificada', 'La medida no ha sido identificada como necesaria'),
         ('L2', 'Identificada, no documentada', 'Se conoce la necesidad pero no está documentada'),
@@ -117,297 +243,231 @@ def render_intro(ws):
         ('L7', 'Implementada, evidencia completa', 'Implementada con evidencia completa'),
         ('L8', 'Cumplimiento total verificado', 'Cumplimiento verificado y validado'),
     ]
+
+    def rows() -> Iterator[Row]:
+        yield from _title_rows('ESCALA DE MADUREZ (L1-L8)')
+        yield 3, [('Según la Guía 16 de AESIA, el nivel de madurez se evalúa en 8 niveles:', None)]
+        yield _header_row(5, ['Nivel', 'Título', 'Descripción'])
+        for row, values in enumerate(levels, 6):
+            yield row, [(value, 'cell') for value in values]
+
+    return SheetSpec(title="2. Intro", rows=rows(), widths={'A': 10, 'B': 35, 'C': 60})
+
+
+def sheet_requirements(requirements: List[Dict]) -> SheetSpec:
+    """Pestaña 3: Listado de requisitos del RIA."""
+    def rows() -> Iterator[Row]:
+        yield from _title_rows('REQUISITOS DEL REGLAMENTO DE IA')
+        yield _header_row(3, ['ID', 'Artículo', 'Título', 'Descripción'])
+        for row, req in enumerate(requirements, 4):
+            values = [req.get('id', ''), req.get('article_ref', ''), req.get('title', ''), req.get('description', '')]
+            yield row, [(str(value) if value else '', 'cell') for value in values]
+
+    return SheetSpec(title="3. Artículo RIA", rows=rows(), widths={'A': 10, 'B': 12, 'C': 40, 'D': 60})
+
+
+def sheet_measures(measures: List[Dict]) -> SheetSpec:
+    """Pestaña 4: Listado de Medidas Guía (por defecto, las del catálogo)."""
+    measures_to_render = measures if measures else get_catalog().measures()
+
+    def rows() -> Iterator[Row]:
+        yield from _title_rows('MEDIDAS GUÍA (MG)', 'Catálogo de medidas según las Guías AESIA para cada requisito del RIA.')
+        yield _header_row(5, ['ID Medida', 'Requisito', 'Guía', 'Descripción'])
+        for row, measure in enumerate(measures_to_render, 6):
+            values = [measure.get('id', ''), measure.get('req', ''), measure.get('guide', ''), measure.get('desc', '')]
+            yield row, [(value, 'cell') for value in values]
+
+    return SheetSpec(title="4. Medidas Guía", rows=rows(), widths={'A': 12, 'B': 10, 'C': 10, 'D': 60})
+
+
+def sheet_rel_mg(measures_map: Optional[Dict] = None, requirement_ids: Optional[List[str]] = None) -> SheetSpec:
+    """
+    Pestaña 5: Matriz de relación Medidas-Requisitos.
     
-    # Headers
-    row = 5
-    headers = ['Nivel', 'Título', 'Descripción']
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=row, column=col, value=header)
-        apply_style(cell, create_header_style())
-    
-    # Data
-    for level, title, desc in levels:
-        row += 1
-        ws.cell(row=row, column=1, value=level)
-        ws.cell(row=row, column=2, value=title)
-        ws.cell(row=row, column=3, value=desc)
-        for col in range(1, 4):
-            apply_style(ws.cell(row=row, column=col), create_cell_style())
-    
-    ws.column_dimensions['A'].width = 10
-    ws.column_dimensions['B'].width = 35
-    ws.column_dimensions['C'].width = 60
+    Las columnas son requirement_ids (por defecto, los requisitos del catálogo).
+    measures_map es la forma dispersa {medida: [requisitos marcados]} (también
+    se admite la forma densa con un 0/1 por columna). Sin measures_map se usa
+    la matriz del catálogo.
+    """
+    catalog = get_catalog()
+    requirements = list(requirement_ids) if requirement_ids else catalog.requirement_codes
+    if measures_map:
+        relation = Relation.from_matrix(measures_map, requirements)
+    else:
+        relation = catalog.measure_relation(requirements)
+    empty_row = [('', 'matrix-cell')] * len(requirements)
+    hit = ('✓', 'matrix-hit')
+
+    def rows() -> Iterator[Row]:
+        yield from _title_rows('MATRIZ DE RELACIÓN MG - REQUISITOS', 'Relación entre Medidas Guía y los Requisitos del RIA que cubren.')
+        yield _header_row(5, ['Medida'] + requirements)
+        # Solo se visitan las marcas de cada fila; el resto de celdas es la fila vacía
+        for r, measure_id in enumerate(relation.rows):
+            cells = [(measure_id, 'cell')] + empty_row
+            for c in relation.row_ids(r):
+                if c < len(requirements):
+                    cells[c + 1] = hit
+            yield r + 6, cells
+
+    widths = {'A': 12, **{get_column_letter(i): 10 for i in range(2, len(requirements) + 2)}}
+    return SheetSpec(title="5. Relación MG", rows=rows(), widths=widths)
+
+
+def sheet_assessments_mg(assessments: List[Dict]) -> SheetSpec:
+    """Pestaña 6: Autoevaluación de Medidas Guía."""
+    def status_cell(status: str) -> Cell:
+        return status, 'status-ok' if status == 'Diagnosticada' else 'status-pending'
+
+    def rows() -> Iterator[Row]:
+        yield from _title_rows('AUTOEVALUACIÓN DE MEDIDAS GUÍA', 'Resultados de la autoevaluación según los niveles de madurez L1-L8.')
+        yield _header_row(5, ['ID Medida', 'Dificultad', 'Madurez', 'Estado', 'Plan de Adaptación'])
+        for row, assessment in enumerate(assessments, 6):
+            status = 'Diagnosticada' if assessment.get('diagnosis_status') == '01' else 'Pendiente'
+            plan_text = f"{assessment.get('adaptation_plan', '-')} - {assessment.get('adaptation_plan_desc', '')}"
+            yield row, [
+                (str(assessment.get('measure_id', '')), 'cell'),
+                (str(assessment.get('difficulty', '-')), 'cell'),
+                (str(assessment.get('maturity', '-')), 'cell'),
+                status_cell(status),
+                (plan_text, 'cell'),
+            ]
+
+    return SheetSpec(title="6. Autoev. MG", rows=rows(), widths=_widths([15, 12, 12, 15, 35]))
+
+
+def sheet_measures_ma() -> SheetSpec:
+    """Pestaña 7: Medidas Adicionales."""
+    def rows() -> Iterator[Row]:
+        yield from _title_rows('MEDIDAS ADICIONALES (MA)', 'Medidas adicionales propuestas por el usuario fuera del catálogo AESIA.')
+        yield _header_row(5, ['ID', 'Título', 'Descripción', 'Doc. Aportada', 'Estado SEDIA', 'Comentarios'])
+        # Mensaje si no hay MAs
+        yield _placeholder_row(6, '(Sin medidas adicionales definidas)')
+
+    return SheetSpec(title="7. Medidas MA", rows=rows(), widths=_widths([10, 25, 40, 15, 15, 30]))
+
+
+def sheet_rel_ma(requirement_ids: Optional[List[str]] = None) -> SheetSpec:
+    """Pestaña 8: Matriz de vinculación MA-Requisitos."""
+    requirements = list(requirement_ids) if requirement_ids else get_catalog().requirement_codes
+
+    def rows() -> Iterator[Row]:
+        yield from _title_rows('MATRIZ DE VINCULACIÓN MA - REQUISITOS', 'Relación N:M entre Medidas Adicionales y Requisitos del RIA.')
+        yield _header_row(5, ['Medida Adicional'] + requirements)
+        yield _placeholder_row(6, '(Sin medidas adicionales)')
+
+    widths = {'A': 20, **{get_column_letter(i): 10 for i in range(2, len(requirements) + 2)}}
+    return SheetSpec(title="8. Relación MA", rows=rows(), widths=widths)
+
+
+def sheet_assessments_ma() -> SheetSpec:
+    """Pestaña 9: Autoevaluación de Medidas Adicionales."""
+    def rows() -> Iterator[Row]:
+        yield from _title_rows('AUTOEVALUACIÓN DE MEDIDAS ADICIONALES', 'Evaluación de madurez para cada MA en el contexto de cada Requisito vinculado.')
+        yield _header_row(5, ['Medida', 'Requisito', 'Dificultad', 'Madurez', 'Estado', 'Plan'])
+        yield _placeholder_row(6, '(Sin evaluaciones de MAs)')
+
+    return SheetSpec(title="9. Autoev. MA", rows=rows(), widths=_widths([15, 10, 12, 12, 15, 30]))
+
+
+# Render sobre hojas estándar (API existente)
+
+def render_portada(ws, data: Dict):
+    """Pestaña 1: Portada con datos del proyecto."""
+    write_sheet(ws, sheet_portada(data))
+
+
+def render_intro(ws):
+    """Pestaña 2: Introducción y escala L1-L8."""
+    write_sheet(ws, sheet_intro())
 
 
 def render_requirements(ws, requirements: List[Dict]):
     """Pestaña 3: Listado de requisitos del RIA."""
-    ws['A1'] = 'REQUISITOS DEL REGLAMENTO DE IA'
-    ws['A1'].font = Font(size=16, bold=True, color=GARRIGUES_GREEN)
-    
-    headers = ['ID', 'Artículo', 'Título', 'Descripción']
-    row = 3
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=row, column=col, value=header)
-        apply_style(cell, create_header_style())
-    
-    for req in requirements:
-        row += 1
-        values = [req.get('id', ''), req.get('article_ref', ''), req.get('title', ''), req.get('description', '')]
-        for col, value in enumerate(values, 1):
-            cell = ws.cell(row=row, column=col, value=str(value) if value else '')
-            apply_style(cell, create_cell_style())
-    
-    ws.column_dimensions['A'].width = 10
-    ws.column_dimensions['B'].width = 12
-    ws.column_dimensions['C'].width = 40
-    ws.column_dimensions['D'].width = 60
+    write_sheet(ws, sheet_requirements(requirements))
 
 
 def render_measures(ws, measures: List[Dict]):
     """Pestaña 4: Listado de Medidas Guía."""
-    ws['A1'] = 'MEDIDAS GUÍA (MG)'
-    ws['A1'].font = Font(size=16, bold=True, color=GARRIGUES_GREEN)
-    
-    ws['A3'] = 'Catálogo de medidas según las Guías AESIA para cada requisito del RIA.'
-    
-    headers = ['ID Medida', 'Requisito', 'Guía', 'Descripción']
-    row = 5
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=row, column=col, value=header)
-        apply_style(cell, create_header_style())
-    
-    # Medidas de ejemplo basadas en los requisitos
-    sample_measures = [
-        {'id': 'MG_01_01', 'req': 'REQ_01', 'guide': 'Guía 4', 'desc': 'Identificar y analizar los riesgos conocidos y previsibles'},
-        {'id': 'MG_01_02', 'req': 'REQ_01', 'guide': 'Guía 4', 'desc': 'Estimar y evaluar los riesgos que puedan surgir'},
-        {'id': 'MG_01_03', 'req': 'REQ_01', 'guide': 'Guía 4', 'desc': 'Evaluar otros riesgos basándose en datos de seguimiento'},
-        {'id': 'MG_01_04', 'req': 'REQ_01', 'guide': 'Guía 4', 'desc': 'Adoptar medidas de gestión de riesgos adecuadas'},
-        {'id': 'MG_02_01', 'req': 'REQ_02', 'guide': 'Guía 5', 'desc': 'Establecer prácticas de gobernanza de datos'},
-        {'id': 'MG_02_02', 'req': 'REQ_02', 'guide': 'Guía 5', 'desc': 'Examinar posibles sesgos en los datos'},
-        {'id': 'MG_02_03', 'req': 'REQ_02', 'guide': 'Guía 5', 'desc': 'Identificar lagunas o deficiencias en los datos'},
-        {'id': 'MG_03_01', 'req': 'REQ_03', 'guide': 'Guía 6', 'desc': 'Preparar documentación técnica completa'},
-        {'id': 'MG_03_02', 'req': 'REQ_03', 'guide': 'Guía 6', 'desc': 'Mantener documentación actualizada'},
-        {'id': 'MG_09_01', 'req': 'REQ_09', 'guide': 'Guía 12', 'desc': 'Estrategia de cumplimiento regulatorio'},
-        {'id': 'MG_09_02', 'req': 'REQ_09', 'guide': 'Guía 12', 'desc': 'Técnicas y procedimientos de diseño'},
-        {'id': 'MG_09_03', 'req': 'REQ_09', 'guide': 'Guía 12', 'desc': 'Examen, prueba y validación'},
-        {'id': 'MG_09_04', 'req': 'REQ_09', 'guide': 'Guía 12', 'desc': 'Gestión de modificaciones'},
-    ]
-    
-    measures_to_render = measures if measures else sample_measures
-
-    for measure in measures_to_render:
-        row += 1
-        values = [measure.get('id', ''), measure.get('req', ''), measure.get('guide', ''), measure.get('desc', '')]
-        for col, value in enumerate(values, 1):
-            cell = ws.cell(row=row, column=col, value=value)
-            apply_style(cell, create_cell_style())
-    
-    ws.column_dimensions['A'].width = 12
-    ws.column_dimensions['B'].width = 10
-    ws.column_dimensions['C'].width = 10
-    ws.column_dimensions['D'].width = 60
+    write_sheet(ws, sheet_measures(measures))
 
 
-def render_rel_mg(ws, measures_map: Optional[Dict] = None):
+def render_rel_mg(ws, measures_map: Optional[Dict] = None, requirement_ids: Optional[List[str]] = None):
     """Pestaña 5: Matriz de relación Medidas-Requisitos."""
-    ws['A1'] = 'MATRIZ DE RELACIÓN MG - REQUISITOS'
-    ws['A1'].font = Font(size=16, bold=True, color=GARRIGUES_GREEN)
-    
-    ws['A3'] = 'Relación entre Medidas Guía y los Requisitos del RIA que cubren.'
-    
-    # Headers
-    requirements = ['REQ_01', 'REQ_02', 'REQ_03', 'REQ_09']
-    row = 5
-    ws.cell(row=row, column=1, value='Medida')
-    apply_style(ws.cell(row=row, column=1), create_header_style())
-    
-    for col, req in enumerate(requirements, 2):
-        cell = ws.cell(row=row, column=col, value=req)
-        apply_style(cell, create_header_style())
-    
-    # Matriz
-    default_measures_map = {
-        'MG_01_01': [1, 0, 0, 0],
-        'MG_01_02': [1, 0, 0, 0],
-        'MG_02_01': [0, 1, 0, 0],
-        'MG_02_02': [0, 1, 0, 0],
-        'MG_03_01': [0, 0, 1, 0],
-        'MG_09_01': [0, 0, 0, 1],
-        'MG_09_02': [0, 0, 0, 1],
-    }
-    
-    map_to_render = measures_map if measures_map else default_measures_map
-
-    for measure_id, mapping in map_to_render.items():
-        row += 1
-        ws.cell(row=row, column=1, value=measure_id)
-        apply_style(ws.cell(row=row, column=1), create_cell_style())
-        
-        for col, value in enumerate(mapping, 2):
-            cell = ws.cell(row=row, column=col, value='✓' if value else '')
-            apply_style(cell, create_cell_style())
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            if value:
-                cell.fill = PatternFill(start_color=LIGHT_GREEN, end_color=LIGHT_GREEN, fill_type='solid')
-    
-    ws.column_dimensions['A'].width = 12
-    for i in range(2, 6):
-        ws.column_dimensions[get_column_letter(i)].width = 10
+    write_sheet(ws, sheet_rel_mg(measures_map, requirement_ids))
 
 
 def render_assessments_mg(ws, assessments: List[Dict]):
     """Pestaña 6: Autoevaluación de Medidas Guía."""
-    ws['A1'] = 'AUTOEVALUACIÓN DE MEDIDAS GUÍA'
-    ws['A1'].font = Font(size=16, bold=True, color=GARRIGUES_GREEN)
-    
-    ws['A3'] = 'Resultados de la autoevaluación según los niveles de madurez L1-L8.'
-    
-    headers = ['ID Medida', 'Dificultad', 'Madurez', 'Estado', 'Plan de Adaptación']
-    row = 5
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=row, column=col, value=header)
-        apply_style(cell, create_header_style())
-    
-    for assessment in assessments:
-        row += 1
-        status = 'Diagnosticada' if assessment.get('diagnosis_status') == '01' else 'Pendiente'
-        plan_text = f"{assessment.get('adaptation_plan', '-')} - {assessment.get('adaptation_plan_desc', '')}"
-        
-        values = [
-            assessment.get('measure_id', ''),
-            assessment.get('difficulty', '-'),
-            assessment.get('maturity', '-'),
-            status,
-            plan_text,
-        ]
-        for col, value in enumerate(values, 1):
-            cell = ws.cell(row=row, column=col, value=str(value))
-            apply_style(cell, create_cell_style())
-            
-            # Color para estado
-            if col == 4:
-                if value == 'Diagnosticada':
-                    cell.fill = PatternFill(start_color=LIGHT_GREEN, end_color=LIGHT_GREEN, fill_type='solid')
-                else:
-                    cell.fill = PatternFill(start_color=LIGHT_YELLOW, end_color=LIGHT_YELLOW, fill_type='solid')
-    
-    for i, width in enumerate([15, 12, 12, 15, 35], 1):
-        ws.column_dimensions[get_column_letter(i)].width = width
+    write_sheet(ws, sheet_assessments_mg(assessments))
 
 
 def render_measures_ma(ws):
     """Pestaña 7: Medidas Adicionales."""
-    ws['A1'] = 'MEDIDAS ADICIONALES (MA)'
-    ws['A1'].font = Font(size=16, bold=True, color=GARRIGUES_GREEN)
-    
-    ws['A3'] = 'Medidas adicionales propuestas por el usuario fuera del catálogo AESIA.'
-    
-    headers = ['ID', 'Título', 'Descripción', 'Doc. Aportada', 'Estado SEDIA', 'Comentarios']
-    row = 5
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=row, column=col, value=header)
-        apply_style(cell, create_header_style())
-    
-    # Mensaje si no hay MAs
-    row += 1
-    ws.cell(row=row, column=1, value='(Sin medidas adicionales definidas)')
-    ws.cell(row=row, column=1).font = Font(italic=True, color='666666')
-    
-    for i, width in enumerate([10, 25, 40, 15, 15, 30], 1):
-        ws.column_dimensions[get_column_letter(i)].width = width
+    write_sheet(ws, sheet_measures_ma())
 
 
-def render_rel_ma(ws):
+def render_rel_ma(ws, requirement_ids: Optional[List[str]] = None):
     """Pestaña 8: Matriz de vinculación MA-Requisitos."""
-    ws['A1'] = 'MATRIZ DE VINCULACIÓN MA - REQUISITOS'
-    ws['A1'].font = Font(size=16, bold=True, color=GARRIGUES_GREEN)
-    
-    ws['A3'] = 'Relación N:M entre Medidas Adicionales y Requisitos del RIA.'
-    
-    headers = ['Medida Adicional', 'REQ_01', 'REQ_02', 'REQ_03', 'REQ_09']
-    row = 5
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=row, column=col, value=header)
-        apply_style(cell, create_header_style())
-    
-    row += 1
-    ws.cell(row=row, column=1, value='(Sin medidas adicionales)')
-    ws.cell(row=row, column=1).font = Font(italic=True, color='666666')
-    
-    ws.column_dimensions['A'].width = 20
-    for i in range(2, 6):
-        ws.column_dimensions[get_column_letter(i)].width = 10
+    write_sheet(ws, sheet_rel_ma(requirement_ids))
 
 
 def render_assessments_ma(ws):
     """Pestaña 9: Autoevaluación de Medidas Adicionales."""
-    ws['A1'] = 'AUTOEVALUACIÓN DE MEDIDAS ADICIONALES'
-    ws['A1'].font = Font(size=16, bold=True, color=GARRIGUES_GREEN)
-    
-    ws['A3'] = 'Evaluación de madurez para cada MA en el contexto de cada Requisito vinculado.'
-    
-    headers = ['Medida', 'Requisito', 'Dificultad', 'Madurez', 'Estado', 'Plan']
-    row = 5
-    for col, header in enumerate(headers, 1):
-        cell = ws.cell(row=row, column=col, value=header)
-        apply_style(cell, create_header_style())
-    
-    row += 1
-    ws.cell(row=row, column=1, value='(Sin evaluaciones de MAs)')
-    ws.cell(row=row, column=1).font = Font(italic=True, color='666666')
-    
-    for i, width in enumerate([15, 10, 12, 12, 15, 30], 1):
-        ws.column_dimensions[get_column_letter(i)].width = width
+    write_sheet(ws, sheet_assessments_ma())
+
+
+def build_sheets(application_data: Dict) -> List[SheetSpec]:
+    """Las 9 pestañas del informe, en orden."""
+    requirement_ids = [r.get('id') for r in application_data.get('requirements') or []]
+    return [
+        sheet_portada(application_data),
+        sheet_intro(),
+        sheet_requirements(application_data.get('requirements', [])),
+        sheet_measures(application_data.get('measures', [])),
+        sheet_rel_mg(application_data.get('measures_map'), requirement_ids),
+        sheet_assessments_mg(application_data.get('assessments_mg', [])),
+        sheet_measures_ma(),
+        sheet_rel_ma(requirement_ids),
+        sheet_assessments_ma(),
+    ]
+
+
+def count_rows(application_data: Dict) -> int:
+    """Filas de datos variables (las que determinan el coste del render)."""
+    return (
+        len(application_data.get('requirements') or [])
+        + len(application_data.get('measures') or [])
+        + len(application_data.get('measures_map') or {})
+        + len(application_data.get('assessments_mg') or [])
+    )
 
 
-def generate_excel(application_data: Dict) -> bytes:
+def generate_excel(application_data: Dict, write_only: Optional[bool] = None) -> bytes:
     """
     Genera el archivo Excel completo con 9 pestañas.
     
     Args:
         application_data: Diccionario con todos los datos de la aplicación
+        write_only: True fuerza el modo streaming (hojas write-only), False el
+                    modo estándar. Por defecto se usa streaming cuando las filas
+                    superan WRITE_ONLY_THRESHOLD.
         
     Returns:
         bytes del archivo Excel
     """
-    wb = Workbook()
-    
-    # 1. Portada
-    ws_portada = wb.active
-    ws_portada.title = "1. Portada"
-    render_portada(ws_portada, application_data)
-    
-    # 2. Intro
-    ws_intro = wb.create_sheet("2. Intro")
-    render_intro(ws_intro)
-    
-    # 3. Artículo RIA
-    ws_req = wb.create_sheet("3. Artículo RIA")
-    render_requirements(ws_req, application_data.get('requirements', []))
-    
-    # 4. Medidas Guía
-    ws_mg = wb.create_sheet("4. Medidas Guía")
-    render_measures(ws_mg, application_data.get('measures', []))
-    
-    # 5. Relación MG
-    ws_rel_mg = wb.create_sheet("5. Relación MG")
-    render_rel_mg(ws_rel_mg, application_data.get('measures_map'))
-    
-    # 6. Autoev. MG
-    ws_autoev_mg = wb.create_sheet("6. Autoev. MG")
-    render_assessments_mg(ws_autoev_mg, application_data.get('assessments_mg', []))
-    
-    # 7. Medidas MA
-    ws_ma = wb.create_sheet("7. Medidas MA")
-    render_measures_ma(ws_ma)
-    
-    # 8. Relación MA
-    ws_rel_ma = wb.create_sheet("8. Relación MA")
-    render_rel_ma(ws_rel_ma)
-    
-    # 9. Autoev. MA
-    ws_autoev_ma = wb.create_sheet("9. Autoev. MA")
-    render_assessments_ma(ws_autoev_ma)
+    if write_only is None:
+        write_only = count_rows(application_data) > WRITE_ONLY_THRESHOLD
+    
+    wb = Workbook(write_only=write_only)
+    for index, spec in enumerate(build_sheets(application_data)):
+        if write_only:
+            stream_sheet(wb.create_sheet(spec.title), spec)
+        elif index == 0:
+            ws = wb.active
+            ws.title = spec.title
+            write_sheet(ws, spec)
+        else:
+            write_sheet(wb.create_sheet(spec.title), spec)
     
     # Guardar como bytes
     buffer = BytesIO()
@@ -0,0 +1,154 @@
+"""
+Incremental Export - Re-fill only the rows whose inputs changed
+Keeps the last export of each (application, requirement) with a digest of the
+values written to every row. The next export of the same template version
+diffs its fill plan against those digests and patches just the changed rows
+into the previous xlsx (see xlsx_patch); cells no longer written get their
+template value back.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+import hashlib
+import os
+import threading
+
+from .xlsx_patch import ReplacedValues, SheetPatch, patch_workbook
+
+# sheet title -> row -> column -> value
+FillPlan = Dict[str, SheetPatch]
+RowKey = Tuple[str, int]
+
+# Default memory budget for kept snapshots, in MB
+DEFAULT_MAX_MB = 64
+
+
+def _row_digest(cells: Dict[int, Any]) -> str:
+    return hashlib.blake2b(repr(sorted(cells.items())).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def _row_states(plan: FillPlan) -> Dict[RowKey, Tuple[str, Tuple[int, ...]]]:
+    """(sheet, row) -> (digest of the row's values, columns written)."""
+    return {
+        (title, row): (_row_digest(cells), tuple(sorted(cells)))
+        for title, rows in plan.items()
+        for row, cells in rows.items()
+        if cells
+    }
+
+
+@dataclass
+class ExportSnapshot:
+    """Last export of one requirement: its bytes and what each row was filled with."""
+    requirement_code: str
+    template_version: str
+    workbook: bytes
+    rows: Dict[RowKey, Tuple[str, Tuple[int, ...]]]
+    # Template value of every cell an export has written, to restore cleared cells
+    originals: ReplacedValues = field(default_factory=dict)
+    mode: str = 'full'
+    patched_rows: int = 0
+
+    @classmethod
+    def full(
+        cls, requirement_code: str, template_version: str, workbook: bytes, plan: FillPlan, originals: ReplacedValues
+    ) -> 'ExportSnapshot':
+        """Snapshot of a full fill; `originals` are the values the fill replaced."""
+        return cls(requirement_code, template_version, workbook, _row_states(plan), dict(originals))
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.workbook)
+
+    def matches(self, requirement_code: str, template_version: str) -> bool:
+        return self.requirement_code == requirement_code and self.template_version == template_version
+
+    def diff(self, plan: FillPlan, new_rows: Optional[Dict[RowKey, Tuple[str, Tuple[int, ...]]]] = None) -> FillPlan:
+        """Cells to rewrite so the previous export matches `plan`."""
+        if new_rows is None:
+            new_rows = _row_states(plan)
+        patch: FillPlan = {}
+        for key in self.rows.keys() | new_rows.keys():
+            old = self.rows.get(key)
+            new = new_rows.get(key)
+            if old is not None and new is not None and old[0] == new[0]:
+                continue
+            title, row = key
+            cells = dict(plan.get(title, {}).get(row, {}))
+            for column in old[1] if old else ():
+                if column not in cells:
+                    cells[column] = self.originals.get((title, row, column))
+            patch.setdefault(title, {})[row] = cells
+        return patch
+
+    def advance(self, plan: FillPlan) -> Tuple[bytes, 'ExportSnapshot']:
+        """Patch the previous export to `plan`; returns the bytes and the next snapshot."""
+        new_rows = _row_states(plan)
+        patch = self.diff(plan, new_rows)
+        workbook, replaced = patch_workbook(self.workbook, patch) if patch else (self.workbook, {})
+        originals = dict(self.originals)
+        for cell, value in replaced.items():
+            originals.setdefault(cell, value)
+        return workbook, ExportSnapshot(
+            requirement_code=self.requirement_code,
+            template_version=self.template_version,
+            workbook=workbook,
+            rows=new_rows,
+            originals=originals,
+            mode='incremental',
+            patched_rows=sum(len(rows) for rows in patch.values()),
+        )
+
+
+class ExportSnapshotStore:
+    """LRU of export snapshots keyed by (application_id, requirement_code), bounded by xlsx size."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], ExportSnapshot]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, application_id: str, requirement_code: str) -> Optional[ExportSnapshot]:
+        with self._lock:
+            snapshot = self._entries.get((application_id, requirement_code))
+            if snapshot is not None:
+                self._entries.move_to_end((application_id, requirement_code))
+            return snapshot
+
+    def put(self, application_id: str, requirement_code: str, snapshot: ExportSnapshot):
+        key = (application_id, requirement_code)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous.size_bytes
+            if snapshot.size_bytes > self.max_bytes:
+                return
+            self._entries[key] = snapshot
+            self._bytes += snapshot.size_bytes
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size_bytes
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'entries': len(self._entries), 'size_bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+
+_snapshot_store: Optional[ExportSnapshotStore] = None
+_snapshot_store_lock = threading.Lock()
+
+
+def get_snapshot_store() -> ExportSnapshotStore:
+    """
+    Return the process-wide snapshot store.
+
+    The memory budget is read once from EXPORT_SNAPSHOT_MAX_MB (default 64).
+    """
+    global _snapshot_store
+    with _snapshot_store_lock:
+        if _snapshot_store is None:
+            max_mb = int(os.environ.get('EXPORT_SNAPSHOT_MAX_MB', DEFAULT_MAX_MB))
+            _snapshot_store = ExportSnapshotStore(max_bytes=max_mb * 1024 * 1024)
+        return _snapshot_store
@@ -0,0 +1,156 @@
+"""
+Template Cache - Pre-parsed AESIA checklist templates
+Keeps an immutable, already-parsed master copy of each template per process so
+exports clone it instead of re-parsing the xlsx XML on every request.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+import hashlib
+import os
+import pickle
+import threading
+
+from openpyxl import load_workbook
+from openpyxl.workbook.workbook import Workbook
+
+from .template_layout import TemplateLayout, build_layout, load_persisted_layout
+from .xlsx_patch import XlsxPackage
+
+# Default memory budget for cached masters (pickled size, in MB)
+DEFAULT_MAX_MB = 256
+
+
+@dataclass(frozen=True)
+class CachedTemplate:
+    """Parsed master of one template file at one on-disk version."""
+    requirement_code: str
+    path: str
+    signature: Tuple[int, int]  # (mtime_ns, size) used for invalidation
+    version: str                # sha256 of the xlsx bytes
+    master: bytes               # pickled Workbook, never mutated
+    layout: TemplateLayout      # sheet/column/row index of this version
+    package: XlsxPackage        # raw xlsx, for fills that patch the package directly
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.master) + len(self.package.data)
+
+    def clone(self) -> Workbook:
+        """Return a private, writable copy of the master workbook."""
+        return pickle.loads(self.master)
+
+
+def _file_signature(path: Path) -> Tuple[int, int]:
+    stat = path.stat()
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+class TemplateCache:
+    """
+    Process-wide LRU cache of parsed template masters.
+
+    Entries are keyed by requirement code and validated against the file's
+    (mtime, size) on every access, so a template replaced on disk is re-parsed
+    on the next request. The master is stored pickled: it cannot be mutated by
+    callers, and unpickling a clone is much cheaper than parsing the xlsx.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, CachedTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, requirement_code: str, path: Union[str, Path]) -> CachedTemplate:
+        """Return the cached master for a template, (re)loading it if stale."""
+        path = Path(path)
+        signature = _file_signature(path)
+
+        with self._lock:
+            entry = self._entries.get(requirement_code)
+            if entry and entry.path == str(path) and entry.signature == signature:
+                self._entries.move_to_end(requirement_code)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Parse outside the lock so other templates keep being served
+        entry = self._load(requirement_code, path)
+
+        with self._lock:
+            self._entries[requirement_code] = entry
+            self._entries.move_to_end(requirement_code)
+            self._evict()
+        return entry
+
+    def checkout(self, requirement_code: str, path: Union[str, Path]) -> Workbook:
+        """Return a writable workbook cloned from the cached master."""
+        return self.get(requirement_code, path).clone()
+
+    def invalidate(self, requirement_code: Optional[str] = None):
+        """Drop one entry, or the whole cache when no code is given."""
+        with self._lock:
+            if requirement_code is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(requirement_code, None)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'size_bytes': sum(e.size_bytes for e in self._entries.values()),
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _load(self, requirement_code: str, path: Path) -> CachedTemplate:
+        raw = path.read_bytes()
+        # Re-stat after reading so the signature matches the bytes we parsed
+        signature = _file_signature(path)
+        version = hashlib.sha256(raw).hexdigest()
+        wb = load_workbook(BytesIO(raw))
+        layout = load_persisted_layout(path, version) or build_layout(wb, version)
+        return CachedTemplate(
+            requirement_code=requirement_code,
+            path=str(path),
+            signature=signature,
+            version=version,
+            master=pickle.dumps(wb, protocol=pickle.HIGHEST_PROTOCOL),
+            layout=layout,
+            package=XlsxPackage(raw),
+        )
+
+    def _evict(self):
+        """Evict least recently used masters until under budget (keeps the newest)."""
+        total = sum(e.size_bytes for e in self._entries.values())
+        while total > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            total -= evicted.size_bytes
+            self.evictions += 1
+
+
+_default_cache: Optional[TemplateCache] = None
+_default_cache_lock = threading.Lock()
+
+
+def get_template_cache() -> TemplateCache:
+    """
+    Return the process-wide template cache.
+
+    The memory budget is read once from TEMPLATE_CACHE_MAX_MB (default 256).
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            max_mb = int(os.environ.get('TEMPLATE_CACHE_MAX_MB', DEFAULT_MAX_MB))
+            _default_cache = TemplateCache(max_bytes=max_mb * 1024 * 1024)
+        return _default_cache
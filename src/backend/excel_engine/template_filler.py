@@ -3,12 +3,21 @@ Template Filler - AESIA Excel Template Processing
 Fills official AESIA checklist templates with assessment data while preserving formulas and styling.
 """
 
-from openpyxl import load_workbook
+from io import BytesIO
 from openpyxl.utils import get_column_letter
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from pathlib import Path
+import logging
 import os
 
+from .incremental import ExportSnapshot, FillPlan
+from .template_cache import CachedTemplate, TemplateCache, get_template_cache
+from .template_layout import TemplateLayout, layout_path_for
+from .xlsx_patch import ReplacedValues
+from services.relations import Relation
+
+logger = logging.getLogger(__name__)
+
 # Template file mapping: requirement_code -> filename
 TEMPLATE_MAPPING = {
     'QUALITY_MGMT': 'Gestión de Calidad_Checklist.xlsx',
@@ -38,31 +47,33 @@ EXPECTED_SHEETS = [
     'Autoeval MA',
 ]
 
-# Column headers to detect (case-insensitive matching)
-COLUMN_MATCHERS = {
-    'difficulty': ['nivel de dificultad', 'dificultad percibida', 'dificultad'],
-    'maturity': ['nivel de madurez', 'madurez', 'nivel madurez'],
-    'mg_id': ['mg', 'medida guía', 'id medida', 'código mg'],
-    'subpart_id': ['apartado', 'subapartado', 'art.', 'artículo'],
-    'description': ['descripción', 'descripcion', 'detalle'],
-    'file_name': ['archivo', 'nombre archivo', 'documento'],
-}
+
+# Fill backends: 'openpyxl' writes into a clone of the parsed master workbook;
+# 'ooxml' patches the template's worksheet XML inside the ZIP package
+FILL_BACKENDS = ('openpyxl', 'ooxml')
 
 
 class TemplateFiller:
     """Fills AESIA Excel templates with assessment data."""
     
-    def __init__(self, templates_dir: str = None):
+    def __init__(self, templates_dir: str = None, cache: TemplateCache = None, backend: str = None):
         """
         Initialize template filler.
         
         Args:
             templates_dir: Path to directory containing template files.
                           If None, uses ./templates/ relative to this file.
+            cache: Parsed template cache. If None, uses the process-wide cache.
+            backend: 'openpyxl' or 'ooxml'. If None, uses TEMPLATE_FILL_BACKEND
+                     (default 'openpyxl').
         """
         if templates_dir is None:
             templates_dir = os.path.join(os.path.dirname(__file__), 'templates')
         self.templates_dir = Path(templates_dir)
+        self.cache = cache if cache is not None else get_template_cache()
+        self.backend = backend or os.environ.get('TEMPLATE_FILL_BACKEND') or 'openpyxl'
+        if self.backend not in FILL_BACKENDS:
+            raise ValueError(f"Unknown fill backend: {self.backend}")
     
     def get_template_path(self, requirement_code: str) -> Optional[Path]:
         """Get path to template file for given requirement code."""
@@ -72,6 +83,84 @@ class TemplateFiller:
         path = self.templates_dir / filename
         return path if path.exists() else None
     
+    def get_layout(self, requirement_code: str) -> Optional[TemplateLayout]:
+        """Get the precomputed sheet layout of a template (None if missing)."""
+        template_path = self.get_template_path(requirement_code)
+        if not template_path:
+            return None
+        return self.cache.get(requirement_code, template_path).layout
+    
+    def get_template_version(self, requirement_code: str) -> Optional[str]:
+        """Get the content version (sha256) of a template (None if missing)."""
+        template_path = self.get_template_path(requirement_code)
+        if not template_path:
+            return None
+        return self.cache.get(requirement_code, template_path).version
+    
+    def preload(self) -> Dict[str, str]:
+        """
+        Parse every available template into the cache.
+        
+        Returns:
+            Dict mapping requirement_code to loaded template version
+        """
+        versions = {}
+        for code in TEMPLATE_MAPPING:
+            template_path = self.get_template_path(code)
+            if template_path:
+                versions[code] = self.cache.get(code, template_path).version
+        return versions
+    
+    def save_layouts(self) -> List[Path]:
+        """Persist the layout of every available template next to its file."""
+        saved = []
+        for code in TEMPLATE_MAPPING:
+            template_path = self.get_template_path(code)
+            if template_path:
+                path = layout_path_for(template_path)
+                self.cache.get(code, template_path).layout.save(path)
+                saved.append(path)
+        return saved
+    
+    def build_plan(
+        self,
+        layout: TemplateLayout,
+        assessments_mg: List[Dict[str, Any]],
+        measures_additional: List[Dict[str, Any]] = None,
+        assessments_ma: List[Dict[str, Any]] = None,
+        ma_to_subpart: List[Dict[str, str]] = None,
+    ) -> FillPlan:
+        """
+        Resolve the cells a fill writes: sheet title -> row -> column -> value.
+        
+        Later writes to the same cell win, as they would on the workbook.
+        """
+        plan: FillPlan = {}
+        self._fill_autoeval_mg(plan, layout, assessments_mg)
+        
+        if measures_additional:
+            self._fill_measures_additional(plan, layout, measures_additional)
+        
+        if ma_to_subpart:
+            self._fill_relation_ma(plan, layout, ma_to_subpart, measures_additional or [])
+        
+        if assessments_ma:
+            self._fill_autoeval_ma(plan, layout, assessments_ma, measures_additional or [])
+        return plan
+    
+    @staticmethod
+    def apply_plan(wb, plan: FillPlan) -> ReplacedValues:
+        """Write a plan into a workbook; returns the value each written cell had before."""
+        replaced = {}
+        for title, rows in plan.items():
+            sheet = wb[title]
+            for row, cells in rows.items():
+                for column, value in cells.items():
+                    cell = sheet.cell(row=row, column=column)
+                    replaced[title, row, column] = cell.value
+                    cell.value = value
+        return replaced
+    
     def fill_template(
         self,
         requirement_code: str,
@@ -95,198 +184,138 @@ class TemplateFiller:
         Returns:
             Excel file as bytes
         """
+        cached = self._cached(requirement_code)
+        plan = self.build_plan(cached.layout, assessments_mg, measures_additional, assessments_ma, ma_to_subpart)
+        return self._full_fill(cached, plan)[0]
+    
+    def fill_template_incremental(
+        self,
+        previous: Optional[ExportSnapshot],
+        requirement_code: str,
+        assessments_mg: List[Dict[str, Any]],
+        measures_additional: List[Dict[str, Any]] = None,
+        assessments_ma: List[Dict[str, Any]] = None,
+        ma_to_subpart: List[Dict[str, str]] = None,
+        application_info: Dict[str, Any] = None,
+    ) -> Tuple[bytes, ExportSnapshot]:
+        """
+        Fill a template by patching the previous export of the same requirement.
+        
+        Only rows whose inputs changed since `previous` are rewritten. Without a
+        snapshot, or when the template changed since it was taken, this is a
+        full fill. Arguments are those of fill_template.
+        
+        Returns:
+            Excel file as bytes and the snapshot to pass to the next call
+        """
+        cached = self._cached(requirement_code)
+        plan = self.build_plan(cached.layout, assessments_mg, measures_additional, assessments_ma, ma_to_subpart)
+        if previous is not None and previous.matches(requirement_code, cached.version):
+            try:
+                return previous.advance(plan)
+            except Exception:
+                logger.exception("Incremental fill of %s failed; doing a full fill", requirement_code)
+        excel_bytes, originals = self._full_fill(cached, plan)
+        return excel_bytes, ExportSnapshot.full(requirement_code, cached.version, excel_bytes, plan, originals)
+    
+    def _cached(self, requirement_code: str) -> CachedTemplate:
         template_path = self.get_template_path(requirement_code)
         if not template_path:
             raise ValueError(f"No template found for requirement: {requirement_code}")
+        return self.cache.get(requirement_code, template_path)
+    
+    def _full_fill(self, cached: CachedTemplate, plan: FillPlan) -> Tuple[bytes, ReplacedValues]:
+        if self.backend == 'ooxml':
+            # Untouched parts are copied as-is; only rows in the plan are rewritten
+            return cached.package.patch(plan)
         
-        # Load workbook preserving formulas
-        wb = load_workbook(template_path)
-        
-        # Fill each relevant sheet
-        self._fill_autoeval_mg(wb, assessments_mg)
-        
-        if measures_additional:
-            self._fill_measures_additional(wb, measures_additional)
-        
-        if ma_to_subpart:
-            self._fill_relation_ma(wb, ma_to_subpart, measures_additional or [])
-        
-        if assessments_ma:
-            self._fill_autoeval_ma(wb, assessments_ma, measures_additional or [])
+        # Clone the cached, pre-parsed master (formulas preserved)
+        wb = cached.clone()
+        originals = self.apply_plan(wb, plan)
         
         # Save to bytes
-        from io import BytesIO
         output = BytesIO()
         wb.save(output)
-        output.seek(0)
-        return output.getvalue()
-    
-    def _find_column_by_header(self, sheet, header_type: str, header_row: int = 1) -> Optional[int]:
-        """Find column index by matching header text."""
-        matchers = COLUMN_MATCHERS.get(header_type, [])
-        for col_idx in range(1, sheet.max_column + 1):
-            cell_value = sheet.cell(row=header_row, column=col_idx).value
-            if cell_value:
-                cell_lower = str(cell_value).lower().strip()
-                for matcher in matchers:
-                    if matcher in cell_lower:
-                        return col_idx
-        return None
+        return output.getvalue(), originals
     
-    def _find_sheet_by_name(self, wb, possible_names: List[str]):
-        """Find sheet by trying multiple possible names."""
-        for name in possible_names:
-            if name in wb.sheetnames:
-                return wb[name]
-            # Try case-insensitive match
-            for sheet_name in wb.sheetnames:
-                if sheet_name.lower().strip() == name.lower().strip():
-                    return wb[sheet_name]
-        return None
-    
-    def _fill_autoeval_mg(self, wb, assessments: List[Dict[str, Any]]):
+    def _fill_autoeval_mg(self, plan: FillPlan, layout: TemplateLayout, assessments: List[Dict[str, Any]]):
         """Fill the Autoeval MG sheet with assessment data."""
-        sheet = self._find_sheet_by_name(wb, ['Autoeval MG', 'Autoevaluación MG', 'AutoevalMG'])
-        if not sheet:
+        sheet_layout = layout.sheet('autoeval_mg')
+        if not sheet_layout:
             return
+        sheet = plan.setdefault(sheet_layout.title, {})
+        difficulty_col = sheet_layout.columns['difficulty']
+        maturity_col = sheet_layout.columns['maturity']
         
-        # Find header row (usually row 1 or 2)
-        header_row = 1
-        for row in range(1, 5):
-            if sheet.cell(row=row, column=1).value:
-                header_row = row
-                break
-        
-        # Find columns
-        mg_col = self._find_column_by_header(sheet, 'mg_id', header_row)
-        subpart_col = self._find_column_by_header(sheet, 'subpart_id', header_row)
-        difficulty_col = self._find_column_by_header(sheet, 'difficulty', header_row)
-        maturity_col = self._find_column_by_header(sheet, 'maturity', header_row)
+        # Last assessment per (id, subpart) wins
+        assessment_lookup = {(a.get('mg_id', ''), a.get('subpart_id', '')): a for a in assessments}
         
-        if not all([difficulty_col, maturity_col]):
-            # Try to detect by position (common layout)
-            # Usually: MG | Apartado | Descripción | Dificultad | Madurez | Estado | Plan
-            difficulty_col = difficulty_col or 4
-            maturity_col = maturity_col or 5
-        
-        # Create lookup by (mg_id, subpart_id) for faster matching
-        assessment_lookup = {}
-        for a in assessments:
-            key = (a.get('mg_id', ''), a.get('subpart_id', ''))
-            assessment_lookup[key] = a
-        
-        # Iterate through data rows
-        for row in range(header_row + 1, sheet.max_row + 1):
-            mg_value = sheet.cell(row=row, column=mg_col or 1).value if mg_col else None
-            subpart_value = sheet.cell(row=row, column=subpart_col or 2).value if subpart_col else None
-            
-            if mg_value and subpart_value:
-                key = (str(mg_value).strip(), str(subpart_value).strip())
-                assessment = assessment_lookup.get(key)
-                
-                if assessment:
-                    if assessment.get('difficulty') and difficulty_col:
-                        sheet.cell(row=row, column=difficulty_col).value = assessment['difficulty']
-                    if assessment.get('maturity') and maturity_col:
-                        sheet.cell(row=row, column=maturity_col).value = assessment['maturity']
+        for key, a in assessment_lookup.items():
+            for row in sheet_layout.rows.get(key, ()):
+                if a.get('difficulty'):
+                    sheet.setdefault(row, {})[difficulty_col] = a['difficulty']
+                if a.get('maturity'):
+                    sheet.setdefault(row, {})[maturity_col] = a['maturity']
     
-    def _fill_measures_additional(self, wb, measures: List[Dict[str, Any]]):
+    def _fill_measures_additional(self, plan: FillPlan, layout: TemplateLayout, measures: List[Dict[str, Any]]):
         """Fill the Medidas Adicionales sheet."""
-        sheet = self._find_sheet_by_name(wb, ['Medidas Adicionales', 'MA', 'Medidas adicionales'])
-        if not sheet:
+        sheet_layout = layout.sheet('measures_additional')
+        if not sheet_layout:
             return
-        
-        # Find header row
-        header_row = 1
-        for row in range(1, 5):
-            if sheet.cell(row=row, column=1).value:
-                header_row = row
-                break
-        
-        # Find columns
-        desc_col = self._find_column_by_header(sheet, 'description', header_row) or 2
-        file_col = self._find_column_by_header(sheet, 'file_name', header_row) or 3
+        sheet = plan.setdefault(sheet_layout.title, {})
+        desc_col = sheet_layout.columns['description']
+        file_col = sheet_layout.columns['file_name']
         
         # Write measures starting after header
         for idx, measure in enumerate(measures):
-            row = header_row + 1 + idx
+            cells = sheet.setdefault(sheet_layout.header_row + 1 + idx, {})
             
             # MA ID in first column
-            sheet.cell(row=row, column=1).value = measure.get('id', f'MA_{idx+1}')
+            cells[1] = measure.get('id', f'MA_{idx+1}')
             
             # Description
-            sheet.cell(row=row, column=desc_col).value = measure.get('description', '')
+            cells[desc_col] = measure.get('description', '')
             
             # File name
             if measure.get('file_name'):
-                sheet.cell(row=row, column=file_col).value = measure['file_name']
+                cells[file_col] = measure['file_name']
     
-    def _fill_relation_ma(self, wb, relations: List[Dict[str, str]], measures: List[Dict[str, Any]]):
+    def _fill_relation_ma(self, plan: FillPlan, layout: TemplateLayout, relations: List[Dict[str, str]], measures: List[Dict[str, Any]]):
         """Fill the Relación MA-Apart sheet with X marks."""
-        sheet = self._find_sheet_by_name(wb, ['Relación MA-Apart', 'Relación MA-Apartado', 'RelMA-Apart'])
-        if not sheet:
+        sheet_layout = layout.sheet('relation_ma')
+        if not sheet_layout:
             return
+        sheet = plan.setdefault(sheet_layout.title, {})
         
-        # This is typically a matrix with MA IDs in columns and subparts in rows
-        # Mark with 'X' where relationships exist
-        
-        # Create lookup
-        relation_set = {(r['ma_id'], r['subpart_id']) for r in relations}
-        
-        # Find header row with MA IDs
-        header_row = 1
-        ma_columns = {}  # ma_id -> column index
-        
-        for col in range(2, sheet.max_column + 1):
-            cell_value = sheet.cell(row=header_row, column=col).value
-            if cell_value and str(cell_value).startswith('MA'):
-                ma_columns[str(cell_value).strip()] = col
-        
-        # Fill X marks
-        for row in range(header_row + 1, sheet.max_row + 1):
-            subpart_id = sheet.cell(row=row, column=1).value
-            if subpart_id:
-                subpart_str = str(subpart_id).strip()
-                for ma_id, col in ma_columns.items():
-                    if (ma_id, subpart_str) in relation_set:
-                        sheet.cell(row=row, column=col).value = 'X'
+        # Matrix with MA IDs in columns and subparts in rows:
+        # mark with 'X' where relationships exist (duplicates collapse in the relation)
+        relation = Relation.from_pairs((r['subpart_id'], r['ma_id']) for r in relations)
+        for ma_id in relation.columns:
+            col = sheet_layout.columns.get(ma_id)
+            if not col:
+                continue
+            for subpart_id in relation.column(ma_id):
+                for row in sheet_layout.rows.get((subpart_id,), ()):
+                    sheet.setdefault(row, {})[col] = 'X'
     
-    def _fill_autoeval_ma(self, wb, assessments: List[Dict[str, Any]], measures: List[Dict[str, Any]]):
+    def _fill_autoeval_ma(self, plan: FillPlan, layout: TemplateLayout, assessments: List[Dict[str, Any]], measures: List[Dict[str, Any]]):
         """Fill the Autoeval MA sheet with assessment data."""
-        sheet = self._find_sheet_by_name(wb, ['Autoeval MA', 'Autoevaluación MA', 'AutoevalMA'])
-        if not sheet:
+        sheet_layout = layout.sheet('autoeval_ma')
+        if not sheet_layout:
             return
+        sheet = plan.setdefault(sheet_layout.title, {})
+        difficulty_col = sheet_layout.columns['difficulty']
+        maturity_col = sheet_layout.columns['maturity']
         
-        # Similar logic to autoeval MG
-        header_row = 1
-        for row in range(1, 5):
-            if sheet.cell(row=row, column=1).value:
-                header_row = row
-                break
-        
-        difficulty_col = self._find_column_by_header(sheet, 'difficulty', header_row) or 4
-        maturity_col = self._find_column_by_header(sheet, 'maturity', header_row) or 5
+        # Last assessment per (id, subpart) wins
+        assessment_lookup = {(a.get('ma_id', ''), a.get('subpart_id', '')): a for a in assessments}
         
-        # Create lookup
-        assessment_lookup = {}
-        for a in assessments:
-            key = (a.get('ma_id', ''), a.get('subpart_id', ''))
-            assessment_lookup[key] = a
-        
-        # Fill data
-        for row in range(header_row + 1, sheet.max_row + 1):
-            ma_value = sheet.cell(row=row, column=1).value
-            subpart_value = sheet.cell(row=row, column=2).value
-            
-            if ma_value and subpart_value:
-                key = (str(ma_value).strip(), str(subpart_value).strip())
-                assessment = assessment_lookup.get(key)
-                
-                if assessment:
-                    if assessment.get('difficulty'):
-                        sheet.cell(row=row, column=difficulty_col).value = assessment['difficulty']
-                    if assessment.get('maturity'):
-                        sheet.cell(row=row, column=maturity_col).value = assessment['maturity']
+        for key, a in assessment_lookup.items():
+            for row in sheet_layout.rows.get(key, ()):
+                if a.get('difficulty'):
+                    sheet.setdefault(row, {})[difficulty_col] = a['difficulty']
+                if a.get('maturity'):
+                    sheet.setdefault(row, {})[maturity_col] = a['maturity']
 
 
 def list_available_templates(templates_dir: str = None) -> Dict[str, bool]:
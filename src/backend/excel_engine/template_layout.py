@@ -0,0 +1,250 @@
+"""
+Template Layout - Precomputed sheet index for AESIA templates
+Resolves sheets, header rows, column indices and row keys once per template
+version so fills can write straight to the target cells.
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Any, Union
+import json
+
+# Sheet aliases, in lookup order (same order the filler has always tried)
+SHEET_ALIASES = {
+    'autoeval_mg': ['Autoeval MG', 'Autoevaluación MG', 'AutoevalMG'],
+    'measures_additional': ['Medidas Adicionales', 'MA', 'Medidas adicionales'],
+    'relation_ma': ['Relación MA-Apart', 'Relación MA-Apartado', 'RelMA-Apart'],
+    'autoeval_ma': ['Autoeval MA', 'Autoevaluación MA', 'AutoevalMA'],
+}
+
+# Column headers to detect (case-insensitive matching)
+COLUMN_MATCHERS = {
+    'difficulty': ['nivel de dificultad', 'dificultad percibida', 'dificultad'],
+    'maturity': ['nivel de madurez', 'madurez', 'nivel madurez'],
+    'mg_id': ['mg', 'medida guía', 'id medida', 'código mg'],
+    'subpart_id': ['apartado', 'subapartado', 'art.', 'artículo'],
+    'description': ['descripción', 'descripcion', 'detalle'],
+    'file_name': ['archivo', 'nombre archivo', 'documento'],
+}
+
+LAYOUT_FORMAT = 1
+LAYOUT_SUFFIX = '.layout.json'
+
+RowKey = Tuple[str, ...]
+
+
+@dataclass
+class SheetLayout:
+    """Resolved location of one sheet's table inside a template."""
+    title: str
+    header_row: int
+    columns: Dict[str, int] = field(default_factory=dict)
+    rows: Dict[RowKey, List[int]] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'title': self.title,
+            'header_row': self.header_row,
+            'columns': self.columns,
+            'rows': [[*key, row_numbers] for key, row_numbers in self.rows.items()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'SheetLayout':
+        return cls(
+            title=data['title'],
+            header_row=data['header_row'],
+            columns=dict(data['columns']),
+            rows={tuple(item[:-1]): list(item[-1]) for item in data['rows']},
+        )
+
+
+@dataclass
+class TemplateLayout:
+    """
+    Index of the fillable tables of one template version.
+
+    - autoeval_mg / autoeval_ma: columns 'difficulty' and 'maturity';
+      rows keyed by (measure_id, subpart_id).
+    - measures_additional: columns 'description' and 'file_name'.
+    - relation_ma: columns keyed by MA id; rows keyed by (subpart_id,).
+    """
+    version: str
+    sheets: Dict[str, SheetLayout] = field(default_factory=dict)
+
+    def sheet(self, role: str) -> Optional[SheetLayout]:
+        return self.sheets.get(role)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'format': LAYOUT_FORMAT,
+            'version': self.version,
+            'sheets': {role: s.to_dict() for role, s in self.sheets.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TemplateLayout':
+        if data.get('format') != LAYOUT_FORMAT:
+            raise ValueError(f"Unsupported layout format: {data.get('format')}")
+        return cls(
+            version=data['version'],
+            sheets={role: SheetLayout.from_dict(s) for role, s in data['sheets'].items()},
+        )
+
+    def save(self, path: Union[str, Path]):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> 'TemplateLayout':
+        with open(path, encoding='utf-8') as f:
+            return cls.from_dict(json.load(f))
+
+
+def layout_path_for(template_path: Union[str, Path]) -> Path:
+    """Location of the persisted layout next to its template."""
+    template_path = Path(template_path)
+    return template_path.with_name(template_path.name + LAYOUT_SUFFIX)
+
+
+def load_persisted_layout(template_path: Union[str, Path], version: str) -> Optional[TemplateLayout]:
+    """Load a persisted layout if it exists and matches the template version."""
+    path = layout_path_for(template_path)
+    if not path.exists():
+        return None
+    try:
+        layout = TemplateLayout.load(path)
+    except (ValueError, KeyError, json.JSONDecodeError):
+        return None
+    return layout if layout.version == version else None
+
+
+# ============ Discovery ============
+
+def find_sheet_by_name(wb, possible_names: List[str]):
+    """Find sheet by trying multiple possible names."""
+    for name in possible_names:
+        if name in wb.sheetnames:
+            return wb[name]
+        # Try case-insensitive match
+        for sheet_name in wb.sheetnames:
+            if sheet_name.lower().strip() == name.lower().strip():
+                return wb[sheet_name]
+    return None
+
+
+def find_column_by_header(sheet, header_type: str, header_row: int = 1) -> Optional[int]:
+    """Find column index by matching header text."""
+    matchers = COLUMN_MATCHERS.get(header_type, [])
+    for col_idx in range(1, sheet.max_column + 1):
+        cell_value = sheet.cell(row=header_row, column=col_idx).value
+        if cell_value:
+            cell_lower = str(cell_value).lower().strip()
+            for matcher in matchers:
+                if matcher in cell_lower:
+                    return col_idx
+    return None
+
+
+def detect_header_row(sheet) -> int:
+    """Header row is the first of rows 1-4 with a value in column A."""
+    for row in range(1, 5):
+        if sheet.cell(row=row, column=1).value:
+            return row
+    return 1
+
+
+def _index_rows(sheet, header_row: int, key_cols: Tuple[int, ...]) -> Dict[RowKey, List[int]]:
+    """Map stripped key-column values to the data rows holding them."""
+    rows: Dict[RowKey, List[int]] = {}
+    for row_idx, row in enumerate(
+        sheet.iter_rows(min_row=header_row + 1, max_col=max(key_cols), values_only=True),
+        header_row + 1,
+    ):
+        values = [row[col - 1] for col in key_cols]
+        if all(values):
+            key = tuple(str(v).strip() for v in values)
+            rows.setdefault(key, []).append(row_idx)
+    return rows
+
+
+def _layout_autoeval_mg(sheet) -> SheetLayout:
+    header_row = detect_header_row(sheet)
+    mg_col = find_column_by_header(sheet, 'mg_id', header_row)
+    subpart_col = find_column_by_header(sheet, 'subpart_id', header_row)
+    difficulty_col = find_column_by_header(sheet, 'difficulty', header_row)
+    maturity_col = find_column_by_header(sheet, 'maturity', header_row)
+
+    if not all([difficulty_col, maturity_col]):
+        # Fall back to the common layout:
+        # MG | Apartado | Descripción | Dificultad | Madurez | Estado | Plan
+        difficulty_col = difficulty_col or 4
+        maturity_col = maturity_col or 5
+
+    # Without both key columns no row can be matched
+    rows = _index_rows(sheet, header_row, (mg_col, subpart_col)) if mg_col and subpart_col else {}
+    return SheetLayout(
+        title=sheet.title,
+        header_row=header_row,
+        columns={'difficulty': difficulty_col, 'maturity': maturity_col},
+        rows=rows,
+    )
+
+
+def _layout_measures_additional(sheet) -> SheetLayout:
+    header_row = detect_header_row(sheet)
+    return SheetLayout(
+        title=sheet.title,
+        header_row=header_row,
+        columns={
+            'description': find_column_by_header(sheet, 'description', header_row) or 2,
+            'file_name': find_column_by_header(sheet, 'file_name', header_row) or 3,
+        },
+    )
+
+
+def _layout_relation_ma(sheet) -> SheetLayout:
+    # Matrix with MA IDs in the header columns and subparts in column A
+    header_row = 1
+    ma_columns = {}
+    for col in range(2, sheet.max_column + 1):
+        cell_value = sheet.cell(row=header_row, column=col).value
+        if cell_value and str(cell_value).startswith('MA'):
+            ma_columns[str(cell_value).strip()] = col
+    return SheetLayout(
+        title=sheet.title,
+        header_row=header_row,
+        columns=ma_columns,
+        rows=_index_rows(sheet, header_row, (1,)),
+    )
+
+
+def _layout_autoeval_ma(sheet) -> SheetLayout:
+    header_row = detect_header_row(sheet)
+    return SheetLayout(
+        title=sheet.title,
+        header_row=header_row,
+        columns={
+            'difficulty': find_column_by_header(sheet, 'difficulty', header_row) or 4,
+            'maturity': find_column_by_header(sheet, 'maturity', header_row) or 5,
+        },
+        rows=_index_rows(sheet, header_row, (1, 2)),
+    )
+
+
+_BUILDERS = {
+    'autoeval_mg': _layout_autoeval_mg,
+    'measures_additional': _layout_measures_additional,
+    'relation_ma': _layout_relation_ma,
+    'autoeval_ma': _layout_autoeval_ma,
+}
+
+
+def build_layout(wb, version: str) -> TemplateLayout:
+    """Scan a pristine template workbook and index its fillable sheets."""
+    layout = TemplateLayout(version=version)
+    for role, builder in _BUILDERS.items():
+        sheet = find_sheet_by_name(wb, SHEET_ALIASES[role])
+        if sheet is not None:
+            layout.sheets[role] = builder(sheet)
+    return layout
@@ -0,0 +1,474 @@
+"""
+XLSX Patch - Cell-level edits of an xlsx without loading it into openpyxl
+Treats the workbook as a ZIP package: parts that are not edited are copied
+byte-for-byte (compressed data included) and each edited worksheet is
+streamed through a row-level transform driven by a row index built once per
+package. Only the <row> elements that hold patched cells are re-serialized.
+Values are written the way openpyxl would (strings starting with '=' become
+formulas, '' clears the cell); new strings are stored inline so
+sharedStrings.xml is never rewritten, and existing shared or inline strings
+are decoded when reporting replaced values. Patched packages are flagged for
+a full recalculation on load, as openpyxl output is.
+"""
+
+from bisect import bisect_left
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+import posixpath
+import re
+import struct
+import threading
+import zipfile
+import zlib
+
+from openpyxl.utils import column_index_from_string, get_column_letter
+
+# row -> column -> value (None clears the value, keeping the cell style)
+SheetPatch = Dict[int, Dict[int, Any]]
+# (sheet title, row, column) -> value the patch replaced
+ReplacedValues = Dict[Tuple[str, int, int], Any]
+
+_NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+_NS_PKG_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+_SHEET_DATA_RE = re.compile(rb'<sheetData\s*/>|<sheetData\b[^>]*>(.*?)</sheetData>', re.S)
+_ROW_RE = re.compile(rb'<row\b(?=[^>]*?\sr="(\d+)")?([^>]*?)(?:/>|>(.*?)</row>)', re.S)
+_CELL_RE = re.compile(rb'<c\b([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+_ATTR_RE = re.compile(rb'([\w:]+)="([^"]*)"')
+_DIMENSION_RE = re.compile(rb'<dimension\s+ref="([^"]*)"\s*/>')
+_REF_RE = re.compile(r'([A-Z]+)(\d+)')
+_TEXT_RE = re.compile(rb'<t\b[^>]*?(?:/>|>(.*?)</t>)', re.S)
+_PHONETIC_RE = re.compile(rb'<rPh\b.*?</rPh>', re.S)
+_VALUE_RE = re.compile(rb'<v>(.*?)</v>', re.S)
+_FORMULA_RE = re.compile(rb'<f\b[^>]*?(?:/>|>(.*?)</f>)', re.S)
+_CALC_PR_RE = re.compile(rb'<calcPr\b[^>]*?/>|<calcPr\b[^>]*>.*?</calcPr>', re.S)
+_FULL_CALC_RE = re.compile(rb'\sfullCalcOnLoad="[^"]*"')
+# Elements that follow calcPr in CT_Workbook
+_AFTER_CALC_PR_RE = re.compile(
+    rb'<(?:oleSize|customWorkbookViews|pivotCaches|smartTagPr|smartTagTypes|webPublishing'
+    rb'|fileRecoveryPr|webPublishObjects|extLst)\b|</workbook>'
+)
+
+CALC_CHAIN_PART = 'xl/calcChain.xml'
+SHARED_STRINGS_PART = 'xl/sharedStrings.xml'
+
+
+def sheet_parts(archive: zipfile.ZipFile) -> Dict[str, str]:
+    """Map sheet titles to their worksheet part names."""
+    workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+    rels = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+    targets = {rel.get('Id'): rel.get('Target') for rel in rels.iter(f'{_NS_PKG_REL}Relationship')}
+    parts = {}
+    for sheet in workbook.iter(f'{_NS_MAIN}sheet'):
+        target = targets.get(sheet.get(f'{_NS_REL}id'))
+        if target:
+            parts[sheet.get('name')] = target.lstrip('/') if target.startswith('/') else posixpath.normpath(
+                posixpath.join('xl', target)
+            )
+    return parts
+
+
+def _unescape(text: bytes) -> str:
+    return (
+        text.decode('utf-8')
+        .replace('&lt;', '<').replace('&gt;', '>').replace('&quot;', '"').replace('&apos;', "'")
+        .replace('&amp;', '&')
+    )
+
+
+def read_shared_strings(archive: zipfile.ZipFile) -> List[str]:
+    """Plain text of every shared string (rich text runs joined, phonetic runs skipped)."""
+    try:
+        raw = archive.read(SHARED_STRINGS_PART)
+    except KeyError:
+        return []
+    root = ElementTree.fromstring(raw)
+    strings = []
+    for si in root.iter(f'{_NS_MAIN}si'):
+        texts = [si.find(f'{_NS_MAIN}t')] + [r.find(f'{_NS_MAIN}t') for r in si.iter(f'{_NS_MAIN}r')]
+        strings.append(''.join(t.text or '' for t in texts if t is not None))
+    return strings
+
+
+def _attrs(raw: bytes) -> Dict[bytes, bytes]:
+    return dict(_ATTR_RE.findall(raw))
+
+
+def decode_cell(attrs: bytes, body: Optional[bytes], shared_strings: List[str]) -> Any:
+    """Value of a <c> element as openpyxl would load it (formulas as '=...')."""
+    if not body:
+        return None
+    formula = _FORMULA_RE.search(body)
+    if formula and formula.group(1):
+        return '=' + _unescape(formula.group(1))
+    kind = _attrs(attrs).get(b't', b'n')
+    if kind == b'inlineStr':
+        return ''.join(_unescape(t or b'') for t in _TEXT_RE.findall(_PHONETIC_RE.sub(b'', body))) or None
+    value = _VALUE_RE.search(body)
+    if value is None:
+        return None
+    text = value.group(1)
+    if kind == b's':
+        return shared_strings[int(text)]
+    if kind == b'b':
+        return text == b'1'
+    if kind in (b'str', b'e'):
+        return _unescape(text)
+    number = text.decode('ascii')
+    return float(number) if any(ch in number for ch in '.eE') else int(number)
+
+
+def encode_cell(ref: str, style: Optional[bytes], value: Any) -> bytes:
+    """Serialize one <c> element for value, keeping the cell's style index."""
+    head = f'<c r="{ref}"'.encode('ascii') + (b' s="' + style + b'"' if style else b'')
+    if value is None or value == '':
+        return head + b'/>'
+    if isinstance(value, bool):
+        return head + b' t="b"><v>' + (b'1' if value else b'0') + b'</v></c>'
+    if isinstance(value, (int, float)):
+        return head + b'><v>' + repr(value).encode('ascii') + b'</v></c>'
+    text = str(value)
+    if text.startswith('=') and len(text) > 1:
+        return head + b'><f>' + escape(text[1:]).encode('utf-8') + b'</f><v></v></c>'
+    space = b' xml:space="preserve"' if text != text.strip() else b''
+    return head + b' t="inlineStr"><is><t' + space + b'>' + escape(text).encode('utf-8') + b'</t></is></c>'
+
+
+def _row_cells(body: Optional[bytes]) -> Iterator[Tuple[int, bytes, bytes, Optional[bytes]]]:
+    """(column, raw element, attrs, body) of each cell in a row body."""
+    column = 0
+    for match in _CELL_RE.finditer(body or b''):
+        ref = _attrs(match.group(1)).get(b'r')
+        column = column_index_from_string(_REF_RE.match(ref.decode('ascii')).group(1)) if ref else column + 1
+        yield column, match.group(0), match.group(1), match.group(2)
+
+
+# (column, raw element, style index, decoded value) of each cell in a row
+RowCells = List[Tuple[int, bytes, Optional[bytes], Any]]
+
+
+def _parse_row(body: Optional[bytes], shared_strings: List[str]) -> RowCells:
+    return [
+        (column, element, _attrs(attrs).get(b's'), decode_cell(attrs, cell_body, shared_strings))
+        for column, element, attrs, cell_body in _row_cells(body)
+    ]
+
+
+def _patch_row(
+    row: int, attrs: bytes, parsed: RowCells, cells: Dict[int, Any], replaced: Dict[Tuple[int, int], Any],
+) -> bytes:
+    out: List[Tuple[int, bytes]] = []
+    pending = dict(cells)
+    for column, element, style, value in parsed:
+        if column not in pending:
+            out.append((column, element))
+            continue
+        replaced[row, column] = value
+        out.append((column, encode_cell(f'{get_column_letter(column)}{row}', style, pending.pop(column))))
+    for column, value in pending.items():
+        replaced[row, column] = None
+        out.append((column, encode_cell(f'{get_column_letter(column)}{row}', None, value)))
+    out.sort(key=lambda item: item[0])
+    return b'<row' + attrs + b'>' + b''.join(element for _, element in out) + b'</row>'
+
+
+def _extend_dimension(xml: bytes, patch: SheetPatch) -> bytes:
+    """Grow the <dimension> ref to cover patched cells that hold a value."""
+    match = _DIMENSION_RE.search(xml)
+    written = [(r, c) for r, cells in patch.items() for c, v in cells.items() if v is not None and v != '']
+    if not match or not written:
+        return xml
+    bounds = [_REF_RE.match(part) for part in match.group(1).decode('ascii').split(':')]
+    if not all(bounds):
+        return xml
+    rows = [int(b.group(2)) for b in bounds] + [r for r, _ in written]
+    cols = [column_index_from_string(b.group(1)) for b in bounds] + [c for _, c in written]
+    ref = f'{get_column_letter(min(cols))}{min(rows)}:{get_column_letter(max(cols))}{max(rows)}'
+    return xml[:match.start(1)] + ref.encode('ascii') + xml[match.end(1):]
+
+
+class SheetIndex:
+    """
+    Byte offsets of every <row> of one worksheet part (rows in ascending order).
+
+    The cells of a row are parsed the first time it is patched and kept, so an
+    index held by the template cache serves later fills without re-parsing.
+    """
+
+    def __init__(self, xml: bytes):
+        sheet_data = _SHEET_DATA_RE.search(xml)
+        if sheet_data is None:
+            raise ValueError("Worksheet has no sheetData")
+        self.xml = xml
+        self.head_end = sheet_data.start()
+        self.tail_start = sheet_data.end()
+        # An empty <sheetData/> gets its rows inserted at the tail
+        self.body_start, self.body_end = (
+            sheet_data.span(1) if sheet_data.group(1) is not None else (self.tail_start, self.tail_start)
+        )
+        self.numbers: List[int] = []
+        self.spans: List[Tuple[int, int]] = []
+        self._matches: List[Tuple[int, int, int, int]] = []
+        row = 0
+        for match in _ROW_RE.finditer(xml, self.body_start, self.body_end):
+            row = int(match.group(1)) if match.group(1) else row + 1
+            self.numbers.append(row)
+            self.spans.append(match.span())
+            self._matches.append((*match.span(2), *match.span(3)))
+        self._parsed: Dict[int, RowCells] = {}
+
+    def row(self, i: int) -> Tuple[bytes, Optional[bytes]]:
+        """(attrs, body) of the i-th row element."""
+        attrs_start, attrs_end, body_start, body_end = self._matches[i]
+        body = self.xml[body_start:body_end] if body_start >= 0 else None
+        return self.xml[attrs_start:attrs_end], body
+
+    def cells(self, i: int, shared_strings: List[str]) -> RowCells:
+        """Parsed cells of the i-th row element."""
+        parsed = self._parsed.get(i)
+        if parsed is None:
+            parsed = self._parsed[i] = _parse_row(self.row(i)[1], shared_strings)
+        return parsed
+
+    def transform(
+        self, patch: SheetPatch, shared_strings: List[str], replaced: Dict[Tuple[int, int], Any]
+    ) -> Iterator[bytes]:
+        """Yield the patched worksheet XML in pieces; untouched rows are sliced through."""
+        yield _extend_dimension(self.xml[:self.head_end], patch)
+        yield b'<sheetData>'
+        position = self.body_start
+        for row in sorted(patch):
+            i = bisect_left(self.numbers, row)
+            if i < len(self.numbers) and self.numbers[i] == row:
+                start, end = self.spans[i]
+                attrs, parsed = self.row(i)[0], self.cells(i, shared_strings)
+            else:
+                start = end = self.spans[i][0] if i < len(self.numbers) else self.body_end
+                attrs, parsed = f' r="{row}"'.encode('ascii'), []
+            yield self.xml[position:start]
+            yield _patch_row(row, attrs, parsed, patch[row], replaced)
+            position = end
+        yield self.xml[position:self.body_end]
+        yield b'</sheetData>'
+        yield self.xml[self.tail_start:]
+
+
+def patch_sheet_xml(
+    xml: bytes, patch: SheetPatch, shared_strings: List[str]
+) -> Tuple[bytes, Dict[Tuple[int, int], Any]]:
+    """
+    Apply a patch to one worksheet part.
+
+    Returns the new XML and the previous value of every patched cell,
+    keyed by (row, column).
+    """
+    replaced: Dict[Tuple[int, int], Any] = {}
+    return b''.join(SheetIndex(xml).transform(patch, shared_strings, replaced)), replaced
+
+
+# ---- ZIP package ----
+
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+_CENTRAL_HEADER = struct.Struct('<4s4B4HL2L5H2L')
+_END_RECORD = struct.Struct('<4s4H2LH')
+_DESCRIPTOR_SIGNATURE = b'PK\x07\x08'
+_UTF8_FLAG = 0x800
+
+
+def _dos_datetime(info: zipfile.ZipInfo) -> Tuple[int, int]:
+    year, month, day, hour, minute, second = info.date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+def _encoded_name(info: zipfile.ZipInfo) -> Tuple[bytes, int]:
+    try:
+        if not info.flag_bits & _UTF8_FLAG:
+            return info.filename.encode('cp437'), info.flag_bits
+    except UnicodeEncodeError:
+        pass
+    return info.filename.encode('utf-8'), info.flag_bits | _UTF8_FLAG
+
+
+@dataclass(frozen=True)
+class _Member:
+    info: zipfile.ZipInfo
+    start: int  # local header offset
+    end: int    # end of compressed data (and data descriptor)
+
+
+class _PackageWriter:
+    """Writes ZIP members either copied raw from another archive or freshly deflated."""
+
+    def __init__(self):
+        self._out = BytesIO()
+        self._central: List[bytes] = []
+
+    def copy(self, source: bytes, member: _Member):
+        info = member.info
+        offset = self._out.tell()
+        self._out.write(memoryview(source)[member.start:member.end])
+        name, _ = _encoded_name(info)
+        self._central_entry(info, name, info.extract_version, info.flag_bits, info.compress_type, info.CRC,
+                            info.compress_size, info.file_size, info.extra, offset)
+
+    def add(self, info: zipfile.ZipInfo, chunks: Iterable[bytes]):
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        crc, size, compressed = 0, 0, []
+        for chunk in chunks:
+            crc = zlib.crc32(chunk, crc)
+            size += len(chunk)
+            compressed.append(compressor.compress(chunk))
+        compressed.append(compressor.flush())
+        data = b''.join(compressed)
+
+        name, flags = _encoded_name(info)
+        flags &= _UTF8_FLAG
+        time, date = _dos_datetime(info)
+        offset = self._out.tell()
+        self._out.write(_LOCAL_HEADER.pack(
+            b'PK\x03\x04', 20, 0, flags, zipfile.ZIP_DEFLATED, time, date, crc, len(data), size, len(name), 0
+        ))
+        self._out.write(name)
+        self._out.write(data)
+        self._central_entry(info, name, 20, flags, zipfile.ZIP_DEFLATED, crc, len(data), size, b'', offset)
+
+    def _central_entry(self, info, name, version, flags, method, crc, compress_size, file_size, extra, offset):
+        time, date = _dos_datetime(info)
+        comment = info.comment or b''
+        self._central.append(_CENTRAL_HEADER.pack(
+            b'PK\x01\x02', info.create_version, info.create_system, version, 0,
+            flags, method, time, date, crc, compress_size, file_size,
+            len(name), len(extra), len(comment), 0, info.internal_attr, info.external_attr, offset,
+        ) + name + extra + comment)
+
+    def close(self) -> bytes:
+        offset = self._out.tell()
+        directory = b''.join(self._central)
+        self._out.write(directory)
+        count = len(self._central)
+        self._out.write(_END_RECORD.pack(b'PK\x05\x06', 0, 0, count, count, len(directory), offset, 0))
+        return self._out.getvalue()
+
+
+class XlsxPackage:
+    """
+    An xlsx held as bytes, indexed for repeated cell patches.
+
+    The member table, sheet part names, shared strings and each worksheet's
+    row index are computed once and reused by every patch, so a patch costs
+    the rows it rewrites plus a raw copy of everything else.
+    """
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self._lock = threading.Lock()
+        self._sheets: Dict[str, SheetIndex] = {}
+        self._shared_strings: Optional[List[str]] = None
+        with zipfile.ZipFile(BytesIO(data)) as archive:
+            self.sheet_parts = sheet_parts(archive)
+            self._members = [self._member(info) for info in archive.infolist()]
+        self._by_name = {member.info.filename: member for member in self._members}
+
+    def _member(self, info: zipfile.ZipInfo) -> _Member:
+        if info.file_size >= 0xFFFFFFFF or info.compress_size >= 0xFFFFFFFF or info.header_offset >= 0xFFFFFFFF:
+            raise ValueError(f"ZIP64 members are not supported: {info.filename}")
+        header = _LOCAL_HEADER.unpack_from(self.data, info.header_offset)
+        end = info.header_offset + _LOCAL_HEADER.size + header[10] + header[11] + info.compress_size
+        if info.flag_bits & 0x08:
+            end += 16 if self.data[end:end + 4] == _DESCRIPTOR_SIGNATURE else 12
+        return _Member(info, info.header_offset, end)
+
+    def read(self, name: str) -> bytes:
+        with zipfile.ZipFile(BytesIO(self.data)) as archive:
+            return archive.read(name)
+
+    def shared_strings(self) -> List[str]:
+        with self._lock:
+            if self._shared_strings is None:
+                with zipfile.ZipFile(BytesIO(self.data)) as archive:
+                    self._shared_strings = read_shared_strings(archive)
+            return self._shared_strings
+
+    def sheet_index(self, title: str) -> SheetIndex:
+        part = self.sheet_parts[title]
+        with self._lock:
+            index = self._sheets.get(part)
+        if index is None:
+            index = SheetIndex(self.read(part))
+            with self._lock:
+                self._sheets[part] = index
+        return index
+
+    def patch(self, patches: Dict[str, SheetPatch]) -> Tuple[bytes, ReplacedValues]:
+        """
+        Apply per-sheet patches (keyed by sheet title).
+
+        Returns the new package bytes and the previous value of every patched
+        cell, keyed by (sheet title, row, column).
+        """
+        missing = set(patches) - set(self.sheet_parts)
+        if missing:
+            raise KeyError(f"Sheets not found: {sorted(missing)}")
+        targets = {self.sheet_parts[title]: title for title, patch in patches.items() if patch}
+        replaced: ReplacedValues = {}
+        if not targets:
+            return self.data, replaced
+
+        shared_strings = self.shared_strings()
+        rewrites = self._recalc_rewrites()
+        writer = _PackageWriter()
+        for member in self._members:
+            name = member.info.filename
+            if name in targets:
+                title = targets[name]
+                sheet_replaced: Dict[Tuple[int, int], Any] = {}
+                writer.add(member.info, self.sheet_index(title).transform(patches[title], shared_strings, sheet_replaced))
+                replaced.update({(title, r, c): v for (r, c), v in sheet_replaced.items()})
+            elif name in rewrites:
+                if rewrites[name] is not None:
+                    writer.add(member.info, (rewrites[name],))
+            else:
+                writer.copy(self.data, member)
+        return writer.close(), replaced
+
+    def _recalc_rewrites(self) -> Dict[str, Optional[bytes]]:
+        """
+        Parts to replace (None: drop) so Excel recalculates formulas on load:
+        fullCalcOnLoad on calcPr and no calcChain, which may list stale cells.
+        """
+        rewrites: Dict[str, Optional[bytes]] = {}
+        workbook = self.read('xl/workbook.xml')
+        calc_pr = _CALC_PR_RE.search(workbook)
+        if calc_pr is None:
+            insert = _AFTER_CALC_PR_RE.search(workbook).start()
+            rewrites['xl/workbook.xml'] = workbook[:insert] + b'<calcPr fullCalcOnLoad="1"/>' + workbook[insert:]
+        elif b' fullCalcOnLoad="1"' not in calc_pr.group(0):
+            tag = _FULL_CALC_RE.sub(b'', calc_pr.group(0))
+            tag = tag[:len(b'<calcPr')] + b' fullCalcOnLoad="1"' + tag[len(b'<calcPr'):]
+            rewrites['xl/workbook.xml'] = workbook[:calc_pr.start()] + tag + workbook[calc_pr.end():]
+
+        if CALC_CHAIN_PART in self._by_name:
+            rewrites[CALC_CHAIN_PART] = None
+            rels = self.read('xl/_rels/workbook.xml.rels')
+            rewrites['xl/_rels/workbook.xml.rels'] = re.sub(
+                rb'<Relationship\b[^>]*Target="[^"]*calcChain\.xml"[^>]*/>', b'', rels
+            )
+            content_types = self.read('[Content_Types].xml')
+            rewrites['[Content_Types].xml'] = re.sub(
+                rb'<Override\b[^>]*PartName="/xl/calcChain\.xml"[^>]*/>', b'', content_types
+            )
+        return rewrites
+
+
+def patch_workbook(xlsx: bytes, patches: Dict[str, SheetPatch]) -> Tuple[bytes, ReplacedValues]:
+    """
+    Apply per-sheet patches (keyed by sheet title) to an xlsx.
+
+    Returns the new package bytes and the previous value of every patched
+    cell, keyed by (sheet title, row, column).
+    """
+    return XlsxPackage(xlsx).patch(patches)
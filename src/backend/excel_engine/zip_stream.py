@@ -0,0 +1,64 @@
+"""
+ZIP Stream - Incremental ZIP archive writer
+Builds a ZIP archive entry by entry and hands back the produced bytes right
+away, so archives can be streamed to the client instead of buffered whole.
+"""
+
+from io import RawIOBase
+from typing import List
+import zipfile
+
+COMPRESSION_MODES = {
+    'stored': zipfile.ZIP_STORED,
+    'deflated': zipfile.ZIP_DEFLATED,
+}
+
+
+class _ChunkSink(RawIOBase):
+    """Non-seekable write target that collects written chunks until drained."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipStream:
+    """
+    Write-once ZIP archive producing output incrementally.
+
+    The sink is not seekable, so zipfile writes each entry followed by a data
+    descriptor and never goes back to patch earlier bytes. Only the entry being
+    added (and the central directory at close) is held in memory.
+
+    Usage:
+        stream = ZipStream('stored')
+        yield stream.add('a.xlsx', data)
+        yield stream.close()
+    """
+
+    def __init__(self, compression: str = 'stored'):
+        if compression not in COMPRESSION_MODES:
+            raise ValueError(f"Unknown ZIP compression: {compression}")
+        self._sink = _ChunkSink()
+        self._zip = zipfile.ZipFile(self._sink, 'w', COMPRESSION_MODES[compression])
+
+    def add(self, name: str, data: bytes) -> bytes:
+        """Add one file and return the archive bytes produced for it."""
+        self._zip.writestr(name, data)
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        """Finish the archive and return the central directory bytes."""
+        self._zip.close()
+        return self._sink.drain()
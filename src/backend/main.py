@@ -2,25 +2,75 @@
 FastAPI Backend - IA_Sandbox
 Sistema de Preevaluación Sandbox IA España
 """
+from contextlib import asynccontextmanager
 from typing import Optional, List
-from fastapi import FastAPI, HTTPException
+import json
+import time
+from fastapi import FastAPI, Header, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
-from pydantic import BaseModel
-
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, Field
+
+from services.analytics import get_analytics
+from services.assessments import MAX_BULK_ROWS, BatchConflict, get_assessment_repository, upsert_assessments
+from services.audit import get_audit_log, shutdown_audit_log
+from services.catalog import get_catalog
+from services.contracts import StreamReport, get_contracts
 from services.conversion_logic import calculate_plan, calculate_all_assessments
-from excel_engine.generator import generate_excel
-from excel_engine.export_api import router as export_router
+from excel_engine.generator import generate_excel, GENERATOR_VERSION
+from excel_engine.export_api import router as export_router, preload_templates
+from services.executor import ExecutorSaturated, get_executor, shutdown_executor
+from services.export_jobs import shutdown_job_queue
+from services.gatekeeper import GatekeeperFailed, check_exportable, get_gatekeeper
+from services.http_cache import get_static_responses
+from services.knowledge_base import get_kb_store
+from services.progress import get_progress_summaries
+from services.result_cache import canonical_digest, etag_matches, get_result_cache, make_etag
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Compile the Guía 16 catalog and parse AESIA templates (and their layouts)
+    # before serving requests
+    get_catalog()
+    preload_templates()
+    get_kb_store().get()
+    get_contracts()
+    yield
+    shutdown_job_queue()
+    shutdown_executor()
+    shutdown_audit_log()
+
 
 app = FastAPI(
     title="IA_Sandbox API",
     description="API para el Sistema de Preevaluación del Sandbox de IA España",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Include export router
 app.include_router(export_router)
 
+
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request, exc: ExecutorSaturated):
+    """Shed load instead of queueing unbounded work."""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Servidor ocupado, reintente más tarde", "lane": exc.lane},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(GatekeeperFailed)
+async def gatekeeper_failed_handler(request, exc: GatekeeperFailed):
+    """Exportación bloqueada: la respuesta incluye los contadores y las filas que fallan."""
+    return JSONResponse(
+        status_code=409,
+        content={"detail": "La aplicación no supera el Gatekeeper previo a la exportación", "gatekeeper": exc.report},
+    )
+
 # CORS para desarrollo
 app.add_middleware(
     CORSMiddleware,
@@ -67,6 +117,38 @@ class ExportRequest(BaseModel):
     assessments: List[AssessmentInput]
 
 
+class BulkAssessmentRow(BaseModel):
+    mg_id: str
+    subpart_id: Optional[str] = None  # None = todos los apartados de la MG
+    maturity: Optional[str] = None
+    difficulty: Optional[str] = None
+    notes: Optional[str] = None
+
+
+class BulkAssessmentRequest(BaseModel):
+    batch_id: str = Field(min_length=1, max_length=128)
+    rows: List[BulkAssessmentRow] = Field(max_length=MAX_BULK_ROWS)
+
+
+class AdditionalMeasureInput(BaseModel):
+    title: str = Field(min_length=1)
+    description: Optional[str] = None
+    attachment_url: Optional[str] = None
+    requirement_codes: List[str] = []
+
+
+class ApplicationOrgInput(BaseModel):
+    org_id: Optional[str] = None
+
+
+# Aplicaciones por petición del resumen de progreso (panel de un asesor)
+MAX_PROGRESS_APPLICATIONS = 1000
+
+
+class ProgressRequest(BaseModel):
+    application_ids: List[str] = Field(max_length=MAX_PROGRESS_APPLICATIONS)
+
+
 # ============ Endpoints ============
 
 @app.get("/")
@@ -79,6 +161,18 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/health/executor")
+async def executor_stats():
+    """Queue length and in-flight counts of the worker pools (for sizing)."""
+    return get_executor().stats()
+
+
+@app.get("/health/audit")
+async def audit_stats():
+    """Queue depth, flush latency and spool counters of the audit log writer."""
+    return get_audit_log().stats()
+
+
 @app.post("/api/calculate-plan")
 async def api_calculate_plan(request: CalculatePlanRequest):
     """
@@ -106,80 +200,270 @@ async def api_calculate_assessments(assessments: List[AssessmentInput]):
     }
 
 
+@app.post("/api/applications/{application_id}/assessments/bulk")
+def api_bulk_assessments(application_id: str, request: BulkAssessmentRequest):
+    """
+    Aplica en una sola transacción un lote de evaluaciones MG.
+    Valida contra el catálogo, calcula los planes en bloque y devuelve el
+    resultado por fila. Reenviar el mismo batch_id devuelve el resultado
+    guardado sin volver a escribir (409 si el contenido es distinto).
+    """
+    try:
+        result = upsert_assessments(
+            application_id, request.batch_id, [row.model_dump() for row in request.rows]
+        )
+    except BatchConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not result['replayed']:
+        get_audit_log().log('ASSESSMENT_UPDATE', entity_type='application', entity_id=application_id, metadata={
+            'batch_id': request.batch_id, 'summary': result['summary'],
+        })
+    return result
+
+
+@app.put("/api/applications/{application_id}/measures-additional/{ma_id}")
+def api_put_additional_measure(application_id: str, ma_id: str, measure: AdditionalMeasureInput):
+    """Crea o reemplaza una medida adicional (MA) y sus requisitos vinculados."""
+    known = set(get_catalog().requirement_codes)
+    unknown = [code for code in measure.requirement_codes if code not in known]
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Requisitos desconocidos: {', '.join(unknown)}")
+    stored = get_assessment_repository().put_ma(application_id, {"id": ma_id, **measure.model_dump()})
+    get_audit_log().log('MA_UPDATE', entity_id=ma_id, metadata={
+        "application_id": application_id, "requirement_codes": measure.requirement_codes,
+    })
+    return stored
+
+
+@app.delete("/api/applications/{application_id}/measures-additional/{ma_id}", status_code=204)
+def api_delete_additional_measure(application_id: str, ma_id: str):
+    """Elimina una medida adicional (MA)."""
+    if not get_assessment_repository().delete_ma(application_id, ma_id):
+        raise HTTPException(status_code=404, detail=f"Medida adicional no encontrada: {ma_id}")
+    get_audit_log().log('MA_UPDATE', action='DELETE', entity_id=ma_id, metadata={"application_id": application_id})
+    return Response(status_code=204)
+
+
+@app.put("/api/applications/{application_id}/org")
+def api_set_application_org(application_id: str, request: ApplicationOrgInput):
+    """Asigna la aplicación a una organización (null la desasigna)."""
+    get_assessment_repository().set_application_org(application_id, request.org_id)
+    return {"application_id": application_id, "org_id": request.org_id}
+
+
+@app.get("/api/applications/{application_id}/gatekeeper")
+def api_gatekeeper(application_id: str, details: bool = False):
+    """
+    Gatekeeper previo a la exportación (COMPLETED → EXPORTED): MAs sin
+    requisito, adjuntos con URL no válida y MGs pendientes, con contadores
+    globales y por requisito. Con details=true incluye las filas que fallan.
+    """
+    gatekeeper = get_gatekeeper()
+    report = gatekeeper.check(application_id)
+    if details:
+        report["offenders"] = gatekeeper.offenders(application_id)
+    return report
+
+
+@app.get("/api/applications/{application_id}/progress")
+def api_application_progress(application_id: str):
+    """
+    Progreso de una aplicación por requisito: filas MG diagnosticadas y
+    pendientes frente a las esperadas, histograma de madurez L1-L8 y
+    distribución de planes 01-05.
+    """
+    return get_progress_summaries().summary(application_id)
+
+
+@app.post("/api/applications/progress")
+def api_applications_progress(request: ProgressRequest):
+    """
+    Resúmenes de progreso de varias aplicaciones en una sola petición (las
+    que el usuario puede ver, p. ej. todos los clientes de un asesor).
+    """
+    return {"applications": get_progress_summaries().summaries(request.application_ids)}
+
+
 @app.post("/api/export-excel")
-async def api_export_excel(request: ExportRequest):
+async def api_export_excel(
+    request: ExportRequest,
+    application_id: str,
+    if_none_match: Optional[str] = Header(None),
+):
     """
     Genera el archivo Excel de preevaluación (9 pestañas).
+    Entradas idénticas se sirven desde la caché de resultados (ETag + 304).
+    La aplicación debe superar el Gatekeeper (409 si no).
     """
+    await check_exportable(application_id)
     try:
         # Preparar datos
         assessments_dict = [a.model_dump() for a in request.assessments]
         calculated = calculate_all_assessments(assessments_dict)
         
-        # Datos de requisitos (demo)
-        requirements = [
-            {"id": "REQ_01", "article_ref": "Art. 6-7", "title": "Sistema de gestión de riesgos"},
-            {"id": "REQ_02", "article_ref": "Art. 10", "title": "Datos y gobernanza de datos"},
-            {"id": "REQ_03", "article_ref": "Art. 11", "title": "Documentación técnica"},
-            {"id": "REQ_09", "article_ref": "Art. 17", "title": "Sistema de gestión de calidad"},
-        ]
+        # Requisitos y medidas del catálogo: las MG de los requisitos evaluados
+        # (todas si ninguna medida evaluada pertenece al catálogo)
+        catalog = get_catalog()
+        requirement_ids = [r["id"] for r in catalog.requirements()]
+        assessed = {catalog.requirement_of(a["measure_id"]) for a in assessments_dict} - {None}
+        measures = catalog.measures([code for code in requirement_ids if code in assessed] if assessed else None)
         
         application_data = {
             "project_metadata": request.project_metadata.model_dump(),
-            "requirements": requirements,
+            "requirements": catalog.requirements(),
+            "measures": measures,
+            "measures_map": catalog.measures_map(requirement_ids, [m["id"] for m in measures]),
             "assessments_mg": calculated,
         }
         
-        # Generar Excel
-        excel_bytes = generate_excel(application_data)
+        cache_key = canonical_digest('preevaluacion', GENERATOR_VERSION, catalog.version, application_data)
+        etag = make_etag(cache_key)
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        
+        # Generar Excel (fuera del event loop), salvo que ya esté en caché
+        executor = get_executor()
+        cache = get_result_cache()
+        excel_bytes = await executor.run_io(cache.get, cache_key, admitted=True)
+        headers["X-Cache"] = "HIT" if excel_bytes is not None else "MISS"
+        if excel_bytes is None:
+            excel_bytes = await executor.run_cpu(generate_excel, application_data)
+            await executor.run_io(cache.put, cache_key, excel_bytes, admitted=True)
         
         # Retornar archivo
         filename = f"preevaluacion_{request.project_metadata.nombre.replace(' ', '_')}.xlsx"
         return Response(
             content=excel_bytes,
             media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
+            headers={**headers, "Content-Disposition": f"attachment; filename={filename}"}
         )
         
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-# ============ Static Data Endpoints ============
+# ============ Catalog Endpoints ============
+
+# Respuestas pre-serializadas; se regeneran solo al cambiar el catálogo (ETag + 304)
 
 @app.get("/api/requirements")
-async def get_requirements():
-    """Retorna los 12 requisitos del RIA."""
-    return {
-        "requirements": [
-            {"id": "REQ_01", "article_ref": "Art. 6-7", "title": "Sistema de gestión de riesgos"},
-            {"id": "REQ_02", "article_ref": "Art. 10", "title": "Datos y gobernanza de datos"},
-            {"id": "REQ_03", "article_ref": "Art. 11", "title": "Documentación técnica"},
-            {"id": "REQ_04", "article_ref": "Art. 12", "title": "Registro de operaciones"},
-            {"id": "REQ_05", "article_ref": "Art. 13", "title": "Transparencia e información"},
-            {"id": "REQ_06", "article_ref": "Art. 14", "title": "Supervisión humana"},
-            {"id": "REQ_07", "article_ref": "Art. 15", "title": "Precisión, robustez y ciberseguridad"},
-            {"id": "REQ_08", "article_ref": "Art. 16", "title": "Obligaciones del proveedor"},
-            {"id": "REQ_09", "article_ref": "Art. 17", "title": "Sistema de gestión de calidad"},
-            {"id": "REQ_10", "article_ref": "Art. 18-19", "title": "Conservación de documentación"},
-            {"id": "REQ_11", "article_ref": "Art. 20-21", "title": "Registro y evaluación"},
-            {"id": "REQ_12", "article_ref": "Art. 22-25", "title": "Monitorización post-comercialización"},
-        ]
-    }
+async def get_requirements(if_none_match: Optional[str] = Header(None)):
+    """Retorna los 12 requisitos del catálogo Guía 16."""
+    catalog = get_catalog()
+    return get_static_responses().respond(
+        "requirements", catalog.version, lambda: {"requirements": catalog.requirements()}, if_none_match
+    )
 
 
 @app.get("/api/maturity-levels")
-async def get_maturity_levels():
+async def get_maturity_levels(if_none_match: Optional[str] = Header(None)):
     """Retorna los 8 niveles de madurez con sus planes."""
+    catalog = get_catalog()
+    return get_static_responses().respond(
+        "maturity-levels", catalog.version, lambda: {"levels": catalog.maturity_levels()}, if_none_match
+    )
+
+
+# ============ Agent Contracts ============
+
+NDJSON_MEDIA_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+
+async def _validate_contract(name: str, request: Request) -> dict:
+    """
+    Valida el cuerpo contra un contrato. Un objeto JSON devuelve
+    {valid, errors}; un flujo NDJSON (un registro por línea) se procesa a
+    medida que llega y devuelve el resumen con los registros inválidos, sin
+    interrumpirse por ellos. Las líneas de más de 1 MiB cuentan como
+    registros inválidos y no se acumulan en memoria.
+
+    La validación se ejecuta en el carril de E/S del executor, fuera del
+    bucle de eventos.
+    """
+    validator = get_contracts()[name]
+    executor = get_executor()
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in NDJSON_MEDIA_TYPES:
+        body = await request.body()
+
+        def validate_body() -> List[str]:
+            try:
+                return validator(json.loads(body))
+            except ValueError as e:
+                return [f"invalid JSON: {e}"]
+        errors = await executor.run_io(validate_body)
+        return {"contract": name, "valid": not errors, "errors": errors}
+
+    report = StreamReport()
+    admitted = False
+    async for chunk in request.stream():
+        # Only the first chunk can be turned away (503): a stream already being validated is finished
+        await executor.run_io(report.feed, chunk, validator, admitted=admitted)
+        admitted = True
+    await executor.run_io(report.finish, validator, admitted=True)
+    return {"contract": name, **report.summary()}
+
+
+@app.post("/api/validate/application")
+async def validate_application(request: Request):
+    """Valida solicitudes contra spec/agent_contracts/input_application.json."""
+    return await _validate_contract("application", request)
+
+
+@app.post("/api/validate/claims")
+async def validate_claims(request: Request):
+    """Valida salidas del agente contra spec/agent_contracts/output_claims.json."""
+    return await _validate_contract("claims", request)
+
+
+# ============ Knowledge Base ============
+
+@app.get("/api/kb/search")
+def kb_search(
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(10, ge=1, le=50),
+    doc: Optional[str] = Query(None, description="Prefijo de documento, p. ej. 'guias_aesia/'"),
+):
+    """
+    Búsqueda de texto completo en la base de conocimiento (guías AESIA,
+    normativa y procedimientos). Devuelve pasajes ordenados por relevancia
+    con la cita de documento y página.
+    """
+    index = get_kb_store().get()
+    if index is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Índice de la base de conocimiento no generado (python tools/build_kb_index.py)",
+        )
+    start = time.perf_counter()
+    found = index.search(q, limit=limit, doc_prefix=doc)
     return {
-        "levels": [
-            {"code": "L1", "label": "No identificada", "plan": "01", "plan_desc": "Documentar e Implementar"},
-            {"code": "L2", "label": "Identificada, no documentada", "plan": "01", "plan_desc": "Documentar e Implementar"},
-            {"code": "L3", "label": "Documentada, no implementada", "plan": "02", "plan_desc": "Implementar"},
-            {"code": "L4", "label": "Parcialmente implementada", "plan": "02", "plan_desc": "Implementar"},
-            {"code": "L5", "label": "Implementada sin evidencia", "plan": "03", "plan_desc": "Adaptación Completa"},
-            {"code": "L6", "label": "Implementada, evidencia parcial", "plan": "04", "plan_desc": "Documentar"},
-            {"code": "L7", "label": "Implementada, evidencia completa", "plan": "04", "plan_desc": "Documentar"},
-            {"code": "L8", "label": "Medida no necesaria", "plan": "05", "plan_desc": "Ninguna acción"},
-        ]
+        "query": q,
+        "total": found["total"],
+        "results": found["results"],
+        "took_ms": round((time.perf_counter() - start) * 1000, 2),
+        "index_version": index.version[:12],
     }
+
+
+# ============ Portfolio Analytics ============
+
+@app.get("/api/analytics/{org_id}/heatmap")
+def analytics_heatmap(org_id: str):
+    """Mapa de calor de madurez por requisito × MG en todas las aplicaciones de la organización."""
+    return {"org_id": org_id, **get_analytics().heatmap(org_id)}
+
+
+@app.get("/api/analytics/{org_id}/plans")
+def analytics_plans(org_id: str):
+    """Planes de adaptación más frecuentes, en total y por requisito."""
+    return {"org_id": org_id, **get_analytics().plans(org_id)}
+
+
+@app.get("/api/analytics/{org_id}/slowest-measures")
+def analytics_slowest_measures(org_id: str, limit: int = Query(20, ge=1, le=200)):
+    """MGs cuya madurez mejora más despacio (cambio medio de nivel cada 30 días)."""
+    return {"org_id": org_id, "measures": get_analytics().slowest_measures(org_id, limit)}
@@ -0,0 +1,314 @@
+"""
+Analytics - Organization-wide portfolio aggregates over MG assessments
+Sistema de Preevaluación Sandbox IA España
+
+Advisors and org admins look across every application of an organization:
+a maturity heatmap per requirement × MG, the most frequent adaptation plans
+and the measures whose maturity improves slowest. An organization's current
+assessments and their change history are loaded into columnar frames
+(categorical ids, int8 maturity ranks 1-8 with 0 for unassessed) and every
+aggregate is a vectorized group-by over them.
+
+Frames and results are cached per organization. The cache listens to the
+assessment repository and drops an organization's entry when one of its
+applications is written or reassigned, so the next read reloads it.
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from services.assessments import (
+    ORG_HISTORY_COLUMNS, ORG_MG_COLUMNS, AssessmentListener, AssessmentRepository, get_assessment_repository,
+)
+from services.conversion_logic import MATURITY_LEVELS
+from services.progress import PLANS
+
+_ID_COLUMNS = ('application_id', 'measure_id', 'subpart_id')
+
+
+def _maturity_ranks(values) -> np.ndarray:
+    """L1..L8 -> 1..8; anything else (unassessed) -> 0."""
+    return (pd.Categorical(values, categories=MATURITY_LEVELS).codes + 1).astype(np.int8)
+
+
+def assessment_frame(rows: Iterable[Tuple]) -> pd.DataFrame:
+    """Columnar frame of ORG_MG_COLUMNS tuples."""
+    frame = pd.DataFrame.from_records(list(rows), columns=ORG_MG_COLUMNS)
+    for column in (*_ID_COLUMNS, 'requirement_code'):
+        frame[column] = frame[column].astype('category')
+    frame['maturity'] = _maturity_ranks(frame['maturity'])
+    frame['adaptation_plan'] = pd.Categorical(frame['adaptation_plan'], categories=PLANS)
+    return frame
+
+
+def history_frame(rows: Iterable[Tuple]) -> pd.DataFrame:
+    """Columnar frame of ORG_HISTORY_COLUMNS tuples, kept in recording order."""
+    frame = pd.DataFrame.from_records(list(rows), columns=ORG_HISTORY_COLUMNS)
+    for column in _ID_COLUMNS:
+        frame[column] = frame[column].astype('category')
+    frame['maturity'] = _maturity_ranks(frame['maturity'])
+    frame['recorded_at'] = pd.to_datetime(frame['recorded_at'], utc=True, format='ISO8601')
+    return frame
+
+
+def _pair_counts(frame: pd.DataFrame, outer: str, inner: np.ndarray, width: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Counts of `inner` values (0..width-1) per (outer category, measure_id
+    category) pair, as a (pairs, width) matrix; only pairs with rows are kept.
+    Rows missing either value (code -1, e.g. a NULL requirement_code) are left out.
+    Returns (pair ids, counts) where a pair id is outer code * measures + measure code.
+    """
+    measures = len(frame['measure_id'].cat.categories)
+    pairs = len(frame[outer].cat.categories) * measures
+    outer_codes = frame[outer].cat.codes.to_numpy().astype(np.int64)
+    measure_codes = frame['measure_id'].cat.codes.to_numpy().astype(np.int64)
+    known = (outer_codes >= 0) & (measure_codes >= 0)
+    pair, inner = outer_codes[known] * measures + measure_codes[known], inner[known]
+    counts = np.bincount(pair * width + inner, minlength=pairs * width).reshape(pairs, width)
+    present = np.flatnonzero(np.bincount(pair, minlength=pairs))
+    return present, counts[present]
+
+
+def maturity_heatmap(frame: pd.DataFrame) -> Dict[str, Any]:
+    """Per requirement × MG: assessed rows, mean maturity rank and count per level."""
+    ranks = len(MATURITY_LEVELS) + 1
+    pair_ids, counts = _pair_counts(frame, 'requirement_code', frame['maturity'].to_numpy(), ranks)
+    counts = counts[:, 1:]  # rank 0 is unassessed
+    totals = counts.sum(axis=1)
+    assessed = totals > 0
+    pair_ids, counts, totals = pair_ids[assessed], counts[assessed], totals[assessed]
+    means = (counts @ np.arange(1, ranks)) / totals
+    requirements, measures = frame['requirement_code'].cat.categories, frame['measure_id'].cat.categories
+    cells = [
+        {
+            'requirement_code': requirements[pair // len(measures)],
+            'mg_id': measures[pair % len(measures)],
+            'assessed': int(total),
+            'mean_level': round(float(mean), 2),
+            'levels': level_counts.tolist(),
+        }
+        for pair, total, mean, level_counts in zip(pair_ids, totals, means, counts)
+    ]
+    cells.sort(key=lambda cell: (cell['requirement_code'], cell['mg_id']))
+    return {
+        'applications': int(frame['application_id'].nunique()),
+        'levels': list(MATURITY_LEVELS),
+        'cells': cells,
+    }
+
+
+def frequent_plans(frame: pd.DataFrame) -> Dict[str, Any]:
+    """Adaptation plans by frequency, overall and per requirement (rows without one count only overall)."""
+    plan_codes = frame['adaptation_plan'].cat.codes.to_numpy().astype(np.int64) + 1  # 0 = no plan
+    width = len(PLANS) + 1
+    overall = np.bincount(plan_codes, minlength=width)[1:]
+    requirement = frame['requirement_code'].cat.codes.to_numpy().astype(np.int64)
+    known = requirement >= 0
+    requirements = frame['requirement_code'].cat.categories
+    counts = np.bincount(requirement[known] * width + plan_codes[known], minlength=len(requirements) * width)
+    counts = counts.reshape(len(requirements), width)[:, 1:]
+
+    def ranked(row: np.ndarray) -> List[Dict[str, Any]]:
+        total = row.sum()
+        order = np.argsort(-row, kind='stable')
+        return [
+            {'plan': PLANS[i], 'count': int(row[i]), 'share': round(float(row[i] / total), 4)}
+            for i in order if row[i]
+        ]
+
+    return {
+        'total': int(overall.sum()),
+        'plans': ranked(overall),
+        'by_requirement': {
+            requirements[i]: ranked(counts[i]) for i in np.argsort(requirements) if counts[i].any()
+        },
+    }
+
+
+def slowest_improving(history: pd.DataFrame, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    MGs ranked by mean maturity change per 30 days, slowest first.
+
+    For every (application, MG, subpart) assessed at least twice, the change
+    is the last recorded rank minus the first over the days between them (at
+    least one). Rows must be in recording order.
+    """
+    maturity = history['maturity'].to_numpy()
+    known = np.flatnonzero(maturity > 0)
+    # One int64 key per (application, MG, subpart); a stable sort keeps each
+    # key's rows in recording order, so its first and last rows bound the run
+    key = np.zeros(len(known), dtype=np.int64)
+    for column in _ID_COLUMNS:
+        key = key * len(history[column].cat.categories) + history[column].cat.codes.to_numpy()[known]
+    sort = np.argsort(key, kind='stable')
+    order, key = known[sort], key[sort]
+    starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]]) if len(key) else np.empty(0, dtype=np.int64)
+    ends = np.r_[starts[1:], len(key)] - 1
+    repeated = ends > starts
+    first, last = order[starts[repeated]], order[ends[repeated]]
+    if not len(first):
+        return []
+
+    # .values is datetime64 (UTC) even for tz-aware columns
+    recorded = history['recorded_at'].values
+    measure = history['measure_id'].cat.codes.to_numpy()[first]
+    change = maturity[last].astype(np.float64) - maturity[first]
+    days = np.maximum((recorded[last] - recorded[first]) / np.timedelta64(1, 'D'), 1)
+
+    measures = len(history['measure_id'].cat.categories)
+    tracked = np.bincount(measure, minlength=measures)
+    present = np.flatnonzero(tracked)
+    tracked = tracked[present]
+    mean_change = np.bincount(measure, change, measures)[present] / tracked
+    rate = np.bincount(measure, change / days * 30, measures)[present] / tracked
+    mean_level = np.bincount(measure, maturity[last], measures)[present] / tracked
+    # Slowest first; more tracked rows first among equals
+    ranked = np.lexsort((-tracked, rate))[:limit]
+    names = history['measure_id'].cat.categories
+    return [
+        {
+            'mg_id': names[present[i]],
+            'tracked': int(tracked[i]),
+            'mean_change': round(float(mean_change[i]), 3),
+            'change_per_30_days': round(float(rate[i]), 3),
+            'mean_level': round(float(mean_level[i]), 2),
+        }
+        for i in ranked
+    ]
+
+
+class _OrgCache:
+    __slots__ = ('applications', 'frame', 'history', 'results')
+
+    def __init__(self, applications: Set[str], frame: pd.DataFrame, history: pd.DataFrame):
+        self.applications = applications
+        self.frame = frame
+        self.history = history
+        self.results: Dict[Hashable, Any] = {}
+
+
+class PortfolioAnalytics(AssessmentListener):
+    """Cached per-organization aggregates (see module docstring)."""
+
+    def __init__(self, repository: AssessmentRepository, max_orgs: Optional[int] = None):
+        self.repository = repository
+        self.max_orgs = max_orgs
+        self._orgs: 'OrderedDict[str, _OrgCache]' = OrderedDict()
+        self._app_org: Dict[str, str] = {}
+        # Bumped on every invalidation, so a load that raced a write is not cached
+        self._epochs: Dict[str, int] = {}
+        # Applications written while loads were running and not yet mapped to an org
+        self._loads = 0
+        self._unmapped_writes: Set[str] = set()
+        self._lock = threading.Lock()
+        self.loads = 0
+        repository.add_listener(self)
+
+    def close(self):
+        self.repository.remove_listener(self)
+
+    # ---- invalidation ----
+
+    def _invalidate(self, org_id: Optional[str]):
+        if org_id is None:
+            return
+        self._epochs[org_id] = self._epochs.get(org_id, 0) + 1
+        cache = self._orgs.pop(org_id, None)
+        if cache is not None:
+            for application_id in cache.applications:
+                self._app_org.pop(application_id, None)
+
+    def _written(self, application_id: str):
+        with self._lock:
+            org_id = self._app_org.get(application_id)
+            if org_id is not None:
+                self._invalidate(org_id)
+            elif self._loads:
+                self._unmapped_writes.add(application_id)
+
+    def mg_written(self, application_id: str, rows: List[Dict[str, Any]]):
+        self._written(application_id)
+
+    def application_assigned(self, application_id: str, org_id: Optional[str]):
+        with self._lock:
+            self._invalidate(self._app_org.get(application_id))
+            self._invalidate(org_id)
+
+    # ---- reads ----
+
+    def _org(self, org_id: str) -> _OrgCache:
+        with self._lock:
+            cache = self._orgs.get(org_id)
+            if cache is not None:
+                self._orgs.move_to_end(org_id)
+                return cache
+            epoch = self._epochs.get(org_id, 0)
+            self._loads += 1
+
+        try:
+            # Outside the lock: listeners run under the repository's lock
+            applications = set(self.repository.org_applications(org_id))
+            cache = _OrgCache(
+                applications,
+                assessment_frame(self.repository.org_mg_rows(org_id)),
+                history_frame(self.repository.org_mg_history(org_id)),
+            )
+        finally:
+            with self._lock:
+                self._loads -= 1
+                raced = self._unmapped_writes
+                if not self._loads:
+                    self._unmapped_writes = set()
+
+        with self._lock:
+            self.loads += 1
+            if self._epochs.get(org_id, 0) == epoch and not (applications & raced):
+                self._orgs[org_id] = cache
+                for application_id in applications:
+                    self._app_org[application_id] = org_id
+                if self.max_orgs is not None:
+                    while len(self._orgs) > self.max_orgs:
+                        self._invalidate(next(iter(self._orgs)))
+        return cache
+
+    def _result(self, org_id: str, key: Hashable, compute: Callable[[_OrgCache], Any]) -> Any:
+        cache = self._org(org_id)
+        with self._lock:
+            if key in cache.results:
+                return cache.results[key]
+        result = compute(cache)
+        with self._lock:
+            cache.results[key] = result
+        return result
+
+    def heatmap(self, org_id: str) -> Dict[str, Any]:
+        return self._result(org_id, 'heatmap', lambda cache: maturity_heatmap(cache.frame))
+
+    def plans(self, org_id: str) -> Dict[str, Any]:
+        return self._result(org_id, 'plans', lambda cache: frequent_plans(cache.frame))
+
+    def slowest_measures(self, org_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        return self._result(org_id, ('slowest', limit), lambda cache: slowest_improving(cache.history, limit))
+
+
+_analytics: Optional[PortfolioAnalytics] = None
+_analytics_lock = threading.Lock()
+
+
+def get_analytics() -> PortfolioAnalytics:
+    """
+    Return the portfolio analytics of the configured assessment repository,
+    caching at most ANALYTICS_CACHE_MAX_ORGS organizations (default 64).
+    """
+    global _analytics
+    repository = get_assessment_repository()
+    with _analytics_lock:
+        if _analytics is None or _analytics.repository is not repository:
+            if _analytics is not None:
+                _analytics.close()
+            _analytics = PortfolioAnalytics(repository, int(os.environ.get('ANALYTICS_CACHE_MAX_ORGS') or 64))
+        return _analytics
@@ -0,0 +1,648 @@
+"""
+Assessments - Bulk, idempotent upsert of MG self-assessments
+Sistema de Preevaluación Sandbox IA España
+
+A bulk request carries a client batch id and up to MAX_BULK_ROWS MG rows. Rows
+are validated against the catalog, their plans are computed in one
+`calculate_plans` call, and every accepted row is written in a single
+transaction together with the batch record. Replaying a batch id returns the
+stored outcome instead of writing again. SQLiteAssessmentRepository stands in
+for the Supabase tables (assessments_mg, migrations 002/007/011; additional
+measures and their requirement links, measures_additional and
+rel_ma_requirements, migration 002; the organization of each application,
+applications.org_id, migration 003). Every MG change is also appended to
+assessments_mg_history, which portfolio analytics reads to measure
+improvement over time.
+
+Listeners registered on a repository are told about every committed change,
+in commit order, so derived state (the Gatekeeper counters, progress
+summaries) can follow the tables incrementally; ApplicationStateCache holds
+such state per application.
+"""
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import json
+import os
+import sqlite3
+import threading
+
+from services.catalog import Catalog, get_catalog
+from services.conversion_logic import MATURITY_LEVELS, calculate_plans
+from services.result_cache import canonical_digest
+
+MAX_BULK_ROWS = 10000
+DIFFICULTY_LEVELS = ('00', '01', '02')
+# Fields set by the client; diagnosis_status and adaptation_plan are derived
+ASSESSMENT_FIELDS = ('maturity', 'difficulty', 'notes')
+
+AssessmentKey = Tuple[str, str]
+
+# Column order of the org-wide row lists (org_mg_rows / org_mg_history)
+ORG_MG_COLUMNS = ('application_id', 'measure_id', 'subpart_id', 'requirement_code', 'maturity', 'adaptation_plan')
+ORG_HISTORY_COLUMNS = ('application_id', 'measure_id', 'subpart_id', 'maturity', 'recorded_at')
+
+
+class BatchConflict(Exception):
+    """A batch id was reused with a different payload."""
+
+    def __init__(self, batch_id: str):
+        super().__init__(f"Batch {batch_id} was already applied with a different payload")
+        self.batch_id = batch_id
+
+
+class AssessmentListener:
+    """
+    Receives committed changes from a repository. Calls are made in commit
+    order while the repository still holds its write lock, so they must be
+    quick and must not call back into the repository.
+    """
+
+    def mg_written(self, application_id: str, rows: List[Dict[str, Any]]):
+        """MG rows inserted or updated (full rows, as in list_mg)."""
+
+    def ma_written(self, application_id: str, measure: Dict[str, Any]):
+        """An additional measure created or replaced (as in list_ma)."""
+
+    def ma_deleted(self, application_id: str, ma_id: str):
+        """An additional measure removed."""
+
+    def application_assigned(self, application_id: str, org_id: Optional[str]):
+        """An application moved to an organization (None: to none)."""
+
+
+class AssessmentRepository(ABC):
+    """Persistence of MG assessments, applied batches and additional measures (MA)."""
+
+    def __init__(self):
+        self._listeners: List[AssessmentListener] = []
+
+    def add_listener(self, listener: AssessmentListener):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: AssessmentListener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def _notify(self, event: str, application_id: str, payload: Any):
+        for listener in self._listeners:
+            getattr(listener, event)(application_id, payload)
+
+    @abstractmethod
+    def get_batch(self, application_id: str, batch_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """Return (payload digest, stored result) of an applied batch, or None."""
+
+    @abstractmethod
+    def apply_batch(
+        self,
+        application_id: str,
+        batch_id: str,
+        digest: str,
+        rows: List[Dict[str, Any]],
+        finalize: Callable[[List[str]], Dict[str, Any]],
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Upsert rows and record the batch in one transaction.
+
+        `finalize` receives each row's outcome ('inserted', 'updated' or
+        'unchanged') and builds the result stored with the batch. Returns
+        (result, replayed); replayed is True when the batch had already been
+        applied concurrently.
+        """
+
+    @abstractmethod
+    def list_mg(self, application_id: str) -> List[Dict[str, Any]]:
+        """Return the application's MG assessments ordered by measure and subpart."""
+
+    @abstractmethod
+    def set_application_org(self, application_id: str, org_id: Optional[str]):
+        """Assign an application to an organization (None removes it)."""
+
+    @abstractmethod
+    def org_applications(self, org_id: str) -> List[str]:
+        """Ids of the applications assigned to an organization."""
+
+    @abstractmethod
+    def org_mg_rows(self, org_id: str) -> List[Tuple]:
+        """MG assessments of every application of an organization, as ORG_MG_COLUMNS tuples."""
+
+    @abstractmethod
+    def org_mg_history(self, org_id: str) -> List[Tuple]:
+        """
+        Every recorded MG change of an organization's applications, as
+        ORG_HISTORY_COLUMNS tuples in recording order.
+        """
+
+    @abstractmethod
+    def put_ma(self, application_id: str, measure: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Create or replace an additional measure (id, title, description,
+        attachment_url, requirement_codes) and its requirement links.
+        """
+
+    @abstractmethod
+    def delete_ma(self, application_id: str, ma_id: str) -> bool:
+        """Remove an additional measure; False if it did not exist."""
+
+    @abstractmethod
+    def list_ma(self, application_id: str) -> List[Dict[str, Any]]:
+        """Return the application's additional measures ordered by id."""
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS assessments_mg (
+    application_id TEXT NOT NULL,
+    measure_id TEXT NOT NULL,
+    subpart_id TEXT NOT NULL,
+    requirement_code TEXT,
+    difficulty TEXT CHECK (difficulty IN ('00', '01', '02')),
+    maturity TEXT CHECK (maturity IN ('L1', 'L2', 'L3', 'L4', 'L5', 'L6', 'L7', 'L8')),
+    diagnosis_status TEXT NOT NULL DEFAULT '00' CHECK (diagnosis_status IN ('00', '01')),
+    adaptation_plan TEXT CHECK (adaptation_plan IN ('01', '02', '03', '04', '05')),
+    notes TEXT,
+    updated_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+    PRIMARY KEY (application_id, measure_id, subpart_id)
+);
+CREATE TABLE IF NOT EXISTS assessment_batches (
+    application_id TEXT NOT NULL,
+    batch_id TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+    PRIMARY KEY (application_id, batch_id)
+);
+CREATE TABLE IF NOT EXISTS assessments_mg_history (
+    application_id TEXT NOT NULL,
+    measure_id TEXT NOT NULL,
+    subpart_id TEXT NOT NULL,
+    maturity TEXT,
+    diagnosis_status TEXT NOT NULL,
+    recorded_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_assessments_mg_history_application ON assessments_mg_history (application_id);
+CREATE TABLE IF NOT EXISTS applications (
+    id TEXT PRIMARY KEY,
+    org_id TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_applications_org ON applications (org_id);
+CREATE TABLE IF NOT EXISTS measures_additional (
+    application_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    title TEXT NOT NULL,
+    description TEXT,
+    attachment_url TEXT,
+    created_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ', 'now')),
+    PRIMARY KEY (application_id, id)
+);
+CREATE TABLE IF NOT EXISTS rel_ma_requirements (
+    application_id TEXT NOT NULL,
+    measure_additional_id TEXT NOT NULL,
+    requirement_id TEXT NOT NULL,
+    PRIMARY KEY (application_id, measure_additional_id, requirement_id)
+);
+"""
+
+_COLUMNS = (
+    'application_id', 'measure_id', 'subpart_id', 'requirement_code',
+    'difficulty', 'maturity', 'diagnosis_status', 'adaptation_plan', 'notes',
+)
+
+_UPSERT = f"""
+INSERT INTO assessments_mg ({', '.join(_COLUMNS)})
+VALUES ({', '.join('?' for _ in _COLUMNS)})
+ON CONFLICT (application_id, measure_id, subpart_id) DO UPDATE SET
+    requirement_code = excluded.requirement_code,
+    difficulty = excluded.difficulty,
+    maturity = excluded.maturity,
+    diagnosis_status = excluded.diagnosis_status,
+    adaptation_plan = excluded.adaptation_plan,
+    notes = excluded.notes,
+    updated_at = strftime('%Y-%m-%dT%H:%M:%fZ', 'now')
+"""
+
+
+class SQLiteAssessmentRepository(AssessmentRepository):
+    """Assessment tables in a SQLite database (':memory:' for tests)."""
+
+    def __init__(self, path: Union[str, Path] = ':memory:'):
+        super().__init__()
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._conn.executescript(_SCHEMA)
+
+    def get_batch(self, application_id: str, batch_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        with self._lock:
+            return self._get_batch(application_id, batch_id)
+
+    def _get_batch(self, application_id: str, batch_id: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+        row = self._conn.execute(
+            'SELECT digest, result FROM assessment_batches WHERE application_id = ? AND batch_id = ?',
+            (application_id, batch_id),
+        ).fetchone()
+        return (row['digest'], json.loads(row['result'])) if row else None
+
+    def apply_batch(self, application_id, batch_id, digest, rows, finalize):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                stored = self._get_batch(application_id, batch_id)
+                if stored is not None:
+                    self._conn.execute('ROLLBACK')
+                    if stored[0] != digest:
+                        raise BatchConflict(batch_id)
+                    return stored[1], True
+
+                existing = {
+                    (row['measure_id'], row['subpart_id']): tuple(row[field] for field in ASSESSMENT_FIELDS)
+                    for row in self._conn.execute(
+                        f"SELECT measure_id, subpart_id, {', '.join(ASSESSMENT_FIELDS)} "
+                        'FROM assessments_mg WHERE application_id = ?',
+                        (application_id,),
+                    )
+                }
+                outcomes, changed, written = [], [], []
+                for row in rows:
+                    current = existing.get((row['measure_id'], row['subpart_id']))
+                    if current is None:
+                        outcomes.append('inserted')
+                    elif current != tuple(row[field] for field in ASSESSMENT_FIELDS):
+                        outcomes.append('updated')
+                    else:
+                        outcomes.append('unchanged')
+                        continue
+                    changed.append(tuple(row[column] for column in _COLUMNS))
+                    written.append(row)
+                self._conn.executemany(_UPSERT, changed)
+                self._conn.executemany(
+                    'INSERT INTO assessments_mg_history (application_id, measure_id, subpart_id, maturity, diagnosis_status) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    [(application_id, row['measure_id'], row['subpart_id'], row['maturity'], row['diagnosis_status'])
+                     for row in written],
+                )
+
+                result = finalize(outcomes)
+                self._conn.execute(
+                    'INSERT INTO assessment_batches (application_id, batch_id, digest, result) VALUES (?, ?, ?, ?)',
+                    (application_id, batch_id, digest, json.dumps(result, ensure_ascii=False)),
+                )
+                self._conn.execute('COMMIT')
+            except BaseException:
+                if self._conn.in_transaction:
+                    self._conn.execute('ROLLBACK')
+                raise
+            if written:
+                self._notify('mg_written', application_id, [{column: row[column] for column in _COLUMNS} for row in written])
+            return result, False
+
+    def list_mg(self, application_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                dict(row)
+                for row in self._conn.execute(
+                    'SELECT * FROM assessments_mg WHERE application_id = ? ORDER BY measure_id, subpart_id',
+                    (application_id,),
+                )
+            ]
+
+    def set_application_org(self, application_id: str, org_id: Optional[str]):
+        with self._lock:
+            with self._conn:
+                self._conn.execute('BEGIN IMMEDIATE')
+                self._conn.execute(
+                    'INSERT INTO applications (id, org_id) VALUES (?, ?) '
+                    'ON CONFLICT (id) DO UPDATE SET org_id = excluded.org_id',
+                    (application_id, org_id),
+                )
+            self._notify('application_assigned', application_id, org_id)
+
+    def _tuples(self) -> sqlite3.Cursor:
+        cursor = self._conn.cursor()
+        cursor.row_factory = None
+        return cursor
+
+    def org_applications(self, org_id: str) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._tuples().execute(
+                'SELECT id FROM applications WHERE org_id = ? ORDER BY id', (org_id,),
+            )]
+
+    def org_mg_rows(self, org_id: str) -> List[Tuple]:
+        with self._lock:
+            return self._tuples().execute(
+                f"SELECT {', '.join('m.' + column for column in ORG_MG_COLUMNS)} FROM assessments_mg m "
+                'JOIN applications a ON a.id = m.application_id WHERE a.org_id = ?',
+                (org_id,),
+            ).fetchall()
+
+    def org_mg_history(self, org_id: str) -> List[Tuple]:
+        with self._lock:
+            return self._tuples().execute(
+                f"SELECT {', '.join('h.' + column for column in ORG_HISTORY_COLUMNS)} FROM assessments_mg_history h "
+                'JOIN applications a ON a.id = h.application_id WHERE a.org_id = ? ORDER BY h.rowid',
+                (org_id,),
+            ).fetchall()
+
+    def put_ma(self, application_id: str, measure: Dict[str, Any]) -> Dict[str, Any]:
+        stored = {
+            'id': measure['id'],
+            'title': measure['title'],
+            'description': measure.get('description'),
+            'attachment_url': measure.get('attachment_url'),
+            'requirement_codes': sorted(set(measure.get('requirement_codes') or ())),
+        }
+        with self._lock:
+            with self._conn:
+                self._conn.execute('BEGIN IMMEDIATE')
+                self._conn.execute(
+                    'INSERT INTO measures_additional (application_id, id, title, description, attachment_url) '
+                    'VALUES (?, ?, ?, ?, ?) ON CONFLICT (application_id, id) DO UPDATE SET '
+                    'title = excluded.title, description = excluded.description, attachment_url = excluded.attachment_url',
+                    (application_id, stored['id'], stored['title'], stored['description'], stored['attachment_url']),
+                )
+                self._conn.execute(
+                    'DELETE FROM rel_ma_requirements WHERE application_id = ? AND measure_additional_id = ?',
+                    (application_id, stored['id']),
+                )
+                self._conn.executemany(
+                    'INSERT INTO rel_ma_requirements (application_id, measure_additional_id, requirement_id) VALUES (?, ?, ?)',
+                    [(application_id, stored['id'], code) for code in stored['requirement_codes']],
+                )
+            self._notify('ma_written', application_id, stored)
+        return stored
+
+    def delete_ma(self, application_id: str, ma_id: str) -> bool:
+        with self._lock:
+            with self._conn:
+                self._conn.execute('BEGIN IMMEDIATE')
+                deleted = self._conn.execute(
+                    'DELETE FROM measures_additional WHERE application_id = ? AND id = ?', (application_id, ma_id),
+                ).rowcount
+                self._conn.execute(
+                    'DELETE FROM rel_ma_requirements WHERE application_id = ? AND measure_additional_id = ?',
+                    (application_id, ma_id),
+                )
+            if deleted:
+                self._notify('ma_deleted', application_id, ma_id)
+        return bool(deleted)
+
+    def list_ma(self, application_id: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            measures = {
+                row['id']: {**dict(row), 'requirement_codes': []}
+                for row in self._conn.execute(
+                    'SELECT id, title, description, attachment_url FROM measures_additional '
+                    'WHERE application_id = ? ORDER BY id',
+                    (application_id,),
+                )
+            }
+            for row in self._conn.execute(
+                'SELECT measure_additional_id, requirement_id FROM rel_ma_requirements '
+                'WHERE application_id = ? ORDER BY requirement_id',
+                (application_id,),
+            ):
+                if row['measure_additional_id'] in measures:
+                    measures[row['measure_additional_id']]['requirement_codes'].append(row['requirement_id'])
+            return list(measures.values())
+
+
+class ApplicationStateCache(AssessmentListener):
+    """
+    Per-application state derived from a repository and kept current by its
+    change events.
+
+    An application's state is built from the repository the first time it is
+    read (_load) and then updated by _mg_changed / _ma_changed / _ma_removed
+    as writes commit. Changes committed while a state is being loaded are
+    replayed once it is installed, so appliers must be idempotent (set
+    semantics). With max_applications, least recently read states are
+    dropped and rebuilt on their next read.
+    """
+
+    def __init__(self, repository: AssessmentRepository, max_applications: Optional[int] = None):
+        self.repository = repository
+        self.max_applications = max_applications
+        self._states: 'OrderedDict[str, Any]' = OrderedDict()
+        # Applications being loaded -> changes committed meanwhile
+        self._loading: Dict[str, List[Callable[[Any], None]]] = {}
+        self._lock = threading.Lock()
+        repository.add_listener(self)
+
+    def close(self):
+        self.repository.remove_listener(self)
+
+    # ---- subclass hooks ----
+
+    def _new_state(self) -> Any:
+        raise NotImplementedError
+
+    def _load(self, state: Any, application_id: str):
+        self._mg_changed(state, self.repository.list_mg(application_id))
+
+    def _mg_changed(self, state: Any, rows: List[Dict[str, Any]]):
+        pass
+
+    def _ma_changed(self, state: Any, measure: Dict[str, Any]):
+        pass
+
+    def _ma_removed(self, state: Any, ma_id: str):
+        pass
+
+    # ---- repository events ----
+
+    def _apply(self, application_id: str, change: Callable[[Any], None]):
+        with self._lock:
+            state = self._states.get(application_id)
+            if state is not None:
+                change(state)
+            elif application_id in self._loading:
+                self._loading[application_id].append(change)
+            # Otherwise the application is not cached and will be loaded with the change
+
+    def mg_written(self, application_id: str, rows: List[Dict[str, Any]]):
+        self._apply(application_id, lambda state: self._mg_changed(state, rows))
+
+    def ma_written(self, application_id: str, measure: Dict[str, Any]):
+        self._apply(application_id, lambda state: self._ma_changed(state, measure))
+
+    def ma_deleted(self, application_id: str, ma_id: str):
+        self._apply(application_id, lambda state: self._ma_removed(state, ma_id))
+
+    # ---- reads ----
+
+    def _state(self, application_id: str) -> Any:
+        with self._lock:
+            state = self._states.get(application_id)
+            if state is not None:
+                self._states.move_to_end(application_id)
+                return state
+            self._loading.setdefault(application_id, [])
+
+        # Read outside the lock: listeners run under the repository's lock
+        state = self._new_state()
+        self._load(state, application_id)
+
+        with self._lock:
+            if application_id in self._states:
+                return self._states[application_id]
+            # Changes are idempotent, so replaying ones the load already saw is harmless
+            for change in self._loading.pop(application_id, ()):
+                change(state)
+            self._states[application_id] = state
+            if self.max_applications is not None:
+                while len(self._states) > self.max_applications:
+                    self._states.popitem(last=False)
+            return state
+
+    def read(self, application_id: str, reader: Callable[[Any], Any]) -> Any:
+        """Run reader on the application's state under the cache lock."""
+        state = self._state(application_id)
+        with self._lock:
+            return reader(state)
+
+    def cached(self) -> int:
+        with self._lock:
+            return len(self._states)
+
+
+def _validate(row: Dict[str, Any], catalog: Catalog) -> Tuple[List[str], List[str], Optional[str]]:
+    """Return (errors, subpart ids, requirement code) for one bulk row."""
+    errors = []
+    mg_id = row.get('mg_id')
+    requirement_code = catalog.requirement_of(mg_id)
+    subparts = []
+    if requirement_code is None:
+        errors.append(f"Unknown measure: {mg_id}")
+    else:
+        subpart_id = row.get('subpart_id')
+        if subpart_id is None:
+            # MG-level row: applies to every subpart the measure covers
+            subparts = catalog.mg_subparts(mg_id)
+            if not subparts:
+                errors.append(f"Measure {mg_id} is not linked to any subpart")
+        elif catalog.is_linked(mg_id, subpart_id):
+            subparts = [subpart_id]
+        else:
+            errors.append(f"Subpart {subpart_id} is not linked to measure {mg_id}")
+    if row.get('maturity') not in (None, '', *MATURITY_LEVELS):
+        errors.append(f"Unknown maturity level: {row['maturity']}")
+    if row.get('difficulty') not in (None, '', *DIFFICULTY_LEVELS):
+        errors.append(f"Unknown difficulty: {row['difficulty']}")
+    return errors, subparts, requirement_code
+
+
+def upsert_assessments(
+    application_id: str,
+    batch_id: str,
+    rows: List[Dict[str, Any]],
+    repository: Optional[AssessmentRepository] = None,
+    catalog: Optional[Catalog] = None,
+) -> Dict[str, Any]:
+    """
+    Apply a batch of MG assessment rows (mg_id, optional subpart_id, maturity,
+    difficulty, notes) to an application.
+
+    Each row replaces the stored values for its (mg_id, subpart_id) keys; a
+    row without subpart_id covers every subpart of the measure. Rows that fail
+    validation or repeat a key already claimed by an earlier row are rejected
+    and the rest are applied. Raises BatchConflict if batch_id was already
+    used for a different payload.
+    """
+    repository = repository or get_assessment_repository()
+    digest = canonical_digest(application_id, rows)
+
+    stored = repository.get_batch(application_id, batch_id)
+    if stored is not None:
+        if stored[0] != digest:
+            raise BatchConflict(batch_id)
+        return {**stored[1], 'replayed': True}
+
+    catalog = catalog or get_catalog()
+    outcomes: List[Dict[str, Any]] = []
+    writes: List[Dict[str, Any]] = []
+    owners: List[int] = []
+    claimed: Dict[AssessmentKey, int] = {}
+    for index, row in enumerate(rows):
+        errors, subparts, requirement_code = _validate(row, catalog)
+        for subpart_id in subparts:
+            if (row['mg_id'], subpart_id) in claimed:
+                errors.append(f"Duplicate of row {claimed[row['mg_id'], subpart_id]} for subpart {subpart_id}")
+        outcome = {'index': index, 'mg_id': row.get('mg_id')}
+        outcomes.append(outcome)
+        if errors:
+            outcome.update(status='rejected', errors=errors)
+            continue
+        outcome['subpart_ids'] = subparts
+        for subpart_id in subparts:
+            claimed[row['mg_id'], subpart_id] = index
+            owners.append(index)
+            writes.append({
+                'application_id': application_id,
+                'measure_id': row['mg_id'],
+                'subpart_id': subpart_id,
+                'requirement_code': requirement_code,
+                'difficulty': row.get('difficulty') or None,
+                'maturity': row.get('maturity') or None,
+                'notes': row.get('notes'),
+            })
+
+    if writes:
+        plans = calculate_plans([write['maturity'] for write in writes])
+        statuses = plans['diagnosis_status'].to_numpy()
+        codes = plans['adaptation_plan'].to_numpy()
+        for write, status, code in zip(writes, statuses, codes):
+            # Same derivation as the derive_diagnosis_and_plan trigger: no plan while pending
+            write['diagnosis_status'] = status
+            write['adaptation_plan'] = code if status == '01' else None
+
+    def finalize(write_outcomes: List[str]) -> Dict[str, Any]:
+        per_row: Dict[int, List[str]] = {}
+        for owner, write, status in zip(owners, writes, write_outcomes):
+            per_row.setdefault(owner, []).append(status)
+            outcome = outcomes[owner]
+            outcome['diagnosis_status'] = write['diagnosis_status']
+            outcome['adaptation_plan'] = write['adaptation_plan']
+        for index, statuses in per_row.items():
+            # A multi-subpart row reports its strongest change
+            outcomes[index]['status'] = next(s for s in ('inserted', 'updated', 'unchanged') if s in statuses)
+        summary = dict.fromkeys(('inserted', 'updated', 'unchanged', 'rejected'), 0)
+        for outcome in outcomes:
+            summary[outcome['status']] += 1
+        return {
+            'application_id': application_id,
+            'batch_id': batch_id,
+            'summary': summary,
+            'rows': outcomes,
+        }
+
+    result, replayed = repository.apply_batch(application_id, batch_id, digest, writes, finalize)
+    return {**result, 'replayed': replayed}
+
+
+_repository: Optional[AssessmentRepository] = None
+_repository_lock = threading.Lock()
+
+
+def get_assessment_repository() -> AssessmentRepository:
+    """
+    Return the configured assessment repository.
+
+    Uses a SQLiteAssessmentRepository at ASSESSMENTS_DB_PATH
+    (default: src/backend/storage/assessments.sqlite3).
+    """
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            default_path = os.path.join(os.path.dirname(__file__), '..', 'storage', 'assessments.sqlite3')
+            _repository = SQLiteAssessmentRepository(os.environ.get('ASSESSMENTS_DB_PATH') or default_path)
+        return _repository
+
+
+def set_assessment_repository(repository: AssessmentRepository):
+    """Install a different repository (e.g. one backed by Supabase)."""
+    global _repository
+    with _repository_lock:
+        _repository = repository
@@ -0,0 +1,528 @@
+"""
+Audit - Buffered audit log writer
+Sistema de Preevaluación Sandbox IA España
+
+Rows follow the `audit_logs` table (migration 006) with the event_type and
+event_category columns of migration 014. Request handlers only enqueue
+events; a background thread writes them to a pluggable AuditSink in batches,
+when batch_size events are waiting or flush_interval seconds after the
+first one arrived.
+
+The queue is bounded. When it is full, log() waits up to put_timeout
+seconds (backpressure) and then appends the event to a local JSON-lines
+spool file instead of dropping it. Batches the sink rejects go to the same
+spool, which is replayed into the sink once it accepts writes again; lines
+that cannot be decoded are set aside in a .bad file next to it. close()
+drains the queue before returning. SQLiteAuditSink stands in for the
+Supabase table.
+
+Each process spools to its own file (AUDIT_SPOOL_PATH with the pid before
+the extension); spools left by processes that are no longer running are
+folded into the new process's spool when its writer starts.
+"""
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Union
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# event_type -> (action, entity_type, event_category); event types from migration 014
+EVENT_TYPES = {
+    'ASSESSMENT_CREATE': ('CREATE', 'assessment_mg', 'ASSESSMENT'),
+    'ASSESSMENT_UPDATE': ('UPDATE', 'assessment_mg', 'ASSESSMENT'),
+    'EXPORT_SINGLE': ('EXPORT', 'export', 'EXPORT'),
+    'EXPORT_FULL': ('EXPORT', 'export', 'EXPORT'),
+    'FILE_UPLOAD': ('CREATE', 'file', 'FILE'),
+    'FILE_DOWNLOAD': ('DOWNLOAD', 'file', 'FILE'),
+    'MA_CREATE': ('CREATE', 'measure_additional', 'ASSESSMENT'),
+    'MA_UPDATE': ('UPDATE', 'measure_additional', 'ASSESSMENT'),
+    'SEDIA_REVIEW': ('REVIEW', 'application', 'REVIEW'),
+}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class AuditEvent:
+    """One row of the `audit_logs` table."""
+    event_type: str
+    action: str
+    entity_type: str
+    event_category: str
+    entity_id: Optional[str] = None
+    org_id: Optional[str] = None
+    user_id: Optional[str] = None
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    ip_address: Optional[str] = None
+    user_agent: Optional[str] = None
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    created_at: datetime = field(default_factory=_now)
+
+    @classmethod
+    def create(cls, event_type: str, action: Optional[str] = None, **fields) -> 'AuditEvent':
+        """Build an event, taking action, entity_type and category from EVENT_TYPES."""
+        if event_type not in EVENT_TYPES:
+            raise ValueError(f"Unknown audit event type: {event_type}")
+        default_action, entity_type, category = EVENT_TYPES[event_type]
+        fields.setdefault('entity_type', entity_type)
+        return cls(event_type=event_type, action=action or default_action, event_category=category, **fields)
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['created_at'] = self.created_at.isoformat()
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AuditEvent':
+        return cls(**{**data, 'created_at': datetime.fromisoformat(data['created_at'])})
+
+
+class AuditSink(ABC):
+    """Destination of audit batches (the Supabase `audit_logs` table in production)."""
+
+    @abstractmethod
+    def write(self, events: List[AuditEvent]):
+        """Persist a batch atomically; raise to have the writer spool it."""
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS audit_logs (
+    id TEXT PRIMARY KEY,
+    org_id TEXT,
+    user_id TEXT,
+    action TEXT NOT NULL,
+    entity_type TEXT NOT NULL,
+    entity_id TEXT,
+    metadata TEXT NOT NULL DEFAULT '{}',
+    ip_address TEXT,
+    user_agent TEXT,
+    event_type TEXT,
+    event_category TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_audit_entity ON audit_logs(entity_type, entity_id);
+CREATE INDEX IF NOT EXISTS idx_audit_created ON audit_logs(created_at DESC);
+"""
+
+_COLUMNS = ('id', 'org_id', 'user_id', 'action', 'entity_type', 'entity_id', 'metadata',
+            'ip_address', 'user_agent', 'event_type', 'event_category', 'created_at')
+
+
+class SQLiteAuditSink(AuditSink):
+    """audit_logs in a SQLite database (':memory:' for tests); one transaction per batch."""
+
+    def __init__(self, path: Union[str, Path] = ':memory:'):
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._conn.executescript(_SCHEMA)
+
+    def write(self, events: List[AuditEvent]):
+        rows = [
+            (e.id, e.org_id, e.user_id, e.action, e.entity_type, e.entity_id, json.dumps(e.metadata),
+             e.ip_address, e.user_agent, e.event_type, e.event_category, e.created_at.isoformat())
+            for e in events
+        ]
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                # A replayed spool may repeat events already written before a failure
+                self._conn.executemany(
+                    f"INSERT OR IGNORE INTO audit_logs ({', '.join(_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(_COLUMNS))})",
+                    rows,
+                )
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def query(self, entity_id: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """Most recent events first, optionally for one entity."""
+        sql = 'SELECT * FROM audit_logs'
+        params: List[Any] = []
+        if entity_id is not None:
+            sql += ' WHERE entity_id = ?'
+            params.append(entity_id)
+        sql += ' ORDER BY created_at DESC, rowid DESC LIMIT ?'
+        with self._lock:
+            rows = self._conn.execute(sql, (*params, limit)).fetchall()
+        return [{**dict(row), 'metadata': json.loads(row['metadata'])} for row in rows]
+
+
+_WAKE = object()
+
+
+class AuditLogWriter:
+    """Bounded queue plus a flush thread that writes batches to a sink (see module docstring)."""
+
+    def __init__(
+        self,
+        sink: AuditSink,
+        spool_path: Union[str, Path],
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        put_timeout: float = 0.05,
+        retry_interval: float = 30.0,
+    ):
+        self.sink = sink
+        self.spool_path = Path(spool_path)
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.retry_interval = retry_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._stopping = threading.Event()
+        self._spool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        # Events accepted by the queue and not yet written or spooled
+        self._pending = 0
+        self._drained = threading.Condition(self._stats_lock)
+        self._counters = dict.fromkeys((
+            'enqueued', 'written', 'batches', 'failed_batches', 'spooled', 'replayed',
+            'backpressure_waits', 'overflowed', 'corrupt', 'dropped',
+        ), 0)
+        self._peak_depth = 0
+        self._latencies: Deque[float] = deque(maxlen=256)
+        self._last_failure: Optional[float] = None
+        self._replay_path = self.spool_path.with_name(self.spool_path.name + '.replay')
+        self._bad_path = self.spool_path.with_name(self.spool_path.name + '.bad')
+        self._recover_spool()
+        self._spool_pending = self.spool_path.exists()
+        self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+        self._thread.start()
+
+    def log(self, event_type: str, action: Optional[str] = None, **fields) -> AuditEvent:
+        """Record an event (see AuditEvent.create) without waiting for the sink."""
+        event = AuditEvent.create(event_type, action, **fields)
+        self.submit(event)
+        return event
+
+    def submit(self, event: AuditEvent):
+        if self._closed:
+            self._spool_or_drop([event])
+            return
+        # Counted before the put: the flush thread may write the event before put returns
+        with self._stats_lock:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self._count('backpressure_waits')
+            try:
+                self._queue.put(event, timeout=self.put_timeout)
+            except queue.Full:
+                self._release(1)
+                self._count('overflowed')
+                self._spool_or_drop([event])
+                return
+        depth = self._queue.qsize()
+        with self._stats_lock:
+            self._counters['enqueued'] += 1
+            self._peak_depth = max(self._peak_depth, depth)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self._counters[name] += amount
+
+    def _release(self, events: int):
+        with self._stats_lock:
+            self._pending -= events
+            if self._pending <= 0:
+                self._drained.notify_all()
+
+    # ---- flush thread ----
+
+    def _collect(self) -> List[AuditEvent]:
+        """Wait for a first event, then gather until batch_size or flush_interval after it."""
+        batch: List[AuditEvent] = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            if self._stopping.is_set():
+                timeout = 0
+            elif deadline is None:
+                timeout = self.flush_interval
+            else:
+                timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _WAKE:
+                continue
+            batch.append(item)
+            if deadline is None:
+                deadline = time.monotonic() + self.flush_interval
+        return batch
+
+    def _run(self):
+        while True:
+            try:
+                batch = self._collect()
+                if batch:
+                    self._flush(batch)
+                elif self._stopping.is_set():
+                    break
+                elif self._spool_pending and time.monotonic() - (self._last_failure or 0) >= self.retry_interval:
+                    self._replay_spool()
+            except Exception:
+                # Keep the writer alive; a failed spool replay is retried after retry_interval
+                logger.exception("Audit writer iteration failed")
+                self._last_failure = time.monotonic()
+
+    def _flush(self, batch: List[AuditEvent]):
+        start = time.perf_counter()
+        try:
+            try:
+                self.sink.write(batch)
+            except Exception:
+                logger.exception("Audit sink failed; spooling %d events to %s", len(batch), self.spool_path)
+                self._last_failure = time.monotonic()
+                self._count('failed_batches')
+                self._spool_or_drop(batch)
+            else:
+                with self._stats_lock:
+                    self._counters['written'] += len(batch)
+                    self._counters['batches'] += 1
+                if self._spool_pending:
+                    self._replay_spool()
+        finally:
+            with self._stats_lock:
+                self._latencies.append(time.perf_counter() - start)
+            self._release(len(batch))
+
+    # ---- spool ----
+
+    def _spool_or_drop(self, events: List[AuditEvent]):
+        """Spool events; if even that fails (e.g. disk full) they are counted as dropped."""
+        try:
+            self._spool(events)
+        except OSError:
+            logger.exception("Could not spool %d audit events to %s; dropping them", len(events), self.spool_path)
+            self._count('dropped', len(events))
+
+    def _spool(self, events: List[AuditEvent]):
+        lines = ''.join(json.dumps(event.to_dict()) + '\n' for event in events)
+        with self._spool_lock:
+            self.spool_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.spool_path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+            self._spool_pending = True
+        self._count('spooled', len(events))
+
+    def _recover_spool(self):
+        """
+        Fold a replay interrupted by a crash back into the spool (ahead of newer
+        events) and terminate a line cut short by a crash mid-append, so the next
+        append does not run into it. Replayed events that were already written
+        are ignored by the sink (same id).
+        """
+        text = ''
+        for path in (self._replay_path, self.spool_path):
+            if path.exists():
+                chunk = path.read_text(encoding='utf-8')
+                text += chunk if not chunk or chunk.endswith('\n') else chunk + '\n'
+        if not text:
+            return
+        partial = self.spool_path.with_name(self.spool_path.name + '.part')
+        partial.write_text(text, encoding='utf-8')
+        os.replace(partial, self.spool_path)
+        self._replay_path.unlink(missing_ok=True)
+
+    def _replay_spool(self):
+        """Move spooled events into the sink; whatever fails stays spooled."""
+        with self._spool_lock:
+            if not self.spool_path.exists():
+                self._spool_pending = False
+                return
+            os.replace(self.spool_path, self._replay_path)
+            self._spool_pending = False
+        lines, events, corrupt = [], [], []
+        with open(self._replay_path, encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    events.append(AuditEvent.from_dict(json.loads(line)))
+                except (ValueError, TypeError, KeyError):
+                    corrupt.append(line if line.endswith('\n') else line + '\n')
+                    continue
+                lines.append(line if line.endswith('\n') else line + '\n')
+        if corrupt:
+            # Kept for inspection instead of blocking the events around them
+            logger.warning("Moving %d undecodable audit spool lines to %s", len(corrupt), self._bad_path)
+            with open(self._bad_path, 'a', encoding='utf-8') as f:
+                f.writelines(corrupt)
+            self._count('corrupt', len(corrupt))
+        done = 0
+        try:
+            while done < len(events):
+                chunk = events[done:done + self.batch_size]
+                self.sink.write(chunk)
+                done += len(chunk)
+                self._count('replayed', len(chunk))
+        except Exception:
+            logger.exception("Audit sink still failing; %d events remain spooled", len(events) - done)
+            self._last_failure = time.monotonic()
+            with self._spool_lock:
+                with open(self.spool_path, 'a', encoding='utf-8') as f:
+                    f.writelines(lines[done:])
+                self._spool_pending = True
+        os.unlink(self._replay_path)
+
+    # ---- lifecycle ----
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued event has been handed to the sink or spooled."""
+        with self._drained:
+            return self._drained.wait_for(lambda: self._pending <= 0, timeout)
+
+    def close(self, timeout: float = 10.0):
+        """Stop accepting events (later ones are spooled), drain the queue and replay the spool."""
+        self._closed = True
+        self._stopping.set()
+        try:
+            self._queue.put_nowait(_WAKE)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning("Audit writer did not drain within %.1fs", timeout)
+            return
+        # Events enqueued concurrently with the last collect
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _WAKE:
+                leftover.append(item)
+        if leftover:
+            self._flush(leftover)
+        if self._spool_pending:
+            self._replay_spool()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            latencies = sorted(self._latencies)
+            stats: Dict[str, Any] = {
+                'queue_depth': self._queue.qsize(),
+                'max_queue': self.max_queue,
+                'peak_queue_depth': self._peak_depth,
+                **self._counters,
+                'spool_pending': self._spool_pending,
+            }
+            last = self._latencies[-1] if latencies else None
+        # Flush latency over the last 256 batches
+        stats['flush_ms'] = {
+            'last': round(last * 1000, 3),
+            'p50': round(latencies[len(latencies) // 2] * 1000, 3),
+            'p95': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 3),
+            'max': round(latencies[-1] * 1000, 3),
+        } if latencies else None
+        return stats
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def process_spool_path(base: Union[str, Path]) -> Path:
+    """
+    This process's spool next to base (audit_spool.jsonl -> audit_spool.<pid>.jsonl),
+    after folding into it the spools of processes that are no longer running
+    (and a spool at base itself, from before spools were per process).
+
+    Several workers may start at once: each orphan is claimed with an atomic
+    rename, so only one of them takes it.
+    """
+    base = Path(base)
+    spool = base.with_name(f'{base.stem}.{os.getpid()}{base.suffix}')
+    owned = re.compile(rf'{re.escape(base.stem)}(?:\.(\d+))?{re.escape(base.suffix)}(?:\.replay|\.claim-\w+)?')
+    if not base.parent.is_dir():
+        return spool
+    for path in sorted(base.parent.iterdir()):
+        match = owned.fullmatch(path.name)
+        if match is None or path.name.startswith(spool.name):
+            continue
+        if match.group(1) is not None and _process_alive(int(match.group(1))):
+            continue
+        claimed = spool.with_name(f'{spool.name}.claim-{uuid.uuid4().hex}')
+        try:
+            os.replace(path, claimed)
+        except FileNotFoundError:
+            continue  # claimed by another process
+        text = claimed.read_text(encoding='utf-8')
+        if text:
+            with open(spool, 'a', encoding='utf-8') as f:
+                f.write(text if text.endswith('\n') else text + '\n')
+        claimed.unlink()
+        logger.info("Adopted audit spool %s into %s", path.name, spool.name)
+    return spool
+
+
+_audit_log: Optional[AuditLogWriter] = None
+_audit_log_lock = threading.Lock()
+
+
+def get_audit_log() -> AuditLogWriter:
+    """
+    Return the process-wide audit writer.
+
+    Writes to a SQLiteAuditSink at AUDIT_DB_PATH (default:
+    src/backend/storage/audit.sqlite3) and spools to AUDIT_SPOOL_PATH
+    (default: src/backend/storage/audit_spool.jsonl; the file used is
+    audit_spool.<pid>.jsonl, see process_spool_path). Sized from
+    AUDIT_MAX_QUEUE (default 10000), AUDIT_BATCH_SIZE (default 500),
+    AUDIT_FLUSH_SECONDS (default 1) and AUDIT_PUT_TIMEOUT_MS (backpressure
+    wait before spooling, default 50).
+    """
+    global _audit_log
+    with _audit_log_lock:
+        if _audit_log is None:
+            storage = os.path.join(os.path.dirname(__file__), '..', 'storage')
+            spool = Path(os.environ.get('AUDIT_SPOOL_PATH') or os.path.join(storage, 'audit_spool.jsonl'))
+            _audit_log = AuditLogWriter(
+                SQLiteAuditSink(os.environ.get('AUDIT_DB_PATH') or os.path.join(storage, 'audit.sqlite3')),
+                process_spool_path(spool),
+                max_queue=max(1, int(os.environ.get('AUDIT_MAX_QUEUE') or 10000)),
+                batch_size=max(1, int(os.environ.get('AUDIT_BATCH_SIZE') or 500)),
+                flush_interval=float(os.environ.get('AUDIT_FLUSH_SECONDS') or 1.0),
+                put_timeout=int(os.environ.get('AUDIT_PUT_TIMEOUT_MS') or 50) / 1000,
+            )
+        return _audit_log
+
+
+def shutdown_audit_log():
+    """Drain and stop the process-wide audit writer (called on application shutdown)."""
+    global _audit_log
+    with _audit_log_lock:
+        if _audit_log is not None:
+            _audit_log.close()
+            _audit_log = None
@@ -0,0 +1,459 @@
+"""
+Catalog - Compiled Guía 16 catalog snapshot
+Sistema de Preevaluación Sandbox IA España
+
+Requirements, article subparts, guide measures (MG) and MG → subpart relations
+compiled once into a compact in-memory structure: every identifier is interned
+to an integer, per-requirement lookup tables are precomputed and relations are
+held as a sparse Relation (per-row and per-column bitsets), so endpoints
+and both Excel engines read the catalog without touching the database or
+re-parsing sources.
+
+Sources, in order of preference:
+- the extractor's consolidated artifact (`extract_aesia_checklist.py --manifest`)
+- the seed migrations (008 requirements/subparts, 011/012 measures/relations)
+
+The snapshot is reloaded in place when its source files change.
+"""
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from services.conversion_logic import MATURITY_TO_PLAN
+from services.relations import Interner, Relation
+
+logger = logging.getLogger(__name__)
+
+_ROOT = Path(__file__).resolve().parents[3]
+DEFAULT_CATALOG_PATH = _ROOT / 'catalog' / 'aesia_g16' / 'catalog.json'
+DEFAULT_MIGRATIONS_DIR = _ROOT / 'src' / 'migrations'
+
+# Seed migrations holding the Guía 16 catalog, applied in order
+CATALOG_MIGRATIONS = (
+    '008_seed_requirements.sql',
+    '011_guia16_p0_backbone.sql',
+    '012_seed_all_mg_mappings.sql',
+)
+
+MATURITY_LABELS = {
+    'L1': 'No identificada',
+    'L2': 'Identificada, no documentada',
+    'L3': 'Documentada, no implementada',
+    'L4': 'Parcialmente implementada',
+    'L5': 'Implementada sin evidencia',
+    'L6': 'Implementada, evidencia parcial',
+    'L7': 'Implementada, evidencia completa',
+    'L8': 'Medida no necesaria',
+}
+
+
+@dataclass(frozen=True)
+class RequirementTables:
+    """Precomputed lookups for one requirement (all ids interned)."""
+    index: int
+    code: str
+    title: str
+    article_ref: str
+    description: str
+    subparts: Tuple[int, ...]
+    subpart_titles: Tuple[str, ...]
+    measures: Tuple[int, ...]
+
+
+class Catalog:
+    """Immutable compiled catalog. Build it with compile_catalog()."""
+
+    def __init__(
+        self,
+        version: str,
+        release: Optional[str],
+        source: str,
+        strings: Interner,
+        requirements: Tuple[RequirementTables, ...],
+        measure_info: Dict[int, Tuple[int, str, str]],
+        relation: Relation,
+    ):
+        self.version = version
+        self.release = release
+        self.source = source
+        self._strings = strings
+        self._requirements = requirements
+        self._by_code = {r.code: r for r in requirements}
+        # mg id -> (requirement index, guide_ref, description)
+        self._measure_info = measure_info
+        # MG → subpart, interned with `strings`
+        self._relation = relation
+        self._requirements_payload = [
+            {
+                'id': r.code,
+                'article_ref': r.article_ref,
+                'title': r.title,
+                'description': r.description,
+                'subparts': len(r.subparts),
+                'measures': len(r.measures),
+            }
+            for r in requirements
+        ]
+        self._measures_payload = {
+            r.code: [self._measure_row(mg) for mg in r.measures] for r in requirements
+        }
+
+    # ---- interning ----
+
+    def intern(self, value: str) -> Optional[int]:
+        return self._strings.get(value)
+
+    def name(self, idx: int) -> str:
+        return self._strings.name(idx)
+
+    # ---- requirements ----
+
+    @property
+    def requirement_codes(self) -> List[str]:
+        return [r.code for r in self._requirements]
+
+    def requirement(self, code: str) -> Optional[RequirementTables]:
+        return self._by_code.get(code)
+
+    def requirements(self) -> List[Dict[str, Any]]:
+        """Requirement rows for the API and the '3. Artículo RIA' tab."""
+        return self._requirements_payload
+
+    def subparts(self, code: str) -> List[str]:
+        req = self._by_code.get(code)
+        return [self._strings.name(s) for s in req.subparts] if req else []
+
+    # ---- measures ----
+
+    def _measure_row(self, mg: int) -> Dict[str, str]:
+        req_idx, guide, desc = self._measure_info[mg]
+        return {'id': self._strings.name(mg), 'req': self._requirements[req_idx].code, 'guide': guide, 'desc': desc}
+
+    def measures(self, codes: Optional[Iterable[str]] = None) -> List[Dict[str, str]]:
+        """MG rows (id, req, guide, desc) of the given requirements (default: all)."""
+        codes = self.requirement_codes if codes is None else codes
+        return [row for code in codes for row in self._measures_payload.get(code, ())]
+
+    def requirement_of(self, mg_id: str) -> Optional[str]:
+        info = self._measure_info.get(self._strings.get(mg_id))
+        return self._requirements[info[0]].code if info else None
+
+    def mg_subparts(self, mg_id: str) -> List[str]:
+        return self._relation.row(mg_id)
+
+    def subpart_measures(self, subpart_id: str) -> List[str]:
+        """MGs linked to a subpart."""
+        return self._relation.column(subpart_id)
+
+    def is_linked(self, mg_id: str, subpart_id: str) -> bool:
+        return (mg_id, subpart_id) in self._relation
+
+    def relations(self, code: str) -> List[Tuple[str, str]]:
+        """(mg_id, subpart_id) pairs of a requirement."""
+        req = self._by_code.get(code)
+        if not req:
+            return []
+        name = self._strings.name
+        return [(name(mg), name(s)) for mg in req.measures for s in self._relation.row_ids(mg)]
+
+    def measure_relation(self, columns: Sequence[str], mg_ids: Optional[Iterable[str]] = None) -> Relation:
+        """MG → requirement relation over `columns` (one mark per MG, at its requirement)."""
+        mg_ids = [row['id'] for row in self.measures()] if mg_ids is None else mg_ids
+        relation = Relation(Interner(mg_ids), Interner(columns))
+        for mg_id in relation.rows:
+            owner = self.requirement_of(mg_id)
+            if owner in relation.columns:
+                relation.add(mg_id, owner)
+        return relation
+
+    def measures_map(self, columns: Sequence[str], mg_ids: Optional[Iterable[str]] = None) -> Dict[str, List[str]]:
+        """Sparse MG × requirement matrix: {mg_id: [requirement codes among columns]}."""
+        return self.measure_relation(columns, mg_ids).to_dict()
+
+    # ---- static tables ----
+
+    @staticmethod
+    def maturity_levels() -> List[Dict[str, str]]:
+        return _MATURITY_LEVELS_PAYLOAD
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'version': self.version,
+            'release': self.release,
+            'source': self.source,
+            'requirements': len(self._requirements),
+            'subparts': sum(len(r.subparts) for r in self._requirements),
+            'measures': len(self._measure_info),
+            'relations': len(self._relation),
+        }
+
+
+_MATURITY_LEVELS_PAYLOAD = [
+    {'code': code, 'label': MATURITY_LABELS[code], 'plan': plan['code'], 'plan_desc': plan['description']}
+    for code, plan in MATURITY_TO_PLAN.items()
+]
+
+
+# ============ Compilation ============
+
+def compile_catalog(
+    requirements: List[Dict[str, Any]],
+    version: str,
+    release: Optional[str] = None,
+    source: str = '',
+) -> Catalog:
+    """
+    Compile a catalog from plain rows:
+    [{code, title, article_ref, description,
+      subparts: [(subpart_id, title)], measures: [(mg_id, guide_ref, description)],
+      relations: [(mg_id, subpart_id)]}]
+    """
+    strings = Interner()
+    intern = strings.intern
+    relation = Relation(strings, strings)
+
+    tables = []
+    measure_info: Dict[int, Tuple[int, str, str]] = {}
+    for req_idx, req in enumerate(requirements):
+        subparts = tuple(intern(s) for s, _ in req['subparts'])
+        measures = []
+        for mg_id, guide, desc in req['measures']:
+            mg = intern(mg_id)
+            if mg not in measure_info:
+                measures.append(mg)
+            measure_info[mg] = (req_idx, guide or '', desc or '')
+        own = set(measures)
+        for mg_id, subpart_id in req['relations']:
+            mg, s = intern(mg_id), intern(subpart_id)
+            if mg in own:
+                relation.add_ids(mg, s)
+        tables.append(RequirementTables(
+            index=req_idx,
+            code=req['code'],
+            title=req.get('title') or '',
+            article_ref=req.get('article_ref') or '',
+            description=req.get('description') or '',
+            subparts=subparts,
+            subpart_titles=tuple(t or '' for _, t in req['subparts']),
+            measures=tuple(measures),
+        ))
+    return Catalog(version, release, source, strings, tuple(tables), measure_info, relation)
+
+
+def _split_description(text: str) -> Tuple[str, str]:
+    """'Transparencia (Art. 13)' -> ('Transparencia', 'Art. 13')."""
+    match = re.match(r'^(.*?)\s*\(([^()]*)\)\s*$', text or '')
+    return (match.group(1), match.group(2)) if match else (text or '', '')
+
+
+def load_extractor_artifact(path: Path) -> Catalog:
+    """Compile the extractor's consolidated --manifest artifact."""
+    raw = path.read_bytes()
+    artifact = json.loads(raw)
+    requirements = []
+    for entry in artifact['requirements']:
+        title, article_ref = _split_description(entry.get('description') or '')
+        requirements.append({
+            'code': entry['requirement_code'],
+            'title': title or entry['requirement_code'],
+            'article_ref': article_ref,
+            'description': entry.get('description') or '',
+            'subparts': [(s['subpart_id'], s.get('short_description') or s.get('description')) for s in entry['subparts']],
+            'measures': [(m['mg_id'], None, m.get('description')) for m in entry['measures']],
+            'relations': [(r['mg_id'], r['subpart_id']) for r in entry['relations']],
+        })
+    return compile_catalog(
+        requirements,
+        version=hashlib.sha256(raw).hexdigest(),
+        release=artifact.get('catalog_release'),
+        source=str(path),
+    )
+
+
+# ---- seed migrations ----
+
+_INSERT_RE = re.compile(r'INSERT\s+INTO\s+(\w+)\s*\(([^)]*)\)\s*VALUES\s*(.*?)(?:ON\s+CONFLICT|;)', re.S | re.I)
+_UPDATE_RE = re.compile(r"UPDATE\s+(\w+)\s+SET\s+(\w+)\s*=\s*'([^']*)'\s+WHERE\s+(\w+)\s*=\s*'([^']*)'\s*;", re.I)
+_TOKEN_RE = re.compile(r"'((?:[^']|'')*)'|(\()|(\))|([^\s,()]+)")
+
+
+def _strip_comments(sql: str) -> str:
+    return re.sub(r'--[^\n]*', '', sql)
+
+
+def _value_tuples(values_sql: str) -> Iterable[List[Any]]:
+    """Tuples of a VALUES list; strings unquoted, TRUE/FALSE/NULL/numbers converted."""
+    row: Optional[List[Any]] = None
+    for quoted, open_, close, bare in _TOKEN_RE.findall(values_sql):
+        if open_:
+            row = []
+        elif close:
+            if row is not None:
+                yield row
+            row = None
+        elif row is None:
+            continue
+        elif bare:
+            upper = bare.upper()
+            if upper in ('TRUE', 'FALSE'):
+                row.append(upper == 'TRUE')
+            elif upper == 'NULL':
+                row.append(None)
+            else:
+                row.append(int(bare) if bare.isdigit() else bare)
+        else:
+            row.append(quoted.replace("''", "'"))
+
+
+def load_seed_migrations(migrations_dir: Path, files: Sequence[str] = CATALOG_MIGRATIONS) -> Catalog:
+    """Compile the catalog from the Guía 16 seed migrations (later rows upsert earlier ones)."""
+    requirements: Dict[str, Dict[str, Any]] = {}
+    subparts: Dict[str, Dict[str, Tuple[int, str]]] = {}
+    measures: Dict[str, Tuple[str, str, str]] = {}
+    relations: Dict[str, Dict[Tuple[str, str], None]] = {}
+    digest = hashlib.sha256()
+
+    for name in files:
+        raw = (migrations_dir / name).read_bytes()
+        digest.update(raw)
+        sql = _strip_comments(raw.decode('utf-8'))
+        statements = sorted(
+            [(m.start(), 'insert', m) for m in _INSERT_RE.finditer(sql)]
+            + [(m.start(), 'update', m) for m in _UPDATE_RE.finditer(sql)],
+            key=lambda item: item[0],
+        )
+        for _, kind, match in statements:
+            table = match.group(1).lower()
+            if kind == 'update':
+                _, column, value, key, key_value = match.groups()
+                if table == 'master_requirements' and key == 'code' and key_value in requirements:
+                    requirements[key_value][column] = value
+                continue
+            columns = [c.strip() for c in match.group(2).split(',')]
+            for values in _value_tuples(match.group(3)):
+                row = dict(zip(columns, values))
+                if table == 'master_requirements' and 'code' in row:
+                    requirements.setdefault(row['code'], {}).update(row)
+                elif table == 'master_article_subparts':
+                    subparts.setdefault(row['requirement_code'], {})[row['subpart_id']] = (
+                        row.get('order_index') or 0, row.get('title_short'),
+                    )
+                elif table == 'master_measures' and row.get('requirement_code'):
+                    measures[row['id']] = (row['requirement_code'], row.get('guide_ref'), row.get('description'))
+                elif table == 'master_mg_to_subpart':
+                    relations.setdefault(row['requirement_code'], {})[(row['mg_id'], row['subpart_id'])] = None
+
+    rows = []
+    for code, req in requirements.items():
+        ordered = sorted(subparts.get(code, {}).items(), key=lambda item: item[1][0])
+        rows.append({
+            'code': code,
+            'title': req.get('title'),
+            'article_ref': req.get('article_ref'),
+            'description': req.get('description'),
+            'subparts': [(subpart_id, title) for subpart_id, (_, title) in ordered],
+            'measures': [(mg_id, guide, desc) for mg_id, (owner, guide, desc) in measures.items() if owner == code],
+            'relations': list(relations.get(code, {})),
+        })
+    return compile_catalog(rows, version=digest.hexdigest(), source=str(migrations_dir))
+
+
+# ============ Hot-reloading store ============
+
+class CatalogStore:
+    """
+    Holds the current snapshot and swaps in a new one when the source files
+    change. Checks are throttled to one stat() round per `check_interval`.
+    """
+
+    def __init__(self, catalog_path: Path, migrations_dir: Path, check_interval: float = 2.0):
+        self.catalog_path = Path(catalog_path)
+        self.migrations_dir = Path(migrations_dir)
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._catalog: Optional[Catalog] = None
+        self._signature: Optional[Tuple] = None
+        self._checked_at = 0.0
+
+    def _sources(self) -> List[Path]:
+        if self.catalog_path.is_file():
+            return [self.catalog_path]
+        return [self.migrations_dir / name for name in CATALOG_MIGRATIONS]
+
+    def _signature_of(self, sources: List[Path]) -> Tuple:
+        signature = []
+        for path in sources:
+            try:
+                stat = path.stat()
+                signature.append((str(path), stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append((str(path), None, None))
+        return tuple(signature)
+
+    def _load(self, sources: List[Path]) -> Catalog:
+        if sources == [self.catalog_path]:
+            return load_extractor_artifact(self.catalog_path)
+        return load_seed_migrations(self.migrations_dir)
+
+    def get(self) -> Catalog:
+        now = time.monotonic()
+        if self._catalog is not None and now - self._checked_at < self.check_interval:
+            return self._catalog
+        with self._lock:
+            if self._catalog is not None and now - self._checked_at < self.check_interval:
+                return self._catalog
+            self._checked_at = now
+            sources = self._sources()
+            signature = self._signature_of(sources)
+            if signature != self._signature:
+                try:
+                    catalog = self._load(sources)
+                except Exception as e:
+                    if self._catalog is None:
+                        raise
+                    # Keep serving the previous snapshot (e.g. file mid-write)
+                    logger.error("Catalog reload failed, keeping %s: %s", self._catalog.version[:12], e)
+                else:
+                    if self._catalog is not None:
+                        self.reloads += 1
+                        logger.info("Catalog reloaded from %s (%s)", catalog.source, catalog.version[:12])
+                    self._catalog = catalog
+                    self._signature = signature
+            return self._catalog
+
+
+_catalog_store: Optional[CatalogStore] = None
+_catalog_store_lock = threading.Lock()
+
+
+def get_catalog_store() -> CatalogStore:
+    """
+    Return the process-wide catalog store.
+
+    Configured by CATALOG_PATH (extractor artifact, default
+    catalog/aesia_g16/catalog.json), CATALOG_MIGRATIONS_DIR (fallback seed
+    migrations, default src/migrations) and CATALOG_RELOAD_SECONDS (how often
+    sources are checked for changes, default 2).
+    """
+    global _catalog_store
+    with _catalog_store_lock:
+        if _catalog_store is None:
+            _catalog_store = CatalogStore(
+                catalog_path=Path(os.environ.get('CATALOG_PATH') or DEFAULT_CATALOG_PATH),
+                migrations_dir=Path(os.environ.get('CATALOG_MIGRATIONS_DIR') or DEFAULT_MIGRATIONS_DIR),
+                check_interval=float(os.environ.get('CATALOG_RELOAD_SECONDS', 2)),
+            )
+        return _catalog_store
+
+
+def get_catalog() -> Catalog:
+    """Current catalog snapshot (reloaded if its sources changed)."""
+    return get_catalog_store().get()
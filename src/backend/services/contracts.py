@@ -0,0 +1,388 @@
+"""
+Contracts - Precompiled validators for the agent I/O schemas
+Sistema de Preevaluación Sandbox IA España
+
+spec/agent_contracts/input_application.json and output_claims.json (JSON
+Schema draft-07) are compiled once into nested closures: every keyword is
+resolved at compile time (enums to sets, required lists to tuples, formats
+to regexes), so validating a record only runs the checks that apply to it.
+The compiler covers the keywords the contracts use and rejects any other,
+so a schema change cannot silently go unchecked.
+
+Validators return a list of "path: message" errors (empty when valid) and
+never raise on bad input; validate_stream applies one to an NDJSON stream
+record by record. A record longer than MAX_RECORD_BYTES is reported as
+invalid without being buffered or parsed.
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import json
+import os
+import re
+import threading
+import time
+
+_ROOT = Path(__file__).resolve().parents[3]
+DEFAULT_CONTRACTS_DIR = _ROOT / 'spec' / 'agent_contracts'
+
+# Contract name -> schema file
+CONTRACTS = {
+    'application': 'input_application.json',
+    'claims': 'output_claims.json',
+}
+
+# Invalid records listed in a stream report (counts are always complete)
+MAX_REPORTED_RECORDS = 1000
+
+# Longest NDJSON record accepted; a stream is only buffered up to this per line
+MAX_RECORD_BYTES = 1024 * 1024
+
+Validator = Callable[[Any, str, List[str]], Any]
+
+# Returned by a type check that failed: the value's other keywords are skipped
+_STOP = object()
+
+_ANNOTATIONS = frozenset({'$schema', '$id', '$comment', 'title', 'description', 'default', 'examples'})
+_SUPPORTED = _ANNOTATIONS | {
+    'type', 'enum', 'const', 'properties', 'required', 'additionalProperties', 'items',
+    'minItems', 'maxItems', 'minLength', 'maxLength', 'pattern', 'format',
+    'minimum', 'maximum', 'if', 'then', 'else',
+}
+
+_UUID_RE = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+_DATE_TIME_RE = re.compile(r'^\d{4}-\d{2}-\d{2}[Tt ]\d{2}:\d{2}:\d{2}(\.\d+)?([Zz]|[+-]\d{2}:\d{2})$')
+
+
+def _is_date_time(value: str) -> bool:
+    if not _DATE_TIME_RE.match(value):
+        return False
+    try:
+        datetime.fromisoformat(value[:-1] + '+00:00' if value[-1] in 'Zz' else value)
+    except ValueError:
+        return False
+    return True
+
+
+FORMATS: Dict[str, Callable[[str], bool]] = {
+    'uuid': lambda value: bool(_UUID_RE.match(value)),
+    'date-time': _is_date_time,
+}
+
+# JSON type -> Python types (bool is excluded from number and integer below)
+_TYPES: Dict[str, tuple] = {
+    'object': (dict,),
+    'array': (list,),
+    'string': (str,),
+    'boolean': (bool,),
+    'null': (type(None),),
+    'number': (int, float),
+    'integer': (int, float),
+}
+
+
+def _type_test(names: List[str]) -> Callable[[Any], bool]:
+    types = tuple({t for name in names for t in _TYPES[name]})
+    numeric = {'number', 'integer'} & set(names)
+    if not numeric:
+        return lambda value: isinstance(value, types)
+    integer_only = 'number' not in numeric
+
+    def test(value):
+        if not isinstance(value, types):
+            return False
+        if isinstance(value, bool):
+            return 'boolean' in names
+        if integer_only and isinstance(value, float):
+            return value.is_integer()
+        return True
+    return test
+
+
+def _json_equal(a: Any, b: Any) -> bool:
+    """Equality as JSON sees it: booleans never equal numbers."""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    return a == b
+
+
+def _compile(schema: Any, location: str) -> Validator:
+    if schema is True or schema == {}:
+        return lambda value, path, errors: None
+    if schema is False:
+        return lambda value, path, errors: errors.append(f'{path}: not allowed')
+    unknown = set(schema) - _SUPPORTED
+    if unknown:
+        raise ValueError(f"Unsupported schema keywords at {location}: {', '.join(sorted(unknown))}")
+
+    checks: List[Validator] = []
+
+    if 'type' in schema:
+        names = schema['type'] if isinstance(schema['type'], list) else [schema['type']]
+        is_type = _type_test(names)
+        expected = ' or '.join(names)
+
+        def check_type(value, path, errors):
+            if not is_type(value):
+                errors.append(f'{path}: expected {expected}')
+                return _STOP
+        checks.append(check_type)
+
+    if 'enum' in schema:
+        options = schema['enum']
+        if all(isinstance(option, str) for option in options):
+            strings = frozenset(options)
+            in_enum = lambda value: isinstance(value, str) and value in strings
+        else:
+            in_enum = lambda value: any(_json_equal(value, option) for option in options)
+        checks.append(lambda v, p, e: not in_enum(v) and e.append(f'{p}: {v!r} is not one of {options}'))
+
+    if 'const' in schema:
+        const = schema['const']
+        checks.append(lambda v, p, e: not _json_equal(v, const) and e.append(f'{p}: must be {const!r}'))
+
+    string_checks: List[Validator] = []
+    if 'minLength' in schema:
+        min_length = schema['minLength']
+        string_checks.append(lambda v, p, e: len(v) < min_length and e.append(f'{p}: shorter than {min_length}'))
+    if 'maxLength' in schema:
+        max_length = schema['maxLength']
+        string_checks.append(lambda v, p, e: len(v) > max_length and e.append(f'{p}: longer than {max_length}'))
+    if 'pattern' in schema:
+        pattern = re.compile(schema['pattern'])
+        string_checks.append(lambda v, p, e: not pattern.search(v) and e.append(f'{p}: does not match {pattern.pattern!r}'))
+    if 'format' in schema:
+        if schema['format'] not in FORMATS:
+            raise ValueError(f"Unsupported format at {location}: {schema['format']}")
+        is_format, name = FORMATS[schema['format']], schema['format']
+        string_checks.append(lambda v, p, e: not is_format(v) and e.append(f'{p}: not a valid {name}'))
+    if string_checks:
+        def check_string(value, path, errors):
+            if isinstance(value, str):
+                for check in string_checks:
+                    check(value, path, errors)
+        checks.append(check_string)
+
+    number_checks: List[Validator] = []
+    if 'minimum' in schema:
+        minimum = schema['minimum']
+        number_checks.append(lambda v, p, e: v < minimum and e.append(f'{p}: less than {minimum}'))
+    if 'maximum' in schema:
+        maximum = schema['maximum']
+        number_checks.append(lambda v, p, e: v > maximum and e.append(f'{p}: greater than {maximum}'))
+    if number_checks:
+        def check_number(value, path, errors):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                for check in number_checks:
+                    check(value, path, errors)
+        checks.append(check_number)
+
+    if {'properties', 'required', 'additionalProperties'} & set(schema):
+        properties = tuple(
+            (name, '.' + name, _compile(sub, f'{location}.{name}'))
+            for name, sub in (schema.get('properties') or {}).items()
+        )
+        names = frozenset(name for name, _, _ in properties)
+        required = tuple(schema.get('required') or ())
+        additional = schema.get('additionalProperties', True)
+        extra = None if additional is True else _compile(additional, f'{location}.*')
+
+        def check_object(value, path, errors):
+            if not isinstance(value, dict):
+                return
+            for name in required:
+                if name not in value:
+                    errors.append(f'{path}: missing required property {name!r}')
+            for name, suffix, validator in properties:
+                if name in value:
+                    validator(value[name], path + suffix, errors)
+            if extra is not None and not value.keys() <= names:
+                for name in [name for name in value if name not in names]:
+                    if additional is False:
+                        errors.append(f'{path}: unexpected property {name!r}')
+                    else:
+                        extra(value[name], f'{path}.{name}', errors)
+        checks.append(check_object)
+
+    if {'items', 'minItems', 'maxItems'} & set(schema):
+        items = _compile(schema['items'], f'{location}[]') if 'items' in schema else None
+        min_items, max_items = schema.get('minItems'), schema.get('maxItems')
+
+        def check_array(value, path, errors):
+            if not isinstance(value, list):
+                return
+            if min_items is not None and len(value) < min_items:
+                errors.append(f'{path}: fewer than {min_items} items')
+            if max_items is not None and len(value) > max_items:
+                errors.append(f'{path}: more than {max_items} items')
+            if items is not None:
+                for i, item in enumerate(value):
+                    items(item, f'{path}[{i}]', errors)
+        checks.append(check_array)
+
+    if 'if' in schema:
+        condition = _compile(schema['if'], f'{location}.if')
+        then = _compile(schema['then'], f'{location}.then') if 'then' in schema else None
+        otherwise = _compile(schema['else'], f'{location}.else') if 'else' in schema else None
+
+        def check_conditional(value, path, errors):
+            probe: List[str] = []
+            condition(value, path, probe)
+            branch = otherwise if probe else then
+            if branch is not None:
+                branch(value, path, errors)
+        checks.append(check_conditional)
+
+    if len(checks) == 1:
+        return checks[0]
+
+    def validate(value, path, errors):
+        for check in checks:
+            # A type mismatch makes the remaining keywords meaningless
+            if check(value, path, errors) is _STOP:
+                return
+    return validate
+
+
+def compile_schema(schema: Dict[str, Any]) -> Callable[[Any], List[str]]:
+    """Compile a JSON Schema into a function returning the errors of a value."""
+    validate = _compile(schema, '$')
+
+    def validator(value: Any) -> List[str]:
+        errors: List[str] = []
+        validate(value, '$', errors)
+        return errors
+    return validator
+
+
+def validate_stream(validator: Callable[[Any], List[str]], lines: Iterable[bytes]) -> Dict[str, Any]:
+    """
+    Validate an NDJSON stream record by record.
+
+    Blank lines are skipped; a line that is not JSON is an invalid record and
+    the stream continues. Records are numbered from 1 by line.
+    """
+    report = StreamReport()
+    for number, line in enumerate(lines, start=1):
+        report.add(number, line, validator)
+    return report.summary()
+
+
+class StreamReport:
+    """
+    Running counts of a validation stream; invalid records listed up to
+    MAX_REPORTED_RECORDS.
+
+    Records are either added one by one (add) or split from the raw stream
+    as chunks arrive (feed, then finish). A line is buffered until its
+    newline only while it fits in max_record_bytes; past that the rest of it
+    is skipped and the record counts as invalid.
+    """
+
+    def __init__(self, max_record_bytes: int = MAX_RECORD_BYTES):
+        self.max_record_bytes = max_record_bytes
+        self.records = 0
+        self.invalid = 0
+        self.errors: List[Dict[str, Any]] = []
+        self._start = time.perf_counter()
+        # Line being split from the stream: its number, bytes so far, and whether it overflowed
+        self._number = 0
+        self._pending = bytearray()
+        self._oversized = False
+
+    def add(self, number: int, line: bytes, validator: Callable[[Any], List[str]]):
+        if len(line) > self.max_record_bytes:
+            self._oversized_record(number)
+            return
+        if not line.strip():
+            return
+        self.records += 1
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            errors = [f'invalid JSON: {e}']
+        else:
+            errors = validator(record)
+        if errors:
+            self._invalid(number, errors)
+
+    def feed(self, chunk: bytes, validator: Callable[[Any], List[str]]):
+        """Validate the lines the next chunk of an NDJSON stream completes."""
+        *lines, rest = chunk.split(b'\n')
+        for line in lines:
+            self._buffer(line)
+            self._end_line(validator)
+        self._buffer(rest)
+
+    def finish(self, validator: Callable[[Any], List[str]]):
+        """Validate the last line of a stream that does not end with a newline."""
+        if self._pending or self._oversized:
+            self._end_line(validator)
+
+    def _buffer(self, data: bytes):
+        if self._oversized:
+            return
+        self._pending += data
+        if len(self._pending) > self.max_record_bytes:
+            self._oversized = True
+            self._pending = bytearray()
+
+    def _end_line(self, validator: Callable[[Any], List[str]]):
+        self._number += 1
+        if self._oversized:
+            self._oversized_record(self._number)
+        else:
+            self.add(self._number, bytes(self._pending), validator)
+        self._pending.clear()
+        self._oversized = False
+
+    def _oversized_record(self, number: int):
+        self.records += 1
+        self._invalid(number, [f'record exceeds {self.max_record_bytes} bytes'])
+
+    def _invalid(self, number: int, errors: List[str]):
+        self.invalid += 1
+        if len(self.errors) < MAX_REPORTED_RECORDS:
+            self.errors.append({'record': number, 'errors': errors})
+
+    def summary(self) -> Dict[str, Any]:
+        elapsed = time.perf_counter() - self._start
+        return {
+            'records': self.records,
+            'valid': self.records - self.invalid,
+            'invalid': self.invalid,
+            'errors': self.errors,
+            'truncated': self.invalid > len(self.errors),
+            'took_ms': round(elapsed * 1000, 3),
+            'records_per_s': round(self.records / elapsed) if elapsed > 0 else None,
+        }
+
+
+class ContractValidators:
+    """The compiled agent contracts, by name (see CONTRACTS)."""
+
+    def __init__(self, contracts_dir: Path):
+        self.contracts_dir = Path(contracts_dir)
+        self.validators: Dict[str, Callable[[Any], List[str]]] = {}
+        for name, filename in CONTRACTS.items():
+            with open(self.contracts_dir / filename, encoding='utf-8') as f:
+                self.validators[name] = compile_schema(json.load(f))
+
+    def __getitem__(self, name: str) -> Callable[[Any], List[str]]:
+        return self.validators[name]
+
+
+_contracts: Optional[ContractValidators] = None
+_contracts_lock = threading.Lock()
+
+
+def get_contracts() -> ContractValidators:
+    """
+    Return the process-wide compiled contracts, read from AGENT_CONTRACTS_DIR
+    (default spec/agent_contracts).
+    """
+    global _contracts
+    with _contracts_lock:
+        if _contracts is None:
+            _contracts = ContractValidators(Path(os.environ.get('AGENT_CONTRACTS_DIR') or DEFAULT_CONTRACTS_DIR))
+        return _contracts
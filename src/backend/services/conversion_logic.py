@@ -2,7 +2,10 @@
 Lógica de Conversión - Regla Guía 16 AESIA
 Sistema de Preevaluación Sandbox IA España
 """
-from typing import TypedDict, Literal, Optional, Dict, List
+from typing import TypedDict, Literal, Optional, Dict, List, Sequence, Union
+
+import numpy as np
+import pandas as pd
 
 
 class AdaptationPlan(TypedDict):
@@ -56,6 +59,66 @@ def get_diagnosis_status(maturity_level: Optional[str]) -> str:
     return '01' if maturity_level else '00'
 
 
+# ============ Cálculo por lotes (columnar) ============
+# Tablas de búsqueda indexadas por la posición del nivel en MATURITY_LEVELS;
+# las dos últimas posiciones son "nivel no reconocido" y "pendiente".
+
+MATURITY_LEVELS = tuple(MATURITY_TO_PLAN)
+_MATURITY_INDEX = pd.Index(MATURITY_LEVELS)
+_UNKNOWN = len(MATURITY_LEVELS)
+_PENDING = _UNKNOWN + 1
+
+_PLAN_ROWS = [*MATURITY_TO_PLAN.values(), calculate_plan(''), {'code': '00', 'description': 'Pendiente'}]
+PLAN_CODES = tuple(sorted({plan['code'] for plan in _PLAN_ROWS}))
+PLAN_DESCRIPTIONS = tuple(dict.fromkeys(plan['description'] for plan in _PLAN_ROWS))
+DIAGNOSIS_STATUSES = ('00', '01')
+
+_PLAN_CODE_LOOKUP = np.array([PLAN_CODES.index(plan['code']) for plan in _PLAN_ROWS], dtype=np.int8)
+_PLAN_DESC_LOOKUP = np.array([PLAN_DESCRIPTIONS.index(plan['description']) for plan in _PLAN_ROWS], dtype=np.int8)
+
+MaturityColumn = Union[Sequence[Optional[str]], np.ndarray, pd.Series, pd.Categorical]
+
+
+def calculate_plans(maturity: Union[MaturityColumn, pd.DataFrame], column: str = 'maturity') -> pd.DataFrame:
+    """
+    Calcula en bloque planes de adaptación y estado de diagnóstico.
+    
+    Equivale a aplicar calculate_plan / get_diagnosis_status a cada elemento,
+    pero el nivel se traduce a un código categórico y el plan se obtiene por
+    indexación en tablas, sin crear un diccionario por fila.
+    
+    Args:
+        maturity: Niveles de madurez (lista, array, Series, Categorical) o un
+                  DataFrame con la columna `column`
+        column: Columna de niveles cuando se pasa un DataFrame
+        
+    Returns:
+        DataFrame con columnas categóricas 'adaptation_plan',
+        'adaptation_plan_desc' y 'diagnosis_status' (mismo índice que la entrada)
+    """
+    if isinstance(maturity, pd.DataFrame):
+        values = maturity[column]
+    elif isinstance(maturity, pd.Series):
+        values = maturity
+    else:
+        values = pd.Series(maturity, dtype=object)
+    
+    codes = _MATURITY_INDEX.get_indexer(values)
+    idx = np.where(codes >= 0, codes, _UNKNOWN)
+    # Sin nivel (None, NaN o cadena vacía) → pendiente
+    diagnosed = (values.notna() & (values != '')).to_numpy(dtype=bool)
+    idx[~diagnosed] = _PENDING
+    
+    return pd.DataFrame(
+        {
+            'adaptation_plan': pd.Categorical.from_codes(_PLAN_CODE_LOOKUP[idx], categories=PLAN_CODES),
+            'adaptation_plan_desc': pd.Categorical.from_codes(_PLAN_DESC_LOOKUP[idx], categories=PLAN_DESCRIPTIONS),
+            'diagnosis_status': pd.Categorical.from_codes(diagnosed.astype(np.int8), categories=DIAGNOSIS_STATUSES),
+        },
+        index=values.index,
+    )
+
+
 def calculate_all_assessments(assessments: List[dict]) -> List[dict]:
     """
     Calcula los planes de adaptación para una lista de evaluaciones.
@@ -66,16 +129,18 @@ def calculate_all_assessments(assessments: List[dict]) -> List[dict]:
     Returns:
         Lista de evaluaciones con 'adaptation_plan' y 'diagnosis_status' calculados
     """
-    results = []
-    for assessment in assessments:
-        maturity = assessment.get('maturity')
-        plan = calculate_plan(maturity) if maturity else {'code': '00', 'description': 'Pendiente'}
-        
-        results.append({
+    plans = calculate_plans([assessment.get('maturity') for assessment in assessments])
+    return [
+        {
             **assessment,
-            'adaptation_plan': plan['code'],
-            'adaptation_plan_desc': plan['description'],
-            'diagnosis_status': get_diagnosis_status(maturity),
-        })
-    
-    return results
+            'adaptation_plan': code,
+            'adaptation_plan_desc': description,
+            'diagnosis_status': status,
+        }
+        for assessment, code, description, status in zip(
+            assessments,
+            plans['adaptation_plan'].tolist(),
+            plans['adaptation_plan_desc'].tolist(),
+            plans['diagnosis_status'].tolist(),
+        )
+    ]
@@ -0,0 +1,438 @@
+"""
+Evals - Golden set runner for the assessment pipeline
+Sistema de Preevaluación Sandbox IA España
+
+Streams a JSONL dataset (evals/datasets/golden_set_v0.jsonl) and runs every
+case with bounded parallelism:
+
+- PLAN-* cases call calculate_plan with input_context.maturity_level;
+- EXT-* / NEG-* cases call an Assessor (a local rule-based stub by default)
+  with input_context {doc_text, query} and expect an output_claims document.
+
+Each case is graded by its grading_criteria (match_type exact, exact_status
+or semantic; citation_verification strict or fuzzy; forbidden_output). The
+report aggregates pass rates per case family, latency percentiles and
+throughput, and checks the evals.pass_thresholds of usecase_manifest.yaml:
+
+- citation_coverage_min: share of successful assessments citing evidence;
+- citation_match_min: share of citations found in the source text;
+- false_red_rate_max: share of cases expecting insufficient evidence for
+  which a maturity level was asserted anyway;
+- schema_valid: every assessor output validates against output_claims.json
+  (run_golden_set checks it with the compiled contract by default).
+"""
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import json
+import re
+import time
+import unicodedata
+import uuid
+
+from services.contracts import get_contracts
+from services.conversion_logic import calculate_plan
+
+_ROOT = Path(__file__).resolve().parents[3]
+DEFAULT_MANIFEST_PATH = _ROOT / 'usecase_manifest.yaml'
+
+# Minimum similarity of a fuzzy citation to the best matching span of the source
+FUZZY_CITATION_RATIO = 0.8
+
+
+def _fold(text: str) -> str:
+    text = unicodedata.normalize('NFKD', str(text).casefold())
+    return ' '.join(''.join(ch for ch in text if not unicodedata.combining(ch)).split())
+
+
+# ============ Assessors ============
+
+class Assessor(ABC):
+    """Produces an output_claims document for one {doc_text, query} context."""
+
+    name = 'assessor'
+
+    @abstractmethod
+    def assess(self, input_context: Dict[str, Any]) -> Dict[str, Any]:
+        ...
+
+
+class RuleBasedAssessor(Assessor):
+    """
+    Deterministic local stand-in for the LLM assessor.
+
+    Sentences of doc_text are scanned for evidence of a control being
+    implemented, documented and in force; the combination maps to a maturity
+    level. Without any such evidence it answers insufficient_evidence. Each
+    evidence sentence is cited verbatim.
+    """
+
+    name = 'rule_based'
+
+    IMPLEMENTED = ('implementado', 'implementada', 'se aplica', 'en funcionamiento', 'en produccion', 'operativo')
+    DOCUMENTED = ('documentado', 'documentada', 'documentacion', 'manual', 'procedimiento', 'politica')
+    UNDOCUMENTED = ('no tiene documentacion', 'sin documentacion', 'no esta documentad', 'no existe documentacion')
+    IN_FORCE = ('aprobado', 'aprobada', 'en vigor', 'auditado', 'auditada', 'evidencia')
+    IDENTIFIED = ('identificado', 'identificada', 'previsto', 'prevista', 'planificado', 'planificada')
+
+    _MEASURE_RE = re.compile(r'\b(MG_\d+_\d+)\b')
+    _REQUIREMENT_RE = re.compile(r'\bREQ_(\d+)\b')
+    _SENTENCE_RE = re.compile(r'[^.!?]+[.!?]?')
+
+    def _measure_id(self, query: str) -> Optional[str]:
+        measure = self._MEASURE_RE.search(query)
+        if measure:
+            return measure.group(1)
+        requirement = self._REQUIREMENT_RE.search(query)
+        # A requirement question is answered for its first guide measure
+        return f'MG_{requirement.group(1)}_01' if requirement else None
+
+    def assess(self, input_context: Dict[str, Any]) -> Dict[str, Any]:
+        doc_text = input_context.get('doc_text') or ''
+        found = {'implemented': False, 'documented': False, 'undocumented': False, 'in_force': False, 'identified': False}
+        evidence: List[str] = []
+        for sentence in (s.strip() for s in self._SENTENCE_RE.findall(doc_text)):
+            folded = _fold(sentence)
+            hits = {
+                'implemented': any(cue in folded for cue in self.IMPLEMENTED),
+                'undocumented': any(cue in folded for cue in self.UNDOCUMENTED),
+                'in_force': any(cue in folded for cue in self.IN_FORCE),
+                'identified': any(cue in folded for cue in self.IDENTIFIED),
+            }
+            hits['documented'] = not hits['undocumented'] and any(cue in folded for cue in self.DOCUMENTED)
+            if any(hits.values()):
+                evidence.append(sentence)
+                for key, hit in hits.items():
+                    found[key] = found[key] or hit
+
+        query = input_context.get('query') or ''
+        metadata = {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'application_id': input_context.get('application_id') or str(uuid.uuid5(uuid.NAMESPACE_URL, query + doc_text)),
+            'model_version': self.name,
+        }
+        measure_id = self._measure_id(query)
+        maturity = self._maturity(found)
+        if maturity is None or measure_id is None:
+            return {'status': 'insufficient_evidence', 'metadata': metadata, 'claims': []}
+        return {
+            'status': 'success',
+            'metadata': metadata,
+            'assessment': {
+                'measure_id': measure_id,
+                'maturity': maturity,
+                'adaptation_plan': calculate_plan(maturity),
+                'diagnosis_status': '01',
+            },
+            'claims': [{
+                'claim_text': f'{measure_id}: nivel {maturity}',
+                'citations': [{'doc_id': 'input', 'snippet_quote': sentence} for sentence in evidence],
+            }],
+        }
+
+    @staticmethod
+    def _maturity(found: Dict[str, bool]) -> Optional[str]:
+        documented = found['documented'] and not found['undocumented']
+        if found['implemented']:
+            if documented:
+                return 'L7' if found['in_force'] else 'L6'
+            return 'L4'
+        if documented:
+            return 'L3'
+        if found['identified'] or found['undocumented']:
+            return 'L2'
+        return None
+
+
+# ============ Grading ============
+
+@dataclass
+class CaseResult:
+    """Outcome of one golden-set case."""
+    test_id: str
+    kind: str
+    passed: bool
+    latency_ms: float
+    failures: List[str] = field(default_factory=list)
+    # Citation and negative-case counters feeding the manifest thresholds
+    citations: int = 0
+    citations_matched: int = 0
+    cited: Optional[bool] = None
+    false_red: Optional[bool] = None
+    schema_valid: Optional[bool] = None
+
+
+def _subset_equal(expected: Any, actual: Any) -> bool:
+    """Every key of expected is present in actual with an equal value."""
+    if isinstance(expected, dict):
+        return isinstance(actual, dict) and all(
+            key in actual and _subset_equal(value, actual[key]) for key, value in expected.items()
+        )
+    return expected == actual
+
+
+def _semantic_equal(expected: Any, actual: Any) -> bool:
+    """Like _subset_equal, but strings compare case-, accent- and spacing-insensitively."""
+    if isinstance(expected, dict):
+        return isinstance(actual, dict) and all(
+            key in actual and _semantic_equal(value, actual[key]) for key, value in expected.items()
+        )
+    if isinstance(expected, str) and isinstance(actual, str):
+        return _fold(expected) == _fold(actual)
+    return expected == actual
+
+
+def citation_matches(snippet: str, source: str, mode: str) -> bool:
+    """
+    Whether a citation's snippet is supported by the source text.
+
+    strict: the snippet occurs verbatim (ignoring case and whitespace);
+    fuzzy: the most similar span of the source is at least
+    FUZZY_CITATION_RATIO similar.
+    """
+    snippet, source = _fold(snippet), _fold(source)
+    if not snippet:
+        return False
+    if snippet in source:
+        return True
+    if mode != 'fuzzy' or not source:
+        return False
+    matcher = SequenceMatcher(None, source, snippet, autojunk=False)
+    best = 0.0
+    for block in matcher.get_matching_blocks():
+        start = max(0, block.a - block.b)
+        window = source[start:start + len(snippet)]
+        best = max(best, SequenceMatcher(None, window, snippet, autojunk=False).ratio())
+    return best >= FUZZY_CITATION_RATIO
+
+
+def _forbidden_hits(output: Dict[str, Any], forbidden: Iterable[str]) -> List[str]:
+    text = json.dumps(output, ensure_ascii=False)
+    return [token for token in forbidden if re.search(rf'(?<![A-Za-z0-9_]){re.escape(token)}(?![A-Za-z0-9_])', text)]
+
+
+def grade(case: Dict[str, Any], output: Dict[str, Any], result: CaseResult):
+    """Grade `output` against the case's expected_output and grading_criteria into result."""
+    expected = case.get('expected_output') or {}
+    criteria = case.get('grading_criteria') or {}
+    match_type = criteria.get('match_type', 'exact')
+
+    if match_type == 'exact':
+        if not _subset_equal(expected, output):
+            result.failures.append('output differs from expected_output')
+    elif match_type == 'exact_status':
+        if output.get('status') != expected.get('status'):
+            result.failures.append(f"status {output.get('status')!r} != {expected.get('status')!r}")
+    elif match_type == 'semantic':
+        if not _semantic_equal(expected, output):
+            result.failures.append('output does not match expected_output')
+    else:
+        result.failures.append(f'unknown match_type {match_type!r}')
+
+    forbidden = criteria.get('forbidden_output') or []
+    hits = _forbidden_hits(output, forbidden)
+    if hits:
+        result.failures.append(f"forbidden output: {', '.join(hits)}")
+
+    if expected.get('status') == 'insufficient_evidence':
+        result.false_red = output.get('status') == 'success' or bool(hits)
+
+    citation_mode = criteria.get('citation_verification')
+    if citation_mode and output.get('status') == 'success':
+        source = (case.get('input_context') or {}).get('doc_text') or ''
+        snippets = [
+            citation.get('snippet_quote') or ''
+            for claim in output.get('claims') or []
+            for citation in claim.get('citations') or []
+        ]
+        result.cited = bool(snippets)
+        result.citations = len(snippets)
+        result.citations_matched = sum(citation_matches(s, source, citation_mode) for s in snippets)
+        if not snippets:
+            result.failures.append('no citations')
+        elif result.citations_matched < len(snippets):
+            result.failures.append(
+                f'{len(snippets) - result.citations_matched}/{len(snippets)} citations not found ({citation_mode})'
+            )
+
+
+# ============ Runner ============
+
+def iter_cases(path: Path) -> Iterator[Dict[str, Any]]:
+    """Cases of a JSONL dataset, read lazily (blank lines skipped)."""
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, start=1):
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise ValueError(f'{path}:{number}: invalid JSON ({e.msg})')
+
+
+def case_kind(test_id: str) -> str:
+    """Case family from its id prefix: 'EXT-001' -> 'EXT'."""
+    return test_id.split('-', 1)[0].upper()
+
+
+class EvalRunner:
+    """
+    Runs golden-set cases concurrently (at most `concurrency` in flight).
+
+    validate_output(output) returns a list of schema errors for an assessor
+    output; without it schema validity is not checked.
+    """
+
+    def __init__(
+        self,
+        assessor: Optional[Assessor] = None,
+        concurrency: int = 8,
+        validate_output: Optional[Callable[[Dict[str, Any]], List[str]]] = None,
+    ):
+        self.assessor = assessor or RuleBasedAssessor()
+        self.concurrency = max(1, concurrency)
+        self.validate_output = validate_output
+
+    def run_case(self, case: Dict[str, Any]) -> CaseResult:
+        test_id = str(case.get('test_id', '?'))
+        kind = case_kind(test_id)
+        context = case.get('input_context') or {}
+        result = CaseResult(test_id=test_id, kind=kind, passed=False, latency_ms=0.0)
+        start = time.perf_counter()
+        try:
+            if kind == 'PLAN':
+                output = {'adaptation_plan': calculate_plan(context.get('maturity_level'))}
+            else:
+                output = self.assessor.assess(context)
+        except Exception as e:
+            result.latency_ms = (time.perf_counter() - start) * 1000
+            result.failures.append(f'{type(e).__name__}: {e}')
+            return result
+        result.latency_ms = (time.perf_counter() - start) * 1000
+
+        if kind != 'PLAN' and self.validate_output is not None:
+            errors = self.validate_output(output)
+            result.schema_valid = not errors
+            result.failures.extend(f'schema: {error}' for error in errors)
+        grade(case, output, result)
+        result.passed = not result.failures
+        return result
+
+    def run(self, cases: Iterable[Dict[str, Any]]) -> Tuple[List[CaseResult], float]:
+        """Results in dataset order and the wall time in seconds."""
+        results: Dict[int, CaseResult] = {}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            pending = {}
+            for position, case in enumerate(cases):
+                # Keep memory flat on large datasets: bounded number in flight
+                if len(pending) >= self.concurrency * 2:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        results[pending.pop(future)] = future.result()
+                pending[pool.submit(self.run_case, case)] = position
+            for future in list(pending):
+                results[pending.pop(future)] = future.result()
+        elapsed = time.perf_counter() - start
+        return [results[i] for i in sorted(results)], elapsed
+
+
+# ============ Report ============
+
+def percentile(values: List[float], p: float) -> float:
+    """Nearest-rank percentile of values (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def _ratio(numerator: int, denominator: int) -> Optional[float]:
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def build_report(results: List[CaseResult], elapsed: float, thresholds: Dict[str, Any]) -> Dict[str, Any]:
+    """Aggregate results and check them against the manifest's pass_thresholds."""
+    by_kind: Dict[str, List[CaseResult]] = {}
+    for result in results:
+        by_kind.setdefault(result.kind, []).append(result)
+    latencies = [r.latency_ms for r in results]
+
+    cited = [r.cited for r in results if r.cited is not None]
+    negatives = [r.false_red for r in results if r.false_red is not None]
+    schema_checked = [r.schema_valid for r in results if r.schema_valid is not None]
+    metrics = {
+        'citation_coverage': _ratio(sum(cited), len(cited)),
+        'citation_match': _ratio(sum(r.citations_matched for r in results), sum(r.citations for r in results)),
+        'false_red_rate': _ratio(sum(negatives), len(negatives)),
+        'schema_valid': all(schema_checked) if schema_checked else None,
+    }
+
+    gates = []
+    for name, threshold in thresholds.items():
+        if name.endswith('_min'):
+            value, check = metrics.get(name[:-4]), lambda v, t: v >= t
+        elif name.endswith('_max'):
+            value, check = metrics.get(name[:-4]), lambda v, t: v <= t
+        else:
+            value, check = metrics.get(name), lambda v, t: v == t
+        # A metric with no applicable cases (or not measured) is reported, not failed
+        passed = None if value is None else bool(check(value, threshold))
+        gates.append({'name': name, 'threshold': threshold, 'value': value, 'passed': passed})
+
+    return {
+        'cases': len(results),
+        'passed': sum(r.passed for r in results),
+        'pass_rate': _ratio(sum(r.passed for r in results), len(results)),
+        'by_kind': {
+            kind: {'cases': len(group), 'passed': sum(r.passed for r in group), 'pass_rate': _ratio(sum(r.passed for r in group), len(group))}
+            for kind, group in sorted(by_kind.items())
+        },
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p90': round(percentile(latencies, 90), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(max(latencies, default=0.0), 3),
+        },
+        'elapsed_s': round(elapsed, 4),
+        'throughput_per_s': round(len(results) / elapsed, 1) if elapsed > 0 else None,
+        'metrics': metrics,
+        'gates': gates,
+        'ok': all(gate['passed'] is not False for gate in gates),
+        'failures': [{'test_id': r.test_id, 'reasons': r.failures} for r in results if not r.passed],
+    }
+
+
+def load_manifest(path: Path = DEFAULT_MANIFEST_PATH) -> Dict[str, Any]:
+    try:
+        import yaml
+    except ImportError:
+        raise RuntimeError("Reading usecase_manifest.yaml requires PyYAML (pip install pyyaml)")
+    with open(path, encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+
+def run_golden_set(
+    manifest_path: Path = DEFAULT_MANIFEST_PATH,
+    dataset: Optional[Path] = None,
+    runner: Optional[EvalRunner] = None,
+) -> Dict[str, Any]:
+    """
+    Run the manifest's eval dataset (or `dataset`) and return the report.
+
+    The dataset path in the manifest is relative to the manifest's directory.
+    The default runner validates assessor outputs against output_claims.json.
+    """
+    manifest = load_manifest(manifest_path)
+    evals = manifest.get('evals') or {}
+    dataset = Path(dataset) if dataset else Path(manifest_path).parent / evals['dataset']
+    runner = runner or EvalRunner(validate_output=get_contracts()['claims'])
+    results, elapsed = runner.run(iter_cases(dataset))
+    report = build_report(results, elapsed, evals.get('pass_thresholds') or {})
+    report['dataset'] = str(dataset)
+    report['assessor'] = runner.assessor.name
+    return report
@@ -0,0 +1,164 @@
+"""
+Executor - Shared worker pools for blocking work
+Sistema de Preevaluación Sandbox IA España
+
+Moves blocking work off the event loop: a process pool for CPU-bound workbook
+building and a thread pool for blocking I/O. Each lane has a bounded queue;
+when it is full new work is rejected with ExecutorSaturated (HTTP 503 +
+Retry-After) instead of letting latency pile up.
+"""
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import os
+import threading
+
+
+class ExecutorSaturated(Exception):
+    """Raised when a lane has no free worker and its queue is full."""
+
+    def __init__(self, lane: str, retry_after: int):
+        super().__init__(f"Executor lane '{lane}' is saturated")
+        self.lane = lane
+        self.retry_after = retry_after
+
+
+class _Lane:
+    """One pool plus its admission counters."""
+
+    def __init__(self, name: str, factory: Callable[[int], Executor], workers: int, max_queue: int):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.outstanding = 0
+        self.rejected = 0
+        self.completed = 0
+        self._factory = factory
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = self._factory(self.workers)
+        return self._executor
+
+    def stats(self) -> Dict[str, int]:
+        # Pools dispatch FIFO, so anything beyond the worker count is queued
+        return {
+            'workers': self.workers,
+            'in_flight': min(self.outstanding, self.workers),
+            'queued': max(0, self.outstanding - self.workers),
+            'max_queue': self.max_queue,
+            'completed': self.completed,
+            'rejected': self.rejected,
+        }
+
+
+class WorkloadExecutor:
+    """
+    Process pool ('cpu' lane) and thread pool ('io' lane) with admission control.
+
+    Counters are guarded by a threading lock, so one executor can be shared by
+    every event loop of the process.
+    """
+
+    def __init__(self, cpu_workers: int, io_workers: int, max_queue: int, retry_after: int = 5):
+        self.retry_after = retry_after
+        self._lock = threading.Lock()
+        self._lanes = {
+            'cpu': _Lane('cpu', lambda n: ProcessPoolExecutor(max_workers=n), cpu_workers, max_queue),
+            'io': _Lane('io', lambda n: ThreadPoolExecutor(max_workers=n, thread_name_prefix='io'), io_workers, max_queue),
+        }
+
+    def ensure_capacity(self, lane: str):
+        """Raise ExecutorSaturated if the lane would reject new work right now."""
+        state = self._lanes[lane]
+        with self._lock:
+            if state.outstanding >= state.workers + state.max_queue:
+                state.rejected += 1
+                raise ExecutorSaturated(lane, self.retry_after)
+
+    def submit(self, lane: str, fn: Callable, *args, admitted: bool = False, **kwargs) -> Future:
+        """
+        Submit fn(*args, **kwargs) to a lane and return its concurrent Future.
+
+        Args:
+            lane: 'cpu' (process pool; fn and arguments must be picklable) or 'io'
+            admitted: skip the queue limit for work whose request already
+                      passed ensure_capacity (e.g. the rest of a full export)
+        """
+        state = self._lanes[lane]
+        with self._lock:
+            if not admitted and state.outstanding >= state.workers + state.max_queue:
+                state.rejected += 1
+                raise ExecutorSaturated(lane, self.retry_after)
+            state.outstanding += 1
+        try:
+            future = state.executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._release(state)
+            raise
+        future.add_done_callback(lambda _: self._release(state))
+        return future
+
+    async def run(self, lane: str, fn: Callable, *args, admitted: bool = False, **kwargs) -> Any:
+        """Run fn on a lane (see submit) and await its result."""
+        return await asyncio.wrap_future(self.submit(lane, fn, *args, admitted=admitted, **kwargs))
+
+    def _release(self, state: _Lane):
+        with self._lock:
+            state.outstanding -= 1
+            state.completed += 1
+
+    async def run_cpu(self, fn: Callable, *args, **kwargs) -> Any:
+        return await self.run('cpu', fn, *args, **kwargs)
+
+    async def run_io(self, fn: Callable, *args, **kwargs) -> Any:
+        return await self.run('io', fn, *args, **kwargs)
+
+    def workers(self, lane: str) -> int:
+        return self._lanes[lane].workers
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {name: lane.stats() for name, lane in self._lanes.items()}
+
+    def shutdown(self):
+        for lane in self._lanes.values():
+            if lane._executor is not None:
+                lane._executor.shutdown(wait=True, cancel_futures=True)
+                lane._executor = None
+
+
+_executor: Optional[WorkloadExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> WorkloadExecutor:
+    """
+    Return the process-wide executor.
+
+    Sized from EXPORT_POOL_SIZE (CPU workers, default CPU count up to 12),
+    EXECUTOR_IO_WORKERS (default 8), EXECUTOR_MAX_QUEUE (queued jobs per lane,
+    default 32) and EXECUTOR_RETRY_AFTER (seconds, default 5).
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            cpu_default = min(os.cpu_count() or 1, 12)
+            _executor = WorkloadExecutor(
+                cpu_workers=max(1, int(os.environ.get('EXPORT_POOL_SIZE', cpu_default))),
+                io_workers=max(1, int(os.environ.get('EXECUTOR_IO_WORKERS', 8))),
+                max_queue=max(0, int(os.environ.get('EXECUTOR_MAX_QUEUE', 32))),
+                retry_after=int(os.environ.get('EXECUTOR_RETRY_AFTER', 5)),
+            )
+        return _executor
+
+
+def shutdown_executor():
+    """Stop the process-wide executor (called on application shutdown)."""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
@@ -0,0 +1,417 @@
+"""
+Export Jobs - Asynchronous export queue
+Sistema de Preevaluación Sandbox IA España
+
+Mirrors the `exports` table state machine (migration 006):
+QUEUED → RUNNING → DONE | FAILED, with started_at, completed_at, expires_at
+and file_size_bytes. Jobs are processed by a local pool of worker threads and
+their artifacts are written to a pluggable StorageBackend. Job rows are kept
+in an ExportJobRepository (SQLiteExportJobRepository stands in for the
+Supabase table), so status and downloads survive a restart; expired rows and
+artifacts are purged on a timer.
+
+Each job records its owner, the process whose queue runs it (host:pid).
+When several processes share the table, a starting queue only fails the
+unfinished jobs of owners that are gone: its own pid, or a pid on the same
+host that is no longer running. Jobs of other hosts are recovered by those
+hosts' own restarts.
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field, asdict, replace
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Union
+import json
+import logging
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import uuid
+
+from services.storage import StorageBackend, get_storage
+
+logger = logging.getLogger(__name__)
+
+EXPORT_TYPES = ('PER_REQUIREMENT', 'FULL_ZIP', 'SINGLE_REQUIREMENT')
+
+# A build returns the artifact bytes, or an iterable of chunks to stream to storage
+BuildFn = Callable[[], Union[bytes, Iterable[bytes]]]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass
+class ExportJob:
+    """One row of the `exports` table."""
+    application_id: str
+    export_type: str
+    file_name: str
+    requirement_code: Optional[str] = None
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    status: str = 'QUEUED'
+    error_message: Optional[str] = None
+    template_version_map: Dict[str, str] = field(default_factory=dict)
+    storage_path: Optional[str] = None
+    file_size_bytes: Optional[int] = None
+    requested_by: Optional[str] = None
+    owner: Optional[str] = None
+    created_at: datetime = field(default_factory=_now)
+    started_at: Optional[datetime] = None
+    completed_at: Optional[datetime] = None
+    expires_at: Optional[datetime] = None
+
+    @property
+    def is_expired(self) -> bool:
+        return self.expires_at is not None and self.expires_at <= _now()
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        for key in ('created_at', 'started_at', 'completed_at', 'expires_at'):
+            if data[key] is not None:
+                data[key] = data[key].isoformat()
+        return data
+
+
+class ExportJobRepository(ABC):
+    """Persistence of export jobs (the `exports` table)."""
+
+    @abstractmethod
+    def save(self, job: ExportJob):
+        """Insert or replace the job's row in one atomic write."""
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        """The job, or None if unknown."""
+
+    @abstractmethod
+    def latest_done(self, application_id: str, requirement_code: Optional[str], now: datetime) -> Optional[ExportJob]:
+        """Most recently completed DONE job of an application/requirement not expired at now."""
+
+    @abstractmethod
+    def expired(self, now: datetime) -> List[ExportJob]:
+        """Jobs whose expires_at is at or before now."""
+
+    @abstractmethod
+    def delete(self, job_ids: List[str]):
+        """Delete the jobs' rows."""
+
+    @abstractmethod
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status."""
+
+    @abstractmethod
+    def fail_unfinished(self, message: str, now: datetime, owner_gone: Callable[[Optional[str]], bool]) -> List[str]:
+        """Mark QUEUED/RUNNING jobs whose owner is gone FAILED and return their ids."""
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS exports (
+    id TEXT PRIMARY KEY,
+    application_id TEXT NOT NULL,
+    export_type TEXT NOT NULL,
+    requirement_code TEXT,
+    template_version_map TEXT NOT NULL DEFAULT '{}',
+    storage_path TEXT,
+    file_name TEXT,
+    file_size_bytes INTEGER,
+    status TEXT NOT NULL DEFAULT 'QUEUED',
+    error_message TEXT,
+    requested_by TEXT,
+    owner TEXT,
+    created_at TEXT NOT NULL,
+    started_at TEXT,
+    completed_at TEXT,
+    expires_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_exports_latest ON exports(application_id, requirement_code, status, completed_at);
+CREATE INDEX IF NOT EXISTS idx_exports_expires ON exports(expires_at);
+"""
+
+_COLUMNS = ('id', 'application_id', 'export_type', 'requirement_code', 'template_version_map', 'storage_path',
+            'file_name', 'file_size_bytes', 'status', 'error_message', 'requested_by', 'owner',
+            'created_at', 'started_at', 'completed_at', 'expires_at')
+_TIMESTAMPS = ('created_at', 'started_at', 'completed_at', 'expires_at')
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[str]:
+    # Fixed-width UTC ISO strings compare in time order
+    return value.astimezone(timezone.utc).isoformat(timespec='microseconds') if value else None
+
+
+class SQLiteExportJobRepository(ExportJobRepository):
+    """exports in a SQLite database (':memory:' for tests)."""
+
+    def __init__(self, path: Union[str, Path] = ':memory:'):
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        self._conn.executescript(_SCHEMA)
+        columns = {row['name'] for row in self._conn.execute('PRAGMA table_info(exports)')}
+        if 'owner' not in columns:
+            # Databases created before jobs recorded their owner
+            self._conn.execute('ALTER TABLE exports ADD COLUMN owner TEXT')
+
+    def _job(self, row: sqlite3.Row) -> ExportJob:
+        data: Dict[str, Any] = dict(row)
+        data['template_version_map'] = json.loads(data['template_version_map'])
+        for key in _TIMESTAMPS:
+            if data[key] is not None:
+                data[key] = datetime.fromisoformat(data[key])
+        return ExportJob(**data)
+
+    def save(self, job: ExportJob):
+        data = asdict(job)
+        data['template_version_map'] = json.dumps(job.template_version_map)
+        for key in _TIMESTAMPS:
+            data[key] = _timestamp(data[key])
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO exports ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})",
+                [data[column] for column in _COLUMNS],
+            )
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        with self._lock:
+            row = self._conn.execute('SELECT * FROM exports WHERE id = ?', (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def latest_done(self, application_id, requirement_code, now):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM exports WHERE application_id = ? AND requirement_code IS ? AND status = 'DONE' "
+                "AND (expires_at IS NULL OR expires_at > ?) ORDER BY completed_at DESC LIMIT 1",
+                (application_id, requirement_code, _timestamp(now)),
+            ).fetchone()
+        return self._job(row) if row else None
+
+    def expired(self, now: datetime) -> List[ExportJob]:
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT * FROM exports WHERE expires_at <= ?', (_timestamp(now),)
+            ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def delete(self, job_ids: List[str]):
+        with self._lock:
+            self._conn.executemany('DELETE FROM exports WHERE id = ?', [(job_id,) for job_id in job_ids])
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute('SELECT status, COUNT(*) FROM exports GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    def fail_unfinished(self, message: str, now: datetime, owner_gone: Callable[[Optional[str]], bool]) -> List[str]:
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                ids = [row[0] for row in self._conn.execute(
+                    "SELECT id, owner FROM exports WHERE status IN ('QUEUED', 'RUNNING')"
+                ) if owner_gone(row[1])]
+                self._conn.executemany(
+                    "UPDATE exports SET status = 'FAILED', error_message = ?, completed_at = ? WHERE id = ?",
+                    [(message, _timestamp(now), job_id) for job_id in ids],
+                )
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+        return ids
+
+
+def _process_owner() -> str:
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _owner_gone(owner: Optional[str]) -> bool:
+    """Whether the process that owned a job is gone (jobs from before owners were recorded count as gone)."""
+    if owner is None:
+        return True
+    host, _, pid = owner.rpartition(':')
+    if host != socket.gethostname():
+        return False
+    if int(pid) == os.getpid():
+        # A queue this process ran before the current one
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+class ExportJobQueue:
+    """
+    Worker threads that run export builds, with job state in a repository.
+
+    Every state change is a new ExportJob saved in one write, so readers see
+    either the previous or the next state. Jobs left QUEUED or RUNNING by a
+    process that is gone are marked FAILED on startup (their builds are lost);
+    see the module docstring.
+    """
+
+    def __init__(
+        self,
+        storage: StorageBackend,
+        workers: int = 2,
+        ttl: timedelta = timedelta(hours=24),
+        repository: Optional[ExportJobRepository] = None,
+        purge_interval: float = 600.0,
+    ):
+        self.storage = storage
+        self.ttl = ttl
+        self.repository = repository or get_export_job_repository()
+        self.purge_interval = purge_interval
+        self.owner = _process_owner()
+        interrupted = self.repository.fail_unfinished('Interrupted by a server restart', _now(), _owner_gone)
+        if interrupted:
+            logger.warning("Marked %d unfinished export jobs as FAILED", len(interrupted))
+        self._queue: "queue.Queue" = queue.Queue()
+        self._stopping = threading.Event()
+        self._threads = [
+            threading.Thread(target=self._worker, name=f'export-job-{i}', daemon=True)
+            for i in range(workers)
+        ]
+        self._purger = threading.Thread(target=self._purge_periodically, name='export-job-purge', daemon=True)
+        for thread in (*self._threads, self._purger):
+            thread.start()
+
+    def enqueue(self, job: ExportJob, build: BuildFn) -> ExportJob:
+        """
+        Register a QUEUED job, owned by this queue's process, and hand it to the
+        workers. Returns the registered job (read its progress with get).
+        """
+        if job.export_type not in EXPORT_TYPES:
+            raise ValueError(f"Unknown export type: {job.export_type}")
+        job = replace(job, owner=self.owner)
+        self.repository.save(job)
+        self._queue.put((job, build))
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        return self.repository.get(job_id)
+
+    def latest_done(self, application_id: str, requirement_code: Optional[str]) -> Optional[ExportJob]:
+        """Most recent finished, unexpired export of an application/requirement."""
+        return self.repository.latest_done(application_id, requirement_code, _now())
+
+    def purge_expired(self) -> List[str]:
+        """Delete jobs past their expires_at and their artifacts."""
+        expired = self.repository.expired(_now())
+        # Artifacts first: if this is interrupted, the rows are found again next time
+        for job in expired:
+            if job.storage_path:
+                self.storage.delete(job.storage_path)
+        self.repository.delete([job.id for job in expired])
+        return [job.id for job in expired]
+
+    def _purge_periodically(self):
+        while not self._stopping.wait(self.purge_interval):
+            try:
+                self.purge_expired()
+            except Exception:
+                logger.exception("Purging expired export jobs failed")
+
+    def stats(self) -> Dict[str, int]:
+        counts = {status: 0 for status in ('QUEUED', 'RUNNING', 'DONE', 'FAILED')}
+        counts.update(self.repository.counts())
+        counts['backlog'] = self._queue.qsize()
+        return counts
+
+    def shutdown(self):
+        self._stopping.set()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in (*self._threads, self._purger):
+            thread.join()
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self._run(*item)
+
+    def _run(self, job: ExportJob, build: BuildFn):
+        job = replace(job, status='RUNNING', started_at=_now())
+        self.repository.save(job)
+        path = f"exports/{job.application_id}/{job.id}/{job.file_name}"
+        try:
+            result = build()
+            chunks = [result] if isinstance(result, (bytes, bytearray)) else result
+            size = self.storage.put(path, chunks)
+            completed_at = _now()
+            job = replace(
+                job, status='DONE', storage_path=path, file_size_bytes=size,
+                completed_at=completed_at, expires_at=completed_at + self.ttl,
+            )
+        except Exception as e:
+            logger.error("Export job %s failed: %s", job.id, e)
+            job = replace(job, status='FAILED', error_message=str(e), completed_at=_now())
+        self.repository.save(job)
+
+
+_repository: Optional[ExportJobRepository] = None
+_repository_lock = threading.Lock()
+
+
+def get_export_job_repository() -> ExportJobRepository:
+    """
+    Return the configured export job repository.
+
+    Uses a SQLiteExportJobRepository at EXPORT_JOBS_DB_PATH
+    (default: src/backend/storage/exports.sqlite3).
+    """
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            default_path = os.path.join(os.path.dirname(__file__), '..', 'storage', 'exports.sqlite3')
+            _repository = SQLiteExportJobRepository(os.environ.get('EXPORT_JOBS_DB_PATH') or default_path)
+        return _repository
+
+
+def set_export_job_repository(repository: ExportJobRepository):
+    """Install a different repository (e.g. one backed by Supabase)."""
+    global _repository
+    with _repository_lock:
+        _repository = repository
+
+
+_job_queue: Optional[ExportJobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> ExportJobQueue:
+    """
+    Return the process-wide export job queue.
+
+    Sized from EXPORT_JOB_WORKERS (default 2); artifacts expire after
+    EXPORT_TTL_HOURS (default 24) and are purged every EXPORT_PURGE_MINUTES
+    (default 10).
+    """
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = ExportJobQueue(
+                storage=get_storage(),
+                workers=max(1, int(os.environ.get('EXPORT_JOB_WORKERS', 2))),
+                ttl=timedelta(hours=float(os.environ.get('EXPORT_TTL_HOURS', 24))),
+                purge_interval=float(os.environ.get('EXPORT_PURGE_MINUTES', 10)) * 60,
+            )
+        return _job_queue
+
+
+def shutdown_job_queue():
+    """Let the workers finish queued jobs and stop (called on shutdown)."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is not None:
+            _job_queue.shutdown()
+            _job_queue = None
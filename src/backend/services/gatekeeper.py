@@ -0,0 +1,212 @@
+"""
+Gatekeeper - Pre-export checks with live per-application counters
+Sistema de Preevaluación Sandbox IA España
+
+spec/workflow_states.md gates COMPLETED → EXPORTED on three rules:
+
+1. every additional measure (MA) is linked to at least one requirement,
+2. every MA attachment URL is valid,
+3. no MG assessment is pending (diagnosis_status '00').
+
+Instead of rescanning an application's assessments on every check, the
+Gatekeeper listens to the assessment repository and keeps, per application,
+the offending rows and per-requirement counters up to date as rows are
+written. An application's state is loaded from the repository the first time
+it is checked; from then on a check reads the counters and costs the same
+however many assessments the application has.
+
+An application with no assessments and no MAs is reported as unknown
+(known: false) and does not pass: an id that was never assessed, or a typo,
+must not be exportable.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+import threading
+
+from services.assessments import ApplicationStateCache, AssessmentKey, get_assessment_repository
+from services.executor import get_executor
+
+# Counter names, in report order
+CHECKS = ('pending_mg', 'unlinked_ma', 'invalid_attachments')
+
+ATTACHMENT_SCHEMES = ('http', 'https')
+
+
+def is_valid_attachment_url(url: Optional[str]) -> bool:
+    """
+    An absolute http(s) URL with a host and no whitespace. A missing
+    attachment is not an invalid one (the MA is just undocumented).
+    """
+    if url is None:
+        return True
+    if not url or any(c.isspace() for c in url):
+        return False
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return False
+    return parts.scheme.lower() in ATTACHMENT_SCHEMES and bool(parts.hostname)
+
+
+class GatekeeperFailed(Exception):
+    """An export was requested for an application that does not pass the Gatekeeper."""
+
+    def __init__(self, report: Dict[str, Any]):
+        super().__init__(f"Application {report['application_id']} does not pass the Gatekeeper")
+        self.report = report
+
+
+class _ApplicationState:
+    """Offending rows and counters of one application."""
+
+    __slots__ = ('assessed', 'pending', 'measures', 'counters', 'totals')
+
+    def __init__(self):
+        # Whether any MG row has been seen (MG rows are never deleted)
+        self.assessed = False
+        # (mg_id, subpart_id) -> requirement code, pending rows only
+        self.pending: Dict[AssessmentKey, Optional[str]] = {}
+        # ma_id -> (requirement codes, attachment_url, attachment valid)
+        self.measures: Dict[str, Tuple[Tuple[str, ...], Optional[str], bool]] = {}
+        # requirement code -> non-zero counts by CHECKS (MAs without a
+        # requirement only count in the totals)
+        self.counters: Dict[str, List[int]] = {}
+        self.totals = [0, 0, 0]
+
+    def _count(self, requirements: Tuple[Optional[str], ...], check: int, delta: int):
+        self.totals[check] += delta
+        for requirement in requirements:
+            if requirement is None:
+                continue
+            counts = self.counters.setdefault(requirement, [0, 0, 0])
+            counts[check] += delta
+            if not any(counts):
+                del self.counters[requirement]
+
+    @property
+    def known(self) -> bool:
+        return self.assessed or bool(self.measures)
+
+    def set_mg(self, row: Dict[str, Any]):
+        self.assessed = True
+        key = (row['measure_id'], row['subpart_id'])
+        was_pending = key in self.pending
+        is_pending = row.get('diagnosis_status') == '00'
+        if was_pending:
+            self._count((self.pending.pop(key),), 0, -1)
+        if is_pending:
+            self.pending[key] = row.get('requirement_code')
+            self._count((row.get('requirement_code'),), 0, 1)
+
+    def set_ma(self, measure: Dict[str, Any]):
+        self.remove_ma(measure['id'])
+        codes = tuple(measure.get('requirement_codes') or ())
+        url = measure.get('attachment_url')
+        valid = is_valid_attachment_url(url)
+        self.measures[measure['id']] = (codes, url, valid)
+        if not codes:
+            self._count((), 1, 1)
+        if not valid:
+            # Counted once in the totals, once under each linked requirement
+            self._count(codes, 2, 1)
+
+    def remove_ma(self, ma_id: str):
+        previous = self.measures.pop(ma_id, None)
+        if previous is None:
+            return
+        codes, _, valid = previous
+        if not codes:
+            self._count((), 1, -1)
+        if not valid:
+            self._count(codes, 2, -1)
+
+
+class Gatekeeper(ApplicationStateCache):
+    """Pre-export checks over a repository's applications (see module docstring)."""
+
+    def _new_state(self) -> _ApplicationState:
+        return _ApplicationState()
+
+    def _load(self, state: _ApplicationState, application_id: str):
+        super()._load(state, application_id)
+        for measure in self.repository.list_ma(application_id):
+            state.set_ma(measure)
+
+    def _mg_changed(self, state: _ApplicationState, rows: List[Dict[str, Any]]):
+        for row in rows:
+            state.set_mg(row)
+
+    def _ma_changed(self, state: _ApplicationState, measure: Dict[str, Any]):
+        state.set_ma(measure)
+
+    def _ma_removed(self, state: _ApplicationState, ma_id: str):
+        state.remove_ma(ma_id)
+
+    # ---- checks ----
+
+    def check(self, application_id: str) -> Dict[str, Any]:
+        """
+        Pass/fail and counters, overall and per requirement (non-zero ones;
+        MAs without a requirement only appear in the overall counts). Unknown
+        applications (no rows) do not pass.
+        """
+        known, totals, requirements = self.read(application_id, lambda state: (
+            state.known,
+            dict(zip(CHECKS, state.totals)),
+            {code: dict(zip(CHECKS, counts)) for code, counts in sorted(state.counters.items())},
+        ))
+        return {
+            'application_id': application_id,
+            'known': known,
+            'passed': known and not any(totals.values()),
+            'checks': totals,
+            'requirements': requirements,
+        }
+
+    def offenders(self, application_id: str) -> Dict[str, List[Dict[str, Any]]]:
+        """The rows behind each non-zero counter."""
+        pending, measures = self.read(
+            application_id, lambda state: (sorted(state.pending.items()), sorted(state.measures.items())),
+        )
+        return {
+            'pending_mg': [
+                {'mg_id': mg_id, 'subpart_id': subpart_id, 'requirement_code': code}
+                for (mg_id, subpart_id), code in pending
+            ],
+            'unlinked_ma': [{'ma_id': ma_id} for ma_id, (codes, _, _) in measures if not codes],
+            'invalid_attachments': [
+                {'ma_id': ma_id, 'attachment_url': url, 'requirement_codes': list(codes)}
+                for ma_id, (codes, url, valid) in measures if not valid
+            ],
+        }
+
+    def ensure_exportable(self, application_id: str) -> Dict[str, Any]:
+        """Return the check report, or raise GatekeeperFailed (with the offending rows)."""
+        report = self.check(application_id)
+        if not report['passed']:
+            raise GatekeeperFailed({**report, 'offenders': self.offenders(application_id)})
+        return report
+
+
+_gatekeeper: Optional[Gatekeeper] = None
+_gatekeeper_lock = threading.Lock()
+
+
+def get_gatekeeper() -> Gatekeeper:
+    """Return the Gatekeeper of the configured assessment repository."""
+    global _gatekeeper
+    repository = get_assessment_repository()
+    with _gatekeeper_lock:
+        if _gatekeeper is None or _gatekeeper.repository is not repository:
+            if _gatekeeper is not None:
+                _gatekeeper.close()
+            _gatekeeper = Gatekeeper(repository)
+        return _gatekeeper
+
+
+async def check_exportable(application_id: str) -> Dict[str, Any]:
+    """
+    Gatekeeper.ensure_exportable for async handlers, run on the executor's I/O
+    lane: the first check of an application reads its rows from the repository.
+    """
+    return await get_executor().run_io(get_gatekeeper().ensure_exportable, application_id)
@@ -0,0 +1,76 @@
+"""
+HTTP Cache - Pre-serialized responses for static endpoints
+Sistema de Preevaluación Sandbox IA España
+
+Catalog and template listings change only when their source changes, so their
+JSON is serialized once per source version and served as bytes. The ETag is
+derived from that version; clients revalidate with If-None-Match and get a 304
+while nothing has changed.
+"""
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+import json
+import os
+import threading
+
+from fastapi.responses import Response
+
+from services.result_cache import canonical_digest, etag_matches, make_etag
+
+
+def directory_version(path: Union[str, Path]) -> str:
+    """
+    Version of a directory's listing: its mtime changes whenever an entry is
+    added, removed or renamed (one stat instead of one per file).
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return f'{path}:missing'
+    return f'{os.path.realpath(path)}:{stat.st_mtime_ns}'
+
+
+class StaticResponseCache:
+    """Serialized JSON bodies keyed by endpoint, rebuilt when the version changes."""
+
+    def __init__(self, max_age: int):
+        self.max_age = max_age
+        self.builds = 0
+        self._entries: Dict[str, Tuple[str, bytes, str]] = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, key: str, version: str, build: Callable[[], Any]) -> Tuple[bytes, str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != version:
+                body = json.dumps(build(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                entry = (version, body, make_etag(canonical_digest(key, version)))
+                self._entries[key] = entry
+                self.builds += 1
+            return entry[1], entry[2]
+
+    def respond(self, key: str, version: str, build: Callable[[], Any], if_none_match: Optional[str] = None) -> Response:
+        """JSON response for `key` at `version`, or 304 if the client's copy is current."""
+        body, etag = self._entry(key, version, build)
+        headers = {'ETag': etag, 'Cache-Control': f'public, max-age={self.max_age}, must-revalidate'}
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type='application/json', headers=headers)
+
+
+_static_responses: Optional[StaticResponseCache] = None
+_static_responses_lock = threading.Lock()
+
+
+def get_static_responses() -> StaticResponseCache:
+    """
+    Return the process-wide static response cache.
+
+    Browsers may reuse a response for HTTP_CACHE_MAX_AGE seconds (default
+    3600) before revalidating it with its ETag.
+    """
+    global _static_responses
+    with _static_responses_lock:
+        if _static_responses is None:
+            _static_responses = StaticResponseCache(max_age=int(os.environ.get('HTTP_CACHE_MAX_AGE', 3600)))
+        return _static_responses
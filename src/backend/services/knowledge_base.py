@@ -0,0 +1,548 @@
+"""
+Knowledge Base - Offline full-text index over the sandbox documentation
+Sistema de Preevaluación Sandbox IA España
+
+Indexes the knowledge base shipped in `Info soporte/` (AESIA guides,
+Reglamento UE 2024/1689, RD 817/2023, procedures, and the master guide and
+index in markdown). Text is extracted page by page (markdown files are paged
+by heading), cut into short passages and written to a single binary file:
+
+- a sorted term dictionary, looked up by binary search;
+- per-term postings (passage id, term frequency);
+- a passage table (document, page, length) and the passage texts.
+
+Every section is a flat little-endian array, so the file is mmapped and
+queried in place: loading it costs one open() regardless of its size.
+Rebuilding reuses the passages of documents whose size and mtime (or
+content hash) did not change, so only new or modified PDFs are re-extracted.
+
+Terms are normalized for Spanish: case and accents are folded
+("Artículo" -> "articulo"), stopwords dropped and plurals reduced.
+"""
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import hashlib
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+_ROOT = Path(__file__).resolve().parents[3]
+DEFAULT_SOURCE_DIR = _ROOT / 'Info soporte' / 'knowledge_base_sandbox_ia_completa 3'
+DEFAULT_INDEX_PATH = Path(__file__).resolve().parents[1] / 'storage' / 'kb_index.bin'
+
+# Bump when normalization or passage splitting changes: older indexes are rebuilt
+INDEX_VERSION = 1
+MAGIC = b'KBIX'
+
+# Words per passage; a page longer than this yields several passages
+PASSAGE_WORDS = 120
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SOURCE_SUFFIXES = ('.pdf', '.md')
+
+
+# ============ Normalization ============
+
+STOPWORDS = frozenset('''
+a al algo ante antes aquel aquella aquellas aquellos asi aun bajo bien cada como con contra cual cuales
+cuando de del desde donde dos durante e el ella ellas ellos en entre era es esa esas ese eso esos esta
+estas este esto estos fue fueron ha han hasta hay la las le les lo los mas me mi mientras muy ni no nos
+o os otra otras otro otros para pero poco por porque que quien se sea segun ser si sido sin sino sobre
+su sus tal tambien tan tanto te tiene tienen todo todos tras tu un una unas uno unos y ya
+'''.split())
+
+# Plural endings and their singular form, longest first
+_PLURAL_SUFFIXES = (
+    ('iones', 'ion'), ('dades', 'dad'), ('ables', 'able'), ('ibles', 'ible'),
+    ('ales', 'al'), ('ores', 'or'), ('ces', 'z'),
+)
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+_COMBINING = {c: None for c in range(0x300, 0x370)}
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents (ñ folds to n, ü to u)."""
+    return unicodedata.normalize('NFKD', text.casefold()).translate(_COMBINING)
+
+
+def stem(word: str) -> str:
+    """Light Spanish plural reduction: "medidas" -> "medida", "funciones" -> "funcion"."""
+    if len(word) <= 4 or word.isdigit():
+        return word
+    for suffix, singular in _PLURAL_SUFFIXES:
+        if word.endswith(suffix):
+            return word[:-len(suffix)] + singular
+    if word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Index terms of a text, in order (stopwords removed)."""
+    return [stem(word) for word in _WORD_RE.findall(fold(text)) if word not in STOPWORDS]
+
+
+# ============ Extraction ============
+
+@dataclass
+class Page:
+    """Text of one page; markdown pages carry the heading they start at."""
+    number: int
+    text: str
+    section: Optional[str] = None
+
+
+def extract_pdf_pages(path: Path) -> List[Page]:
+    """Text of every page of a PDF (pages without text are kept, empty)."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise RuntimeError("Indexing PDFs requires pypdf (pip install pypdf)")
+    reader = PdfReader(str(path))
+    return [Page(number, page.extract_text() or '') for number, page in enumerate(reader.pages, start=1)]
+
+
+_HEADING_RE = re.compile(r'^#{1,6}\s+(.*\S)\s*$')
+_TABLE_RULE_RE = re.compile(r'^\s*\|?[\s:|-]+\|?\s*$')
+
+
+def extract_markdown_pages(path: Path) -> List[Page]:
+    """One page per heading section, numbered in document order."""
+    pages: List[Page] = []
+    section, lines = None, []
+
+    def flush():
+        text = '\n'.join(lines).strip()
+        if text or section:
+            pages.append(Page(len(pages) + 1, text, section))
+
+    for line in path.read_text(encoding='utf-8').splitlines():
+        heading = _HEADING_RE.match(line)
+        if heading:
+            flush()
+            section, lines = heading.group(1).strip('*_ '), [heading.group(1)]
+        elif not _TABLE_RULE_RE.match(line):
+            lines.append(line)
+    flush()
+    return pages
+
+
+def extract_pages(path: Path) -> List[Page]:
+    if path.suffix.lower() == '.md':
+        return extract_markdown_pages(path)
+    return extract_pdf_pages(path)
+
+
+def split_passages(text: str, words: int = PASSAGE_WORDS) -> List[str]:
+    """Cut a page into passages of at most `words` words (whitespace collapsed)."""
+    tokens = text.split()
+    return [' '.join(tokens[i:i + words]) for i in range(0, len(tokens), words)]
+
+
+def discover_sources(source_dir: Path) -> List[Path]:
+    """PDF and markdown files under source_dir, in a stable order."""
+    return sorted(
+        path for path in Path(source_dir).rglob('*')
+        if path.is_file() and path.suffix.lower() in SOURCE_SUFFIXES
+    )
+
+
+def _file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _title_of(path: Path, pages: Sequence[Page]) -> str:
+    if path.suffix.lower() == '.md' and pages and pages[0].section:
+        return pages[0].section
+    return path.stem.replace('_', ' ')
+
+
+def _extract_document(path: Path, extract: Callable[[Path], List[Page]]) -> Tuple[Dict[str, Any], List[Tuple[int, str]]]:
+    """Document metadata and its (page, passage text) list; failures are recorded, not raised."""
+    doc: Dict[str, Any] = {'pages': 0, 'sections': {}}
+    passages: List[Tuple[int, str]] = []
+    try:
+        pages = extract(path)
+    except Exception as e:
+        doc['error'] = f'{type(e).__name__}: {e}'
+        doc['title'] = _title_of(path, [])
+        return doc, passages
+    doc['title'] = _title_of(path, pages)
+    doc['pages'] = len(pages)
+    for page in pages:
+        if page.section:
+            doc['sections'][str(page.number)] = page.section
+        passages.extend((page.number, text) for text in split_passages(page.text))
+    return doc, passages
+
+
+# ============ Index file ============
+
+# magic, format version, 8 × (offset, length) sections, total passage tokens
+_HEADER = struct.Struct('<4sI16QQ')
+_SECTIONS = (
+    'meta', 'term_offsets', 'terms', 'term_postings',
+    'posting_passages', 'posting_tfs', 'passages', 'texts',
+)
+# doc, page, token count, text offset, text length
+_PASSAGE_FIELDS = 5
+
+
+def _u32(values: Iterable[int]) -> bytes:
+    data = array('I', values)
+    if sys.byteorder != 'little':
+        data.byteswap()
+    return data.tobytes()
+
+
+def _u32_view(buffer: memoryview):
+    if sys.byteorder == 'little':
+        return buffer.cast('I')
+    data = array('I', buffer.tobytes())
+    data.byteswap()
+    return data
+
+
+def write_index(path: Path, docs: List[Dict[str, Any]], passages: List[Tuple[int, int, str]]):
+    """
+    Write an index for `passages` [(doc id, page, text)] atomically to path.
+
+    docs[i] is the metadata of doc id i; it is stored as JSON in the file.
+    """
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    table: List[int] = []
+    texts = bytearray()
+    total_tokens = 0
+    for passage_id, (doc_id, page, text) in enumerate(passages):
+        terms = tokenize(text)
+        counts: Dict[str, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, tf in counts.items():
+            postings.setdefault(term, []).append((passage_id, tf))
+        encoded = text.encode('utf-8')
+        table.extend((doc_id, page, len(terms), len(texts), len(encoded)))
+        texts += encoded
+        total_tokens += len(terms)
+
+    terms_sorted = sorted(postings, key=lambda t: t.encode('utf-8'))
+    term_blob = bytearray()
+    term_offsets, term_postings, posting_passages, posting_tfs = [0], [0], [], []
+    for term in terms_sorted:
+        term_blob += term.encode('utf-8')
+        term_offsets.append(len(term_blob))
+        for passage_id, tf in postings[term]:
+            posting_passages.append(passage_id)
+            posting_tfs.append(tf)
+        term_postings.append(len(posting_passages))
+
+    meta = {'version': INDEX_VERSION, 'built_at': time.time(), 'docs': docs}
+    sections = [
+        json.dumps(meta, ensure_ascii=False).encode('utf-8'),
+        _u32(term_offsets), bytes(term_blob), _u32(term_postings),
+        _u32(posting_passages), _u32(posting_tfs), _u32(table), bytes(texts),
+    ]
+    layout, position = [], _HEADER.size
+    for data in sections:
+        position += -position % 8
+        layout.extend((position, len(data)))
+        position += len(data)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f'.{path.name}.{os.getpid()}.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(_HEADER.pack(MAGIC, INDEX_VERSION, *layout, total_tokens))
+        for (offset, _), data in zip(zip(layout[::2], layout[1::2]), sections):
+            f.write(b'\0' * (offset - f.tell()))
+            f.write(data)
+    os.replace(tmp, path)
+
+
+class KnowledgeBaseIndex:
+    """A built index, mmapped read-only and searched in place."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, version, *layout, total_tokens = _HEADER.unpack_from(view)
+        if magic != MAGIC or version != INDEX_VERSION:
+            raise ValueError(f"Not a knowledge base index (v{INDEX_VERSION}): {self.path}")
+        sections = {
+            name: view[offset:offset + length]
+            for name, offset, length in zip(_SECTIONS, layout[::2], layout[1::2])
+        }
+        meta = json.loads(bytes(sections['meta']))
+        self.docs: List[Dict[str, Any]] = meta['docs']
+        self.built_at: float = meta['built_at']
+        self._term_offsets = _u32_view(sections['term_offsets'])
+        self._terms = sections['terms']
+        self._term_postings = _u32_view(sections['term_postings'])
+        self._posting_passages = _u32_view(sections['posting_passages'])
+        self._posting_tfs = _u32_view(sections['posting_tfs'])
+        self._passages = _u32_view(sections['passages'])
+        self._texts = sections['texts']
+        self.term_count = len(self._term_offsets) - 1
+        self.passage_count = len(self._passages) // _PASSAGE_FIELDS
+        self.average_length = total_tokens / self.passage_count if self.passage_count else 0.0
+        self.version = hashlib.sha256(bytes(view[:_HEADER.size]) + bytes(sections['meta'])).hexdigest()
+
+    def _find(self, term: str) -> Optional[int]:
+        """Position of term in the dictionary (binary search over the mmapped terms)."""
+        key = term.encode('utf-8')
+        offsets, terms = self._term_offsets, self._terms
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            candidate = terms[offsets[mid]:offsets[mid + 1]].tobytes()
+            if candidate < key:
+                lo = mid + 1
+            elif candidate > key:
+                hi = mid
+            else:
+                return mid
+        return None
+
+    def postings(self, term: str) -> List[Tuple[int, int]]:
+        """(passage id, term frequency) pairs of a normalized term."""
+        position = self._find(term)
+        if position is None:
+            return []
+        start, end = self._term_postings[position], self._term_postings[position + 1]
+        return list(zip(self._posting_passages[start:end], self._posting_tfs[start:end]))
+
+    def passage(self, passage_id: int) -> Tuple[int, int, int, str]:
+        """(doc id, page, token count, text) of a passage."""
+        base = passage_id * _PASSAGE_FIELDS
+        doc_id, page, length, offset, size = self._passages[base:base + _PASSAGE_FIELDS]
+        return doc_id, page, length, self._texts[offset:offset + size].tobytes().decode('utf-8')
+
+    def _length(self, passage_id: int) -> int:
+        return self._passages[passage_id * _PASSAGE_FIELDS + 2]
+
+    def _doc_of(self, passage_id: int) -> int:
+        return self._passages[passage_id * _PASSAGE_FIELDS]
+
+    def search(self, query: str, limit: int = 10, doc_prefix: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Rank passages for a free-text query with BM25.
+
+        doc_prefix restricts results to documents whose path starts with it
+        (e.g. "guias_aesia/" or "normativa/Reglamento").
+        Returns {'total': matching passages, 'results': [...]}, best first.
+        """
+        allowed = None
+        if doc_prefix:
+            allowed = {i for i, doc in enumerate(self.docs) if doc['path'].startswith(doc_prefix)}
+        scores: Dict[int, float] = {}
+        n = self.passage_count
+        for term in dict.fromkeys(tokenize(query)):
+            postings = self.postings(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for passage_id, tf in postings:
+                if allowed is not None and self._doc_of(passage_id) not in allowed:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self._length(passage_id) / self.average_length)
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+        results = []
+        for passage_id, score in heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0])):
+            doc_id, page, _, text = self.passage(passage_id)
+            doc = self.docs[doc_id]
+            result = {
+                'doc': doc['path'],
+                'title': doc['title'],
+                'page': page,
+                'score': round(score, 4),
+                'text': text,
+            }
+            section = doc['sections'].get(str(page))
+            if section:
+                result['section'] = section
+            results.append(result)
+        return {'total': len(scores), 'results': results}
+
+    def document_passages(self, doc_id: int) -> List[Tuple[int, str]]:
+        """(page, text) of every passage of a document, in order."""
+        first, count = self.docs[doc_id]['passages']
+        return [self.passage(i)[1::2] for i in range(first, first + count)]
+
+    def close(self):
+        for name in ('_term_offsets', '_terms', '_term_postings', '_posting_passages',
+                     '_posting_tfs', '_passages', '_texts'):
+            view = getattr(self, name)
+            if isinstance(view, memoryview):
+                view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # A caller still holds a slice; the mapping goes away with it
+            pass
+
+
+def open_index(path: Path) -> Optional[KnowledgeBaseIndex]:
+    """The index at path, or None if it is missing or from another format version."""
+    try:
+        return KnowledgeBaseIndex(path)
+    except (FileNotFoundError, ValueError, struct.error) as e:
+        logger.info("No usable knowledge base index at %s: %s", path, e)
+        return None
+
+
+# ============ Build ============
+
+def build_index(
+    source_dir: Path,
+    index_path: Path,
+    force: bool = False,
+    workers: int = 1,
+    extract: Callable[[Path], List[Page]] = extract_pages,
+) -> Dict[str, List[str]]:
+    """
+    (Re)build the index of every source under source_dir into index_path.
+
+    Documents already in the previous index are reused when their size and
+    mtime match, or failing that their SHA-256 (unless force); documents whose
+    extraction failed are always extracted again. The others are
+    extracted, in a process pool when workers > 1.
+    Returns {"indexed": [...], "reused": [...], "removed": [...], "failed": [...]}
+    relative paths.
+    """
+    source_dir = Path(source_dir)
+    previous = None if force else open_index(index_path)
+    known = {doc['path']: (i, doc) for i, doc in enumerate(previous.docs)} if previous else {}
+
+    entries: List[Tuple[str, Path, Dict[str, Any], Optional[int]]] = []
+    for path in discover_sources(source_dir):
+        relative = path.relative_to(source_dir).as_posix()
+        stat = path.stat()
+        signature = {'path': relative, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        old_id, old = known.get(relative, (None, None))
+        if old is not None and 'error' in old:
+            # A failed extraction may have been transient; always retry it
+            old_id = None
+        if old is not None and (old['size'], old['mtime_ns']) == (stat.st_size, stat.st_mtime_ns):
+            signature['sha256'] = old['sha256']
+        else:
+            signature['sha256'] = _file_sha256(path)
+            if old is None or old['sha256'] != signature['sha256']:
+                old_id = None
+        entries.append((relative, path, signature, old_id))
+
+    pending = [path for _, path, _, old_id in entries if old_id is None]
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            extracted = dict(zip(pending, pool.map(_extract_document, pending, [extract] * len(pending))))
+    else:
+        extracted = {path: _extract_document(path, extract) for path in pending}
+
+    report: Dict[str, List[str]] = {'indexed': [], 'reused': [], 'removed': [], 'failed': []}
+    docs: List[Dict[str, Any]] = []
+    passages: List[Tuple[int, int, str]] = []
+    for relative, path, signature, old_id in entries:
+        if old_id is not None:
+            old = previous.docs[old_id]
+            doc = {k: old[k] for k in ('title', 'pages', 'sections', 'error') if k in old}
+            doc_passages = previous.document_passages(old_id)
+            report['reused'].append(relative)
+        else:
+            doc, doc_passages = extracted[path]
+            report['failed' if 'error' in doc else 'indexed'].append(relative)
+            if 'error' in doc:
+                logger.warning("Could not extract %s: %s", relative, doc['error'])
+        doc.update(signature, passages=[len(passages), len(doc_passages)])
+        passages.extend((len(docs), page, text) for page, text in doc_passages)
+        docs.append(doc)
+    report['removed'] = sorted(set(known) - {relative for relative, *_ in entries})
+
+    write_index(index_path, docs, passages)
+    if previous is not None:
+        previous.close()
+    return report
+
+
+# ============ Store ============
+
+class KnowledgeBaseStore:
+    """
+    Holds the open index and reopens it when the file is replaced (a rebuild
+    swaps it atomically). Checks are throttled to one stat() per `check_interval`.
+    """
+
+    def __init__(self, index_path: Path, check_interval: float = 2.0):
+        self.index_path = Path(index_path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._index: Optional[KnowledgeBaseIndex] = None
+        self._signature: Optional[Tuple] = None
+        self._checked_at = 0.0
+
+    def get(self) -> Optional[KnowledgeBaseIndex]:
+        """Current index, or None if it has not been built."""
+        now = time.monotonic()
+        if self._signature is not None and now - self._checked_at < self.check_interval:
+            return self._index
+        with self._lock:
+            self._checked_at = now
+            try:
+                stat = self.index_path.stat()
+                signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            except FileNotFoundError:
+                signature = ()
+            if signature != self._signature:
+                index = open_index(self.index_path) if signature else None
+                if self._index is not None and index is not None:
+                    logger.info("Knowledge base index reloaded from %s", self.index_path)
+                # The previous index is not closed here: a search that fetched it
+                # may still be reading it. Its mapping is unmapped when the last
+                # reference goes away.
+                self._index, self._signature = index, signature
+            return self._index
+
+
+_kb_store: Optional[KnowledgeBaseStore] = None
+_kb_store_lock = threading.Lock()
+
+
+def get_kb_store() -> KnowledgeBaseStore:
+    """
+    Return the process-wide knowledge base store.
+
+    Configured by KB_INDEX_PATH (default src/backend/storage/kb_index.bin)
+    and KB_RELOAD_SECONDS (how often the file is checked, default 2). The
+    index is built offline with tools/build_kb_index.py.
+    """
+    global _kb_store
+    with _kb_store_lock:
+        if _kb_store is None:
+            _kb_store = KnowledgeBaseStore(
+                index_path=Path(os.environ.get('KB_INDEX_PATH') or DEFAULT_INDEX_PATH),
+                check_interval=float(os.environ.get('KB_RELOAD_SECONDS', 2)),
+            )
+        return _kb_store
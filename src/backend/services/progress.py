@@ -0,0 +1,157 @@
+"""
+Progress - Per-application assessment progress summaries
+Sistema de Preevaluación Sandbox IA España
+
+For each requirement of an application: MG rows diagnosed and pending
+against the (MG, subpart) rows the catalog expects, a histogram of maturity
+levels L1-L8 and the distribution of adaptation plans 01-05. Summaries are
+maintained from the assessment repository's change events (an
+ApplicationStateCache) instead of being recomputed from raw rows, so a
+dashboard can read hundreds of applications in one request.
+
+Each application keeps one packed int per assessment row (to undo it when
+the row changes) and one array of counters per requirement.
+"""
+from array import array
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import os
+import threading
+
+from services.assessments import ApplicationStateCache, AssessmentKey, get_assessment_repository
+from services.catalog import Catalog, get_catalog
+from services.conversion_logic import MATURITY_LEVELS
+
+PLANS = ('01', '02', '03', '04', '05')
+
+# Counter layout per requirement
+_DIAGNOSED, _PENDING = 0, 1
+_MATURITY = 2
+_PLAN = _MATURITY + len(MATURITY_LEVELS)
+_WIDTH = _PLAN + len(PLANS)
+
+_MATURITY_INDEX = {level: i for i, level in enumerate(MATURITY_LEVELS)}
+_PLAN_INDEX = {plan: i for i, plan in enumerate(PLANS)}
+
+
+def _pack(row: Dict[str, Any]) -> int:
+    """Counter slots of a row: bit 0 diagnosed, bits 1-4 maturity + 1, bits 5-7 plan + 1 (0 = none)."""
+    maturity = _MATURITY_INDEX.get(row.get('maturity'), -1) + 1
+    plan = _PLAN_INDEX.get(row.get('adaptation_plan'), -1) + 1
+    return (row.get('diagnosis_status') == '01') | maturity << 1 | plan << 5
+
+
+def _unpack(packed: int) -> Tuple[int, ...]:
+    slots = [_DIAGNOSED if packed & 1 else _PENDING]
+    maturity, plan = packed >> 1 & 0xF, packed >> 5 & 0x7
+    if maturity:
+        slots.append(_MATURITY + maturity - 1)
+    if plan:
+        slots.append(_PLAN + plan - 1)
+    return tuple(slots)
+
+
+class _Progress:
+    __slots__ = ('rows', 'counters')
+
+    def __init__(self):
+        # (mg_id, subpart_id) -> (requirement code, packed slots)
+        self.rows: Dict[AssessmentKey, Tuple[str, int]] = {}
+        self.counters: Dict[str, array] = {}
+
+    def _add(self, requirement: str, packed: int, delta: int):
+        counts = self.counters.get(requirement)
+        if counts is None:
+            counts = self.counters[requirement] = array('l', [0]) * _WIDTH
+        for slot in _unpack(packed):
+            counts[slot] += delta
+
+    def set_row(self, row: Dict[str, Any]):
+        key = (row['measure_id'], row['subpart_id'])
+        value = (row.get('requirement_code') or '', _pack(row))
+        previous = self.rows.get(key)
+        if previous == value:
+            return
+        if previous is not None:
+            self._add(*previous, -1)
+        self.rows[key] = value
+        self._add(*value, 1)
+
+
+def _summarize(counts: Optional[array], expected: int) -> Dict[str, Any]:
+    counts = counts if counts is not None else (0,) * _WIDTH
+    diagnosed, pending = counts[_DIAGNOSED], counts[_PENDING]
+    return {
+        'expected': expected,
+        'diagnosed': diagnosed,
+        'pending': pending,
+        'not_started': max(expected - diagnosed - pending, 0),
+        'percent': round(100 * diagnosed / expected, 1) if expected else 0.0,
+        'maturity': dict(zip(MATURITY_LEVELS, counts[_MATURITY:_PLAN])),
+        'plans': dict(zip(PLANS, counts[_PLAN:_WIDTH])),
+    }
+
+
+class ProgressSummaries(ApplicationStateCache):
+    """Progress summaries of a repository's applications (see module docstring)."""
+
+    def __init__(self, repository, max_applications: Optional[int] = None):
+        super().__init__(repository, max_applications)
+        self._expected: Tuple[Optional[str], Dict[str, int]] = (None, {})
+
+    def _new_state(self) -> _Progress:
+        return _Progress()
+
+    def _mg_changed(self, state: _Progress, rows: List[Dict[str, Any]]):
+        for row in rows:
+            state.set_row(row)
+
+    def _expected_rows(self, catalog: Catalog) -> Dict[str, int]:
+        """(MG, subpart) rows per requirement, computed once per catalog version."""
+        version, expected = self._expected
+        if version != catalog.version:
+            expected = {code: len(catalog.relations(code)) for code in catalog.requirement_codes}
+            self._expected = (catalog.version, expected)
+        return expected
+
+    def summary(self, application_id: str, catalog: Optional[Catalog] = None) -> Dict[str, Any]:
+        """Per-requirement progress of one application, in catalog order, plus totals."""
+        expected = self._expected_rows(catalog or get_catalog())
+        counters = self.read(application_id, lambda state: {
+            code: array('l', counts) for code, counts in state.counters.items()
+        })
+        codes = list(expected) + sorted(set(counters) - set(expected))
+        totals = array('l', [0]) * _WIDTH
+        for counts in counters.values():
+            for slot, value in enumerate(counts):
+                totals[slot] += value
+        return {
+            'application_id': application_id,
+            'totals': _summarize(totals, sum(expected.values())),
+            'requirements': {code: _summarize(counters.get(code), expected.get(code, 0)) for code in codes},
+        }
+
+    def summaries(self, application_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        catalog = get_catalog()
+        return [self.summary(application_id, catalog) for application_id in dict.fromkeys(application_ids)]
+
+
+_summaries: Optional[ProgressSummaries] = None
+_summaries_lock = threading.Lock()
+
+
+def get_progress_summaries() -> ProgressSummaries:
+    """
+    Return the progress summaries of the configured assessment repository,
+    caching at most PROGRESS_CACHE_MAX_APPLICATIONS applications (default
+    10000; least recently read ones are rebuilt on demand).
+    """
+    global _summaries
+    repository = get_assessment_repository()
+    with _summaries_lock:
+        if _summaries is None or _summaries.repository is not repository:
+            if _summaries is not None:
+                _summaries.close()
+            _summaries = ProgressSummaries(
+                repository, int(os.environ.get('PROGRESS_CACHE_MAX_APPLICATIONS') or 10000),
+            )
+        return _summaries
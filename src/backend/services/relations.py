@@ -0,0 +1,156 @@
+"""
+Relations - Sparse relation matrices over interned identifiers
+Sistema de Preevaluación Sandbox IA España
+
+MG → subpart, MA → subpart and MG → requirement are boolean matrices with
+very few marks per row. A Relation interns both axes to dense integers and
+keeps one bitset (a Python int) per row and per column, so membership is a
+shift and a mask, and row / column queries and iteration cost one step per
+mark instead of one per cell. It is shared by the checklist extractor, the
+Excel engines and the catalog.
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+
+class Interner:
+    """Maps strings to dense integer ids, in first-seen order."""
+
+    __slots__ = ('_ids', '_names')
+
+    def __init__(self, values: Iterable[str] = ()):
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        for value in values:
+            self.intern(value)
+
+    def intern(self, value: str) -> int:
+        idx = self._ids.get(value)
+        if idx is None:
+            idx = self._ids[value] = len(self._names)
+            self._names.append(value)
+        return idx
+
+    def get(self, value: str) -> Optional[int]:
+        return self._ids.get(value)
+
+    def name(self, idx: int) -> str:
+        return self._names[idx]
+
+    def __contains__(self, value: str) -> bool:
+        return value in self._ids
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._names)
+
+
+def iter_bits(bits: int) -> Iterator[int]:
+    """Indices of the set bits of `bits`, lowest first."""
+    while bits:
+        low = bits & -bits
+        yield low.bit_length() - 1
+        bits ^= low
+
+
+class Relation:
+    """
+    Sparse boolean matrix between two interned axes.
+
+    Rows and columns may share an Interner (the catalog interns every id in
+    one table). Rows are listed in interning order, including rows without
+    marks, so a relation can also describe the row order of a rendered matrix.
+    """
+
+    __slots__ = ('rows', 'columns', '_row_bits', '_column_bits', '_marks')
+
+    def __init__(self, rows: Optional[Interner] = None, columns: Optional[Interner] = None):
+        self.rows = rows if rows is not None else Interner()
+        self.columns = columns if columns is not None else Interner()
+        self._row_bits: Dict[int, int] = {}
+        self._column_bits: Dict[int, int] = {}
+        self._marks = 0
+
+    @classmethod
+    def from_pairs(
+        cls, pairs: Iterable[Tuple[str, str]], rows: Optional[Interner] = None, columns: Optional[Interner] = None,
+    ) -> 'Relation':
+        relation = cls(rows, columns)
+        for row, column in pairs:
+            relation.add(row, column)
+        return relation
+
+    @classmethod
+    def from_matrix(cls, matrix: Dict[str, Sequence], columns: Sequence[str]) -> 'Relation':
+        """
+        From {row: marks} where marks are the row's column names, or (the
+        older dense form) one truthy/falsy flag per entry of `columns`.
+        """
+        relation = cls(Interner(matrix), Interner(columns))
+        for row, marks in matrix.items():
+            if marks and not isinstance(marks[0], str):
+                marks = [column for column, flag in zip(columns, marks) if flag]
+            for column in marks:
+                relation.add(row, column)
+        return relation
+
+    # ---- building ----
+
+    def add(self, row: str, column: str) -> bool:
+        """Mark (row, column); False if it was already marked."""
+        return self.add_ids(self.rows.intern(row), self.columns.intern(column))
+
+    def add_ids(self, r: int, c: int) -> bool:
+        bit = 1 << c
+        bits = self._row_bits.get(r, 0)
+        if bits & bit:
+            return False
+        self._row_bits[r] = bits | bit
+        self._column_bits[c] = self._column_bits.get(c, 0) | (1 << r)
+        self._marks += 1
+        return True
+
+    # ---- queries ----
+
+    def __len__(self) -> int:
+        """Number of marks."""
+        return self._marks
+
+    def __contains__(self, pair: Tuple[str, str]) -> bool:
+        r, c = self.rows.get(pair[0]), self.columns.get(pair[1])
+        return r is not None and c is not None and self.has_ids(r, c)
+
+    def has_ids(self, r: int, c: int) -> bool:
+        return bool(self._row_bits.get(r, 0) >> c & 1)
+
+    def row_ids(self, r: int) -> Iterator[int]:
+        return iter_bits(self._row_bits.get(r, 0))
+
+    def column_ids(self, c: int) -> Iterator[int]:
+        return iter_bits(self._column_bits.get(c, 0))
+
+    def row(self, row: str) -> List[str]:
+        """Columns marked in a row, in column interning order."""
+        r = self.rows.get(row)
+        return [] if r is None else [self.columns.name(c) for c in self.row_ids(r)]
+
+    def column(self, column: str) -> List[str]:
+        """Rows marked in a column, in row interning order."""
+        c = self.columns.get(column)
+        return [] if c is None else [self.rows.name(r) for r in self.column_ids(c)]
+
+    def row_count(self, row: str) -> int:
+        r = self.rows.get(row)
+        return 0 if r is None else bin(self._row_bits.get(r, 0)).count('1')
+
+    def pairs(self) -> Iterator[Tuple[str, str]]:
+        """Every (row, column) mark, row-major in interning order."""
+        for r in sorted(self._row_bits):
+            row = self.rows.name(r)
+            for c in iter_bits(self._row_bits[r]):
+                yield row, self.columns.name(c)
+
+    def to_dict(self) -> Dict[str, List[str]]:
+        """{row: marked columns} for every row, JSON-serializable."""
+        return {row: [self.columns.name(c) for c in self.row_ids(r)] for r, row in enumerate(self.rows)}
@@ -0,0 +1,250 @@
+"""
+Result Cache - Content-addressed cache of generated exports
+Sistema de Preevaluación Sandbox IA España
+
+Identical export inputs hash to the same key, so repeat downloads are served
+from memory or disk instead of rebuilding the workbook. The key doubles as a
+strong ETag. Both tiers are size-bounded (LRU) and entries expire after the
+same TTL as `exports.expires_at`.
+"""
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+def canonical_digest(*parts: Any) -> str:
+    """sha256 of the canonical JSON encoding (sorted keys, compact) of parts."""
+    encoded = json.dumps(parts, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+def make_etag(key: str) -> str:
+    return f'"{key}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header against an ETag (weak comparison)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate == '*' or candidate.removeprefix('W/') == etag:
+            return True
+    return False
+
+
+class ExportResultCache:
+    """Two-tier (memory + disk) LRU cache of export bytes keyed by content hash."""
+
+    def __init__(
+        self,
+        max_memory_bytes: int,
+        ttl_seconds: float,
+        disk_dir: Optional[Union[str, Path]] = None,
+        max_disk_bytes: int = 0,
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self._memory_bytes = 0
+        # Disk tier index: key -> (size, last access), least recently used first
+        self._disk: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = {'memory': 0, 'disk': 0}
+        self.misses = 0
+        if self.disk_dir:
+            self._disk_scan()
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                data, stored_at = item
+                if now - stored_at < self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.hits['memory'] += 1
+                    return data
+                self._drop_memory(key)
+
+        found = self._disk_get(key, now)
+        with self._lock:
+            if found is None:
+                self.misses += 1
+                return None
+            data, stored_at = found
+            self.hits['disk'] += 1
+            # Keeps its creation time: promotion must not extend the TTL
+            self._put_memory(key, data, stored_at)
+        return data
+
+    def put(self, key: str, data: bytes):
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, data, now)
+        self._disk_put(key, data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes,
+                'hits': dict(self.hits),
+                'misses': self.misses,
+            }
+
+    # ---- memory tier ----
+
+    def _put_memory(self, key: str, data: bytes, stored_at: float):
+        if len(data) > self.max_memory_bytes:
+            return
+        self._drop_memory(key)
+        self._memory[key] = (data, stored_at)
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _drop_memory(self, key: str):
+        item = self._memory.pop(key, None)
+        if item is not None:
+            self._memory_bytes -= len(item[0])
+
+    # ---- disk tier ----
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / f'{key}.bin'
+
+    def _disk_scan(self):
+        """Seed the index from the files left by a previous process (once, at startup)."""
+        now = time.time()
+        files = []
+        # Temp files of writes interrupted by a crash (current ones are younger than the TTL)
+        for path in self.disk_dir.glob('*/*.part'):
+            try:
+                if now - path.stat().st_mtime >= self.ttl_seconds:
+                    path.unlink(missing_ok=True)
+            except FileNotFoundError:
+                continue
+        for path in self.disk_dir.glob('*/*.bin'):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            if now - stat.st_mtime >= self.ttl_seconds:
+                path.unlink(missing_ok=True)
+            else:
+                files.append((stat.st_atime, stat.st_size, path.stem))
+        with self._lock:
+            for accessed, size, key in sorted(files):
+                self._disk[key] = (size, accessed)
+                self._disk_bytes += size
+            evicted = self._disk_evict(now)
+        self._disk_unlink(evicted)
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[bytes, float]]:
+        """The entry's bytes and creation time, or None."""
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            # Creation time is kept in the file's mtime; atime marks recency
+            stat = path.stat()
+            if now - stat.st_mtime >= self.ttl_seconds:
+                path.unlink(missing_ok=True)
+                with self._lock:
+                    self._disk_drop(key)
+                return None
+            data = path.read_bytes()
+            os.utime(path, (now, stat.st_mtime))
+        except FileNotFoundError:
+            with self._lock:
+                self._disk_drop(key)
+            return None
+        with self._lock:
+            self._disk_drop(key)
+            self._disk[key] = (len(data), now)
+            self._disk_bytes += len(data)
+        return data, stat.st_mtime
+
+    def _disk_put(self, key: str, data: bytes):
+        if not self.disk_dir or len(data) > self.max_disk_bytes:
+            return
+        path = self._disk_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A temp file per write: concurrent puts of the same key must not share one
+        fd, partial = tempfile.mkstemp(dir=path.parent, prefix=f'{key}.', suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(partial, path)
+        except BaseException:
+            Path(partial).unlink(missing_ok=True)
+            raise
+        now = time.time()
+        with self._lock:
+            self._disk_drop(key)
+            self._disk[key] = (len(data), now)
+            self._disk_bytes += len(data)
+            evicted = self._disk_evict(now)
+        self._disk_unlink(evicted)
+
+    def _disk_drop(self, key: str):
+        item = self._disk.pop(key, None)
+        if item is not None:
+            self._disk_bytes -= item[0]
+
+    def _disk_evict(self, now: float) -> List[str]:
+        """
+        Pop least recently used entries while over budget, plus any not read
+        within the TTL (those are expired, since access time >= creation time).
+        Returns the keys whose files the caller must delete outside the lock.
+        """
+        evicted = []
+        while self._disk:
+            key, (size, accessed) = next(iter(self._disk.items()))
+            if self._disk_bytes <= self.max_disk_bytes and now - accessed < self.ttl_seconds:
+                break
+            self._disk_drop(key)
+            evicted.append(key)
+        return evicted
+
+    def _disk_unlink(self, keys: List[str]):
+        for key in keys:
+            self._disk_path(key).unlink(missing_ok=True)
+
+
+_result_cache: Optional[ExportResultCache] = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> ExportResultCache:
+    """
+    Return the process-wide export result cache.
+
+    Configured by EXPORT_CACHE_MEMORY_MB (default 128), EXPORT_CACHE_DIR
+    (default: storage/cache; empty disables the disk tier),
+    EXPORT_CACHE_DISK_MB (default 1024) and EXPORT_TTL_HOURS (default 24).
+    """
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            default_dir = os.path.join(os.path.dirname(__file__), '..', 'storage', 'cache')
+            _result_cache = ExportResultCache(
+                max_memory_bytes=int(os.environ.get('EXPORT_CACHE_MEMORY_MB', 128)) * 1024 * 1024,
+                ttl_seconds=float(os.environ.get('EXPORT_TTL_HOURS', 24)) * 3600,
+                disk_dir=os.environ.get('EXPORT_CACHE_DIR', default_dir) or None,
+                max_disk_bytes=int(os.environ.get('EXPORT_CACHE_DISK_MB', 1024)) * 1024 * 1024,
+            )
+        return _result_cache
@@ -0,0 +1,97 @@
+"""
+Storage - Pluggable artifact storage for generated exports
+Sistema de Preevaluación Sandbox IA España
+
+Paths follow the Supabase Storage layout (exports/{application_id}/...);
+LocalStorageBackend stands in for Supabase Storage on a local filesystem.
+"""
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Iterable, Optional, Union
+import os
+import threading
+
+
+class StorageBackend(ABC):
+    """Minimal object storage interface used by the export job queue."""
+
+    @abstractmethod
+    def put(self, path: str, chunks: Iterable[bytes]) -> int:
+        """Store an object from an iterable of chunks and return its size in bytes."""
+
+    @abstractmethod
+    def get(self, path: str) -> bytes:
+        """Return the object's bytes (FileNotFoundError if missing)."""
+
+    @abstractmethod
+    def exists(self, path: str) -> bool:
+        """Whether the object exists."""
+
+    @abstractmethod
+    def delete(self, path: str):
+        """Delete the object if it exists."""
+
+
+class LocalStorageBackend(StorageBackend):
+    """Stores objects as files below a root directory."""
+
+    def __init__(self, root: Union[str, Path]):
+        self.root = Path(root)
+
+    def _resolve(self, path: str) -> Path:
+        full = (self.root / path).resolve()
+        if self.root.resolve() not in full.parents:
+            raise ValueError(f"Invalid storage path: {path}")
+        return full
+
+    def put(self, path: str, chunks: Iterable[bytes]) -> int:
+        target = self._resolve(path)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file first so readers never see a partial object
+        partial = target.with_name(target.name + '.part')
+        size = 0
+        with open(partial, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(partial, target)
+        return size
+
+    def get(self, path: str) -> bytes:
+        return self._resolve(path).read_bytes()
+
+    def local_path(self, path: str) -> Path:
+        """The file holding an object, for serving it straight from disk."""
+        return self._resolve(path)
+
+    def exists(self, path: str) -> bool:
+        return self._resolve(path).is_file()
+
+    def delete(self, path: str):
+        self._resolve(path).unlink(missing_ok=True)
+
+
+_storage: Optional[StorageBackend] = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    """
+    Return the configured storage backend.
+
+    Uses a LocalStorageBackend rooted at EXPORT_STORAGE_DIR
+    (default: src/backend/storage).
+    """
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            default_root = os.path.join(os.path.dirname(__file__), '..', 'storage')
+            _storage = LocalStorageBackend(os.environ.get('EXPORT_STORAGE_DIR', default_root))
+        return _storage
+
+
+def set_storage(storage: StorageBackend):
+    """Install a different storage backend (e.g. Supabase Storage)."""
+    global _storage
+    with _storage_lock:
+        _storage = storage
@@ -0,0 +1,103 @@
+import pytest
+from openpyxl import Workbook
+
+from excel_engine.template_filler import EXPECTED_SHEETS, TEMPLATE_MAPPING
+from services import assessments, audit, export_jobs, result_cache
+
+# Minimal AESIA-like checklist content used to build fixture templates
+SAMPLE_MG_ROWS = [
+    ('MG_TRANS_01', '13.1', 'Diseñar el sistema para que sea transparente'),
+    ('MG_TRANS_02', '13.3.a', 'Proporcionar identidad del proveedor'),
+    ('MG_TRANS_03', '13.3.b.i', 'Documentar características y limitaciones'),
+    ('MG_TRANS_03', '13.3.b.ii', 'Documentar características y limitaciones'),
+]
+SAMPLE_MA_SUBPARTS = ['13.1', '13.3.a', '13.3.b.i']
+
+
+def build_template(path, mg_rows=SAMPLE_MG_ROWS, subparts=SAMPLE_MA_SUBPARTS, ma_ids=('MA_1', 'MA_2')):
+    """Write a synthetic AESIA checklist template with the nine expected sheets."""
+    wb = Workbook()
+    wb.active.title = EXPECTED_SHEETS[0]
+    for name in EXPECTED_SHEETS[1:]:
+        wb.create_sheet(name)
+
+    ws = wb['Autoeval MG']
+    ws.append(['MG', 'Apartado', 'Descripción', 'Nivel de dificultad', 'Nivel de madurez', 'Plan'])
+    for idx, (mg_id, subpart_id, desc) in enumerate(mg_rows, 2):
+        ws.append([mg_id, subpart_id, desc, None, None, None])
+        ws.cell(row=idx, column=6).value = f'=IF(E{idx}="","",E{idx})'
+
+    ws = wb['Medidas Adicionales']
+    ws.append(['ID', 'Descripción', 'Nombre archivo'])
+
+    ws = wb['Relación MA-Apart']
+    ws.append(['Apartado', *ma_ids])
+    for subpart_id in subparts:
+        ws.append([subpart_id] + [None] * len(ma_ids))
+
+    ws = wb['Autoeval MA']
+    ws.append(['MA', 'Apartado', 'Descripción', 'Nivel de dificultad', 'Nivel de madurez'])
+    for ma_id in ma_ids:
+        for subpart_id in subparts:
+            ws.append([ma_id, subpart_id, None, None, None])
+
+    wb.save(path)
+    return path
+
+
+@pytest.fixture
+def templates_dir(tmp_path):
+    """Directory holding a fixture template for every requirement code."""
+    for filename in TEMPLATE_MAPPING.values():
+        build_template(tmp_path / filename)
+    return tmp_path
+
+
+@pytest.fixture(autouse=True)
+def isolated_result_cache(tmp_path_factory, monkeypatch):
+    """Fresh export result cache per test, with its disk tier in a temp dir."""
+    cache = result_cache.ExportResultCache(
+        max_memory_bytes=16 * 1024 * 1024,
+        ttl_seconds=3600,
+        disk_dir=tmp_path_factory.mktemp('result_cache'),
+        max_disk_bytes=64 * 1024 * 1024,
+    )
+    monkeypatch.setattr(result_cache, '_result_cache', cache)
+    return cache
+
+
+@pytest.fixture(autouse=True)
+def assessment_repository(monkeypatch):
+    """In-memory assessment repository per test."""
+    repository = assessments.SQLiteAssessmentRepository(':memory:')
+    monkeypatch.setattr(assessments, '_repository', repository)
+    return repository
+
+
+@pytest.fixture
+def assessed_application(assessment_repository):
+    """Give an application one assessed MG, so it passes the Gatekeeper; returns its id."""
+    def seed(application_id='app-1'):
+        assessments.upsert_assessments(application_id, 'seed', [{'mg_id': 'MG_TRANS_01', 'maturity': 'L3'}])
+        return application_id
+    return seed
+
+
+@pytest.fixture(autouse=True)
+def export_job_repository(monkeypatch):
+    """In-memory export job repository per test."""
+    repository = export_jobs.SQLiteExportJobRepository(':memory:')
+    monkeypatch.setattr(export_jobs, '_repository', repository)
+    return repository
+
+@pytest.fixture(autouse=True)
+def audit_log(tmp_path_factory, monkeypatch):
+    """Audit writer per test over an in-memory sink, drained after the test."""
+    writer = audit.AuditLogWriter(
+        audit.SQLiteAuditSink(':memory:'),
+        tmp_path_factory.mktemp('audit') / 'spool.jsonl',
+        flush_interval=0.01,
+    )
+    monkeypatch.setattr(audit, '_audit_log', writer)
+    yield writer
+    writer.close()
@@ -0,0 +1,86 @@
+from fastapi.testclient import TestClient
+
+from services.analytics import (
+    PortfolioAnalytics, assessment_frame, frequent_plans, history_frame, maturity_heatmap, slowest_improving,
+)
+from services.assessments import upsert_assessments
+from main import app
+
+client = TestClient(app)
+
+ROWS = [
+    ('a1', 'MG_TRANS_01', '13.1', 'TRANSPARENCY', 'L2', '01'),
+    ('a2', 'MG_TRANS_01', '13.1', 'TRANSPARENCY', 'L6', '04'),
+    ('a1', 'MG_TRANS_02', '13.3.a', 'TRANSPARENCY', None, None),
+    ('a1', 'MG_ACC_01', '15.1', 'ACCURACY', 'L1', '01'),
+    # requirement_code is nullable: counted in the overall plans only
+    ('a2', 'MG_LEGACY', '9.9', None, 'L4', '03'),
+]
+
+HISTORY = [
+    ('a1', 'MG_TRANS_01', '13.1', 'L1', '2026-01-01T00:00:00.000Z'),
+    ('a1', 'MG_ACC_01', '15.1', 'L1', '2026-01-01T00:00:00.000Z'),
+    ('a1', 'MG_TRANS_01', '13.1', 'L7', '2026-01-31T00:00:00.000Z'),
+    ('a1', 'MG_ACC_01', '15.1', 'L2', '2026-03-02T00:00:00.000Z'),
+    ('a2', 'MG_TRANS_01', '13.1', 'L6', '2026-02-01T00:00:00.000Z'),
+]
+
+
+def test_heatmap_and_plans():
+    frame = assessment_frame(ROWS)
+    heatmap = maturity_heatmap(frame)
+    assert heatmap['applications'] == 2
+    assert [(c['requirement_code'], c['mg_id'], c['assessed'], c['mean_level']) for c in heatmap['cells']] == [
+        ('ACCURACY', 'MG_ACC_01', 1, 1.0),
+        ('TRANSPARENCY', 'MG_TRANS_01', 2, 4.0),
+    ]
+    assert heatmap['cells'][1]['levels'] == [0, 1, 0, 0, 0, 1, 0, 0]
+
+    plans = frequent_plans(frame)
+    assert plans['total'] == 4
+    assert None not in plans['by_requirement']
+    assert plans['plans'][0] == {'plan': '01', 'count': 2, 'share': 0.5}
+    assert [p['plan'] for p in plans['by_requirement']['TRANSPARENCY']] == ['01', '04']
+
+
+def test_slowest_improving_uses_first_and_last_record():
+    slowest = slowest_improving(history_frame(HISTORY))
+    # MG_ACC_01: +1 level in 60 days; MG_TRANS_01: +6 in 30 (a2 has a single record)
+    assert [(m['mg_id'], m['tracked'], m['change_per_30_days']) for m in slowest] == [
+        ('MG_ACC_01', 1, 0.5), ('MG_TRANS_01', 1, 6.0),
+    ]
+    assert slowest_improving(history_frame(HISTORY[:2])) == []
+
+
+def test_cache_is_invalidated_by_org_writes(assessment_repository):
+    analytics = PortfolioAnalytics(assessment_repository)
+    assessment_repository.set_application_org('a1', 'org-1')
+    upsert_assessments('a1', 'b1', [{'mg_id': 'MG_TRANS_01', 'maturity': 'L2'}])
+
+    assert analytics.heatmap('org-1')['cells'][0]['levels'][1] == 1
+    analytics.plans('org-1')
+    assert analytics.loads == 1
+
+    upsert_assessments('other', 'b1', [{'mg_id': 'MG_TRANS_01', 'maturity': 'L8'}])
+    analytics.heatmap('org-1')
+    assert analytics.loads == 1
+
+    upsert_assessments('a1', 'b2', [{'mg_id': 'MG_TRANS_01', 'maturity': 'L5'}])
+    assert analytics.heatmap('org-1')['cells'][0]['levels'][4] == 1
+    assert analytics.loads == 2
+    assert analytics.slowest_measures('org-1')[0]['mg_id'] == 'MG_TRANS_01'
+
+    assessment_repository.set_application_org('other', 'org-1')
+    assert analytics.heatmap('org-1')['applications'] == 2
+    analytics.close()
+
+
+def test_analytics_endpoints():
+    client.put('/api/applications/a1/org', json={'org_id': 'org-1'})
+    upsert_assessments('a1', 'b1', [{'mg_id': 'MG_TRANS_01', 'maturity': 'L3'}])
+
+    heatmap = client.get('/api/analytics/org-1/heatmap').json()
+    assert heatmap['org_id'] == 'org-1' and heatmap['cells'][0]['mg_id'] == 'MG_TRANS_01'
+    assert client.get('/api/analytics/org-1/plans').json()['plans'] == [{'plan': '02', 'count': 1, 'share': 1.0}]
+    assert client.get('/api/analytics/org-1/slowest-measures', params={'limit': 5}).json()['measures'] == []
+    assert client.get('/api/analytics/empty-org/heatmap').json()['cells'] == []
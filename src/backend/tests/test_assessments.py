@@ -0,0 +1,121 @@
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services.assessments import BatchConflict, upsert_assessments
+from services.catalog import compile_catalog
+from main import app
+
+client = TestClient(app)
+
+CATALOG = compile_catalog(
+    [{
+        'code': 'TRANSPARENCY',
+        'subparts': [('13.1', 'Diseño'), ('13.3.a', 'Identidad')],
+        'measures': [('MG_TRANS_01', None, 'Diseñar'), ('MG_TRANS_02', None, 'Identificar')],
+        'relations': [('MG_TRANS_01', '13.1'), ('MG_TRANS_01', '13.3.a'), ('MG_TRANS_02', '13.3.a')],
+    }],
+    version='test',
+)
+
+
+def upsert(repository, batch_id, rows):
+    return upsert_assessments('app-1', batch_id, rows, repository=repository, catalog=CATALOG)
+
+
+def test_rows_are_validated_planned_and_written(assessment_repository):
+    result = upsert(assessment_repository, 'b1', [
+        {'mg_id': 'MG_TRANS_01', 'maturity': 'L5', 'difficulty': '01'},
+        {'mg_id': 'MG_TRANS_02', 'subpart_id': '13.3.a', 'maturity': None},
+        {'mg_id': 'MG_NOPE', 'maturity': 'L1'},
+        {'mg_id': 'MG_TRANS_02', 'subpart_id': '13.1', 'maturity': 'L9', 'difficulty': '07'},
+        {'mg_id': 'MG_TRANS_02', 'subpart_id': '13.3.a', 'maturity': 'L2'},
+    ])
+
+    assert result['summary'] == {'inserted': 2, 'updated': 0, 'unchanged': 0, 'rejected': 3}
+    assert result['replayed'] is False
+    rows = result['rows']
+    assert rows[0] == {
+        'index': 0, 'mg_id': 'MG_TRANS_01', 'subpart_ids': ['13.1', '13.3.a'],
+        'status': 'inserted', 'diagnosis_status': '01', 'adaptation_plan': '03',
+    }
+    assert (rows[1]['diagnosis_status'], rows[1]['adaptation_plan']) == ('00', None)
+    assert rows[2]['errors'] == ['Unknown measure: MG_NOPE']
+    assert rows[3]['errors'] == [
+        'Subpart 13.1 is not linked to measure MG_TRANS_02',
+        'Unknown maturity level: L9',
+        'Unknown difficulty: 07',
+    ]
+    assert rows[4]['errors'] == ['Duplicate of row 1 for subpart 13.3.a']
+
+    stored = assessment_repository.list_mg('app-1')
+    assert [(r['measure_id'], r['subpart_id'], r['maturity'], r['adaptation_plan']) for r in stored] == [
+        ('MG_TRANS_01', '13.1', 'L5', '03'),
+        ('MG_TRANS_01', '13.3.a', 'L5', '03'),
+        ('MG_TRANS_02', '13.3.a', None, None),
+    ]
+
+
+def test_second_batch_reports_updates(assessment_repository):
+    upsert(assessment_repository, 'b1', [{'mg_id': 'MG_TRANS_01', 'maturity': 'L5'}])
+    result = upsert(assessment_repository, 'b2', [
+        {'mg_id': 'MG_TRANS_01', 'subpart_id': '13.1', 'maturity': 'L8'},
+        {'mg_id': 'MG_TRANS_01', 'subpart_id': '13.3.a', 'maturity': 'L5'},
+    ])
+    assert [r['status'] for r in result['rows']] == ['updated', 'unchanged']
+    assert [r['adaptation_plan'] for r in assessment_repository.list_mg('app-1')] == ['05', '03']
+
+
+def test_batch_id_makes_upsert_idempotent(assessment_repository):
+    rows = [{'mg_id': 'MG_TRANS_02', 'maturity': 'L3'}]
+    first = upsert(assessment_repository, 'b1', rows)
+    # A later batch changes the row; replaying b1 must not undo it
+    upsert(assessment_repository, 'b2', [{'mg_id': 'MG_TRANS_02', 'maturity': 'L7'}])
+
+    replay = upsert(assessment_repository, 'b1', rows)
+    assert replay == {**first, 'replayed': True}
+    assert assessment_repository.list_mg('app-1')[0]['maturity'] == 'L7'
+
+    with pytest.raises(BatchConflict):
+        upsert(assessment_repository, 'b1', [{'mg_id': 'MG_TRANS_02', 'maturity': 'L1'}])
+
+
+def test_concurrent_replays_apply_once(assessment_repository):
+    rows = [{'mg_id': 'MG_TRANS_01', 'maturity': 'L1'}]
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(upsert(assessment_repository, 'b1', rows))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(r['replayed'] for r in results) == [False, True, True, True]
+
+
+def test_failed_batch_is_rolled_back(assessment_repository):
+    def explode(outcomes):
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        assessment_repository.apply_batch('app-1', 'b1', 'digest', [{
+            'application_id': 'app-1', 'measure_id': 'MG_TRANS_01', 'subpart_id': '13.1',
+            'requirement_code': 'TRANSPARENCY', 'difficulty': None, 'maturity': 'L1',
+            'diagnosis_status': '01', 'adaptation_plan': '01', 'notes': None,
+        }], explode)
+    assert assessment_repository.list_mg('app-1') == []
+    assert assessment_repository.get_batch('app-1', 'b1') is None
+
+
+def test_bulk_endpoint(assessment_repository):
+    payload = {'batch_id': 'wizard-1', 'rows': [
+        {'mg_id': 'MG_TRANS_01', 'subpart_id': '13.1', 'maturity': 'L4'},
+        {'mg_id': 'MG_QUAL_01', 'maturity': 'L6', 'notes': 'Pendiente de revisión'},
+    ]}
+    response = client.post('/api/applications/app-9/assessments/bulk', json=payload)
+    assert response.status_code == 200
+    assert response.json()['summary']['inserted'] == 2
+    assert client.post('/api/applications/app-9/assessments/bulk', json=payload).json()['replayed'] is True
+
+    payload['rows'][0]['maturity'] = 'L1'
+    assert client.post('/api/applications/app-9/assessments/bulk', json=payload).status_code == 409
+    assert client.post('/api/applications/app-9/assessments/bulk', json={'batch_id': '', 'rows': []}).status_code == 422
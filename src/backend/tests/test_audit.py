@@ -0,0 +1,176 @@
+import json
+import os
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services.audit import AuditEvent, AuditLogWriter, SQLiteAuditSink, process_spool_path
+from main import app
+
+client = TestClient(app)
+
+
+class FlakySink(SQLiteAuditSink):
+    """Fails while `down` is set; `gate` lets a test hold the flush thread."""
+
+    def __init__(self):
+        super().__init__(':memory:')
+        self.down = False
+        self.gate = threading.Event()
+        self.gate.set()
+        self.batches = []
+
+    def write(self, events):
+        self.gate.wait()
+        if self.down:
+            raise ConnectionError('sink unavailable')
+        self.batches.append(len(events))
+        super().write(events)
+
+
+def test_events_are_batched_by_size_and_time(tmp_path):
+    sink = FlakySink()
+    writer = AuditLogWriter(sink, tmp_path / 'spool.jsonl', batch_size=10, flush_interval=0.05)
+    sink.gate.clear()
+    first = writer.log('ASSESSMENT_UPDATE', entity_id='app-1', metadata={'batch_id': 'b1'})
+    for i in range(24):
+        writer.log('EXPORT_SINGLE', metadata={'i': i})
+    sink.gate.set()
+    assert writer.flush()
+    assert sink.batches == [10, 10, 5]
+
+    stored = sink.query(entity_id='app-1')
+    assert stored[0]['id'] == first.id
+    assert (stored[0]['action'], stored[0]['event_category'], stored[0]['metadata']) == (
+        'UPDATE', 'ASSESSMENT', {'batch_id': 'b1'},
+    )
+    stats = writer.stats()
+    assert (stats['enqueued'], stats['written'], stats['batches'], stats['queue_depth']) == (25, 25, 3, 0)
+    assert stats['flush_ms']['max'] >= stats['flush_ms']['p50']
+    writer.close()
+
+    with pytest.raises(ValueError):
+        writer.log('LOGIN')
+
+
+def test_full_queue_applies_backpressure_then_spools(tmp_path):
+    sink = FlakySink()
+    sink.gate.clear()
+    writer = AuditLogWriter(sink, tmp_path / 'spool.jsonl', max_queue=2, batch_size=1, put_timeout=0.01)
+    events = [writer.log('FILE_UPLOAD', entity_id=f'f{i}') for i in range(6)]
+    stats = writer.stats()
+    assert stats['backpressure_waits'] >= 1 and stats['overflowed'] >= 1
+    assert stats['spooled'] == stats['overflowed']
+
+    sink.gate.set()
+    writer.close()
+    assert {row['entity_id'] for row in sink.query()} == {event.entity_id for event in events}
+    assert not writer.spool_path.exists()
+
+
+def test_sink_failure_spools_and_replays(tmp_path):
+    sink = FlakySink()
+    sink.down = True
+    writer = AuditLogWriter(sink, tmp_path / 'spool.jsonl', flush_interval=0.01)
+    writer.log('EXPORT_FULL', entity_id='job-1')
+    assert writer.flush()
+    assert writer.stats()['failed_batches'] == 1 and writer.spool_path.exists()
+
+    # The next successful batch replays the spool
+    sink.down = False
+    writer.log('EXPORT_FULL', entity_id='job-2')
+    assert writer.flush()
+    assert [row['entity_id'] for row in sink.query()] == ['job-2', 'job-1']
+    assert writer.stats()['replayed'] == 1 and not writer.spool_path.exists()
+
+    # A spool left by an earlier process is replayed on shutdown
+    sink.down = True
+    writer.log('EXPORT_FULL', entity_id='job-3')
+    writer.close()
+    restarted = AuditLogWriter(SQLiteAuditSink(':memory:'), writer.spool_path)
+    restarted.close()
+    assert [row['entity_id'] for row in restarted.sink.query()] == ['job-3']
+
+
+def test_corrupt_spool_lines_are_set_aside(tmp_path):
+    spool = tmp_path / 'spool.jsonl'
+    valid = [AuditEvent.create('EXPORT_FULL', entity_id=f'job-{i}') for i in range(3)]
+    spool.write_text(
+        json.dumps(valid[0].to_dict()) + '\n{"id": "trunc\n' + json.dumps(valid[1].to_dict()) + '\n',
+        encoding='utf-8',
+    )
+    # A replay interrupted by a crash is folded back into the spool
+    spool.with_name('spool.jsonl.replay').write_text(json.dumps(valid[2].to_dict()), encoding='utf-8')
+
+    writer = AuditLogWriter(SQLiteAuditSink(':memory:'), spool, flush_interval=0.01)
+    writer.log('EXPORT_FULL', entity_id='job-new')
+    assert writer.flush()
+    writer.close()
+
+    assert {row['entity_id'] for row in writer.sink.query()} == {'job-0', 'job-1', 'job-2', 'job-new'}
+    assert (writer.stats()['replayed'], writer.stats()['corrupt']) == (3, 1)
+    assert spool.with_name('spool.jsonl.bad').read_text(encoding='utf-8') == '{"id": "trunc\n'
+    assert not spool.exists() and not spool.with_name('spool.jsonl.replay').exists()
+
+
+def test_writer_survives_spool_errors(tmp_path):
+    sink = FlakySink()
+    sink.down = True
+    writer = AuditLogWriter(sink, tmp_path / 'spool.jsonl', flush_interval=0.01)
+    # A directory in the spool's place makes spooling raise OSError
+    writer.spool_path.mkdir()
+    writer.log('EXPORT_FULL', entity_id='job-1')
+    assert writer.flush(timeout=2)
+    assert writer.stats()['dropped'] == 1
+
+    sink.down = False
+    writer.log('EXPORT_FULL', entity_id='job-2')
+    assert writer.flush(timeout=2)
+    assert [row['entity_id'] for row in sink.query()] == ['job-2']
+    writer.close()
+
+
+def test_spools_of_dead_processes_are_adopted(tmp_path):
+    base = tmp_path / 'audit_spool.jsonl'
+    lines = {name: json.dumps(AuditEvent.create('EXPORT_FULL', entity_id=name).to_dict()) for name in (
+        'legacy', 'dead', 'dead-replay', 'alive',
+    )}
+    base.write_text(lines['legacy'] + '\n', encoding='utf-8')
+    # pid 2**22 + 1 is above the kernel's pid_max, so never a live process
+    dead = 2 ** 22 + 1
+    tmp_path.joinpath(f'audit_spool.{dead}.jsonl').write_text(lines['dead'], encoding='utf-8')
+    tmp_path.joinpath(f'audit_spool.{dead}.jsonl.replay').write_text(lines['dead-replay'], encoding='utf-8')
+    alive = tmp_path / f'audit_spool.{os.getppid()}.jsonl'
+    alive.write_text(lines['alive'], encoding='utf-8')
+
+    spool = process_spool_path(base)
+    assert spool.name == f'audit_spool.{os.getpid()}.jsonl'
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted([alive.name, spool.name])
+
+    writer = AuditLogWriter(SQLiteAuditSink(':memory:'), spool)
+    writer.close()
+    assert {row['entity_id'] for row in writer.sink.query()} == {'legacy', 'dead', 'dead-replay'}
+
+
+def test_endpoints_record_audit_events(audit_log):
+    client.post('/api/applications/app-1/assessments/bulk', json={
+        'batch_id': 'b1', 'rows': [{'mg_id': 'MG_TRANS_01', 'maturity': 'L2'}],
+    })
+    client.post('/api/applications/app-1/assessments/bulk', json={
+        'batch_id': 'b1', 'rows': [{'mg_id': 'MG_TRANS_01', 'maturity': 'L2'}],
+    })
+    client.put('/api/applications/app-1/measures-additional/MA_1', json={
+        'title': 'Registro', 'requirement_codes': ['TRANSPARENCY'],
+    })
+    client.delete('/api/applications/app-1/measures-additional/MA_1')
+    assert audit_log.flush()
+
+    rows = audit_log.sink.query()
+    assert [(row['event_type'], row['action'], row['entity_id']) for row in rows] == [
+        ('MA_UPDATE', 'DELETE', 'MA_1'),
+        ('MA_UPDATE', 'UPDATE', 'MA_1'),
+        ('ASSESSMENT_UPDATE', 'UPDATE', 'app-1'),
+    ]
+    assert rows[2]['metadata']['summary']['inserted'] == 1
+    assert client.get('/health/audit').json()['written'] == 3
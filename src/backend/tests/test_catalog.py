@@ -0,0 +1,117 @@
+import json
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+
+from excel_engine import export_api, generator
+from excel_engine.template_filler import TemplateFiller
+from services import catalog as catalog_module
+from services.catalog import CatalogStore, DEFAULT_MIGRATIONS_DIR, load_seed_migrations
+from main import app
+
+client = TestClient(app)
+
+
+def _artifact(release='R1', description='Diseño transparente'):
+    return {
+        'catalog_release': release,
+        'requirements': [{
+            'requirement_code': 'TRANSPARENCY',
+            'description': 'Transparencia (Art. 13)',
+            'subparts': [
+                {'subpart_id': '13.1', 'description': description, 'short_description': ''},
+                {'subpart_id': '13.3.a', 'description': 'Identidad', 'short_description': 'Proveedor'},
+            ],
+            'measures': [
+                {'mg_id': 'MG_TRANS_01', 'description': 'Diseñar', 'guidance_questions': []},
+                {'mg_id': 'MG_TRANS_02', 'description': 'Identificar', 'guidance_questions': []},
+            ],
+            'relations': [
+                {'mg_id': 'MG_TRANS_01', 'subpart_id': '13.1'},
+                {'mg_id': 'MG_TRANS_01', 'subpart_id': '13.3.a'},
+                {'mg_id': 'MG_TRANS_02', 'subpart_id': '13.3.a'},
+            ],
+        }],
+    }
+
+
+def test_seed_migrations_compile():
+    catalog = load_seed_migrations(DEFAULT_MIGRATIONS_DIR)
+    stats = catalog.stats()
+    assert (stats['requirements'], stats['measures'], stats['relations']) == (12, 84, 84)
+
+    # 011 moves RISK_MGMT to Art. 9 after 008 seeded it
+    assert catalog.requirement('RISK_MGMT').article_ref == 'Art. 9'
+    assert catalog.subparts('TRANSPARENCY')[:2] == ['13.1', '13.3.a']
+    assert catalog.requirement_of('MG_TRANS_03') == 'TRANSPARENCY'
+    assert catalog.mg_subparts('MG_TRANS_03') == ['13.3.b.i']
+    row = catalog.measures(['ACCURACY'])[0]
+    assert (row['id'], row['req']) == ('MG_ACCU_01', 'ACCURACY')
+
+    # Identifiers are interned to integers
+    req = catalog.requirement('TRANSPARENCY')
+    assert all(isinstance(i, int) for i in req.subparts + req.measures)
+    assert catalog.name(catalog.intern('13.1')) == '13.1'
+
+
+def test_extractor_artifact_and_hot_reload(tmp_path):
+    path = tmp_path / 'catalog.json'
+    path.write_text(json.dumps(_artifact()), encoding='utf-8')
+    store = CatalogStore(path, tmp_path / 'missing', check_interval=0)
+
+    first = store.get()
+    assert first.release == 'R1'
+    assert first.requirements()[0]['title'] == 'Transparencia'
+    assert first.requirements()[0]['article_ref'] == 'Art. 13'
+    assert first.relations('TRANSPARENCY') == [
+        ('MG_TRANS_01', '13.1'), ('MG_TRANS_01', '13.3.a'), ('MG_TRANS_02', '13.3.a'),
+    ]
+    assert store.get() is first
+
+    path.write_text(json.dumps(_artifact(release='R2-hotfix')), encoding='utf-8')
+    second = store.get()
+    assert (second.release, store.reloads) == ('R2-hotfix', 1)
+    assert second.version != first.version
+
+    # A broken file keeps the last good snapshot
+    path.write_text('{', encoding='utf-8')
+    assert store.get() is second
+
+
+@pytest.fixture
+def small_catalog(tmp_path, monkeypatch):
+    path = tmp_path / 'catalog.json'
+    path.write_text(json.dumps(_artifact()), encoding='utf-8')
+    store = CatalogStore(path, tmp_path / 'missing', check_interval=0)
+    monkeypatch.setattr(catalog_module, '_catalog_store', store)
+    return store
+
+
+def test_endpoints_read_the_catalog(small_catalog):
+    requirements = client.get('/api/requirements').json()['requirements']
+    assert [r['id'] for r in requirements] == ['TRANSPARENCY']
+    assert requirements[0]['measures'] == 2
+
+    levels = client.get('/api/maturity-levels').json()['levels']
+    assert levels[4] == {'code': 'L5', 'label': 'Implementada sin evidencia', 'plan': '03', 'plan_desc': 'Adaptación Completa'}
+
+
+def test_generator_falls_back_to_catalog(small_catalog):
+    wb = load_workbook(BytesIO(generator.generate_excel({})))
+    assert [c.value for c in wb['4. Medidas Guía']['A'][5:]] == ['MG_TRANS_01', 'MG_TRANS_02']
+    assert [c.value for c in wb['5. Relación MG'][5]] == ['Medida', 'TRANSPARENCY']
+    assert wb['5. Relación MG']['B6'].value == '✓'
+
+
+def test_mg_level_assessment_expands_to_catalog_subparts(small_catalog, templates_dir, monkeypatch, assessed_application):
+    monkeypatch.setattr(export_api, 'TEMPLATES_DIR', str(templates_dir))
+    monkeypatch.setattr(export_api, 'filler', TemplateFiller(str(templates_dir)))
+
+    payload = {'requirement_code': 'TRANSPARENCY', 'assessments_mg': [{'mg_id': 'MG_TRANS_01', 'maturity': 'L4'}]}
+    response = client.post('/export/single/TRANSPARENCY', params={'application_id': assessed_application()}, json=payload)
+    assert response.status_code == 200
+    ws = load_workbook(BytesIO(response.content))['Autoeval MG']
+    # MG_TRANS_01 covers 13.1 (row 2); 13.3.a is listed for MG_TRANS_02 in the template
+    assert [ws[f'E{row}'].value for row in range(2, 6)] == ['L4', None, None, None]
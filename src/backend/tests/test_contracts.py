@@ -0,0 +1,128 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services.contracts import MAX_RECORD_BYTES, StreamReport, compile_schema, get_contracts, validate_stream
+from services.evals import EvalRunner, RuleBasedAssessor, run_golden_set
+from main import app
+
+client = TestClient(app)
+
+APPLICATION = {
+    'project_metadata': {'nombre': 'Triaje', 'sector': 'salud', 'trl': 6},
+    'risk_profile': {'nivel': 'high', 'citas': ['Art. 6 RIA']},
+}
+CLAIMS = {
+    'status': 'success',
+    'metadata': {'timestamp': '2025-03-01T10:00:00Z', 'application_id': '123e4567-e89b-12d3-a456-426614174000'},
+    'assessment': {
+        'measure_id': 'MG_01_01', 'maturity': 'L4',
+        'adaptation_plan': {'code': '02', 'description': 'Implementar'},
+    },
+    'claims': [{'claim_text': 'Implementado', 'citations': [{'doc_id': 'd1', 'page_number': 3}]}],
+}
+
+
+def test_contracts_accept_valid_records():
+    contracts = get_contracts()
+    assert contracts['application'](APPLICATION) == []
+    assert contracts['claims'](CLAIMS) == []
+
+
+def test_contracts_report_every_error_with_its_path():
+    errors = get_contracts()['application']({
+        'project_metadata': {'nombre': 'IA', 'sector': 'banca', 'trl': 10},
+        'risk_profile': {'citas': [3]},
+    })
+    assert errors == [
+        '$.project_metadata.nombre: shorter than 3',
+        '$.project_metadata.trl: greater than 9',
+        "$.project_metadata.sector: 'banca' is not one of ['salud', 'finanzas', 'educacion', 'transporte', "
+        "'energia', 'administracion_publica', 'justicia', 'empleo', 'otro']",
+        '$.risk_profile.citas[0]: expected string',
+    ]
+
+
+def test_claims_conditional_and_closed_object():
+    claims = get_contracts()['claims']
+    without_assessment = {k: v for k, v in CLAIMS.items() if k != 'assessment'}
+    assert claims(without_assessment) == ["$: missing required property 'assessment'"]
+    assert claims({**without_assessment, 'status': 'insufficient_evidence'}) == []
+    assert claims({**CLAIMS, 'debug': True}) == ["$: unexpected property 'debug'"]
+    bad_meta = {**CLAIMS, 'metadata': {'timestamp': '2025-02-30T10:00:00Z', 'application_id': 'app-1'}}
+    assert claims(bad_meta) == [
+        '$.metadata.timestamp: not a valid date-time',
+        '$.metadata.application_id: not a valid uuid',
+    ]
+
+
+def test_compiler_type_rules_and_unknown_keywords():
+    integer = compile_schema({'type': 'integer'})
+    assert integer(3) == [] and integer(3.0) == []
+    assert integer(True) == ['$: expected integer'] and integer(3.5) == ['$: expected integer']
+    assert compile_schema({'enum': [1, 'a']})(True) == ["$: True is not one of [1, 'a']"]
+    with pytest.raises(ValueError, match='oneOf'):
+        compile_schema({'oneOf': [{'type': 'string'}]})
+
+
+def test_validate_stream_keeps_going_after_bad_records():
+    lines = [json.dumps(APPLICATION).encode(), b'{not json', b'', json.dumps({'project_metadata': {}}).encode()]
+    report = validate_stream(get_contracts()['application'], lines)
+    assert (report['records'], report['valid'], report['invalid']) == (3, 1, 2)
+    assert [e['record'] for e in report['errors']] == [2, 4]
+    assert report['errors'][0]['errors'][0].startswith('invalid JSON')
+    assert report['truncated'] is False
+
+
+def test_stream_report_splits_chunks_and_caps_line_length():
+    validator = get_contracts()['claims']
+    record = json.dumps(CLAIMS).encode()
+    report = StreamReport(max_record_bytes=len(record))
+    stream = record + b'\n' + b'x' * (len(record) + 1) + b'\n\n' + record
+    # Chunk boundaries fall inside records
+    for i in range(0, len(stream), 7):
+        report.feed(stream[i:i + 7], validator)
+    report.finish(validator)
+    summary = report.summary()
+    assert (summary['records'], summary['valid'], summary['invalid']) == (3, 2, 1)
+    assert summary['errors'] == [{'record': 2, 'errors': [f'record exceeds {len(record)} bytes']}]
+    assert not report._pending
+
+
+def test_validate_endpoints_single_and_ndjson():
+    assert client.post('/api/validate/claims', json=CLAIMS).json() == {'contract': 'claims', 'valid': True, 'errors': []}
+
+    invalid = client.post('/api/validate/application', json={'project_metadata': {'nombre': 'X'}}).json()
+    assert invalid['valid'] is False
+    assert "$.project_metadata: missing required property 'sector'" in invalid['errors']
+    assert client.post('/api/validate/application', content=b'{').json()['errors'][0].startswith('invalid JSON')
+
+    body = b'\n'.join(json.dumps(r).encode() for r in [CLAIMS, {'status': 'ok'}, CLAIMS] * 200)
+    response = client.post('/api/validate/claims', content=body, headers={'Content-Type': 'application/x-ndjson'})
+    report = response.json()
+    assert (report['records'], report['valid'], report['invalid']) == (600, 400, 200)
+    assert report['errors'][0]['record'] == 2
+    assert report['records_per_s'] > 0
+
+    # A line with no newline in sight is not buffered past MAX_RECORD_BYTES
+    body = b'{"status": "' + b'x' * MAX_RECORD_BYTES + b'\n' + json.dumps(CLAIMS).encode()
+    report = client.post('/api/validate/claims', content=body, headers={'Content-Type': 'application/x-ndjson'}).json()
+    assert (report['records'], report['valid'], report['invalid']) == (2, 1, 1)
+    assert report['errors'][0]['errors'][0].startswith('record exceeds')
+
+
+def test_golden_set_enforces_schema_valid():
+    class SloppyAssessor(RuleBasedAssessor):
+        def assess(self, input_context):
+            output = super().assess(input_context)
+            output['metadata'].pop('timestamp')
+            return output
+
+    assert {g['name']: g['passed'] for g in run_golden_set()['gates']}['schema_valid'] is True
+
+    runner = EvalRunner(SloppyAssessor(), validate_output=get_contracts()['claims'])
+    report = run_golden_set(runner=runner)
+    gate = next(g for g in report['gates'] if g['name'] == 'schema_valid')
+    assert gate['value'] is False and gate['passed'] is False
+    assert report['ok'] is False
@@ -1,5 +1,6 @@
+import pandas as pd
 import pytest
-from services.conversion_logic import calculate_plan, calculate_all_assessments
+from services.conversion_logic import calculate_plan, calculate_plans, calculate_all_assessments, get_diagnosis_status
 
 def test_calculate_plan_valid_levels():
     # Test all valid levels from L1 to L8
@@ -45,3 +46,24 @@ def test_calculate_all_assessments():
     # Check missing maturity
     assert results[3]['adaptation_plan'] == '00'
     assert results[3]['diagnosis_status'] == '00'
+
+def test_calculate_plans_matches_scalar_rules():
+    levels = ['L1', 'L2', 'L3', 'L4', 'L5', 'L6', 'L7', 'L8', 'L99', '', None, float('nan')]
+    plans = calculate_plans(levels)
+
+    for level, (_, row) in zip(levels, plans.iterrows()):
+        maturity = level if level == level else None
+        expected = calculate_plan(maturity) if maturity else {'code': '00', 'description': 'Pendiente'}
+        assert row['adaptation_plan'] == expected['code']
+        assert row['adaptation_plan_desc'] == expected['description']
+        assert row['diagnosis_status'] == get_diagnosis_status(maturity)
+
+def test_calculate_plans_from_dataframe():
+    frame = pd.DataFrame({'maturity': ['L5', None, 'L8']}, index=['a', 'b', 'c'])
+    plans = calculate_plans(frame)
+
+    assert list(plans.index) == ['a', 'b', 'c']
+    assert plans['adaptation_plan'].dtype == 'category'
+    assert plans['adaptation_plan'].tolist() == ['03', '00', '05']
+    assert plans['diagnosis_status'].tolist() == ['01', '00', '01']
+    assert calculate_plans([]).empty
@@ -0,0 +1,131 @@
+import json
+import threading
+import time
+
+import pytest
+
+from services.evals import (
+    Assessor,
+    EvalRunner,
+    RuleBasedAssessor,
+    build_report,
+    citation_matches,
+    percentile,
+    run_golden_set,
+)
+
+THRESHOLDS = {'citation_coverage_min': 0.8, 'citation_match_min': 0.8, 'false_red_rate_max': 0.1}
+
+EXT_CASE = {
+    'test_id': 'EXT-900',
+    'input_context': {'doc_text': 'Existe un procedimiento documentado. Se aplica desde 2022.', 'query': 'Nivel de MG_03_02'},
+    'expected_output': {'status': 'success', 'assessment': {'measure_id': 'MG_03_02', 'maturity': 'L6'}},
+    'grading_criteria': {'match_type': 'semantic', 'citation_verification': 'strict'},
+}
+NEG_CASE = {
+    'test_id': 'NEG-900',
+    'input_context': {'doc_text': 'El sistema clasifica correos.', 'query': 'Nivel de MG_03_02'},
+    'expected_output': {'status': 'insufficient_evidence'},
+    'grading_criteria': {'match_type': 'exact_status', 'forbidden_output': ['L1', 'L2', 'L3', 'L4', 'L5', 'L6', 'L7', 'L8']},
+}
+
+
+class FixedAssessor(Assessor):
+    """Always asserts L5 with a citation that is not in the document."""
+
+    name = 'fixed'
+
+    def assess(self, input_context):
+        return {
+            'status': 'success',
+            'metadata': {},
+            'assessment': {'measure_id': 'MG_03_02', 'maturity': 'L5'},
+            'claims': [{'claim_text': 'x', 'citations': [{'snippet_quote': 'texto inventado por completo'}]}],
+        }
+
+
+def test_golden_set_meets_manifest_thresholds():
+    report = run_golden_set()
+    assert report['cases'] == 5
+    assert report['pass_rate'] == 1.0
+    assert set(report['by_kind']) == {'EXT', 'NEG', 'PLAN'}
+    assert report['ok'] is True
+    assert {g['name']: g['passed'] for g in report['gates']}['false_red_rate_max'] is True
+    assert report['latency_ms']['p50'] <= report['latency_ms']['p99'] <= report['latency_ms']['max']
+
+
+def test_plan_cases_grade_against_calculate_plan():
+    runner = EvalRunner()
+    ok = runner.run_case({
+        'test_id': 'PLAN-900', 'input_context': {'maturity_level': 'L5'},
+        'expected_output': {'adaptation_plan': {'code': '03', 'description': 'Adaptación Completa'}},
+        'grading_criteria': {'match_type': 'exact'},
+    })
+    wrong = runner.run_case({
+        'test_id': 'PLAN-901', 'input_context': {'maturity_level': 'L5'},
+        'expected_output': {'adaptation_plan': {'code': '03', 'description': 'adaptacion completa'}},
+        'grading_criteria': {'match_type': 'exact'},
+    })
+    assert ok.passed
+    assert not wrong.passed
+
+
+def test_rule_based_assessor_cites_evidence():
+    result = EvalRunner().run_case(EXT_CASE)
+    assert result.passed, result.failures
+    assert (result.citations, result.citations_matched) == (2, 2)
+    assert RuleBasedAssessor().assess(NEG_CASE['input_context'])['status'] == 'insufficient_evidence'
+
+
+def test_citation_matching_modes():
+    source = 'La empresa ha implementado un sistema de monitorización de riesgos.'
+    assert citation_matches('ha implementado un SISTEMA de monitorizacion', source, 'strict')
+    assert not citation_matches('ha implementado el sistema de monitorizacion', source, 'strict')
+    assert citation_matches('ha implementado el sistema de monitorizacion', source, 'fuzzy')
+    assert not citation_matches('dispone de un comité de ética', source, 'fuzzy')
+
+
+def test_failing_assessor_breaks_thresholds():
+    results, elapsed = EvalRunner(FixedAssessor()).run([EXT_CASE, NEG_CASE])
+    report = build_report(results, elapsed, THRESHOLDS)
+    assert report['passed'] == 0
+    gates = {g['name']: g for g in report['gates']}
+    assert gates['citation_match_min']['value'] == 0.0 and gates['citation_match_min']['passed'] is False
+    assert gates['false_red_rate_max']['value'] == 1.0 and gates['false_red_rate_max']['passed'] is False
+    assert report['ok'] is False
+    neg = next(f for f in report['failures'] if f['test_id'] == 'NEG-900')
+    assert any('forbidden output: L5' in reason for reason in neg['reasons'])
+
+
+def test_runner_bounds_concurrency_and_keeps_order():
+    active, peak, lock = [0], [0], threading.Lock()
+
+    class SlowAssessor(RuleBasedAssessor):
+        def assess(self, input_context):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.005)
+            with lock:
+                active[0] -= 1
+            return super().assess(input_context)
+
+    cases = ({**NEG_CASE, 'test_id': f'NEG-{i:04d}'} for i in range(60))
+    results, _ = EvalRunner(SlowAssessor(), concurrency=4).run(cases)
+    assert [r.test_id for r in results] == [f'NEG-{i:04d}' for i in range(60)]
+    assert all(r.passed for r in results)
+    assert peak[0] <= 4
+
+
+def test_dataset_path_resolves_against_manifest(tmp_path):
+    (tmp_path / 'set.jsonl').write_text(json.dumps(EXT_CASE) + '\n\n' + json.dumps(NEG_CASE) + '\n', encoding='utf-8')
+    (tmp_path / 'manifest.yaml').write_text(
+        'evals:\n  dataset: set.jsonl\n  pass_thresholds:\n    false_red_rate_max: 0.0\n', encoding='utf-8'
+    )
+    report = run_golden_set(tmp_path / 'manifest.yaml')
+    assert report['cases'] == 2 and report['ok']
+
+
+@pytest.mark.parametrize('p, expected', [(50, 2), (90, 4), (99, 4), (0, 1)])
+def test_percentile_nearest_rank(p, expected):
+    assert percentile([4, 1, 3, 2], p) == expected
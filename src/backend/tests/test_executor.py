@@ -0,0 +1,61 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services import executor as executor_module
+from services.executor import ExecutorSaturated, WorkloadExecutor
+from main import app
+
+client = TestClient(app)
+
+
+def test_run_offloads_and_counts():
+    executor = WorkloadExecutor(cpu_workers=1, io_workers=2, max_queue=1)
+
+    async def scenario():
+        return await asyncio.gather(executor.run_io(sum, [1, 2]), executor.run_cpu(max, [3, 9]))
+
+    assert asyncio.run(scenario()) == [3, 9]
+    stats = executor.stats()
+    assert stats['io']['completed'] == 1
+    assert stats['cpu']['completed'] == 1
+    assert stats['io']['in_flight'] == 0
+    executor.shutdown()
+
+
+def test_saturated_lane_rejects_new_work():
+    executor = WorkloadExecutor(cpu_workers=1, io_workers=1, max_queue=1)
+    release = threading.Event()
+
+    async def scenario():
+        running = [asyncio.ensure_future(executor.run_io(release.wait)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        assert executor.stats()['io']['in_flight'] == 1
+        assert executor.stats()['io']['queued'] == 1
+        with pytest.raises(ExecutorSaturated) as exc_info:
+            await executor.run_io(release.wait)
+        # Work already admitted by its request may still be enqueued
+        running.append(asyncio.ensure_future(executor.run_io(release.wait, admitted=True)))
+        release.set()
+        await asyncio.gather(*running)
+        return exc_info.value
+
+    error = asyncio.run(scenario())
+    assert error.lane == 'io'
+    assert executor.stats()['io']['rejected'] == 1
+    executor.shutdown()
+
+
+def test_saturation_maps_to_503_with_retry_after(monkeypatch, assessed_application):
+    assessed_application('app-1')
+    saturated = WorkloadExecutor(cpu_workers=1, io_workers=1, max_queue=0, retry_after=7)
+    saturated._lanes['cpu'].outstanding = 1
+    monkeypatch.setattr(executor_module, '_executor', saturated)
+
+    response = client.post('/export/full', json={'application_id': 'app-1', 'requirements': []})
+
+    assert response.status_code == 503
+    assert response.headers['retry-after'] == '7'
+    assert client.get('/health/executor').json()['cpu']['rejected'] == 1
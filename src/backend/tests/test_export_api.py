@@ -0,0 +1,89 @@
+import json
+import zipfile
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+
+from excel_engine import export_api
+from excel_engine.template_filler import TemplateFiller, TEMPLATE_MAPPING
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def export_templates(templates_dir, monkeypatch):
+    monkeypatch.setenv('EXPORT_POOL_SIZE', '2')
+    monkeypatch.setattr(export_api, 'TEMPLATES_DIR', str(templates_dir))
+    monkeypatch.setattr(export_api, 'filler', TemplateFiller(str(templates_dir)))
+    return templates_dir
+
+
+def _requirement(code, maturity='L3'):
+    return {
+        'requirement_code': code,
+        'assessments_mg': [{'mg_id': 'MG_TRANS_01', 'subpart_id': '13.1', 'difficulty': '02', 'maturity': maturity}],
+    }
+
+
+def test_export_single(export_templates, assessed_application):
+    url = '/export/single/TRANSPARENCY'
+    assert client.post(url, json=_requirement('TRANSPARENCY')).status_code == 422
+    # Unknown applications do not pass the Gatekeeper
+    assert client.post(url, params={'application_id': 'app-1'}, json=_requirement('TRANSPARENCY')).status_code == 409
+
+    response = client.post(url, params={'application_id': assessed_application()}, json=_requirement('TRANSPARENCY'))
+    assert response.status_code == 200
+    assert load_workbook(BytesIO(response.content))['Autoeval MG']['E2'].value == 'L3'
+
+
+def test_export_full_writes_zip_in_request_order(export_templates, assessed_application):
+    assessed_application('app-1')
+    (export_templates / TEMPLATE_MAPPING['LOGGING']).unlink()
+    payload = {
+        'application_id': 'app-1',
+        'requirements': [
+            _requirement('TRANSPARENCY', 'L1'),
+            _requirement('NOT_A_REQ'),
+            _requirement('LOGGING'),
+            _requirement('ACCURACY', 'L8'),
+        ],
+    }
+
+    response = client.post('/export/full', json=payload)
+    assert response.status_code == 200
+
+    archive = zipfile.ZipFile(BytesIO(response.content))
+    assert archive.namelist() == ['TRANSPARENCY_Checklist.xlsx', 'ACCURACY_Checklist.xlsx', 'manifest.json']
+
+    wb = load_workbook(BytesIO(archive.read('ACCURACY_Checklist.xlsx')))
+    assert wb['Autoeval MG']['E2'].value == 'L8'
+
+    manifest = json.loads(archive.read('manifest.json'))
+    assert manifest['application_id'] == 'app-1'
+    assert [(f['requirement_code'], f['status']) for f in manifest['files']] == [
+        ('TRANSPARENCY', 'ok'),
+        ('NOT_A_REQ', 'skipped'),
+        ('LOGGING', 'failed'),
+        ('ACCURACY', 'ok'),
+    ]
+    assert 'No template found' in manifest['files'][2]['error']
+
+
+@pytest.mark.parametrize('compression, expected', [
+    (None, zipfile.ZIP_STORED),
+    ('deflated', zipfile.ZIP_DEFLATED),
+])
+def test_export_full_compression_mode(export_templates, compression, expected, assessed_application):
+    assessed_application('app-2')
+    payload = {'application_id': 'app-2', 'requirements': [_requirement('TRANSPARENCY')]}
+    params = {'compression': compression} if compression else {}
+
+    response = client.post('/export/full', json=payload, params=params)
+    assert response.status_code == 200
+
+    archive = zipfile.ZipFile(BytesIO(response.content))
+    assert archive.getinfo('TRANSPARENCY_Checklist.xlsx').compress_type == expected
+    assert archive.testzip() is None
@@ -0,0 +1,167 @@
+import os
+import socket
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+
+from excel_engine import export_api
+from excel_engine.template_filler import TemplateFiller
+from services import export_jobs
+from services.export_jobs import ExportJob, ExportJobQueue
+from services.storage import LocalStorageBackend
+from main import app
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def job_queue(tmp_path, templates_dir, monkeypatch):
+    monkeypatch.setattr(export_api, 'TEMPLATES_DIR', str(templates_dir))
+    monkeypatch.setattr(export_api, 'filler', TemplateFiller(str(templates_dir)))
+    jobs = ExportJobQueue(LocalStorageBackend(tmp_path / 'storage'), workers=2)
+    monkeypatch.setattr(export_jobs, '_job_queue', jobs)
+    yield jobs
+    jobs.shutdown()
+
+
+def _wait_for(job_id, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/export/jobs/{job_id}').json()
+        if job['status'] in ('DONE', 'FAILED'):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f'Job {job_id} did not finish')
+
+
+def test_single_export_job_lifecycle(job_queue, assessed_application):
+    assessed_application('app-1')
+    payload = {
+        'requirement_code': 'TRANSPARENCY',
+        'assessments_mg': [{'mg_id': 'MG_TRANS_01', 'subpart_id': '13.1', 'maturity': 'L6'}],
+    }
+    response = client.post('/export/jobs/single/TRANSPARENCY', json=payload, params={'application_id': 'app-1'})
+    assert response.status_code == 202
+    queued = response.json()
+    assert queued['status'] in ('QUEUED', 'RUNNING', 'DONE')
+    assert queued['template_version_map']['TRANSPARENCY']
+
+    job = _wait_for(queued['id'])
+    assert job['status'] == 'DONE'
+    assert job['started_at'] and job['completed_at'] and job['expires_at']
+
+    download = client.get(job['download_url'])
+    assert download.status_code == 200
+    assert download.headers['content-disposition'] == 'attachment; filename="TRANSPARENCY_Checklist_Filled.xlsx"'
+    assert len(download.content) == job['file_size_bytes']
+    assert load_workbook(BytesIO(download.content))['Autoeval MG']['E2'].value == 'L6'
+
+    latest = client.get('/export/download/app-1/TRANSPARENCY')
+    assert latest.content == download.content
+
+
+def test_full_export_job(job_queue, assessed_application):
+    assessed_application('app-2')
+    payload = {
+        'application_id': 'app-2',
+        'requirements': [
+            {'requirement_code': 'LOGGING', 'assessments_mg': []},
+            {'requirement_code': 'BOGUS', 'assessments_mg': []},
+        ],
+    }
+    queued = client.post('/export/jobs/full', json=payload).json()
+    job = _wait_for(queued['id'])
+    assert job['status'] == 'DONE'
+
+    archive = zipfile.ZipFile(BytesIO(client.get('/export/download/app-2/FULL').content))
+    assert archive.namelist() == ['LOGGING_Checklist.xlsx', 'manifest.json']
+
+
+def test_failed_and_missing_jobs(job_queue):
+    def explode():
+        raise RuntimeError('boom')
+
+    job = job_queue.enqueue(ExportJob(application_id='app-3', export_type='FULL_ZIP', file_name='x.zip'), explode)
+    assert _wait_for(job.id)['error_message'] == 'boom'
+    assert client.get(f'/export/jobs/{job.id}/download').status_code == 500
+
+    assert client.get('/export/jobs/does-not-exist').status_code == 404
+    assert client.get('/export/download/app-3/TRANSPARENCY').status_code == 404
+
+
+def _wait_until_done(jobs, job_id):
+    deadline = time.monotonic() + 5
+    while jobs.get(job_id).status != 'DONE' and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return jobs.get(job_id)
+
+
+def test_expired_artifacts_are_purged(tmp_path):
+    jobs = ExportJobQueue(LocalStorageBackend(tmp_path), workers=1, ttl=timedelta(seconds=0))
+    queued = jobs.enqueue(ExportJob(application_id='app-4', export_type='FULL_ZIP', file_name='x.zip'), lambda: b'data')
+    job = _wait_until_done(jobs, queued.id)
+    assert queued.status == 'QUEUED'  # state changes are new rows, not edits of the caller's job
+
+    assert jobs.storage.exists(job.storage_path)
+    assert jobs.purge_expired() == [job.id]
+    assert not jobs.storage.exists(job.storage_path)
+    assert jobs.get(job.id) is None
+    jobs.shutdown()
+
+    # An idle queue purges on its timer
+    jobs = ExportJobQueue(LocalStorageBackend(tmp_path), workers=1, ttl=timedelta(seconds=0), purge_interval=0.01)
+    built = threading.Event()
+    job = jobs.enqueue(
+        ExportJob(application_id='app-4', export_type='FULL_ZIP', file_name='y.zip'), lambda: built.set() or b'data',
+    )
+    assert built.wait(5)
+    deadline = time.monotonic() + 5
+    while jobs.get(job.id) is not None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert jobs.get(job.id) is None
+    assert not jobs.storage.exists(f'exports/app-4/{job.id}/y.zip')
+    jobs.shutdown()
+
+
+def test_jobs_survive_a_restart(job_queue, export_job_repository, assessed_application):
+    assessed_application('app-5')
+    payload = {'requirement_code': 'TRANSPARENCY', 'assessments_mg': []}
+    queued = client.post('/export/jobs/single/TRANSPARENCY', json=payload, params={'application_id': 'app-5'}).json()
+    assert _wait_for(queued['id'])['status'] == 'DONE'
+    stuck = ExportJob(
+        application_id='app-5', export_type='FULL_ZIP', file_name='z.zip', status='RUNNING', owner=job_queue.owner,
+    )
+    # Jobs of another worker process still running are left alone
+    elsewhere = ExportJob(
+        application_id='app-5', export_type='FULL_ZIP', file_name='w.zip', status='RUNNING',
+        owner=f'{socket.gethostname()}:{os.getppid()}',
+    )
+    for job in (stuck, elsewhere):
+        export_job_repository.save(job)
+    job_queue.shutdown()
+
+    restarted = ExportJobQueue(job_queue.storage, workers=1, repository=export_job_repository)
+    export_jobs._job_queue = restarted
+    try:
+        assert client.get(f"/export/jobs/{queued['id']}").json()['status'] == 'DONE'
+        assert client.get(queued['download_url']).status_code == 200
+        assert client.get('/export/download/app-5/TRANSPARENCY').status_code == 200
+        assert restarted.get(stuck.id).status == 'FAILED'
+        assert restarted.get(elsewhere.id).status == 'RUNNING'
+        assert restarted.stats()['DONE'] == 1
+    finally:
+        restarted.shutdown()
+
+
+def test_local_storage_round_trip(tmp_path):
+    storage = LocalStorageBackend(tmp_path)
+    assert storage.put('exports/app/1/a.bin', [b'ab', b'cd']) == 4
+    assert storage.get('exports/app/1/a.bin') == b'abcd'
+    with pytest.raises(ValueError):
+        storage.put('../escape.bin', [b'x'])
@@ -0,0 +1,174 @@
+import json
+import sys
+from pathlib import Path
+
+import openpyxl
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[3] / 'tools'))
+
+import extract_aesia_checklist as extractor
+
+
+def build_checklist(path, article_offset=2, with_article_header=True, extra_rows=0):
+    """Write a Guía 16-style checklist with the three sheets the extractor reads."""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = 'Artículo RIA'
+    for _ in range(article_offset):
+        ws.append(['Artículo 13 - Transparencia'])
+    if with_article_header:
+        ws.append(['Apartado', 'Descripción', 'Descripción resumida'])
+    ws.append(['13.1', ' Diseño transparente ', 'Transparencia'])
+    ws.append([None, 'fila sin apartado'])
+    ws.append(['13.3.a', 'Identidad del proveedor'])
+    ws.append(['13.3.b.i', 'Características', 'Limitaciones'])
+    for i in range(extra_rows):
+        ws.append([f'13.{i + 10}', f'Apartado {i}', None])
+    ws.append(['   ', 'fin de tabla'])
+    ws.append(['99.9', 'después del fin'])
+
+    ws = wb.create_sheet('Medidas guías (MG)')
+    ws.append(['Medidas guía'])
+    ws.append(['IDMedida', 'Descripción', 'Preguntas guía'])
+    ws.append(['MG_TRANS_01', 'Diseñar el sistema', '¿Pregunta 1?\n\n ¿Pregunta 2? '])
+    ws.append(['MG_TRANS_02', 'Identificar al proveedor'])
+    ws.append(['mg_trans_03', 'Documentar', '¿Pregunta 3?'])
+    ws.append(['Notas', 'no es una medida'])
+    ws.append(['MG_TRANS_04', 'ignorada'])
+
+    ws = wb.create_sheet('Relación MG-Apart.')
+    ws.append(['Relación de medidas'])
+    ws.append([None, 'MG_TRANS_01', 'MG_TRANS_02', 'mg_trans_03', 'MG_FOREIGN'])
+    ws.append(['13.1. Diseño del sistema', 'X', None, 'x'])
+    ws.append(['13.3.a Identidad', None, ' X '])
+    ws.append(['13.9 Desconocido', 'X'])
+    ws.append(['Texto libre', 'X'])
+    ws.append(['13.3.b.i', 'X', 'X', 'X'])
+    wb.save(path)
+    return path
+
+
+EXPECTED = {
+    'requirement_code': 'TRANSPARENCY',
+    'source_file': 'checklist.xlsx',
+    'subparts': [
+        {'subpart_id': '13.1', 'description': 'Diseño transparente', 'short_description': 'Transparencia'},
+        {'subpart_id': '13.3.a', 'description': 'Identidad del proveedor', 'short_description': ''},
+        {'subpart_id': '13.3.b.i', 'description': 'Características', 'short_description': 'Limitaciones'},
+    ],
+    'measures': [
+        {'mg_id': 'MG_TRANS_01', 'description': 'Diseñar el sistema', 'guidance_questions': ['¿Pregunta 1?', '¿Pregunta 2?']},
+        {'mg_id': 'MG_TRANS_02', 'description': 'Identificar al proveedor', 'guidance_questions': []},
+        {'mg_id': 'mg_trans_03', 'description': 'Documentar', 'guidance_questions': ['¿Pregunta 3?']},
+    ],
+    'relations': [
+        {'mg_id': 'MG_TRANS_01', 'subpart_id': '13.1'},
+        {'mg_id': 'mg_trans_03', 'subpart_id': '13.1'},
+        {'mg_id': 'MG_TRANS_02', 'subpart_id': '13.3.a'},
+        {'mg_id': 'MG_TRANS_01', 'subpart_id': '13.3.b.i'},
+        {'mg_id': 'MG_TRANS_02', 'subpart_id': '13.3.b.i'},
+        {'mg_id': 'mg_trans_03', 'subpart_id': '13.3.b.i'},
+    ],
+}
+
+
+def test_extract_checklist_output(tmp_path, capsys):
+    path = build_checklist(tmp_path / 'checklist.xlsx')
+    assert extractor.extract_checklist(path, 'TRANSPARENCY') == EXPECTED
+    assert "Skipping row 5: Subpart '13.9' not found" in capsys.readouterr().out
+
+
+def test_streamed_and_full_workbooks_parse_identically(tmp_path):
+    path = build_checklist(tmp_path / 'checklist.xlsx', article_offset=0, with_article_header=False)
+    results = []
+    for read_only in (False, True):
+        wb = openpyxl.load_workbook(path, read_only=read_only, data_only=True)
+        subparts = extractor.parse_article_sheet(wb, 'Artículo RIA')
+        measures = extractor.parse_measures_sheet(wb, 'Medidas guías (MG)')
+        relations = extractor.parse_relation_sheet(
+            wb, 'Relación MG-Apart.', [m['mg_id'] for m in measures], [s['subpart_id'] for s in subparts]
+        )
+        wb.close()
+        results.append(json.dumps([subparts, measures, relations], ensure_ascii=False))
+
+    assert results[0] == results[1]
+    # Without a header the first row is skipped and parsing starts on row 2
+    assert [s['subpart_id'] for s in json.loads(results[1])[0]] == ['13.3.a', '13.3.b.i']
+
+
+def test_missing_sheet_and_matrix_header(tmp_path):
+    path = build_checklist(tmp_path / 'checklist.xlsx')
+    wb = openpyxl.load_workbook(path, read_only=True)
+    with pytest.raises(ValueError, match="Sheet 'Nope' not found"):
+        extractor.parse_article_sheet(wb, 'Nope')
+    with pytest.raises(ValueError, match='Could not detect Matrix header'):
+        extractor.parse_relation_sheet(wb, 'Relación MG-Apart.', ['MG_X'], ['13.1'])
+    wb.close()
+
+
+def test_cli_writes_json(tmp_path, monkeypatch):
+    path = build_checklist(tmp_path / 'checklist.xlsx')
+    output = tmp_path / 'out.json'
+    monkeypatch.setattr(sys, 'argv', ['extract', str(path), '--req-code', 'TRANSPARENCY', '--output', str(output)])
+    extractor.main()
+    assert json.loads(output.read_text(encoding='utf-8')) == EXPECTED
+
+
+MANIFEST = """\
+version: "1.0"
+source: "AESIA Guía 16"
+catalog_release: "TEST_RELEASE"
+
+defaults:
+  sheet_names:
+    article: "Artículo RIA"
+    measures: "Medidas guías (MG)"
+    relation: "Relación MG-Apart."
+
+requirements:
+  - requirement_code: "TRANSPARENCY"
+    description: "Transparencia (Art. 13)"
+    source_xlsx: "5. Transparencia_Checklist.xlsx"
+  - requirement_code: "LOGGING"
+    description: "Registros (Art. 12)"
+    source_xlsx: "9. Registros_Checklist.xlsx"
+  - requirement_code: "ACCURACY"
+    description: "Precisión (Art. 15)"
+    source_xlsx: "6. Precisión_Checklist.xlsx"
+"""
+
+
+def test_manifest_builds_consolidated_catalog(tmp_path):
+    manifest = tmp_path / 'manifest.yaml'
+    manifest.write_text(MANIFEST, encoding='utf-8')
+    for name in ('5. Transparencia_Checklist.xlsx', '9. Registros_Checklist.xlsx', '6. Precisión_Checklist.xlsx'):
+        build_checklist(tmp_path / name)
+
+    summary = extractor.build_catalog(manifest, workers=2)
+    assert summary == {'extracted': ['TRANSPARENCY', 'LOGGING', 'ACCURACY'], 'skipped': []}
+
+    catalog = json.loads((tmp_path / 'catalog.json').read_text(encoding='utf-8'))
+    assert catalog['catalog_release'] == 'TEST_RELEASE'
+    assert [r['requirement_code'] for r in catalog['requirements']] == ['TRANSPARENCY', 'LOGGING', 'ACCURACY']
+    logging_entry = catalog['requirements'][1]
+    assert logging_entry['description'] == 'Registros (Art. 12)'
+    assert logging_entry['relations'] == EXPECTED['relations']
+    assert len(logging_entry['source_sha256']) == 64
+
+    # Only the modified checklist is parsed again
+    build_checklist(tmp_path / '9. Registros_Checklist.xlsx', extra_rows=2)
+    summary = extractor.build_catalog(manifest, workers=2)
+    assert summary == {'extracted': ['LOGGING'], 'skipped': ['TRANSPARENCY', 'ACCURACY']}
+    catalog = json.loads((tmp_path / 'catalog.json').read_text(encoding='utf-8'))
+    assert len(catalog['requirements'][1]['subparts']) == 5
+
+    assert extractor.build_catalog(manifest, force=True)['skipped'] == []
+
+
+def test_manifest_missing_source(tmp_path):
+    manifest = tmp_path / 'manifest.yaml'
+    manifest.write_text(MANIFEST, encoding='utf-8')
+    with pytest.raises(FileNotFoundError, match='TRANSPARENCY'):
+        extractor.build_catalog(manifest)
+    assert not (tmp_path / 'catalog.json').exists()
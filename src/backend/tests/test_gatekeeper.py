@@ -0,0 +1,89 @@
+from fastapi.testclient import TestClient
+
+from services.assessments import upsert_assessments
+from services.gatekeeper import Gatekeeper, get_gatekeeper, is_valid_attachment_url
+from main import app
+
+client = TestClient(app)
+
+APP = 'app-1'
+
+
+def test_attachment_url_rules():
+    assert is_valid_attachment_url(None)
+    assert is_valid_attachment_url('https://storage.example.com/ma/informe.pdf')
+    assert not is_valid_attachment_url('')
+    assert not is_valid_attachment_url('informe.pdf')
+    assert not is_valid_attachment_url('ftp://example.com/informe.pdf')
+    assert not is_valid_attachment_url('https://example.com/mi informe.pdf')
+
+
+def test_counters_follow_writes(assessment_repository):
+    gatekeeper = get_gatekeeper()
+    report = gatekeeper.check(APP)
+    assert (report['known'], report['passed']) == (False, False)
+
+    upsert_assessments(APP, 'b1', [{'mg_id': 'MG_TRANS_03'}, {'mg_id': 'MG_TRANS_02'}, {'mg_id': 'MG_TRANS_01', 'maturity': 'L5'}])
+    report = gatekeeper.check(APP)
+    assert report['known'] and not report['passed']
+    assert report['checks'] == {'pending_mg': 2, 'unlinked_ma': 0, 'invalid_attachments': 0}
+    assert report['requirements'] == {'TRANSPARENCY': {'pending_mg': 2, 'unlinked_ma': 0, 'invalid_attachments': 0}}
+    assert gatekeeper.offenders(APP)['pending_mg'] == [
+        {'mg_id': 'MG_TRANS_02', 'subpart_id': '13.3.a', 'requirement_code': 'TRANSPARENCY'},
+        {'mg_id': 'MG_TRANS_03', 'subpart_id': '13.3.b.i', 'requirement_code': 'TRANSPARENCY'},
+    ]
+
+    assessment_repository.put_ma(APP, {'id': 'MA_1', 'title': 'Registro', 'attachment_url': 'registro.pdf'})
+    assessment_repository.put_ma(APP, {
+        'id': 'MA_2', 'title': 'Auditoría', 'attachment_url': 'https://x.example/a.pdf',
+        'requirement_codes': ['TRANSPARENCY'],
+    })
+    report = gatekeeper.check(APP)
+    assert report['checks'] == {'pending_mg': 2, 'unlinked_ma': 1, 'invalid_attachments': 1}
+    offenders = gatekeeper.offenders(APP)
+    assert offenders['unlinked_ma'] == [{'ma_id': 'MA_1'}]
+    assert offenders['invalid_attachments'] == [{'ma_id': 'MA_1', 'attachment_url': 'registro.pdf', 'requirement_codes': []}]
+
+    upsert_assessments(APP, 'b2', [{'mg_id': 'MG_TRANS_02', 'maturity': 'L2'}, {'mg_id': 'MG_TRANS_03', 'maturity': 'L8'}])
+    assessment_repository.put_ma(APP, {
+        'id': 'MA_1', 'title': 'Registro', 'attachment_url': 'https://x.example/r.pdf', 'requirement_codes': ['TRANSPARENCY'],
+    })
+    report = gatekeeper.check(APP)
+    assert report['passed'] and report['requirements'] == {}
+
+    assessment_repository.put_ma(APP, {'id': 'MA_3', 'title': 'Sin enlace'})
+    assert not gatekeeper.check(APP)['passed']
+    assert assessment_repository.delete_ma(APP, 'MA_3')
+    assert gatekeeper.check(APP)['passed']
+
+
+def test_state_loads_from_existing_rows(assessment_repository):
+    upsert_assessments(APP, 'b1', [{'mg_id': 'MG_TRANS_02'}])
+    assessment_repository.put_ma(APP, {'id': 'MA_1', 'title': 'Registro', 'requirement_codes': ['TRANSPARENCY']})
+    fresh = Gatekeeper(assessment_repository)
+    assert fresh.check(APP)['checks'] == {'pending_mg': 1, 'unlinked_ma': 0, 'invalid_attachments': 0}
+    fresh.close()
+
+
+def test_endpoints_and_export_guard():
+    upsert_assessments(APP, 'b1', [{'mg_id': 'MG_TRANS_01', 'maturity': 'L5'}])
+    client.put(f'/api/applications/{APP}/measures-additional/MA_1', json={'title': 'Registro', 'attachment_url': 'nope'})
+    assert client.put(
+        f'/api/applications/{APP}/measures-additional/MA_2', json={'title': 'X', 'requirement_codes': ['NOPE']},
+    ).status_code == 422
+
+    body = client.get(f'/api/applications/{APP}/gatekeeper', params={'details': True}).json()
+    assert not body['passed']
+    assert body['offenders']['unlinked_ma'] == [{'ma_id': 'MA_1'}]
+
+    response = client.post('/export/full', json={'application_id': APP, 'requirements': []})
+    assert response.status_code == 409
+    assert response.json()['gatekeeper']['checks']['invalid_attachments'] == 1
+    preevaluacion = {'project_metadata': {'nombre': 'Demo', 'sector': 'Salud'}, 'assessments': []}
+    assert client.post('/api/export-excel', params={'application_id': APP}, json=preevaluacion).status_code == 409
+    assert client.post('/api/export-excel', json=preevaluacion).status_code == 422
+
+    assert client.delete(f'/api/applications/{APP}/measures-additional/MA_1').status_code == 204
+    assert client.delete(f'/api/applications/{APP}/measures-additional/MA_1').status_code == 404
+    assert client.get(f'/api/applications/{APP}/gatekeeper').json()['passed']
+    assert client.post('/export/full', json={'application_id': APP, 'requirements': []}).status_code == 200
@@ -0,0 +1,77 @@
+from io import BytesIO
+
+import pytest
+from openpyxl import load_workbook
+
+from excel_engine import generator
+
+APPLICATION_DATA = {
+    'project_metadata': {'nombre': 'Streaming', 'sector': 'Salud', 'trl': '6'},
+    'requirements': [{'id': 'REQ_01', 'article_ref': 'Art. 9', 'title': 'Gestión de riesgos'}],
+    'measures': [{'id': f'MG_{i:03d}', 'req': 'REQ_01', 'guide': 'Guía 4', 'desc': 'Medida'} for i in range(50)],
+    'measures_map': {'MG_001': [1], 'MG_002': [0]},
+    'assessments_mg': [
+        {
+            'measure_id': f'MG_{i:03d}',
+            'difficulty': '02',
+            'maturity': 'L6' if i % 2 else 'L2',
+            'diagnosis_status': '01' if i % 3 else '00',
+            'adaptation_plan': '03',
+            'adaptation_plan_desc': 'Plan',
+        }
+        for i in range(200)
+    ],
+}
+
+
+def _snapshot(content):
+    """Values, styles, merged ranges and column widths of every sheet."""
+    wb = load_workbook(BytesIO(content))
+    sheets = []
+    for ws in wb:
+        cells = [
+            (
+                cell.coordinate, cell.value, cell.font.b, cell.font.i, cell.font.sz, cell.font.color,
+                cell.fill.fgColor.rgb, cell.border.left.style, cell.alignment.horizontal, cell.alignment.wrap_text,
+            )
+            for row in ws.iter_rows() for cell in row
+            # B3 of the cover holds the generation timestamp
+            if (cell.value is not None or cell.has_style) and (ws.title, cell.coordinate) != ('1. Portada', 'B3')
+        ]
+        widths = {key: dim.width for key, dim in ws.column_dimensions.items() if dim.width}
+        sheets.append((ws.title, sorted(map(str, ws.merged_cells.ranges)), widths, cells))
+    return sheets
+
+
+def test_write_only_matches_standard_output():
+    standard = _snapshot(generator.generate_excel(APPLICATION_DATA, write_only=False))
+    streamed = _snapshot(generator.generate_excel(APPLICATION_DATA, write_only=True))
+
+    assert [sheet[0] for sheet in standard] == [
+        '1. Portada', '2. Intro', '3. Artículo RIA', '4. Medidas Guía', '5. Relación MG',
+        '6. Autoev. MG', '7. Medidas MA', '8. Relación MA', '9. Autoev. MA',
+    ]
+    assert streamed == standard
+
+
+@pytest.mark.parametrize('threshold, expected', [(10_000, False), (100, True)])
+def test_mode_is_selected_by_row_count(monkeypatch, threshold, expected):
+    seen = []
+    original = generator.Workbook
+    monkeypatch.setattr(generator, 'WRITE_ONLY_THRESHOLD', threshold)
+    monkeypatch.setattr(generator, 'Workbook', lambda write_only=False: seen.append(write_only) or original(write_only=write_only))
+
+    generator.generate_excel(APPLICATION_DATA)
+    assert seen == [expected]
+
+
+def test_table_cells_use_named_styles():
+    wb = load_workbook(BytesIO(generator.generate_excel(APPLICATION_DATA, write_only=False)))
+    assert set(generator.NAMED_STYLES) <= set(wb.named_styles)
+
+    ws = wb['6. Autoev. MG']
+    assert ws['A5'].style == 'header'
+    assert ws['A6'].style == 'cell'
+    assert ws['D6'].style == 'status-pending'
+    assert ws['D7'].style == 'status-ok'
+    assert wb['5. Relación MG']['B6'].style == 'matrix-hit'
@@ -0,0 +1,85 @@
+import json
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from excel_engine import export_api
+from excel_engine.template_filler import TEMPLATE_MAPPING, TemplateFiller
+from services import catalog as catalog_module
+from services import http_cache
+from services.catalog import CatalogStore
+from main import app
+
+client = TestClient(app)
+
+ARTIFACT = {
+    'catalog_release': 'R1',
+    'requirements': [{
+        'requirement_code': 'TRANSPARENCY',
+        'description': 'Transparencia (Art. 13)',
+        'subparts': [{'subpart_id': '13.1', 'description': 'Diseño transparente', 'short_description': ''}],
+        'measures': [{'mg_id': 'MG_TRANS_01', 'description': 'Diseñar', 'guidance_questions': []}],
+        'relations': [{'mg_id': 'MG_TRANS_01', 'subpart_id': '13.1'}],
+    }],
+}
+
+
+@pytest.fixture
+def static_responses(monkeypatch):
+    cache = http_cache.StaticResponseCache(max_age=600)
+    monkeypatch.setattr(http_cache, '_static_responses', cache)
+    return cache
+
+
+@pytest.mark.parametrize('path', ['/api/requirements', '/api/maturity-levels'])
+def test_catalog_endpoints_revalidate_with_etag(static_responses, path):
+    first = client.get(path)
+    assert first.status_code == 200
+    assert first.headers['cache-control'] == 'public, max-age=600, must-revalidate'
+
+    second = client.get(path)
+    assert second.headers['etag'] == first.headers['etag']
+    assert second.content == first.content
+    assert static_responses.builds == 1
+
+    revalidated = client.get(path, headers={'If-None-Match': first.headers['etag']})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b''
+    assert revalidated.headers['etag'] == first.headers['etag']
+
+
+def test_catalog_change_invalidates_payload(static_responses, tmp_path, monkeypatch):
+    path = tmp_path / 'catalog.json'
+    artifact = json.loads(json.dumps(ARTIFACT))
+    path.write_text(json.dumps(artifact), encoding='utf-8')
+    monkeypatch.setattr(catalog_module, '_catalog_store', CatalogStore(path, tmp_path / 'missing', check_interval=0))
+
+    first = client.get('/api/requirements')
+    artifact['requirements'][0]['description'] = 'Transparencia revisada (Art. 13)'
+    path.write_text(json.dumps(artifact), encoding='utf-8')
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    second = client.get('/api/requirements', headers={'If-None-Match': first.headers['etag']})
+    assert second.status_code == 200
+    assert second.headers['etag'] != first.headers['etag']
+    assert second.json()['requirements'][0]['title'] == 'Transparencia revisada'
+
+
+def test_templates_listing_follows_directory(static_responses, templates_dir, monkeypatch):
+    monkeypatch.setattr(export_api, 'TEMPLATES_DIR', str(templates_dir))
+    monkeypatch.setattr(export_api, 'filler', TemplateFiller(str(templates_dir)))
+
+    first = client.get('/export/templates')
+    assert first.json() == {'available': {code: True for code in TEMPLATE_MAPPING}, 'total': len(TEMPLATE_MAPPING)}
+    assert client.get('/export/templates', headers={'If-None-Match': first.headers['etag']}).status_code == 304
+
+    (templates_dir / TEMPLATE_MAPPING['TRANSPARENCY']).unlink()
+    stat = templates_dir.stat()
+    os.utime(templates_dir, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    second = client.get('/export/templates', headers={'If-None-Match': first.headers['etag']})
+    assert second.status_code == 200
+    assert second.json()['available']['TRANSPARENCY'] is False
+    assert static_responses.builds == 2
@@ -0,0 +1,116 @@
+from io import BytesIO
+import copy
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+
+from tests.conftest import build_template
+from excel_engine import export_api, incremental
+from excel_engine.incremental import ExportSnapshotStore
+from excel_engine.template_cache import TemplateCache
+from excel_engine.template_filler import TemplateFiller, TEMPLATE_MAPPING
+from excel_engine.xlsx_patch import patch_workbook
+from main import app
+
+client = TestClient(app)
+
+BASE = {
+    'requirement_code': 'TRANSPARENCY',
+    'assessments_mg': [
+        {'mg_id': 'MG_TRANS_01', 'subpart_id': '13.1', 'difficulty': '01', 'maturity': 'L2'},
+        {'mg_id': 'MG_TRANS_03', 'subpart_id': '13.3.b.ii', 'difficulty': '02', 'maturity': 'L6'},
+    ],
+    'measures_additional': [{'id': 'MA_1', 'title': 'Extra', 'description': 'Medida <extra> & más', 'file_name': 'doc.pdf'}],
+    'assessments_ma': [{'ma_id': 'MA_1', 'subpart_id': '13.3.a', 'difficulty': '01', 'maturity': 'L4'}],
+    'ma_to_subpart': [{'ma_id': 'MA_1', 'subpart_id': '13.3.a'}],
+}
+
+
+def sheet_values(excel_bytes):
+    wb = load_workbook(BytesIO(excel_bytes))
+    return {ws.title: [[c.value for c in row] for row in ws.iter_rows()] for ws in wb.worksheets}
+
+
+@pytest.fixture
+def filler(templates_dir):
+    return TemplateFiller(str(templates_dir), cache=TemplateCache())
+
+
+def test_patch_workbook_rewrites_only_target_sheet(filler):
+    original = filler.fill_template(**BASE)
+    patched, replaced = patch_workbook(original, {'Autoeval MG': {3: {5: 'L8'}, 2: {5: None}, 9: {2: ' x '}}})
+
+    assert replaced == {('Autoeval MG', 3, 5): None, ('Autoeval MG', 2, 5): 'L2', ('Autoeval MG', 9, 2): None}
+    ws = load_workbook(BytesIO(patched))['Autoeval MG']
+    assert (ws['E3'].value, ws['E2'].value, ws['B9'].value) == ('L8', None, ' x ')
+    assert ws['F3'].value == '=IF(E3="","",E3)'
+    assert ws.max_row == 9
+
+    with zipfile.ZipFile(BytesIO(original)) as before, zipfile.ZipFile(BytesIO(patched)) as after:
+        assert before.namelist() == after.namelist()
+        changed = [name for name in before.namelist() if before.read(name) != after.read(name)]
+    assert changed == ['xl/worksheets/sheet6.xml']
+
+
+def test_incremental_fill_matches_full_fill(filler):
+    first, snapshot = filler.fill_template_incremental(None, **BASE)
+    assert snapshot.mode == 'full'
+    assert sheet_values(first) == sheet_values(filler.fill_template(**BASE))
+
+    edited = {
+        **BASE,
+        'assessments_mg': [
+            {'mg_id': 'MG_TRANS_01', 'subpart_id': '13.1', 'difficulty': '01', 'maturity': 'L7'},
+            {'mg_id': 'MG_TRANS_02', 'subpart_id': '13.3.a', 'maturity': 'L1'},
+        ],
+        'ma_to_subpart': [{'ma_id': 'MA_2', 'subpart_id': '13.1'}],
+    }
+    second, snapshot = filler.fill_template_incremental(snapshot, **edited)
+    assert snapshot.mode == 'incremental'
+    # MG rows 2, 3 and 5; relation rows 2 and 3
+    assert snapshot.patched_rows == 5
+    assert sheet_values(second) == sheet_values(filler.fill_template(**edited))
+
+    # Reverting restores the first export's values, including cleared cells
+    third, snapshot = filler.fill_template_incremental(snapshot, **BASE)
+    assert sheet_values(third) == sheet_values(first)
+
+    unchanged, snapshot = filler.fill_template_incremental(snapshot, **BASE)
+    assert (unchanged, snapshot.patched_rows) == (third, 0)
+
+
+def test_template_change_forces_full_fill(filler, templates_dir):
+    _, snapshot = filler.fill_template_incremental(None, **BASE)
+    build_template(templates_dir / TEMPLATE_MAPPING['TRANSPARENCY'], ma_ids=('MA_1', 'MA_2', 'MA_3'))
+
+    excel_bytes, snapshot = filler.fill_template_incremental(snapshot, **BASE)
+    assert snapshot.mode == 'full'
+    assert sheet_values(excel_bytes)['Relación MA-Apart'][0] == ['Apartado', 'MA_1', 'MA_2', 'MA_3']
+
+
+def test_snapshot_store_is_bounded():
+    store = ExportSnapshotStore(max_bytes=10)
+    for code in ('A', 'B', 'C'):
+        store.put('app', code, incremental.ExportSnapshot(code, 'v', b'12345', {}))
+    assert store.get('app', 'A') is None
+    assert store.stats() == {'entries': 2, 'size_bytes': 10, 'max_bytes': 10}
+
+
+def test_single_export_patches_previous_export(templates_dir, monkeypatch, assessed_application):
+    assessed_application('app-1')
+    monkeypatch.setattr(export_api, 'TEMPLATES_DIR', str(templates_dir))
+    monkeypatch.setattr(export_api, 'filler', TemplateFiller(str(templates_dir)))
+    store = ExportSnapshotStore(max_bytes=16 * 1024 * 1024)
+    monkeypatch.setattr(incremental, '_snapshot_store', store)
+
+    payload = copy.deepcopy({key: BASE[key] for key in ('requirement_code', 'assessments_mg')})
+    first = client.post('/export/single/TRANSPARENCY?application_id=app-1', json=payload)
+    assert first.status_code == 200
+    assert store.get('app-1', 'TRANSPARENCY').mode == 'full'
+
+    payload['assessments_mg'][0]['maturity'] = 'L3'
+    second = client.post('/export/single/TRANSPARENCY?application_id=app-1', json=payload)
+    assert store.get('app-1', 'TRANSPARENCY').mode == 'incremental'
+    assert load_workbook(BytesIO(second.content))['Autoeval MG']['E2'].value == 'L3'
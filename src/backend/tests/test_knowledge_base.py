@@ -0,0 +1,149 @@
+import gc
+import os
+import weakref
+
+import pytest
+from fastapi.testclient import TestClient
+
+from services import knowledge_base
+from services.knowledge_base import KnowledgeBaseIndex, KnowledgeBaseStore, Page, build_index, tokenize
+from main import app
+
+client = TestClient(app)
+
+GUIDE = """# Guía Maestra del Sandbox
+
+Introducción al entorno controlado de pruebas.
+
+## Artículo 13: Transparencia
+
+Los sistemas de IA de alto riesgo se diseñarán de modo que los responsables
+del despliegue puedan interpretar la información de salida.
+
+## Artículo 12: Registros
+
+Los sistemas permitirán el registro automático de eventos (logs).
+"""
+
+REGLAMENTO_PAGES = [
+    'Reglamento (UE) 2024/1689 del Parlamento Europeo.',
+    'Artículo 14 Supervisión humana. Las personas físicas vigilarán el funcionamiento.',
+    'Artículo 13 Transparencia y comunicación de información a los responsables del despliegue.',
+]
+
+
+def fake_extract(path):
+    if path.suffix == '.md':
+        return knowledge_base.extract_markdown_pages(path)
+    if path.stat().st_size == 0:
+        raise ValueError('Cannot read an empty file')
+    return [Page(number, text) for number, text in enumerate(REGLAMENTO_PAGES, start=1)]
+
+
+@pytest.fixture
+def kb_source(tmp_path):
+    source = tmp_path / 'kb'
+    (source / 'knowledge_base' / 'normativa').mkdir(parents=True)
+    (source / 'GUIA_MAESTRA.md').write_text(GUIDE, encoding='utf-8')
+    (source / 'knowledge_base' / 'normativa' / 'Reglamento_UE_2024_1689_IA.pdf').write_bytes(b'%PDF-1.7 stub')
+    (source / 'knowledge_base' / 'normativa' / 'Vacio.pdf').write_bytes(b'')
+    return source
+
+
+def test_tokenize_folds_accents_stopwords_and_plurals():
+    assert tokenize('Artículos de las Guías') == ['articulo', 'guia']
+    assert tokenize('SUPERVISIÓN humana; funciones') == ['supervision', 'humana', 'funcion']
+    assert tokenize('Año 2024/1689') == ['ano', '2024', '1689']
+
+
+def test_search_returns_cited_passages(kb_source, tmp_path):
+    index_path = tmp_path / 'kb.bin'
+    report = build_index(kb_source, index_path, extract=fake_extract)
+    assert report['indexed'] == ['GUIA_MAESTRA.md', 'knowledge_base/normativa/Reglamento_UE_2024_1689_IA.pdf']
+    assert report['failed'] == ['knowledge_base/normativa/Vacio.pdf']
+
+    index = KnowledgeBaseIndex(index_path)
+    found = index.search('articulo 13 transparencia', limit=3)
+    assert found['total'] == 4
+    top = found['results'][:2]
+    assert {(r['doc'], r['page']) for r in top} == {
+        ('GUIA_MAESTRA.md', 2),
+        ('knowledge_base/normativa/Reglamento_UE_2024_1689_IA.pdf', 3),
+    }
+    section = next(r for r in top if r['doc'] == 'GUIA_MAESTRA.md')
+    assert section['section'] == 'Artículo 13: Transparencia'
+
+    only_pdf = index.search('transparencia', doc_prefix='knowledge_base/')
+    assert [(r['doc'], r['page']) for r in only_pdf['results']] == [
+        ('knowledge_base/normativa/Reglamento_UE_2024_1689_IA.pdf', 3),
+    ]
+    assert index.search('inexistente')['results'] == []
+    index.close()
+
+
+def test_rebuild_reuses_unchanged_documents(kb_source, tmp_path):
+    index_path = tmp_path / 'kb.bin'
+    build_index(kb_source, index_path, extract=fake_extract)
+
+    extracted = []
+
+    def tracking_extract(path):
+        extracted.append(path.name)
+        return fake_extract(path)
+
+    guide = kb_source / 'GUIA_MAESTRA.md'
+    os.utime(guide, ns=(0, 0))  # same content, new mtime: reused by hash
+    (kb_source / 'knowledge_base' / 'normativa' / 'Vacio.pdf').unlink()
+    (kb_source / 'NUEVO.md').write_text('# Procedimiento\n\nResolución provisional del sandbox.', encoding='utf-8')
+
+    report = build_index(kb_source, index_path, extract=tracking_extract)
+    assert extracted == ['NUEVO.md']
+    assert report['reused'] == ['GUIA_MAESTRA.md', 'knowledge_base/normativa/Reglamento_UE_2024_1689_IA.pdf']
+    assert report['removed'] == ['knowledge_base/normativa/Vacio.pdf']
+
+    index = KnowledgeBaseIndex(index_path)
+    assert index.search('resolucion provisional')['results'][0]['doc'] == 'NUEVO.md'
+    assert index.search('registros eventos')['results'][0]['section'] == 'Artículo 12: Registros'
+
+    guide.write_text(GUIDE.replace('logs', 'trazas'), encoding='utf-8')
+    assert build_index(kb_source, index_path, extract=tracking_extract)['indexed'] == ['GUIA_MAESTRA.md']
+
+
+def test_failed_documents_are_extracted_again(kb_source, tmp_path):
+    index_path = tmp_path / 'kb.bin'
+    empty = 'knowledge_base/normativa/Vacio.pdf'
+    assert build_index(kb_source, index_path, extract=fake_extract)['failed'] == [empty]
+
+    # Same size and mtime, but the extractor now works
+    report = build_index(kb_source, index_path, extract=lambda path: [Page(1, 'Documento recuperado')])
+    assert empty in report['indexed'] and empty not in report['reused']
+    assert KnowledgeBaseIndex(index_path).search('recuperado')['results'][0]['doc'] == empty
+
+
+def test_kb_search_endpoint(kb_source, tmp_path, monkeypatch):
+    index_path = tmp_path / 'kb.bin'
+    store = KnowledgeBaseStore(index_path, check_interval=0)
+    monkeypatch.setattr(knowledge_base, '_kb_store', store)
+
+    assert client.get('/api/kb/search', params={'q': 'transparencia'}).status_code == 503
+
+    build_index(kb_source, index_path, extract=fake_extract)
+    response = client.get('/api/kb/search', params={'q': 'supervisión humana', 'limit': 1})
+    assert response.status_code == 200
+    body = response.json()
+    assert body['total'] == 1
+    assert body['results'][0]['doc'] == 'knowledge_base/normativa/Reglamento_UE_2024_1689_IA.pdf'
+    assert body['results'][0]['page'] == 2
+    assert 'took_ms' in body
+
+    # A rebuild swaps the index; a search still holding the previous one can
+    # finish, and its mapping is released once nothing references it
+    previous = store.get()
+    (kb_source / 'NUEVO.md').write_text('# Procedimiento\n\nResolución provisional.', encoding='utf-8')
+    build_index(kb_source, index_path, extract=fake_extract)
+    assert store.get() is not previous
+    assert previous.search('supervisión humana')['total'] == 1
+    released = weakref.ref(previous)
+    del previous
+    gc.collect()
+    assert released() is None
@@ -20,7 +20,7 @@ def test_get_requirements():
     data = response.json()
     assert "requirements" in data
     assert len(data["requirements"]) == 12
-    assert data["requirements"][0]["id"] == "REQ_01"
+    assert data["requirements"][0]["id"] == "QUALITY_MGMT"
 
 def test_get_maturity_levels():
     response = client.get("/api/maturity-levels")
@@ -50,3 +50,18 @@ def test_calculate_assessments_endpoint():
     assert len(data["assessments"]) == 2
     assert data["assessments"][0]["adaptation_plan"] == "01"
     assert data["assessments"][1]["adaptation_plan"] == "05"
+
+def test_export_excel_endpoint(assessed_application):
+    # An application that was never assessed does not pass the Gatekeeper
+    assert client.post("/api/export-excel", params={"application_id": "app-demo"}, json={
+        "project_metadata": {"nombre": "Proyecto Demo", "sector": "Salud"}, "assessments": [],
+    }).status_code == 409
+    assessed_application("app-demo")
+    payload = {
+        "project_metadata": {"nombre": "Proyecto Demo", "sector": "Salud"},
+        "assessments": [{"measure_id": "MG_01", "difficulty": "01", "maturity": "L5"}]
+    }
+    response = client.post("/api/export-excel", params={"application_id": "app-demo"}, json=payload)
+    assert response.status_code == 200
+    assert "preevaluacion_Proyecto_Demo.xlsx" in response.headers["content-disposition"]
+    assert response.content[:2] == b"PK"
@@ -0,0 +1,142 @@
+from io import BytesIO
+import re
+import struct
+import zipfile
+
+import pytest
+from openpyxl import load_workbook
+
+from excel_engine.template_cache import TemplateCache
+from excel_engine.template_filler import TemplateFiller, TEMPLATE_MAPPING
+from excel_engine.xlsx_patch import XlsxPackage
+
+FILL_INPUTS = [
+    {
+        'requirement_code': 'TRANSPARENCY',
+        'assessments_mg': [
+            {'mg_id': 'MG_TRANS_01', 'subpart_id': '13.1', 'difficulty': '01', 'maturity': 'L2'},
+            {'mg_id': 'MG_TRANS_03', 'subpart_id': '13.3.b.ii', 'difficulty': '02', 'maturity': 'L6'},
+            {'mg_id': 'MG_TRANS_01', 'subpart_id': '13.1', 'maturity': 'L3'},
+        ],
+        'measures_additional': [
+            {'id': 'MA_1', 'title': 'Extra', 'description': 'Medida <extra> & "más" ', 'file_name': 'doc.pdf'},
+            {'id': 'MA_2', 'title': 'Otra', 'description': ''},
+            {'id': 'MA_3', 'title': 'Fórmula', 'description': '=1+1'},
+        ],
+        'assessments_ma': [{'ma_id': 'MA_2', 'subpart_id': '13.3.b.i', 'difficulty': '00', 'maturity': 'L8'}],
+        'ma_to_subpart': [{'ma_id': 'MA_1', 'subpart_id': '13.3.a'}, {'ma_id': 'MA_2', 'subpart_id': '13.1'}],
+    },
+    {'requirement_code': 'TRANSPARENCY', 'assessments_mg': []},
+]
+
+
+def to_shared_strings(path):
+    """
+    Rewrite a fixture template the way Excel saves it: strings in
+    sharedStrings.xml (one rich text with a phonetic run), a calcChain and
+    calcPr without fullCalcOnLoad.
+    """
+    with zipfile.ZipFile(path) as source:
+        parts = {info.filename: source.read(info) for info in source.infolist()}
+
+    strings = []
+
+    def shared(match):
+        text = match.group(2)
+        if text not in strings:
+            strings.append(text)
+        return match.group(1) + b' t="s"><v>' + str(strings.index(text)).encode() + b'</v></c>'
+
+    for name in [n for n in parts if n.startswith('xl/worksheets/')]:
+        parts[name] = re.sub(rb'(<c r="[A-Z]+\d+"(?: s="\d+")?) t="inlineStr"><is><t>(.*?)</t></is></c>', shared, parts[name])
+    items = [
+        b'<si><r><t>Descrip</t></r><r><t>ci\xc3\xb3n</t></r><rPh sb="0" eb="1"><t>x</t></rPh></si>'
+        if text == 'Descripción'.encode() else b'<si><t>' + text + b'</t></si>'
+        for text in strings
+    ]
+    parts['xl/sharedStrings.xml'] = (
+        b'<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" count="%d" uniqueCount="%d">'
+        % (len(items), len(items)) + b''.join(items) + b'</sst>'
+    )
+    parts['xl/calcChain.xml'] = (
+        b'<calcChain xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><c r="F2" i="6"/></calcChain>'
+    )
+    parts['xl/_rels/workbook.xml.rels'] = parts['xl/_rels/workbook.xml.rels'].replace(b'</Relationships>', (
+        b'<Relationship Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml" Id="rId90" />'
+        b'<Relationship Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/calcChain" Target="calcChain.xml" Id="rId91" />'
+        b'</Relationships>'
+    ))
+    parts['[Content_Types].xml'] = parts['[Content_Types].xml'].replace(b'</Types>', (
+        b'<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml" />'
+        b'<Override PartName="/xl/calcChain.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.calcChain+xml" />'
+        b'</Types>'
+    ))
+    parts['xl/workbook.xml'] = re.sub(rb'<calcPr [^>]*/>', b'<calcPr calcId="191029" />', parts['xl/workbook.xml'])
+
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as target:
+        for name, data in parts.items():
+            target.writestr(name, data)
+    return path
+
+
+def sheet_values(excel_bytes):
+    wb = load_workbook(BytesIO(excel_bytes))
+    return {ws.title: [[c.value for c in row] for row in ws.iter_rows()] for ws in wb.worksheets}
+
+
+def raw_members(data):
+    """Compressed bytes of every ZIP member, as stored."""
+    members = {}
+    with zipfile.ZipFile(BytesIO(data)) as archive:
+        for info in archive.infolist():
+            name_len, extra_len = struct.unpack_from('<2H', data, info.header_offset + 26)
+            start = info.header_offset + 30 + name_len + extra_len
+            members[info.filename] = data[start:start + info.compress_size]
+    return members
+
+
+@pytest.fixture(params=['inline', 'shared'])
+def template_dir(request, templates_dir):
+    if request.param == 'shared':
+        to_shared_strings(templates_dir / TEMPLATE_MAPPING['TRANSPARENCY'])
+    return templates_dir
+
+
+@pytest.mark.parametrize('fill', FILL_INPUTS)
+def test_ooxml_backend_matches_openpyxl(template_dir, fill):
+    openpyxl_filler = TemplateFiller(str(template_dir), cache=TemplateCache(), backend='openpyxl')
+    ooxml_filler = TemplateFiller(str(template_dir), cache=TemplateCache(), backend='ooxml')
+
+    expected = sheet_values(openpyxl_filler.fill_template(**fill))
+    actual = sheet_values(ooxml_filler.fill_template(**fill))
+    assert actual == expected
+
+
+def test_ooxml_backend_copies_untouched_parts(template_dir):
+    template = (template_dir / TEMPLATE_MAPPING['TRANSPARENCY']).read_bytes()
+    filler = TemplateFiller(str(template_dir), cache=TemplateCache(), backend='ooxml')
+    filled = filler.fill_template(**FILL_INPUTS[0])
+
+    with zipfile.ZipFile(BytesIO(filled)) as archive:
+        assert archive.testzip() is None
+        assert b'fullCalcOnLoad="1"' in archive.read('xl/workbook.xml')
+        assert b'calcChain' not in archive.read('[Content_Types].xml')
+
+    before, after = raw_members(template), raw_members(filled)
+    assert 'xl/calcChain.xml' not in after
+    rewritten = {'xl/worksheets/sheet6.xml', 'xl/worksheets/sheet7.xml', 'xl/worksheets/sheet8.xml', 'xl/worksheets/sheet9.xml'}
+    if 'xl/calcChain.xml' in before:
+        rewritten |= {'xl/calcChain.xml', 'xl/workbook.xml', 'xl/_rels/workbook.xml.rels', '[Content_Types].xml'}
+    assert {name for name in before if before[name] != after.get(name)} == rewritten
+
+
+def test_replaced_values_decode_shared_strings(templates_dir):
+    path = to_shared_strings(templates_dir / TEMPLATE_MAPPING['TRANSPARENCY'])
+    package = XlsxPackage(path.read_bytes())
+
+    _, replaced = package.patch({'Autoeval MG': {1: {3: 'Nueva'}, 2: {1: None, 6: 'L1'}}})
+    assert replaced == {
+        ('Autoeval MG', 1, 3): 'Descripción',
+        ('Autoeval MG', 2, 1): 'MG_TRANS_01',
+        ('Autoeval MG', 2, 6): '=IF(E2="","",E2)',
+    }
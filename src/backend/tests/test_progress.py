@@ -0,0 +1,54 @@
+from fastapi.testclient import TestClient
+
+from services.assessments import upsert_assessments
+from services.progress import ProgressSummaries, get_progress_summaries
+from main import app
+
+client = TestClient(app)
+
+
+def test_summary_follows_writes():
+    summaries = get_progress_summaries()
+    empty = summaries.summary('app-1')['requirements']['TRANSPARENCY']
+    assert (empty['diagnosed'], empty['pending'], empty['not_started']) == (0, 0, empty['expected'])
+
+    upsert_assessments('app-1', 'b1', [
+        {'mg_id': 'MG_TRANS_01', 'maturity': 'L1'},
+        {'mg_id': 'MG_TRANS_02', 'maturity': 'L6'},
+        {'mg_id': 'MG_TRANS_03'},
+    ])
+    transparency = summaries.summary('app-1')['requirements']['TRANSPARENCY']
+    assert (transparency['diagnosed'], transparency['pending']) == (2, 1)
+    assert transparency['maturity']['L1'] == 1 and transparency['maturity']['L6'] == 1
+    assert sum(transparency['plans'].values()) == 2
+
+    # Replacing a row moves its counts instead of adding new ones
+    upsert_assessments('app-1', 'b2', [{'mg_id': 'MG_TRANS_03', 'maturity': 'L8'}, {'mg_id': 'MG_TRANS_02', 'maturity': 'L6'}])
+    summary = summaries.summary('app-1')
+    transparency = summary['requirements']['TRANSPARENCY']
+    assert (transparency['diagnosed'], transparency['pending']) == (3, 0)
+    assert sum(transparency['maturity'].values()) == 3
+    assert summary['totals']['diagnosed'] == 3
+    assert summary['totals']['expected'] == 84
+
+
+def test_rebuilt_from_repository_after_eviction(assessment_repository):
+    summaries = ProgressSummaries(assessment_repository, max_applications=1)
+    upsert_assessments('app-1', 'b1', [{'mg_id': 'MG_TRANS_01', 'maturity': 'L3'}])
+    assert summaries.summary('app-1')['totals']['diagnosed'] == 1
+    summaries.summary('app-2')
+    assert summaries.cached() == 1
+    upsert_assessments('app-1', 'b2', [{'mg_id': 'MG_TRANS_02', 'maturity': 'L4'}])
+    assert summaries.summary('app-1')['totals']['diagnosed'] == 2
+    summaries.close()
+
+
+def test_progress_endpoints():
+    upsert_assessments('app-1', 'b1', [{'mg_id': 'MG_TRANS_01', 'maturity': 'L2'}])
+    single = client.get('/api/applications/app-1/progress').json()
+    assert single['requirements']['TRANSPARENCY']['maturity']['L2'] == 1
+
+    body = client.post('/api/applications/progress', json={'application_ids': ['app-1', 'app-2', 'app-1']}).json()
+    assert [a['application_id'] for a in body['applications']] == ['app-1', 'app-2']
+    assert body['applications'][0] == single
+    assert body['applications'][1]['totals']['diagnosed'] == 0
@@ -0,0 +1,57 @@
+from excel_engine import generator
+from services.catalog import get_catalog
+from services.relations import Interner, Relation, iter_bits
+
+
+def test_relation_queries_by_row_and_column():
+    relation = Relation.from_pairs([
+        ('13.1', 'MG_01'), ('13.3.a', 'MG_01'), ('13.3.a', 'MG_02'), ('13.1', 'MG_01'),
+    ])
+    assert len(relation) == 3
+    assert ('13.3.a', 'MG_02') in relation
+    assert ('13.1', 'MG_02') not in relation
+    assert ('99.9', 'MG_01') not in relation
+    assert relation.row('13.3.a') == ['MG_01', 'MG_02']
+    assert relation.column('MG_01') == ['13.1', '13.3.a']
+    assert relation.row_count('13.1') == 1
+    assert relation.row('missing') == [] and relation.column('missing') == []
+    assert list(relation.pairs()) == [('13.1', 'MG_01'), ('13.3.a', 'MG_01'), ('13.3.a', 'MG_02')]
+    assert list(iter_bits(0b100101)) == [0, 2, 5]
+
+
+def test_from_matrix_accepts_sparse_and_dense_rows():
+    columns = ['TRANSPARENCY', 'ACCURACY', 'ROBUSTNESS']
+    sparse = Relation.from_matrix({'MG_01': ['ACCURACY'], 'MG_02': []}, columns)
+    dense = Relation.from_matrix({'MG_01': [0, 1, 0], 'MG_02': [0, 0, 0]}, columns)
+    for relation in (sparse, dense):
+        assert relation.to_dict() == {'MG_01': ['ACCURACY'], 'MG_02': []}
+        assert list(relation.rows) == ['MG_01', 'MG_02']
+
+
+def test_shared_interner_axes():
+    strings = Interner(['MG_01', '13.1'])
+    relation = Relation(strings, strings)
+    relation.add('MG_01', '13.1')
+    assert relation.has_ids(strings.get('MG_01'), strings.get('13.1'))
+    assert len(strings) == 2
+
+
+def test_catalog_relation_lookups():
+    catalog = get_catalog()
+    assert catalog.mg_subparts('MG_TRANS_03') == ['13.3.b.i']
+    assert 'MG_TRANS_03' in catalog.subpart_measures('13.3.b.i')
+    assert catalog.is_linked('MG_TRANS_03', '13.3.b.i')
+    assert not catalog.is_linked('MG_TRANS_03', '13.1')
+    assert catalog.measures_map(['TRANSPARENCY', 'ACCURACY'], ['MG_TRANS_03']) == {'MG_TRANS_03': ['TRANSPARENCY']}
+
+
+def test_rel_mg_sheet_renders_sparse_and_dense_alike():
+    columns = ['TRANSPARENCY', 'ACCURACY']
+
+    def rows(measures_map):
+        return list(generator.sheet_rel_mg(measures_map, columns).rows)
+
+    sparse = rows({'MG_01': ['ACCURACY'], 'MG_02': []})
+    assert sparse == rows({'MG_01': [0, 1], 'MG_02': [0, 0]})
+    assert sparse[-2] == (6, [('MG_01', 'cell'), ('', 'matrix-cell'), ('✓', 'matrix-hit')])
+    assert sparse[-1] == (7, [('MG_02', 'cell'), ('', 'matrix-cell'), ('', 'matrix-cell')])
@@ -0,0 +1,141 @@
+import os
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+from excel_engine import export_api
+from excel_engine.template_filler import TemplateFiller
+from services.result_cache import ExportResultCache, canonical_digest, etag_matches
+from main import app
+
+client = TestClient(app)
+
+
+def test_canonical_digest_ignores_key_order():
+    assert canonical_digest({'a': 1, 'b': [1, 2]}) == canonical_digest({'b': [1, 2], 'a': 1})
+    assert canonical_digest({'a': 1}) != canonical_digest({'a': 2})
+
+
+def test_etag_matching():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc", "def"', '"abc"')
+    assert etag_matches('*', '"abc"')
+    assert not etag_matches('"def"', '"abc"')
+    assert not etag_matches(None, '"abc"')
+
+
+def test_memory_tier_lru_and_disk_promotion(tmp_path):
+    cache = ExportResultCache(max_memory_bytes=10, ttl_seconds=60, disk_dir=tmp_path, max_disk_bytes=100)
+    cache.put('a' * 64, b'12345')
+    cache.put('b' * 64, b'67890')
+    cache.put('c' * 64, b'abcde')
+
+    assert cache.stats()['memory_entries'] == 2
+    # Evicted from memory but still on disk
+    assert cache.get('a' * 64) == b'12345'
+    assert cache.stats()['hits'] == {'memory': 0, 'disk': 1}
+    assert cache.get('a' * 64) == b'12345'
+    assert cache.stats()['hits'] == {'memory': 1, 'disk': 1}
+
+
+def test_entries_expire_after_ttl(tmp_path):
+    cache = ExportResultCache(max_memory_bytes=100, ttl_seconds=60, disk_dir=tmp_path, max_disk_bytes=100)
+    key = 'd' * 64
+    cache.put(key, b'data')
+    cache._memory[key] = (b'data', time.time() - 120)
+    path = cache._disk_path(key)
+    os.utime(path, (time.time(), time.time() - 120))
+
+    assert cache.get(key) is None
+    assert not path.exists()
+
+
+def test_disk_promotion_keeps_creation_time(tmp_path):
+    cache = ExportResultCache(max_memory_bytes=100, ttl_seconds=60, disk_dir=tmp_path, max_disk_bytes=100)
+    key = 'a' * 64
+    cache.put(key, b'data')
+    assert not list(tmp_path.glob('*/*.part'))
+    created = time.time() - 50
+    os.utime(cache._disk_path(key), (time.time(), created))
+    cache._drop_memory(key)
+
+    assert cache.get(key) == b'data'
+    # Promoted with the file's creation time, so it still expires 10s from now
+    assert cache._memory[key][1] == pytest.approx(created)
+
+
+def test_disk_tier_respects_budget(tmp_path):
+    cache = ExportResultCache(max_memory_bytes=0, ttl_seconds=60, disk_dir=tmp_path, max_disk_bytes=10)
+    for i, key in enumerate(['e' * 64, 'f' * 64, '0' * 64]):
+        cache.put(key, b'xxxxx')
+        path = cache._disk_path(key)
+        os.utime(path, (time.time() + i, time.time()))
+
+    assert sum(p.stat().st_size for p in tmp_path.glob('*/*.bin')) <= 10
+    assert cache.get('0' * 64) == b'xxxxx'
+
+
+def test_disk_index_is_seeded_once(tmp_path, monkeypatch):
+    ExportResultCache(max_memory_bytes=0, ttl_seconds=60, disk_dir=tmp_path, max_disk_bytes=12).put('1' * 64, b'xxxxx')
+    cache = ExportResultCache(max_memory_bytes=0, ttl_seconds=60, disk_dir=tmp_path, max_disk_bytes=12)
+    assert (cache.stats()['disk_entries'], cache.stats()['disk_bytes']) == (1, 5)
+
+    # Later writes evict from the in-memory index instead of listing the directory
+    monkeypatch.setattr(type(tmp_path), 'glob', lambda *args: pytest.fail('disk tier rescanned'))
+    cache.put('2' * 64, b'yyyyy')
+    cache.put('3' * 64, b'zzzzz')
+    assert (cache.stats()['disk_entries'], cache.stats()['disk_bytes']) == (2, 10)
+    assert not cache._disk_path('1' * 64).exists()
+
+
+@pytest.fixture
+def export_templates(templates_dir, monkeypatch):
+    monkeypatch.setattr(export_api, 'TEMPLATES_DIR', str(templates_dir))
+    monkeypatch.setattr(export_api, 'filler', TemplateFiller(str(templates_dir)))
+    return templates_dir
+
+
+def test_single_export_is_served_from_cache(export_templates, assessed_application):
+    url = f'/export/single/TRANSPARENCY?application_id={assessed_application()}'
+    payload = {
+        'requirement_code': 'TRANSPARENCY',
+        'assessments_mg': [
+            {'mg_id': 'MG_TRANS_01', 'subpart_id': '13.1', 'maturity': 'L2'},
+            {'mg_id': 'MG_TRANS_02', 'subpart_id': '13.3.a', 'maturity': 'L5'},
+        ],
+    }
+    first = client.post(url, json=payload)
+    assert first.headers['x-cache'] == 'MISS'
+
+    # Same content in a different order hits the cache
+    payload['assessments_mg'].reverse()
+    second = client.post(url, json=payload)
+    assert second.headers['x-cache'] == 'HIT'
+    assert second.headers['etag'] == first.headers['etag']
+    assert second.content == first.content
+
+    revalidated = client.post(url, json=payload, headers={'If-None-Match': first.headers['etag']})
+    assert revalidated.status_code == 304
+    assert revalidated.content == b''
+
+    payload['assessments_mg'][0]['maturity'] = 'L8'
+    changed = client.post(url, json=payload)
+    assert changed.headers['x-cache'] == 'MISS'
+    assert changed.headers['etag'] != first.headers['etag']
+
+
+def test_preevaluacion_export_is_cached(assessed_application):
+    assessed_application('app-1')
+    payload = {
+        'project_metadata': {'nombre': 'Cache', 'sector': 'Banca'},
+        'assessments': [{'measure_id': 'MG_01', 'maturity': 'L3'}],
+    }
+    first = client.post('/api/export-excel', params={'application_id': 'app-1'}, json=payload)
+    second = client.post('/api/export-excel', params={'application_id': 'app-1'}, json=payload)
+
+    assert (first.headers['x-cache'], second.headers['x-cache']) == ('MISS', 'HIT')
+    assert second.content == first.content
+    assert client.post(
+        '/api/export-excel', params={'application_id': 'app-1'}, json=payload, headers={'If-None-Match': first.headers['etag']}
+    ).status_code == 304
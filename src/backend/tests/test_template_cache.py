@@ -0,0 +1,67 @@
+import os
+from io import BytesIO
+
+from openpyxl import load_workbook
+
+from excel_engine.template_cache import TemplateCache
+from excel_engine.template_filler import TemplateFiller, TEMPLATE_MAPPING
+from tests.conftest import build_template
+
+
+def test_checkout_reuses_parsed_master(templates_dir):
+    cache = TemplateCache()
+    path = templates_dir / TEMPLATE_MAPPING['TRANSPARENCY']
+
+    first = cache.checkout('TRANSPARENCY', path)
+    second = cache.checkout('TRANSPARENCY', path)
+
+    assert cache.stats()['misses'] == 1
+    assert cache.stats()['hits'] == 1
+    # Clones are independent: writes never leak into the master
+    first['Autoeval MG']['E2'] = 'L3'
+    assert second['Autoeval MG']['E2'].value is None
+    assert cache.checkout('TRANSPARENCY', path)['Autoeval MG']['E2'].value is None
+
+
+def test_template_change_on_disk_invalidates(templates_dir):
+    cache = TemplateCache()
+    path = templates_dir / TEMPLATE_MAPPING['TRANSPARENCY']
+    version = cache.get('TRANSPARENCY', path).version
+
+    build_template(path, mg_rows=[('MG_NEW_01', '13.1', 'Nueva medida')])
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    entry = cache.get('TRANSPARENCY', path)
+    assert entry.version != version
+    assert entry.clone()['Autoeval MG']['A2'].value == 'MG_NEW_01'
+
+
+def test_lru_eviction_respects_budget(templates_dir):
+    cache = TemplateCache()
+    size = cache.get('TRANSPARENCY', templates_dir / TEMPLATE_MAPPING['TRANSPARENCY']).size_bytes
+    cache.invalidate()
+    cache.max_bytes = size * 2
+
+    for code in ['TRANSPARENCY', 'LOGGING', 'ACCURACY']:
+        cache.get(code, templates_dir / TEMPLATE_MAPPING[code])
+
+    stats = cache.stats()
+    assert stats['entries'] == 2
+    assert stats['evictions'] == 1
+    assert stats['size_bytes'] <= cache.max_bytes
+
+
+def test_filler_uses_cache(templates_dir):
+    cache = TemplateCache()
+    filler = TemplateFiller(str(templates_dir), cache=cache)
+    assessments = [{'mg_id': 'MG_TRANS_01', 'subpart_id': '13.1', 'difficulty': '02', 'maturity': 'L4'}]
+
+    for _ in range(3):
+        excel_bytes = filler.fill_template('TRANSPARENCY', assessments)
+
+    assert cache.stats()['misses'] == 1
+    ws = load_workbook(BytesIO(excel_bytes))['Autoeval MG']
+    assert ws['D2'].value == '02'
+    assert ws['E2'].value == 'L4'
+    assert ws['F2'].value == '=IF(E2="","",E2)'
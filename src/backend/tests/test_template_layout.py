@@ -0,0 +1,74 @@
+from io import BytesIO
+
+from openpyxl import load_workbook
+
+from excel_engine.template_cache import TemplateCache
+from excel_engine.template_filler import TemplateFiller, TEMPLATE_MAPPING
+from excel_engine.template_layout import TemplateLayout, build_layout, layout_path_for
+
+
+def test_build_layout_indexes_fillable_sheets(templates_dir):
+    wb = load_workbook(templates_dir / TEMPLATE_MAPPING['TRANSPARENCY'])
+    layout = build_layout(wb, 'v1')
+
+    mg = layout.sheet('autoeval_mg')
+    assert mg.title == 'Autoeval MG'
+    assert mg.header_row == 1
+    assert mg.columns == {'difficulty': 4, 'maturity': 5}
+    assert mg.rows[('MG_TRANS_03', '13.3.b.ii')] == [5]
+
+    relation = layout.sheet('relation_ma')
+    assert relation.columns == {'MA_1': 2, 'MA_2': 3}
+    assert relation.rows[('13.3.a',)] == [3]
+
+    assert layout.sheet('autoeval_ma').rows[('MA_2', '13.1')] == [5]
+    assert layout.sheet('measures_additional').columns == {'description': 2, 'file_name': 3}
+
+
+def test_layout_round_trips_through_json(templates_dir, tmp_path):
+    wb = load_workbook(templates_dir / TEMPLATE_MAPPING['TRANSPARENCY'])
+    layout = build_layout(wb, 'v1')
+
+    layout.save(tmp_path / 'layout.json')
+    loaded = TemplateLayout.load(tmp_path / 'layout.json')
+
+    assert loaded == layout
+
+
+def test_persisted_layout_is_loaded_for_matching_version(templates_dir):
+    filler = TemplateFiller(str(templates_dir), cache=TemplateCache())
+    saved = filler.save_layouts()
+    assert len(saved) == len(TEMPLATE_MAPPING)
+
+    path = templates_dir / TEMPLATE_MAPPING['TRANSPARENCY']
+    persisted = TemplateLayout.load(layout_path_for(path))
+    persisted.sheets['autoeval_mg'].columns['maturity'] = 6
+    persisted.save(layout_path_for(path))
+
+    # A fresh cache trusts the persisted index instead of rescanning
+    fresh = TemplateFiller(str(templates_dir), cache=TemplateCache())
+    assert fresh.get_layout('TRANSPARENCY').sheet('autoeval_mg').columns['maturity'] == 6
+
+
+def test_fill_template_writes_all_sheets(templates_dir):
+    filler = TemplateFiller(str(templates_dir), cache=TemplateCache())
+    excel_bytes = filler.fill_template(
+        'TRANSPARENCY',
+        assessments_mg=[
+            {'mg_id': 'MG_TRANS_02', 'subpart_id': '13.3.a', 'difficulty': '01', 'maturity': 'L2'},
+            {'mg_id': 'MG_UNKNOWN', 'subpart_id': '13.1', 'difficulty': '01', 'maturity': 'L2'},
+        ],
+        measures_additional=[{'id': 'MA_1', 'title': 'Extra', 'description': 'Medida extra', 'file_name': 'doc.pdf'}],
+        assessments_ma=[{'ma_id': 'MA_1', 'subpart_id': '13.3.a', 'difficulty': '03', 'maturity': 'L7'}],
+        ma_to_subpart=[{'ma_id': 'MA_1', 'subpart_id': '13.3.a'}, {'ma_id': 'MA_9', 'subpart_id': '13.1'}],
+    )
+
+    wb = load_workbook(BytesIO(excel_bytes))
+    mg = wb['Autoeval MG']
+    assert (mg['D3'].value, mg['E3'].value) == ('01', 'L2')
+    assert mg['E2'].value is None
+
+    assert [c.value for c in wb['Medidas Adicionales'][2]] == ['MA_1', 'Medida extra', 'doc.pdf']
+    assert wb['Relación MA-Apart']['B3'].value == 'X'
+    assert wb['Relación MA-Apart']['B2'].value is None
+    assert (wb['Autoeval MA']['D3'].value, wb['Autoeval MA']['E3'].value) == ('03', 'L7')
@@ -0,0 +1,34 @@
+import zipfile
+from io import BytesIO
+
+import pytest
+
+from excel_engine.zip_stream import ZipStream
+
+
+def test_zip_stream_emits_entries_incrementally():
+    stream = ZipStream('deflated')
+    chunks = [stream.add('a.txt', b'a' * 1000), stream.add('b.txt', b'hola')]
+
+    # Each entry is flushed as soon as it is added
+    assert all(chunks)
+    chunks.append(stream.close())
+
+    archive = zipfile.ZipFile(BytesIO(b''.join(chunks)))
+    assert archive.namelist() == ['a.txt', 'b.txt']
+    assert archive.read('a.txt') == b'a' * 1000
+    assert archive.getinfo('a.txt').compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_zip_stream_stored_mode():
+    stream = ZipStream()
+    data = stream.add('x.xlsx', b'PK-already-compressed') + stream.close()
+
+    info = zipfile.ZipFile(BytesIO(data)).getinfo('x.xlsx')
+    assert info.compress_type == zipfile.ZIP_STORED
+    assert info.file_size == info.compress_size
+
+
+def test_zip_stream_rejects_unknown_mode():
+    with pytest.raises(ValueError):
+        ZipStream('bzip9')
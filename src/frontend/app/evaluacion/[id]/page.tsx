@@ -102,6 +102,7 @@ export default function ApplicationDetailPage() {
 
             // Call export API with correct signature
             const blob = await exportRequirementExcel(
+                applicationId,
                 'ALL',
                 allMGData,
                 [],
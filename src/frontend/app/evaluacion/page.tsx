@@ -142,6 +142,11 @@ export default function EvaluacionPage() {
     }
 
     const handleExportExcel = async () => {
+        if (!currentAppId) {
+            alert('Primero guarda los datos del proyecto')
+            return
+        }
+
         setExporting(true)
         try {
             const assessments = Object.entries(evaluations).map(([measureId, maturity]) => ({
@@ -149,7 +154,7 @@ export default function EvaluacionPage() {
                 maturity: maturity,
             }))
 
-            const response = await fetch(`${API_URL}/api/export-excel`, {
+            const response = await fetch(`${API_URL}/api/export-excel?application_id=${encodeURIComponent(currentAppId)}`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify({
@@ -171,9 +176,7 @@ export default function EvaluacionPage() {
             document.body.removeChild(a)
 
             // Update status to EXPORTED
-            if (currentAppId) {
-                await updateApplication(currentAppId, { status: 'EXPORTED' })
-            }
+            await updateApplication(currentAppId, { status: 'EXPORTED' })
 
         } catch (error) {
             console.error('Error:', error)
@@ -13,19 +13,20 @@ import {
 } from '../../lib/supabase'
 import styles from './page.module.css'
 
+// Guía 16 requirement codes (the ids the backend catalog accepts)
 const REQUIREMENTS: Record<string, string> = {
-    'REQ_01': 'Sistema de gestión de riesgos',
-    'REQ_02': 'Datos y gobernanza de datos',
-    'REQ_03': 'Documentación técnica',
-    'REQ_04': 'Registro de operaciones',
-    'REQ_05': 'Transparencia e información',
-    'REQ_06': 'Supervisión humana',
-    'REQ_07': 'Precisión, robustez y ciberseguridad',
-    'REQ_08': 'Obligaciones del proveedor',
-    'REQ_09': 'Sistema de gestión de calidad',
-    'REQ_10': 'Conservación de documentación',
-    'REQ_11': 'Registro y evaluación',
-    'REQ_12': 'Monitorización post-comercialización',
+    'QUALITY_MGMT': 'Sistema de gestión de la calidad',
+    'RISK_MGMT': 'Sistema de gestión de riesgos',
+    'HUMAN_OVERSIGHT': 'Supervisión humana',
+    'DATA_GOVERNANCE': 'Datos y gobernanza de datos',
+    'TRANSPARENCY': 'Transparencia',
+    'ACCURACY': 'Precisión',
+    'ROBUSTNESS': 'Solidez (Robustez)',
+    'CYBERSECURITY': 'Ciberseguridad',
+    'LOGGING': 'Registros',
+    'TECHNICAL_DOC': 'Documentación técnica',
+    'POST_MARKET': 'Vigilancia poscomercialización',
+    'INCIDENT_MGMT': 'Gestión de incidentes graves',
 }
 
 interface MAWithDetails {
@@ -24,19 +24,20 @@ interface Props {
     existingMeasure?: AdditionalMeasure
 }
 
+// Guía 16 requirement codes (the ids the backend catalog accepts)
 const REQUIREMENTS: Requirement[] = [
-    { id: 'REQ_01', title: 'Sistema de gestión de riesgos' },
-    { id: 'REQ_02', title: 'Datos y gobernanza de datos' },
-    { id: 'REQ_03', title: 'Documentación técnica' },
-    { id: 'REQ_04', title: 'Registro de operaciones' },
-    { id: 'REQ_05', title: 'Transparencia e información' },
-    { id: 'REQ_06', title: 'Supervisión humana' },
-    { id: 'REQ_07', title: 'Precisión, robustez y ciberseguridad' },
-    { id: 'REQ_08', title: 'Obligaciones del proveedor' },
-    { id: 'REQ_09', title: 'Sistema de gestión de calidad' },
-    { id: 'REQ_10', title: 'Conservación de documentación' },
-    { id: 'REQ_11', title: 'Registro y evaluación' },
-    { id: 'REQ_12', title: 'Monitorización post-comercialización' },
+    { id: 'QUALITY_MGMT', title: 'Sistema de gestión de la calidad' },
+    { id: 'RISK_MGMT', title: 'Sistema de gestión de riesgos' },
+    { id: 'HUMAN_OVERSIGHT', title: 'Supervisión humana' },
+    { id: 'DATA_GOVERNANCE', title: 'Datos y gobernanza de datos' },
+    { id: 'TRANSPARENCY', title: 'Transparencia' },
+    { id: 'ACCURACY', title: 'Precisión' },
+    { id: 'ROBUSTNESS', title: 'Solidez (Robustez)' },
+    { id: 'CYBERSECURITY', title: 'Ciberseguridad' },
+    { id: 'LOGGING', title: 'Registros' },
+    { id: 'TECHNICAL_DOC', title: 'Documentación técnica' },
+    { id: 'POST_MARKET', title: 'Vigilancia poscomercialización' },
+    { id: 'INCIDENT_MGMT', title: 'Gestión de incidentes graves' },
 ]
 
 const MATURITY_LEVELS = [
@@ -753,8 +753,10 @@ export interface ExportMAAssessment {
 
 /**
  * Export a single requirement's checklist as Excel file
+ * (the application must pass the Gatekeeper; the backend answers 409 otherwise)
  */
 export async function exportRequirementExcel(
+    applicationId: string,
     requirementCode: string,
     assessmentsMG: ExportMGData[],
     measuresAdditional?: ExportMAData[],
@@ -763,7 +765,8 @@ export async function exportRequirementExcel(
     applicationInfo?: Record<string, any>
 ): Promise<Blob | null> {
     try {
-        const response = await fetch(`${BACKEND_URL}/export/single/${requirementCode}`, {
+        const params = new URLSearchParams({ application_id: applicationId })
+        const response = await fetch(`${BACKEND_URL}/export/single/${requirementCode}?${params}`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
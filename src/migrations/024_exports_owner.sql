@@ -0,0 +1,12 @@
+-- ============================================================
+-- Migration 024: Export job owner
+-- ============================================================
+-- Process whose export queue runs the job (host:pid). On startup a queue
+-- only marks FAILED the unfinished jobs of owners that are gone, so workers
+-- sharing the table do not fail each other's jobs.
+
+ALTER TABLE exports
+ADD COLUMN IF NOT EXISTS owner TEXT;
+
+COMMENT ON COLUMN exports.owner IS
+    'Process running the job (host:pid); NULL for jobs created before this column.';
@@ -0,0 +1,60 @@
+"""
+Benchmark for services.audit: one synchronous insert per event vs the buffered writer.
+
+Times the request-path cost of recording --events audit events into a
+file-backed SQLite sink, then how long the writer takes to drain them.
+
+    python tools/bench_audit_log.py --events 20000
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'src' / 'backend'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--events', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    from services.audit import AuditEvent, AuditLogWriter, SQLiteAuditSink
+
+    def event(i):
+        return {'entity_id': f'app-{i % 100}', 'metadata': {'batch_id': f'b{i}', 'rows': 12}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sink = SQLiteAuditSink(Path(tmp) / 'sync.sqlite3')
+        start = time.perf_counter()
+        for i in range(args.events):
+            sink.write([AuditEvent.create('ASSESSMENT_UPDATE', **event(i))])
+        sync_s = time.perf_counter() - start
+
+        writer = AuditLogWriter(
+            SQLiteAuditSink(Path(tmp) / 'buffered.sqlite3'), Path(tmp) / 'spool.jsonl',
+            max_queue=args.events, batch_size=args.batch_size,
+        )
+        start = time.perf_counter()
+        for i in range(args.events):
+            writer.log('ASSESSMENT_UPDATE', **event(i))
+        enqueue_s = time.perf_counter() - start
+        writer.flush(timeout=300)
+        drained_s = time.perf_counter() - start
+        stats = writer.stats()
+        writer.close()
+
+    per_event = lambda seconds: seconds / args.events * 1e6
+    print(f"{args.events:,} events")
+    print(f"  synchronous insert   {per_event(sync_s):8.1f} us/event in the request path ({sync_s:.2f}s total)")
+    print(f"  buffered log()       {per_event(enqueue_s):8.1f} us/event in the request path")
+    print(f"  buffered drain       {drained_s:8.2f} s  ({stats['batches']} batches, "
+          f"flush p50 {stats['flush_ms']['p50']:.1f} ms, p95 {stats['flush_ms']['p95']:.1f} ms, "
+          f"peak queue {stats['peak_queue_depth']:,})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Benchmark for services.conversion_logic: per-row vs columnar plan calculation.
+
+    python tools/bench_conversion.py --rows 1000000
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'src' / 'backend'
+
+
+def per_row(assessments, conversion_logic):
+    """calculate_all_assessments as it was before the columnar API."""
+    results = []
+    for assessment in assessments:
+        maturity = assessment.get('maturity')
+        plan = conversion_logic.calculate_plan(maturity) if maturity else {'code': '00', 'description': 'Pendiente'}
+        results.append({
+            **assessment,
+            'adaptation_plan': plan['code'],
+            'adaptation_plan_desc': plan['description'],
+            'diagnosis_status': conversion_logic.get_diagnosis_status(maturity),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    import pandas as pd
+    from services import conversion_logic
+
+    rng = random.Random(16)
+    choices = [f'L{i}' for i in range(1, 9)] + [None]
+    maturity = [rng.choice(choices) for _ in range(args.rows)]
+    assessments = [{'mg_id': f'MG_{i % 500}', 'maturity': level} for i, level in enumerate(maturity)]
+    frame = pd.DataFrame(assessments)
+
+    timings = []
+    for label, fn in (
+        ('per-row loop (before)', lambda: per_row(assessments, conversion_logic)),
+        ('calculate_all_assessments', lambda: conversion_logic.calculate_all_assessments(assessments)),
+        ('calculate_plans(list)', lambda: conversion_logic.calculate_plans(maturity)),
+        ('calculate_plans(DataFrame)', lambda: conversion_logic.calculate_plans(frame)),
+    ):
+        start = time.perf_counter()
+        fn()
+        timings.append((label, time.perf_counter() - start))
+
+    print(f"{args.rows:,} rows")
+    for label, seconds in timings:
+        print(f"  {label:<28} {seconds:>7.3f} s")
+
+
+if __name__ == '__main__':
+    main()
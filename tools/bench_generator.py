@@ -0,0 +1,144 @@
+"""
+Benchmark for excel_engine.generator: standard vs write-only (streaming) mode.
+
+Each configuration runs in a fresh subprocess so peak RSS is not polluted by
+previous runs.
+
+    python tools/bench_generator.py --rows 1000 10000 100000
+
+--autoeval runs the style microbenchmark instead: a 10k-row "6. Autoev. MG"
+sheet rendered with the shared named styles vs. per-cell style objects (how
+the generator styled cells before the NamedStyle registry).
+
+    python tools/bench_generator.py --autoeval 10000
+"""
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'src' / 'backend'
+
+
+def synthetic_application(rows: int) -> dict:
+    return {
+        'project_metadata': {'nombre': 'Benchmark', 'sector': 'Banca', 'trl': '7'},
+        'measures': [
+            {'id': f'MG_{i:06d}', 'req': 'REQ_01', 'guide': 'Guía 4', 'desc': 'Medida de benchmark'}
+            for i in range(rows)
+        ],
+        'assessments_mg': [
+            {
+                'measure_id': f'MG_{i:06d}',
+                'difficulty': '02',
+                'maturity': f'L{i % 8 + 1}',
+                'diagnosis_status': '01' if i % 4 else '00',
+                'adaptation_plan': f'0{i % 5 + 1}',
+                'adaptation_plan_desc': 'Plan de adaptación',
+            }
+            for i in range(rows)
+        ],
+    }
+
+
+def run_one(rows: int, write_only: bool) -> dict:
+    sys.path.insert(0, str(BACKEND_DIR))
+    from excel_engine.generator import generate_excel
+
+    data = synthetic_application(rows)
+    start = time.perf_counter()
+    content = generate_excel(data, write_only=write_only)
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'mode': 'write_only' if write_only else 'standard',
+        'seconds': round(elapsed, 3),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        'size_kb': len(content) // 1024,
+    }
+
+
+def legacy_autoeval_sheet(generator, assessments):
+    """The autoeval sheet with fresh Font/Fill/Border objects for every cell."""
+    from openpyxl.styles import Alignment, Border, PatternFill, Side
+
+    def cell_style():
+        side = Side(style='thin')
+        return {
+            'alignment': Alignment(vertical='center', wrap_text=True),
+            'border': Border(left=side, right=side, top=side, bottom=side),
+        }
+
+    spec = generator.sheet_assessments_mg(assessments)
+    fills = {'status-ok': generator.LIGHT_GREEN, 'status-pending': generator.LIGHT_YELLOW}
+
+    def rows():
+        for row_idx, cells in spec.rows:
+            legacy = []
+            for value, style in cells:
+                if style == 'header':
+                    style = {**generator.NAMED_STYLES['header'], 'font': generator.Font(bold=True, color='FFFFFF')}
+                elif style == 'cell':
+                    style = cell_style()
+                elif isinstance(style, str):
+                    color = fills[style]  # status-ok / status-pending
+                    style = {**cell_style(), 'fill': PatternFill(start_color=color, end_color=color, fill_type='solid')}
+                legacy.append((value, style))
+            yield row_idx, legacy
+
+    return generator.SheetSpec(spec.title, rows(), spec.widths, spec.merges)
+
+
+def run_autoeval(rows: int):
+    from io import BytesIO
+    from openpyxl import Workbook
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    from excel_engine import generator
+
+    assessments = synthetic_application(rows)['assessments_mg']
+    print(f"{'styles':>8} {'render s':>9} {'save s':>7} {'cellXfs':>8}")
+    for label, build in (
+        ('per-cell', lambda: legacy_autoeval_sheet(generator, assessments)),
+        ('named', lambda: generator.sheet_assessments_mg(assessments)),
+    ):
+        wb = Workbook()
+        start = time.perf_counter()
+        generator.write_sheet(wb.active, build())
+        rendered = time.perf_counter()
+        wb.save(BytesIO())
+        saved = time.perf_counter()
+        print(f"{label:>8} {rendered - start:>9.3f} {saved - rendered:>7.3f} {len(wb._cell_styles):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--autoeval', type=int, metavar='ROWS', help='run the style microbenchmark')
+    parser.add_argument('--child', nargs=2, metavar=('ROWS', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.autoeval:
+        run_autoeval(args.autoeval)
+        return
+
+    if args.child:
+        print(json.dumps(run_one(int(args.child[0]), args.child[1] == 'write_only')))
+        return
+
+    print(f"{'rows':>8} {'mode':>11} {'seconds':>8} {'peak MB':>8} {'size KB':>8}")
+    for rows in args.rows:
+        for mode in ('standard', 'write_only'):
+            output = subprocess.run(
+                [sys.executable, __file__, '--child', str(rows), mode],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            r = json.loads(output)
+            print(f"{r['rows']:>8} {r['mode']:>11} {r['seconds']:>8} {r['peak_rss_mb']:>8} {r['size_kb']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark for organization-wide portfolio analytics.
+
+Builds synthetic frames for --apps applications with --assessments MG rows
+each (12 requirements, two subparts per MG) plus a two-entry change history
+per row, then times the heatmap, plan frequency and slowest-improving
+aggregates.
+
+    python tools/bench_portfolio_analytics.py --apps 10000 --assessments 500
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'src' / 'backend'
+
+
+def timed(fn, repeat):
+    samples, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--apps', type=int, default=10000)
+    parser.add_argument('--assessments', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    import numpy as np
+    import pandas as pd
+    from services.analytics import frequent_plans, maturity_heatmap, slowest_improving
+    from services.conversion_logic import MATURITY_LEVELS, MATURITY_TO_PLAN
+    from services.progress import PLANS
+
+    rng = np.random.default_rng(17)
+    rows = args.apps * args.assessments
+    per_app = np.arange(args.assessments)
+    measures = [f'MG_{i:04d}' for i in range((args.assessments + 1) // 2)]
+    subparts = [f'{i // 2}.{i % 2}' for i in range(args.assessments)]
+    requirements = [f'REQ_{i:02d}' for i in range(12)]
+
+    start = time.perf_counter()
+    apps = pd.Categorical.from_codes(np.repeat(np.arange(args.apps, dtype=np.int32), args.assessments),
+                                     [f'app-{i}' for i in range(args.apps)])
+    measure_codes = np.tile(per_app // 2, args.apps)
+    measure = pd.Categorical.from_codes(measure_codes, measures)
+    subpart = pd.Categorical.from_codes(np.tile(per_app, args.apps), subparts)
+    requirement = pd.Categorical.from_codes(measure_codes % len(requirements), requirements)
+    # 10% unassessed (rank 0)
+    maturity = np.where(rng.random(rows) < 0.1, 0, rng.integers(1, 9, rows)).astype(np.int8)
+    plan_of_rank = np.array([-1] + [PLANS.index(MATURITY_TO_PLAN[level]['code']) for level in MATURITY_LEVELS])
+    frame = pd.DataFrame({
+        'application_id': apps, 'measure_id': measure, 'subpart_id': subpart, 'requirement_code': requirement,
+        'maturity': maturity, 'adaptation_plan': pd.Categorical.from_codes(plan_of_rank[maturity], PLANS),
+    })
+
+    # History: an earlier, lower-or-equal rank, then the current one
+    first = np.where(maturity > 0, rng.integers(1, 9, rows).clip(max=np.maximum(maturity, 1)), 0).astype(np.int8)
+    now = pd.Timestamp('2026-01-01', tz='UTC')
+    started = now - pd.to_timedelta(rng.integers(30, 365, rows), unit='D')
+    reassessed = started + pd.to_timedelta(rng.integers(1, 30, rows), unit='D')
+    ids = {'application_id': apps, 'measure_id': measure, 'subpart_id': subpart}
+    history = pd.concat([
+        pd.DataFrame({**ids, 'maturity': first, 'recorded_at': started}),
+        pd.DataFrame({**ids, 'maturity': maturity, 'recorded_at': reassessed}),
+    ], ignore_index=True)
+    built = time.perf_counter() - start
+    size = (frame.memory_usage(deep=True).sum() + history.memory_usage(deep=True).sum()) / 1e6
+    print(f"{args.apps:,} applications x {args.assessments} assessments = {rows:,} rows "
+          f"(+{len(history):,} history rows, {size:.0f} MB) built in {built:.1f}s")
+
+    heatmap_s, heatmap = timed(lambda: maturity_heatmap(frame), args.repeat)
+    plans_s, plans = timed(lambda: frequent_plans(frame), args.repeat)
+    slowest_s, slowest = timed(lambda: slowest_improving(history, 20), args.repeat)
+    print(f"  heatmap           {heatmap_s * 1000:8.0f} ms  ({len(heatmap['cells']):,} cells)")
+    print(f"  frequent plans    {plans_s * 1000:8.0f} ms  (top {plans['plans'][0]['plan']})")
+    print(f"  slowest measures  {slowest_s * 1000:8.0f} ms  (slowest {slowest[0]['mg_id']}: "
+          f"{slowest[0]['change_per_30_days']:+.2f} levels / 30 days)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark for template fills: openpyxl vs OOXML full fill, and incremental re-export.
+
+Builds a synthetic AESIA-like checklist with --rows MG rows (and the same
+number of MA rows), fills every row with both fill backends, then re-exports
+after changing --changed-pct of the MG maturity levels.
+
+    python tools/bench_template_fill.py --rows 5000 --changed-pct 1
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'src' / 'backend'
+
+
+def timed(fn, repeat):
+    samples, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--changed-pct', type=float, default=1.0)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(BACKEND_DIR))
+    sys.path.insert(0, str(BACKEND_DIR / 'tests'))
+    from conftest import build_template
+    from excel_engine.template_cache import TemplateCache
+    from excel_engine.template_filler import TemplateFiller, TEMPLATE_MAPPING
+
+    rng = random.Random(17)
+    levels = [f'L{i}' for i in range(1, 9)]
+    subparts = [f'13.{i}' for i in range(max(1, args.rows // 10))]
+    mg_rows = [(f'MG_{i:05d}', subparts[i % len(subparts)], 'Medida') for i in range(args.rows)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build_template(Path(tmp) / TEMPLATE_MAPPING['TRANSPARENCY'], mg_rows=mg_rows, subparts=subparts, ma_ids=('MA_1', 'MA_2', 'MA_3', 'MA_4', 'MA_5', 'MA_6', 'MA_7', 'MA_8', 'MA_9', 'MA_10'))
+        filler = TemplateFiller(tmp, cache=TemplateCache())
+        assessments = [
+            {'mg_id': mg_id, 'subpart_id': subpart_id, 'difficulty': '01', 'maturity': rng.choice(levels)}
+            for mg_id, subpart_id, _ in mg_rows
+        ]
+        kwargs = {'requirement_code': 'TRANSPARENCY', 'assessments_mg': assessments}
+        filler.preload()
+        ooxml_filler = TemplateFiller(tmp, cache=filler.cache, backend='ooxml')
+
+        full, _ = timed(lambda: filler.fill_template(**kwargs), args.repeat)
+        ooxml, _ = timed(lambda: ooxml_filler.fill_template(**kwargs), args.repeat)
+        _, snapshot = filler.fill_template_incremental(None, **kwargs)
+
+        changed = max(1, int(args.rows * args.changed_pct / 100))
+        edits = []
+        for _ in range(args.repeat):
+            edited = [dict(a) for a in assessments]
+            for a in rng.sample(edited, changed):
+                a['maturity'] = rng.choice(levels)
+            edits.append(edited)
+        samples = []
+        for edited in edits:
+            start = time.perf_counter()
+            _, next_snapshot = filler.fill_template_incremental(snapshot, requirement_code='TRANSPARENCY', assessments_mg=edited)
+            samples.append(time.perf_counter() - start)
+        incremental = statistics.median(samples)
+
+    print(f"{args.rows:,} MG rows, {changed} changed ({args.changed_pct}%), median of {args.repeat}")
+    print(f"  full fill (openpyxl)   {full * 1000:>8.1f} ms")
+    print(f"  full fill (ooxml)      {ooxml * 1000:>8.1f} ms   ({full / ooxml:.1f}x)")
+    print(f"  incremental re-export  {incremental * 1000:>8.1f} ms   ({full / incremental:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Build (or incrementally refresh) the knowledge base search index.
+
+Extracts the PDFs and markdown under the knowledge base directory page by
+page and writes the mmap-loadable index served by /api/kb/search. Documents
+whose size/mtime or content hash did not change are reused from the previous
+index; --force re-extracts everything. Requires pypdf for the PDFs.
+
+    python tools/build_kb_index.py
+    python tools/build_kb_index.py --source "Info soporte/knowledge_base_sandbox_ia_completa 3" --workers 4
+    python tools/build_kb_index.py --query "artículo 13 transparencia"
+"""
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'src' / 'backend'
+
+
+def main():
+    sys.path.insert(0, str(BACKEND_DIR))
+    from services.knowledge_base import DEFAULT_INDEX_PATH, DEFAULT_SOURCE_DIR, KnowledgeBaseIndex, build_index
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--source', type=Path, default=Path(os.environ.get('KB_SOURCE_DIR') or DEFAULT_SOURCE_DIR))
+    parser.add_argument('--output', type=Path, default=Path(os.environ.get('KB_INDEX_PATH') or DEFAULT_INDEX_PATH))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--force', action='store_true', help='re-extract unchanged documents too')
+    parser.add_argument('--query', help='run a search against the built index')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    report = build_index(args.source, args.output, force=args.force, workers=args.workers)
+    elapsed = time.perf_counter() - start
+    for status in ('indexed', 'reused', 'removed', 'failed'):
+        for path in report[status]:
+            print(f"  {status:<8} {path}")
+
+    index = KnowledgeBaseIndex(args.output)
+    print(
+        f"{len(index.docs)} documents, {index.passage_count:,} passages, {index.term_count:,} terms "
+        f"-> {args.output} ({args.output.stat().st_size / 1e6:.1f} MB) in {elapsed:.1f}s"
+    )
+    if args.query:
+        start = time.perf_counter()
+        found = index.search(args.query, limit=5)
+        print(f"\n{found['total']} passages for {args.query!r} in {(time.perf_counter() - start) * 1000:.2f} ms")
+        for result in found['results']:
+            print(f"  [{result['score']:.2f}] {result['doc']} p.{result['page']}: {result['text'][:100]}...")
+
+
+if __name__ == '__main__':
+    main()
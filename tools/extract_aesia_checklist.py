@@ -1,10 +1,29 @@
 import argparse
+import contextlib
+import hashlib
+import io
 import json
+import os
 import re
 import sys
 import openpyxl
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
+
+# The relation matrix is built with the backend's sparse Relation type
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / 'src' / 'backend'))
+from services.relations import Interner, Relation
+
+# Bump when parsing changes so --manifest re-extracts unchanged sources
+EXTRACTOR_VERSION = "1"
+
+# Guía 16 sheet names; a manifest may override them in defaults.sheet_names
+DEFAULT_SHEET_NAMES = {
+    "article": "Artículo RIA",
+    "measures": "Medidas guías (MG)",
+    "relation": "Relación MG-Apart.",
+}
 
 def normalize_text(text: str) -> str:
     """Normalize text by stripping whitespace and handling None."""
@@ -12,158 +31,348 @@ def normalize_text(text: str) -> str:
         return ""
     return str(text).strip()
 
-def parse_article_sheet(wb, sheet_name: str) -> List[Dict[str, Any]]:
-    """Extracts subparts from the Article sheet."""
+# Sentinels returned by row parsers
+SKIP = object()
+STOP = object()
+
+def cell(row, idx: int):
+    """Value at idx, or None when the (streamed) row is shorter."""
+    return row[idx] if idx < len(row) else None
+
+def get_sheet(wb, sheet_name: str):
     if sheet_name not in wb.sheetnames:
         raise ValueError(f"Sheet '{sheet_name}' not found")
-    
     sheet = wb[sheet_name]
-    subparts = []
-    
-    # Find header row
-    header_row_idx = None
-    for i, row in enumerate(sheet.iter_rows(values_only=True), 1):
+    if hasattr(sheet, "reset_dimensions"):
+        # Read-only sheets trust the stored <dimension>, which some exporters
+        # get wrong; read every cell that is actually present instead.
+        sheet.reset_dimensions()
+    return sheet
+
+def scan_table(sheet, is_header, parse_row, fallback_header_row=None) -> Tuple[bool, List[Any]]:
+    """
+    Single pass over a sheet: find the header row and parse the data rows
+    below it in the same iteration.
+
+    parse_row(row, row_idx) returns a record, SKIP or STOP. When no header is
+    found and fallback_header_row is given, rows after that row are parsed
+    speculatively as data, so the fallback needs no second pass either.
+    Returns (header_found, records).
+    """
+    header_found = False
+    records: List[Any] = []
+    fallback: Optional[List[Any]] = [] if fallback_header_row else None
+    fallback_open = True
+
+    for row_idx, row in enumerate(sheet.iter_rows(values_only=True), 1):
+        if header_found:
+            record = parse_row(row, row_idx)
+            if record is STOP:
+                break
+            if record is not SKIP:
+                records.append(record)
+            continue
+
+        if is_header(row):
+            header_found = True
+            fallback = None
+            continue
+
+        if fallback is not None and fallback_open and row_idx > fallback_header_row:
+            record = parse_row(row, row_idx)
+            if record is STOP:
+                fallback_open = False
+            elif record is not SKIP:
+                fallback.append(record)
+
+    if header_found:
+        return True, records
+    return False, fallback or []
+
+def has_headers(*needles: str):
+    """Header test: every needle appears in some non-empty cell of the row."""
+    def is_header(row) -> bool:
         row_str = [str(c).lower() for c in row if c]
-        if any("apartado" in c for c in row_str) and any("descripción" in c for c in row_str):
-            header_row_idx = i
-            break
-            
-    if not header_row_idx:
-        print(f"Warning: Could not find header row in {sheet_name}, assuming row 1 or trying best effort")
-        header_row_idx = 1
+        return all(any(needle in c for c in row_str) for needle in needles)
+    return is_header
 
+def parse_article_row(row, row_idx: int):
     # Simple column mapping by index (robustness improvements possible)
     # Assuming columns: Apartado | Descripción | Descripción resumida
-    
-    for row in sheet.iter_rows(min_row=header_row_idx + 1, values_only=True):
-        if not row or not row[0]: continue
-        
-        subpart_id = normalize_text(row[0])
-        description = normalize_text(row[1])
-        short_desc = normalize_text(row[2]) if len(row) > 2 else ""
-        
-        # Stop on empty rows that look like end of table
-        if not subpart_id: break
-        
-        subparts.append({
-            "subpart_id": subpart_id,
-            "description": description,
-            "short_description": short_desc
-        })
-        
+    if not row or not row[0]: return SKIP
+
+    subpart_id = normalize_text(row[0])
+    description = normalize_text(cell(row, 1))
+    short_desc = normalize_text(cell(row, 2))
+
+    # Stop on empty rows that look like end of table
+    if not subpart_id: return STOP
+
+    return {
+        "subpart_id": subpart_id,
+        "description": description,
+        "short_description": short_desc
+    }
+
+def parse_article_sheet(wb, sheet_name: str) -> List[Dict[str, Any]]:
+    """Extracts subparts from the Article sheet."""
+    sheet = get_sheet(wb, sheet_name)
+    found, subparts = scan_table(sheet, has_headers("apartado", "descripción"), parse_article_row, fallback_header_row=1)
+    if not found:
+        print(f"Warning: Could not find header row in {sheet_name}, assuming row 1 or trying best effort")
     return subparts
 
+def parse_measures_row(row, row_idx: int):
+    if not row or not row[0]: return SKIP
+
+    mg_id = normalize_text(row[0])
+    description = normalize_text(cell(row, 1))
+    guidance = normalize_text(cell(row, 2))
+
+    if not mg_id.upper().startswith("MG"): return STOP
+
+    return {
+        "mg_id": mg_id,
+        "description": description,
+        "guidance_questions": [q.strip() for q in guidance.split('\n') if q.strip()]
+    }
+
 def parse_measures_sheet(wb, sheet_name: str) -> List[Dict[str, Any]]:
     """Extracts MG details from Measures sheet."""
-    if sheet_name not in wb.sheetnames:
-        raise ValueError(f"Sheet '{sheet_name}' not found")
-        
-    sheet = wb[sheet_name]
-    measures = []
-    
-    header_row_idx = None
-    for i, row in enumerate(sheet.iter_rows(values_only=True), 1):
-        row_str = [str(c).lower() for c in row if c]
-        if any("idmedida" in c for c in row_str) and any("descripción" in c for c in row_str):
-            header_row_idx = i
-            break
-            
-    if not header_row_idx:
-        header_row_idx = 1
-        
-    for row in sheet.iter_rows(min_row=header_row_idx + 1, values_only=True):
-        if not row or not row[0]: continue
-        
-        mg_id = normalize_text(row[0])
-        description = normalize_text(row[1])
-        guidance = normalize_text(row[2]) if len(row) > 2 else ""
-        
-        if not mg_id.upper().startswith("MG"): break
-        
-        measures.append({
-            "mg_id": mg_id,
-            "description": description,
-            "guidance_questions": [q.strip() for q in guidance.split('\n') if q.strip()]
-        })
-        
+    sheet = get_sheet(wb, sheet_name)
+    _, measures = scan_table(sheet, has_headers("idmedida", "descripción"), parse_measures_row, fallback_header_row=1)
     return measures
 
+# Subpart id at the start of a row label, e.g. "13.1", "9.2.a", "AnexoIV.1"
+SUBPART_ID_RE = re.compile(r'^([0-9]+\.[0-9]+(\.[a-z]+(\.[vix]+)?)?|Anexo[A-Z]+\.[0-9]+(\.[a-z])?)')
+
 def parse_relation_sheet(wb, sheet_name: str, valid_mgs: List[str], valid_subparts: List[str]) -> List[Dict[str, str]]:
     """Extracts MG-Subpart relations from the Matrix sheet."""
-    if sheet_name not in wb.sheetnames:
-        raise ValueError(f"Sheet '{sheet_name}' not found")
-        
-    sheet = wb[sheet_name]
-    relations = []
-    
+    sheet = get_sheet(wb, sheet_name)
+    valid_mgs = set(valid_mgs)
+    valid_subparts = set(valid_subparts)
+    mg_col_map = {} # {col_index: mg_id}
+    relation = Relation()
+
     # 1. Detect Matrix Structure
     # Look for the row that has MG IDs in columns
-    mg_col_map = {} # {col_index: mg_id}
-    header_row_idx = None
-    
-    for i, row in enumerate(sheet.iter_rows(values_only=True), 1):
+    def is_header(row) -> bool:
         # check if this row contains multiple valid MG IDs
-        found_mgs = 0
         current_map = {}
         for col_idx, cell_value in enumerate(row):
             val = normalize_text(cell_value)
             if val in valid_mgs:
-                found_mgs += 1
                 current_map[col_idx] = val
-        
-        if found_mgs >= 3: # Heuristic: if we find at least 3 MGs, this is the header row
-            header_row_idx = i
-            mg_col_map = current_map
-            break
-            
-    if not header_row_idx:
-        raise ValueError("Could not detect Matrix header row with MG IDs")
-        
-    # 2. Iterate rows looking for Subparts
-    for row_idx, row in enumerate(sheet.iter_rows(min_row=header_row_idx + 1, values_only=True), header_row_idx + 1):
+        if len(current_map) >= 3: # Heuristic: if we find at least 3 MGs, this is the header row
+            mg_col_map.update(current_map)
+            # Columns interned in sheet order so relations come out row by row, left to right
+            relation.columns = Interner(current_map.values())
+            return True
+        return False
+
+    # 2. Rows below the header hold the subparts
+    def parse_row(row, row_idx: int):
         # The first column usually holds the subpart or article text
         # We need to extract the subpart_id from the text (e.g. "13.1. Diseño...") -> "13.1"
-        
-        cell_text = normalize_text(row[0])
-        if not cell_text: continue
-        
-        # Try to match subpart ID at start of string
-        # Regex for patterns like "13.1", "9.2.a", "AnexoIV.1"
-        match = re.match(r'^([0-9]+\.[0-9]+(\.[a-z]+(\.[vix]+)?)?|Anexo[A-Z]+\.[0-9]+(\.[a-z])?)', cell_text)
-        
+        cell_text = normalize_text(cell(row, 0))
+        if not cell_text: return SKIP
+
+        match = SUBPART_ID_RE.match(cell_text)
         if not match:
-             # Check if exact match in valid_subparts
-             if cell_text in valid_subparts:
-                 subpart_id = cell_text
-             else:
-                 continue
+            # Check if exact match in valid_subparts
+            if cell_text in valid_subparts:
+                subpart_id = cell_text
+            else:
+                return SKIP
         else:
             subpart_id = match.group(1)
-            
+
         if subpart_id not in valid_subparts:
             # Maybe the regex was too greedy or strict, try fuzzy check or skip
             # For now, skip to avoid bad data
             print(f"Skipping row {row_idx}: Subpart '{subpart_id}' not found in Article definitions.")
-            continue
-            
-        # 3. Check for X in MG columns
+            return SKIP
+
+        # 3. Check for X in MG columns; empty cells (most of the matrix) are skipped
+        # without normalizing and marks go straight into the relation
         for col_idx, mg_id in mg_col_map.items():
-            cell_val = normalize_text(row[col_idx])
-            if cell_val.upper() == 'X':
-                relations.append({
-                    "mg_id": mg_id,
-                    "subpart_id": subpart_id
-                })
-                
-    return relations
+            value = cell(row, col_idx)
+            if value is not None and normalize_text(value).upper() == 'X':
+                relation.add(subpart_id, mg_id)
+        return SKIP
+
+    found, _ = scan_table(sheet, is_header, parse_row)
+    if not found:
+        raise ValueError("Could not detect Matrix header row with MG IDs")
+
+    return [{"mg_id": mg_id, "subpart_id": subpart_id} for subpart_id, mg_id in relation.pairs()]
+
+def extract_checklist(file_path: Path, req_code: str, sheet_names: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Parse one checklist workbook (streamed, read-only) into the catalog JSON shape."""
+    sheet_names = {**DEFAULT_SHEET_NAMES, **(sheet_names or {})}
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        print("Parsing Subparts...")
+        subparts = parse_article_sheet(wb, sheet_names["article"])
+        valid_subpart_ids = [s['subpart_id'] for s in subparts]
+        print(f"Found {len(subparts)} subparts.")
+
+        print("Parsing Measures...")
+        measures = parse_measures_sheet(wb, sheet_names["measures"])
+        valid_mg_ids = [m['mg_id'] for m in measures]
+        print(f"Found {len(measures)} measures.")
+
+        print("Parsing Relations...")
+        relations = parse_relation_sheet(wb, sheet_names["relation"], valid_mg_ids, valid_subpart_ids)
+        print(f"Found {len(relations)} relations.")
+    finally:
+        wb.close()
+
+    return {
+        "requirement_code": req_code,
+        "source_file": file_path.name,
+        "subparts": subparts,
+        "measures": measures,
+        "relations": relations
+    }
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def load_manifest(manifest_path: Path) -> Dict[str, Any]:
+    try:
+        import yaml
+    except ImportError:
+        raise RuntimeError("--manifest requires PyYAML (pip install pyyaml)")
+    with open(manifest_path, encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+def extract_manifest_entry(file_path: Path, req_code: str, sheet_names: Dict[str, str]) -> Tuple[Dict[str, Any], str]:
+    """Process-pool worker: extract one checklist, returning (result, captured log)."""
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        print(f"Processing {file_path.name} for {req_code}...")
+        result = extract_checklist(file_path, req_code, sheet_names)
+    return result, log.getvalue()
+
+def build_catalog(
+    manifest_path: Path,
+    source_dir: Optional[Path] = None,
+    output: Optional[Path] = None,
+    workers: Optional[int] = None,
+    force: bool = False,
+) -> Dict[str, List[str]]:
+    """
+    Extract every requirement listed in a catalog manifest into one artifact.
+
+    Checklists run concurrently in a process pool. A requirement whose source
+    file hash, sheet names and extractor version match the previous artifact
+    is copied over instead of re-parsed (unless force). Source files resolve
+    against source_dir (default: the manifest's directory); the artifact
+    defaults to catalog.json next to the manifest.
+
+    Returns {"extracted": [...], "skipped": [...]} requirement codes.
+    """
+    manifest = load_manifest(manifest_path)
+    source_dir = Path(source_dir or manifest_path.parent)
+    output = Path(output or manifest_path.parent / "catalog.json")
+    default_sheet_names = {**DEFAULT_SHEET_NAMES, **(manifest.get("defaults") or {}).get("sheet_names", {})}
+
+    previous: Dict[str, Dict[str, Any]] = {}
+    if output.exists() and not force:
+        with open(output, encoding='utf-8') as f:
+            artifact = json.load(f)
+        if artifact.get("extractor_version") == EXTRACTOR_VERSION:
+            previous = {r["requirement_code"]: r for r in artifact.get("requirements", [])}
+
+    entries = []
+    for item in manifest["requirements"]:
+        file_path = source_dir / item["source_xlsx"]
+        if not file_path.exists():
+            raise FileNotFoundError(f"{item['requirement_code']}: source file {file_path} not found")
+        sheet_names = {**default_sheet_names, **item.get("sheet_names", {})}
+        entries.append((item, file_path, sheet_names, file_sha256(file_path)))
+
+    results: Dict[str, Dict[str, Any]] = {}
+    pending = []
+    for item, file_path, sheet_names, sha256 in entries:
+        cached = previous.get(item["requirement_code"])
+        if cached and cached.get("source_sha256") == sha256 and cached.get("sheet_names") == sheet_names:
+            results[item["requirement_code"]] = cached
+            print(f"Unchanged: {file_path.name} ({item['requirement_code']})")
+        else:
+            pending.append((item, file_path, sheet_names, sha256))
+
+    if pending:
+        max_workers = workers or min(len(pending), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            futures = [
+                pool.submit(extract_manifest_entry, file_path, item["requirement_code"], sheet_names)
+                for item, file_path, sheet_names, _ in pending
+            ]
+            for (item, file_path, sheet_names, sha256), future in zip(pending, futures):
+                result, log = future.result()
+                print(log, end="")
+                results[item["requirement_code"]] = {
+                    **result,
+                    "description": item.get("description"),
+                    "source_sha256": sha256,
+                    "sheet_names": sheet_names,
+                }
+
+    artifact = {
+        "catalog_release": manifest.get("catalog_release"),
+        "source": manifest.get("source"),
+        "manifest_version": manifest.get("version"),
+        "extractor_version": EXTRACTOR_VERSION,
+        "requirements": [results[item["requirement_code"]] for item, *_ in entries],
+    }
+    output.parent.mkdir(parents=True, exist_ok=True)
+    partial = output.with_suffix(output.suffix + ".part")
+    with open(partial, 'w', encoding='utf-8') as f:
+        json.dump(artifact, f, indent=2, ensure_ascii=False)
+    os.replace(partial, output)
+    print(f"Catalog {artifact['catalog_release']} saved to {output}")
+
+    pending_codes = {item["requirement_code"] for item, *_ in pending}
+    return {
+        "extracted": [item["requirement_code"] for item, *_ in entries if item["requirement_code"] in pending_codes],
+        "skipped": [item["requirement_code"] for item, *_ in entries if item["requirement_code"] not in pending_codes],
+    }
 
 def main():
     parser = argparse.ArgumentParser(description="Extract data from AESIA Guía 16 Excel Checklist")
-    parser.add_argument("xlsx_file", help="Path to the .xlsx file")
-    parser.add_argument("--req-code", required=True, help="Requirement Code (e.g. RISK_MGMT)")
+    parser.add_argument("xlsx_file", nargs="?", help="Path to the .xlsx file")
+    parser.add_argument("--req-code", help="Requirement Code (e.g. RISK_MGMT)")
     parser.add_argument("--output", help="Output JSON file path")
+    parser.add_argument("--manifest", help="Catalog manifest (e.g. catalog/aesia_g16/manifest.yaml): extract every requirement into one artifact")
+    parser.add_argument("--source-dir", help="Directory holding the manifest's checklists (default: manifest directory)")
+    parser.add_argument("--workers", type=int, help="Worker processes for --manifest (default: CPU count)")
+    parser.add_argument("--force", action="store_true", help="Re-extract unchanged sources in --manifest mode")
     
     args = parser.parse_args()
+
+    if args.manifest:
+        try:
+            summary = build_catalog(
+                Path(args.manifest),
+                source_dir=Path(args.source_dir) if args.source_dir else None,
+                output=Path(args.output) if args.output else None,
+                workers=args.workers,
+                force=args.force,
+            )
+        except Exception as e:
+            print(f"Error building catalog: {e}")
+            sys.exit(1)
+        print(f"Extracted {len(summary['extracted'])}, unchanged {len(summary['skipped'])}.")
+        return
+
+    if not args.xlsx_file or not args.req_code:
+        parser.error("xlsx_file and --req-code are required unless --manifest is given")
     
     file_path = Path(args.xlsx_file)
     if not file_path.exists():
@@ -173,32 +382,7 @@ def main():
     print(f"Processing {file_path.name} for {args.req_code}...")
     
     try:
-        wb = openpyxl.load_workbook(file_path, data_only=True)
-        
-        # Hardcoded sheet names based on Guía spec, but customizable
-        # "Artículo RIA", "Medidas guías (MG)", "Relación MG-Apart."
-        
-        print("Parsing Subparts...")
-        subparts = parse_article_sheet(wb, "Artículo RIA")
-        valid_subpart_ids = [s['subpart_id'] for s in subparts]
-        print(f"Found {len(subparts)} subparts.")
-        
-        print("Parsing Measures...")
-        measures = parse_measures_sheet(wb, "Medidas guías (MG)")
-        valid_mg_ids = [m['mg_id'] for m in measures]
-        print(f"Found {len(measures)} measures.")
-        
-        print("Parsing Relations...")
-        relations = parse_relation_sheet(wb, "Relación MG-Apart.", valid_mg_ids, valid_subpart_ids)
-        print(f"Found {len(relations)} relations.")
-        
-        result = {
-            "requirement_code": args.req_code,
-            "source_file": file_path.name,
-            "subparts": subparts,
-            "measures": measures,
-            "relations": relations
-        }
+        result = extract_checklist(file_path, args.req_code)
         
         if args.output:
             with open(args.output, 'w', encoding='utf-8') as f:
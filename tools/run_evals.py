@@ -0,0 +1,57 @@
+"""
+Run the golden set declared in usecase_manifest.yaml and gate on its pass_thresholds.
+
+PLAN cases run against calculate_plan, EXT/NEG cases against the local
+rule-based assessor, whose outputs must validate against output_claims.json.
+Prints pass rates, latency percentiles and throughput; exits 1 when a
+threshold is missed (or any case fails with --strict).
+
+    python tools/run_evals.py
+    python tools/run_evals.py --dataset big_set.jsonl --concurrency 32 --json report.json
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'src' / 'backend'
+
+
+def main() -> int:
+    sys.path.insert(0, str(BACKEND_DIR))
+    from services.contracts import get_contracts
+    from services.evals import DEFAULT_MANIFEST_PATH, EvalRunner, run_golden_set
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--manifest', type=Path, default=DEFAULT_MANIFEST_PATH)
+    parser.add_argument('--dataset', type=Path, help='override the manifest dataset')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--json', type=Path, help='also write the full report here')
+    parser.add_argument('--strict', action='store_true', help='fail when any case fails')
+    args = parser.parse_args()
+
+    report = run_golden_set(args.manifest, args.dataset, EvalRunner(
+        concurrency=args.concurrency, validate_output=get_contracts()['claims'],
+    ))
+    if args.json:
+        args.json.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+
+    print(f"{report['dataset']} ({report['assessor']} assessor)")
+    print(f"  {report['passed']}/{report['cases']} passed ({report['pass_rate']:.1%})")
+    for kind, stats in report['by_kind'].items():
+        print(f"    {kind:<6} {stats['passed']}/{stats['cases']}")
+    latency = report['latency_ms']
+    print(f"  latency p50 {latency['p50']:.2f} ms, p90 {latency['p90']:.2f} ms, p99 {latency['p99']:.2f} ms, max {latency['max']:.2f} ms")
+    print(f"  throughput {report['throughput_per_s']} cases/s ({report['elapsed_s']} s)")
+    for gate in report['gates']:
+        status = {True: 'ok', False: 'FAIL', None: 'n/a'}[gate['passed']]
+        print(f"  [{status:>4}] {gate['name']} = {gate['value']} (threshold {gate['threshold']})")
+    for failure in report['failures']:
+        print(f"  {failure['test_id']}: {'; '.join(failure['reasons'])}")
+
+    failed = not report['ok'] or (args.strict and report['failures'])
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())